@@ -0,0 +1,59 @@
+function samples = MotoTrakDecodeStream ( fid, num_samples )
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+% MotoTrakDecodeStream.m
+% Vulintus, Inc., 2026.
+% Date Created:         2026-10-19
+% Last date modified:   2026-10-19
+% Description: Reads and decodes one stream of trial data from a
+%   compressed MotoTrak data file (file version -7).  Each stream is saved
+%   as a codec identifier (uint8), the number of bytes that follow
+%   (uint32), and then the encoded samples:
+%
+%   0 - raw: each sample as a float32.
+%   1 - delta varint: the difference between each sample and the previous
+%       sample, zigzag-encoded, as variable-length integers.
+%   2 - quantized delta varint: the quantum (float32), followed by each
+%       sample as a whole number of quanta, encoded as in codec 1.
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+%Read the codec and the number of bytes in the encoded stream
+codec = fread(fid, 1, 'uint8');
+num_bytes = fread(fid, 1, 'uint32');
+
+if (codec == 0)
+    
+    %Raw samples
+    samples = fread(fid, num_samples, '*float32')';
+    return;
+    
+end
+
+%Read the quantum
+quantum = 1;
+if (codec == 2)
+    quantum = double(fread(fid, 1, 'float32'));
+    num_bytes = num_bytes - 4;
+end
+
+%An empty stream has no variable-length integers
+if (num_bytes == 0)
+    samples = zeros(1, 0);
+    return;
+end
+
+%Read the variable-length integers.  Each byte holds 7 bits of a value,
+%least-significant group first, and the high bit is set on every byte of a
+%value except the last.
+encoded = double(fread(fid, num_bytes, 'uint8'));
+is_last_byte = (encoded < 128);
+value_index = cumsum([1; is_last_byte(1:end-1)]);
+first_byte = [1; find(is_last_byte(1:end-1)) + 1];
+byte_position = (1:length(encoded))' - first_byte(value_index);
+zigzag = accumarray(value_index, mod(encoded, 128) .* 128.^byte_position);
+
+%Undo the zigzag encoding, and add up the differences
+is_negative = (mod(zigzag, 2) == 1);
+deltas = zigzag / 2;
+deltas(is_negative) = -(zigzag(is_negative) + 1) / 2;
+samples = (cumsum(deltas) * quantum)';
@@ -8,7 +8,8 @@ function data = MotoTrakFileRead ( file )
 % Author: David Pruitt
 % Description: This is a first pass at some code to load in MotoTrak 2.0
 %   data files into Matlab.  These data files are generated by the C# 
-%   MotoTrak program using file version -5.
+%   MotoTrak program using file version -5, -6, or (with compressed trial
+%   data, see MotoTrakDecodeStream.m) -7.
 %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 %Create an empty structure for the data
@@ -23,7 +24,7 @@ fseek(fid, 0, -1);
 %Get the file version
 version = fread(fid, 1, 'int8');
 
-if (version == -5 || version == -6)
+if (version == -5 || version == -6 || version == -7)
     
     %If the file version is -5, then go ahead and attempt to read it
     data.version = version;
@@ -98,7 +99,7 @@ if (version == -5 || version == -6)
     data.nominal_parameters = {};
     
     %Nominal parameters only exist for file version -6 and later.  Not for -5.
-    if (version == -6)
+    if (version <= -6)
         
         %Read in the number of nominal parameters
         N = fread(fid, 1, 'uint32');
@@ -247,7 +248,7 @@ trial.parameters = variable_params;
 trial.nominal_parameters = {};
 
 %If this is file version -6 or later, read in any nominal parameters for this trial
-if (version == -6)
+if (version <= -6)
     
     %Read the number of nominal parameters
     N = fread(fid, 1, 'uint8');
@@ -280,5 +281,9 @@ N = fread(fid, 1, 'uint32');
 %Read in each data stream
 trial.signal = nan(num_streams, N);
 for i=1:num_streams
-    trial.signal(i, :) = fread(fid, N, '*float32');
+    if (version == -7)
+        trial.signal(i, :) = MotoTrakDecodeStream(fid, N);
+    else
+        trial.signal(i, :) = fread(fid, N, '*float32');
+    end
 end
\ No newline at end of file
@@ -0,0 +1,330 @@
+function [trial, trial_index] = MotoTrakReadTrial ( file, trial_number )
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+% MotoTrakReadTrial.m
+% Vulintus, Inc., 2026.
+% Date Created:         2026-10-19
+% Last date modified:   2026-10-19
+% Description: Reads a single trial from a MotoTrak 2.0 data file (file
+%   version -5, -6, or -7) without reading the trials that come before it.
+%   The C# MotoTrak program saves a trial index file alongside each
+%   session file (the session file name plus ".index"), which holds the
+%   byte offset of each trial.  If the trial index is missing, or does not
+%   match the session file, the session file is scanned instead, skipping
+%   over the trial signals.
+%
+%   trial_number is the one-based position of the trial in the session.
+%   trial_index is a structure array with the trial number, byte offset,
+%   block length, result, and sample count of every trial that was found.
+%   Call MotoTrakReadTrial(file, []) to get only the trial index.
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+trial = [];
+
+%Open the MotoTrak file
+fid = fopen(file, 'r');
+fseek(fid, 0, 'eof');
+file_length = ftell(fid);
+fseek(fid, 0, -1);
+
+%Get the file version
+version = fread(fid, 1, 'int8');
+if (version ~= -5 && version ~= -6 && version ~= -7)
+    disp('Incorrect file version.  We cannot read this file.');
+    fclose(fid);
+    trial_index = [];
+    return;
+end
+
+%Skip the session start time, rat name, booth name, stage title, and device name
+fseek(fid, 8, 0);
+for i=1:4
+    N = fread(fid, 1, 'uint8');
+    fseek(fid, N, 0);
+end
+
+%Skip the calibration coefficients
+N = fread(fid, 1, 'uint8');
+fseek(fid, 4*N, 0);
+
+%Read the number of data streams, and skip their metadata
+number_of_streams = fread(fid, 1, 'uint8');
+for i=1:(2*number_of_streams)
+    N = fread(fid, 1, 'uint8');
+    fseek(fid, N, 0);
+end
+
+%Skip the names of the quantitative (and, for file version -6, nominal) stage parameters
+number_of_parameter_lists = 1 + (version <= -6);
+for j=1:number_of_parameter_lists
+    N = fread(fid, 1, 'uint32');
+    for i=1:N
+        n_param_name = fread(fid, 1, 'uint8');
+        fseek(fid, n_param_name, 0);
+    end
+end
+
+scan_position = ftell(fid);
+
+%Load the trial index.  The last entry must point to a trial block with
+%the same trial number, otherwise the index does not match this file.
+trial_index = mototrak_read_index_file([file '.index'], file_length);
+if (~isempty(trial_index))
+    last_entry = trial_index(end);
+    if (mototrak_is_trial_block_at(fid, last_entry))
+        scan_position = last_entry.byte_offset + last_entry.block_length;
+    else
+        trial_index = trial_index([]);
+    end
+end
+
+%Scan the rest of the file for trials that are not in the trial index
+fseek(fid, scan_position, -1);
+while (ftell(fid) < file_length)
+    [entry, is_complete] = mototrak_scan_block(fid, number_of_streams, version);
+    if (~is_complete || ftell(fid) > file_length)
+        break;
+    end
+    if (~isempty(entry))
+        trial_index(end+1) = entry;
+    end
+end
+
+%Seek to the requested trial and read it in
+if (~isempty(trial_number))
+    if (trial_number >= 1 && trial_number <= length(trial_index))
+        fseek(fid, trial_index(trial_number).byte_offset + 4, -1);
+        trial = mototrak_read_trial(fid, number_of_streams, version);
+    else
+        disp('The requested trial does not exist in this file.');
+    end
+end
+
+%Close the data file.
+fclose(fid);
+
+
+%% mototrak_read_index_file - a subfunction that reads the trial index file that goes along with a session file
+
+function trial_index = mototrak_read_index_file ( index_file, session_file_length )
+
+trial_index = struct('trial_number', {}, 'byte_offset', {}, 'block_length', {}, 'result', {}, 'sample_count', {});
+
+fid = fopen(index_file, 'r');
+if (fid == -1)
+    return;
+end
+
+%Check the signature and version of the trial index file
+signature = fread(fid, 4, '*char')';
+index_version = fread(fid, 1, 'int32');
+if (~strcmp(signature, 'MTIX') || isempty(index_version) || index_version ~= 1)
+    fclose(fid);
+    return;
+end
+
+%Read each 21-byte entry, stopping at the first entry that is incomplete or
+%that points beyond the end of the session file
+while (true)
+    entry.trial_number = fread(fid, 1, 'uint32');
+    entry.byte_offset = fread(fid, 1, 'int64');
+    entry.block_length = fread(fid, 1, 'int32');
+    entry.result = fread(fid, 1, 'uint8');
+    entry.sample_count = fread(fid, 1, 'uint32');
+    
+    if (isempty(entry.sample_count) || entry.byte_offset < 0 || entry.block_length <= 0 || ...
+            entry.byte_offset + entry.block_length > session_file_length)
+        break;
+    end
+    
+    trial_index(end+1) = entry;
+end
+
+fclose(fid);
+
+
+%% mototrak_is_trial_block_at - a subfunction that checks whether a trial index entry points to the trial block it describes
+
+function result = mototrak_is_trial_block_at ( fid, entry )
+
+fseek(fid, entry.byte_offset, -1);
+block_id = fread(fid, 1, 'int32');
+trial_number = fread(fid, 1, 'uint32');
+result = (~isempty(trial_number) && block_id == 0 && trial_number == entry.trial_number);
+
+
+%% mototrak_scan_block - a subfunction that steps over one block of a session file without reading the trial signal
+
+function [entry, is_complete] = mototrak_scan_block ( fid, num_streams, version )
+
+entry = [];
+byte_offset = ftell(fid);
+
+%Read in the block identifier
+block_id = fread(fid, 1, 'int32');
+is_complete = ~isempty(block_id);
+if (~is_complete)
+    return;
+end
+
+if (block_id == 0)
+    
+    %Trial: read the trial number and result, and skip everything else
+    trial_number = fread(fid, 1, 'uint32');
+    fseek(fid, 8, 0);
+    result = fread(fid, 1, 'uint8');
+    if (result == 'P')
+        fseek(fid, 8, 0);
+    end
+    fseek(fid, 5*4, 0);
+    
+    N = fread(fid, 1, 'uint8');
+    fseek(fid, 4*N, 0);
+    
+    if (version <= -6)
+        N = fread(fid, 1, 'uint8');
+        for i=1:N
+            n_chars = fread(fid, 1, 'uint8');
+            fseek(fid, n_chars, 0);
+        end
+    end
+    
+    N = fread(fid, 1, 'uint8');
+    fseek(fid, 8*N, 0);
+    N = fread(fid, 1, 'uint8');
+    fseek(fid, 8*N, 0);
+    
+    sample_count = fread(fid, 1, 'uint32');
+    if (isempty(sample_count))
+        is_complete = false;
+        return;
+    end
+    if (version == -7)
+        for i=1:num_streams
+            fseek(fid, 1, 0);
+            num_bytes = fread(fid, 1, 'uint32');
+            fseek(fid, num_bytes, 0);
+        end
+    else
+        fseek(fid, 4*num_streams*sample_count, 0);
+    end
+    
+    entry.trial_number = trial_number;
+    entry.byte_offset = byte_offset;
+    entry.block_length = ftell(fid) - byte_offset;
+    entry.result = result;
+    entry.sample_count = sample_count;
+    
+elseif (block_id >= 1 && block_id <= 3) || (block_id == 6)
+    
+    %Manual feed, pause start, pause finish, or session end: skip the timestamp
+    fseek(fid, 8, 0);
+    
+elseif (block_id == 4)
+    
+    %Timestamped note: skip the timestamp and the note
+    fseek(fid, 8, 0);
+    note_length = fread(fid, 1, 'uint16');
+    fseek(fid, note_length, 0);
+    
+elseif (block_id == 5)
+    
+    %General session notes: skip the notes
+    note_length = fread(fid, 1, 'uint16');
+    fseek(fid, note_length, 0);
+    
+end
+
+
+%% mototrak_read_trial - a subfunction that reads in individual trials from the MotoTrak session file
+
+function [trial, trial_number] = mototrak_read_trial ( fid, num_streams, version )
+
+
+%Read in the trial number
+trial_number = fread(fid, 1, 'uint32');
+
+%Read in the start time of the trial
+trial.start_time = fread(fid, 1, 'float64');
+
+%Read in the outcome of the trial
+result = fread(fid, 1, 'uint8');
+trial.result = result;
+
+%If the trial was a pause, then read the end time of the trial
+if (result == 'P')
+    trial.end_time = fread(fid, 1, 'float64');
+else
+    trial.end_time = NaN;
+end
+
+%Read in the hit window duration
+trial.hit_window_duration = fread(fid, 1, 'float32');
+
+%Read in the pre-trial duration
+trial.pre_trial_duration = fread(fid, 1, 'float32');
+
+%Read in the post-trial duration
+trial.post_trial_duration = fread(fid, 1, 'float32');
+
+%Read in the post-trial time-out period
+trial.post_trial_timeout = fread(fid, 1, 'float32');
+
+%Read in the manipulandum position
+trial.position = fread(fid, 1, 'float32');
+
+%Read in the number of quantitative parameters that exist for the trial
+N = fread(fid, 1, 'uint8');
+
+%Read in each quantitative parameter value
+variable_params = [];
+for i=1:N
+    %Read in the parameter value
+    param_value = fread(fid, 1, 'float32');
+    variable_params(end+1) = param_value;
+end
+trial.parameters = variable_params;
+
+%Declare an empty list of nominal parameters
+trial.nominal_parameters = {};
+
+%If this is file version -6 or later, read in any nominal parameters for this trial
+if (version <= -6)
+    
+    %Read the number of nominal parameters
+    N = fread(fid, 1, 'uint8');
+    
+    %Read in each nominal parameter
+    for i=1:N
+        n_chars = fread(fid, 1, 'uint8');
+        nominal_param_value = fread(fid, n_chars, '*char')';
+        trial.nominal_parameters{end+1} = nominal_param_value;
+    end
+    
+end
+
+%Read in the number of hits that occurred during this trial
+N = fread(fid, 1, 'uint8');
+
+%Read in the timestamp of each hit
+trial.hit_times = fread(fid, N, '*float64');
+
+%Read in the number of output triggers that occurred during this
+%trial
+N = fread(fid, 1, 'uint8');
+
+%Read in the output triggers for the trial
+trial.output_trigger_times = fread(fid, N, '*float64');
+
+%Read in the number of samples in each data stream for this trial
+N = fread(fid, 1, 'uint32');
+
+%Read in each data stream
+trial.signal = nan(num_streams, N);
+for i=1:num_streams
+    if (version == -7)
+        trial.signal(i, :) = MotoTrakDecodeStream(fid, N);
+    else
+        trial.signal(i, :) = fread(fid, N, '*float32');
+    end
+end
\ No newline at end of file
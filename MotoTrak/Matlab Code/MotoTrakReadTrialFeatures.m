@@ -0,0 +1,58 @@
+function features = MotoTrakReadTrialFeatures ( file )
+
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+% MotoTrakReadTrialFeatures.m
+% Vulintus, Inc., 2026.
+% Date Created:         2026-10-19
+% Last date modified:   2026-10-19
+% Description: Reads the features of each trial of a MotoTrak 2.0 session
+%   (peak value, time to peak, time above threshold, and hit latency, along
+%   with the same features of the absolute value of the signal), as they
+%   were calculated by the C# MotoTrak program when each trial ended.  The
+%   features are saved in a file alongside each session file (the session
+%   file name plus ".features").  An empty structure array is returned if
+%   the session was saved without a features file.
+%
+%   Times are in milliseconds from the beginning of the hit window, and
+%   peak indices are zero-based indices into the trial signal.
+%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+features = struct('trial_number', {}, 'threshold', {}, 'peak_value', {}, 'peak_index', {}, ...
+    'time_to_peak_ms', {}, 'time_above_threshold_ms', {}, 'absolute_peak_value', {}, 'absolute_peak_index', {}, ...
+    'absolute_time_to_peak_ms', {}, 'absolute_time_above_threshold_ms', {}, 'hit_latency_ms', {});
+
+fid = fopen([file '.features'], 'r');
+if (fid == -1)
+    return;
+end
+
+%Check the signature and version of the features file
+signature = fread(fid, 4, '*char')';
+features_version = fread(fid, 1, 'int32');
+if (~strcmp(signature, 'MTFX') || isempty(features_version) || features_version ~= 1)
+    fclose(fid);
+    return;
+end
+
+%Read each 44-byte entry, stopping at the first entry that is incomplete
+while (true)
+    entry.trial_number = fread(fid, 1, 'uint32');
+    entry.threshold = fread(fid, 1, 'float32');
+    entry.peak_value = fread(fid, 1, 'float32');
+    entry.peak_index = fread(fid, 1, 'int32');
+    entry.time_to_peak_ms = fread(fid, 1, 'float32');
+    entry.time_above_threshold_ms = fread(fid, 1, 'float32');
+    entry.absolute_peak_value = fread(fid, 1, 'float32');
+    entry.absolute_peak_index = fread(fid, 1, 'int32');
+    entry.absolute_time_to_peak_ms = fread(fid, 1, 'float32');
+    entry.absolute_time_above_threshold_ms = fread(fid, 1, 'float32');
+    entry.hit_latency_ms = fread(fid, 1, 'float32');
+    
+    if (isempty(entry.hit_latency_ms))
+        break;
+    end
+    
+    features(end+1) = entry;
+end
+
+fclose(fid);
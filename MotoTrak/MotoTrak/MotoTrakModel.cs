@@ -6,6 +6,7 @@ using System.Collections.Generic;
 using System.Collections.ObjectModel;
 using System.ComponentModel;
 using System.Diagnostics;
+using System.IO;
 using System.Linq;
 using System.Text;
 using System.Threading;
@@ -571,6 +572,20 @@ namespace MotoTrak
             //getters/setters are written.
             Stages = MotorStage.RetrieveAllStages();
 
+            //Watch the stage implementations folder, so that changes to stage implementations are picked up without restarting MotoTrak
+            if (config.StageHotReload)
+            {
+                try
+                {
+                    _stage_reloader = new MotoTrakStageReloader(config.GetStageImplementationsFolder(), Stages, CurrentDevice);
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    _stage_reloader = null;
+                }
+            }
+
             //Create a brand new session to be run as our current session
             CurrentSession = new MotoTrakSession();
             CurrentSession.BoothLabel = BoothLabel;
@@ -626,6 +641,12 @@ namespace MotoTrak
         /// </summary>
         public void ShutdownMotoTrak ()
         {
+            //Stop watching for changes to stage implementations
+            if (_stage_reloader != null)
+            {
+                _stage_reloader.Close();
+            }
+
             //Cancel the background thread that is reading data from the MotoTrak controller board.
             if (_background_thread != null)
             {
@@ -717,8 +738,15 @@ namespace MotoTrak
                     _history_loader.WorkerSupportsCancellation = true;
                     _history_loader.DoWork += delegate
                     {
-                        //Load in this rat's recent history
-                        RecentBehaviorSessions = MotoTrakFileRead.ReadHistory(CurrentSession.RatName, CurrentSession.SelectedStage.StageName);
+                        //Load in this rat's most recent sessions, for the performance plot and for stages that start from where the last sessions ended
+                        List<Tuple<string, MotoTrakSession>> recent_session_files = MotoTrakFileRead.ReadHistoryFiles(CurrentSession.RatName,
+                            CurrentSession.SelectedStage.StageName, MotoTrakConfiguration.GetInstance().RecentHistorySessionCount);
+                        RecentBehaviorSessions = recent_session_files.Select(x => x.Item2).ToList();
+
+                        //Look up the total number of hits this rat has on this stage from the hit index.  Sessions that were just loaded
+                        //are not read again if they still need to be added to the index.
+                        CurrentSession.SelectedStage.CumulativeHitCount = MotoTrakHitIndex.GetCumulativeHits(CurrentSession.RatName,
+                            CurrentSession.SelectedStage.StageName, recent_session_files);
 
                         //Adjust stage parameters based on data from the recent behavior sessions
                         try
@@ -731,6 +759,9 @@ namespace MotoTrak
                             ErrorLoggingService.GetInstance().LogExceptionError(e);
                         }
 
+                        //Run the stage implementation's code on synthetic data, so the first frames of the session do not have to compile it
+                        WarmUpStageImplementation(CurrentSession.SelectedStage);
+
                         //Tell the calling function that we are done
                         _history_loader.ReportProgress(0);
                     };
@@ -757,6 +788,10 @@ namespace MotoTrak
         private int _device_analog_value = 0;
         private int _device_calibrated_value = 0;
         private MotoTrakFileSave PrimarySaveLocation = null;
+        private MotoTrakShadowStage _shadow_stage = null;
+        private MotoTrakStreamRecorder _stream_recorder = null;
+        private MotoTrakSignalQualityMonitor _signal_quality_monitor = null;
+        private MotoTrakStageReloader _stage_reloader = null;
 
         #endregion
 
@@ -871,14 +906,14 @@ namespace MotoTrak
              * that has been transformed from its raw format to something more useful.
              */
 
-            //Create a 2D array to hold transformed stream data
-            List<List<double>> stream_data_transformed = new List<List<double>>();
-            for (int i = 0; i < CurrentSession.SelectedStage.TotalDataStreams; i++)
-            {
-                //Add a list of floating-point values for each stream we will be handling
-                var new_stream = Enumerable.Repeat<double>(0, buffer_size).ToList();
-                stream_data_transformed.Add(new_stream);
-            }
+            //Create a block to hold transformed stream data, with an array for each stream we will be handling.  The block keeps
+            //the most recent buffer_size samples, and starts out filled with zeros.
+            MotorSignalBlock stream_data_transformed = new MotorSignalBlock(CurrentSession.SelectedStage.TotalDataStreams, buffer_size);
+            stream_data_transformed.Reset(CurrentSession.SelectedStage.TotalDataStreams, buffer_size);
+
+            //Create blocks that are reused on each frame to hold the new data from the Arduino board, and the transformed new data
+            MotorSignalBlock new_data_block = new MotorSignalBlock();
+            MotorSignalBlock transformed_new_data = new MotorSignalBlock();
             
             /*
              * Now we will move on from declaring variables...
@@ -942,15 +977,29 @@ namespace MotoTrak
                     LoadNewlySelectedStageParametersOnMicrocontroller();
                 }
 
+                //Switch over to any stage implementations that have been reloaded.  This is only done between trials, so that each
+                //trial is run from start to finish by the same stage implementation.
+                if (_stage_reloader != null && TrialState != TrialRunState.TrialRun && TrialState != TrialRunState.TrialEnd)
+                {
+                    _stage_reloader.SwapReloadedStageImplementations(Stages, CurrentSession.SelectedStage);
+                }
+
                 //Run the autopositioner
                 MotoTrakAutopositioner.GetInstance().RunAutopositioner();
 
                 //Set the buffer size (it may change inbetween trials)
                 buffer_size = CurrentSession.SelectedStage.TotalRecordedSamplesPerTrial;
+                stream_data_transformed.WindowLength = buffer_size;
 
                 //Read in new datapoints from the Arduino board
                 var new_data_points = ReadNewDataFromArduino();
 
+                //Record all of the new data points, if the whole session is being recorded
+                if (_stream_recorder != null)
+                {
+                    _stream_recorder.Add(new_data_points);
+                }
+
                 //If the number of new data points exceeds the buffer size, reduce the number of new data points and only keep the most recent
                 if (new_data_points.Count > buffer_size)
                 {
@@ -960,43 +1009,41 @@ namespace MotoTrak
                 //Set a local variable indicating the number of new data points we have
                 int number_of_new_data_points = new_data_points.Count;
 
-                //Make a transposed copy of the new data
-                var transposed_new_data = MotorMath.Transpose(new_data_points);
+                //Copy the new data into a block, with an array for each stream (this transposes the data)
+                new_data_block.SetFromRows(new_data_points);
                 
-                List<List<double>> transformed_new_data = null;
-                try
+                MotorStageFrame frame = ProcessStageFrame(new_data_block, number_of_new_data_points, stream_data_transformed, transformed_new_data);
+                if (frame == null)
                 {
-                    //Perform transformations on the new data
-                    transformed_new_data = CurrentSession.SelectedStage.StageImplementation.TransformSignals(transposed_new_data,
-                        CurrentSession.SelectedStage, CurrentSession.Device);
+                    try
+                    {
+                        //Perform transformations on the new data.  Stage implementations that work with lists are called through an adapter.
+                        MotorSignalBlockAdapter.For(CurrentSession.SelectedStage.StageImplementation).TransformSignalBlock(new_data_block,
+                            transformed_new_data, CurrentSession.SelectedStage, CurrentSession.Device);
 
-                    //Add the transformed data to the stream_data_transformed variable
-                    for (int stream_index = 0; stream_index < transformed_new_data.Count; stream_index++)
+                        //Add the transformed data to the stream_data_transformed variable.  The oldest samples are dropped, so that
+                        //the buffer stays within the limits of the defined buffer size.
+                        stream_data_transformed.Append(transformed_new_data);
+                    }
+                    catch
                     {
-                        stream_data_transformed[stream_index].AddRange(transformed_new_data[stream_index]);
+                        transformed_new_data.Reset(0, 0);
+                        MotoTrakMessaging.GetInstance().AddMessage("Unable to transform signal data!");
                     }
                 }
-                catch
+
+                //Check the new data for problems with the equipment
+                if (_signal_quality_monitor != null)
                 {
-                    MotoTrakMessaging.GetInstance().AddMessage("Unable to transform signal data!");
+                    _signal_quality_monitor.AddFrame(new_data_block, transformed_new_data);
                 }
-
-                /*
-                 * At this point, we have read in new data and transformed it.
-                 * Now we need to reduce the size of the buffer to make sure it stays 
-                 * within the limits of the defined buffer size. 
-                 */
-                 
-                //Do the same for the transformed data (these are in transposed form, so it has to be done a bit differently)
-                stream_data_transformed = stream_data_transformed.Select((x, index) => 
-                    x.Skip(Math.Max(0, x.Count - buffer_size)).Take(buffer_size).ToList()).ToList();
                 
                 //Set these properties for debugging purposes
                 try
                 {
-                    if (transposed_new_data[device_signal_index].Count > 0)
+                    if (new_data_block.Length > 0)
                     {
-                        DeviceAnalogValue = Convert.ToInt32(transposed_new_data[device_signal_index][0]);
+                        DeviceAnalogValue = Convert.ToInt32(new_data_block[device_signal_index, 0]);
                     }
                 }
                 catch
@@ -1006,7 +1053,7 @@ namespace MotoTrak
                 
                 try
                 {
-                    DeviceCalibratedValue = Convert.ToInt32(stream_data_transformed[device_signal_index][stream_data_transformed[device_signal_index].Count - 1]);
+                    DeviceCalibratedValue = Convert.ToInt32(stream_data_transformed[device_signal_index, stream_data_transformed.Length - 1]);
                 }
                 catch
                 {
@@ -1023,9 +1070,15 @@ namespace MotoTrak
                 //Handle the current session state
                 HandleSessionState();
 
+                //Hand this frame to the shadow stage, if one is running alongside the session
+                if (_shadow_stage != null)
+                {
+                    _shadow_stage.AddFrame(transformed_new_data, number_of_new_data_points, buffer_size, TrialState == TrialRunState.TrialWait);
+                }
+
                 //Handle the current trial state
                 HandleTrialState(device_signal_index, number_of_new_data_points, buffer_size, 
-                    stream_data_transformed, transposed_new_data, transformed_new_data);
+                    stream_data_transformed, new_data_block, transformed_new_data, frame);
 
                 //Iterate through all trial actions and perform any actions that need to occur during this frame
                 List<MotorTrialAction> actions_to_retain = new List<MotorTrialAction>();
@@ -1081,7 +1134,8 @@ namespace MotoTrak
         }
 
         private void HandleTrialState (int device_signal_index, int number_of_new_data_points, int buffer_size, 
-            List<List<double>> stream_data_transformed, List<List<Int64>> transposed_new_data, List<List<double>> transformed_new_data)
+            MotorSignalBlock stream_data_transformed, MotorSignalBlock new_data_block, MotorSignalBlock transformed_new_data,
+            MotorStageFrame frame)
         {
             //Perform actions based on which trial state we are in
             switch (TrialState)
@@ -1100,8 +1154,7 @@ namespace MotoTrak
                     try
                     {
                         //Grab the data that is currently in the buffer and take the mean of it.
-                        var device_signal_raw = transposed_new_data[device_signal_index].Select(x => Convert.ToInt32(x)).ToList();
-                        int mean_signal_value = Convert.ToInt32(Math.Round(device_signal_raw.Average()));
+                        int mean_signal_value = Convert.ToInt32(Math.Round(new_data_block.Mean(device_signal_index)));
 
                         //Set the baseline on the controller board.
                         ControllerBoard.SetBaseline(mean_signal_value);
@@ -1162,16 +1215,24 @@ namespace MotoTrak
                         }
                     }
 
-                    try
+                    if (frame != null && frame.Phase == MotorStageFrame.FramePhase.WaitingForTrial)
                     {
-                        //Run code specific to this stage to check for trial initiation
-                        trial_initiation_index = CurrentSession.SelectedStage.StageImplementation.CheckSignalForTrialInitiation(stream_data_transformed,
-                            number_of_new_data_points, CurrentSession.SelectedStage);
+                        //The stage implementation has already checked for trial initiation while handling the frame
+                        trial_initiation_index = frame.TrialInitiationIndex;
                     }
-                    catch
+                    else
                     {
-                        //If an error occurred within the stage implementation's code, log it:
-                        MotoTrakMessaging.GetInstance().AddMessage("Error encountered while attempting to check for trial initiation");
+                        try
+                        {
+                            //Run code specific to this stage to check for trial initiation
+                            trial_initiation_index = MotorSignalBlockAdapter.For(CurrentSession.SelectedStage.StageImplementation).CheckSignalBlockForTrialInitiation(
+                                stream_data_transformed, number_of_new_data_points, CurrentSession.SelectedStage);
+                        }
+                        catch
+                        {
+                            //If an error occurred within the stage implementation's code, log it:
+                            MotoTrakMessaging.GetInstance().AddMessage("Error encountered while attempting to check for trial initiation");
+                        }
                     }
 
                     //Handle the case in which a trial was initiated
@@ -1189,6 +1250,15 @@ namespace MotoTrak
                             //The following method basically just fills the "trial_device_signal" object with the data that occured up until the device value
                             //broke the trial initiation threshold.  It also fills the same data into the "trial" object, but in raw form.
                             HandleTrialInitiation(buffer_size, trial_initiation_index, stream_data_transformed, CurrentTrial);
+                            if (_shadow_stage != null)
+                            {
+                                _shadow_stage.StartTrial(trial_initiation_index);
+                            }
+
+                            if (_signal_quality_monitor != null)
+                            {
+                                _signal_quality_monitor.NotifyTrialInitiation();
+                            }
 
                             //Create an event for the trial initation
                             MotorTrialEvent trial_initiation_event = new MotorTrialEvent()
@@ -1236,134 +1306,71 @@ namespace MotoTrak
                     //maybe a VNS stimulus or other output).  After the trial time has expired, we should move on to the next state.
                     //Trial success does NOT immediately move us to the next state.  ONLY TIME.
                     
-                    //Add the new raw data to the trial object to be saved to disk later.
-                    for (int i = 0; i < CurrentTrial.TrialData.Count && i < transformed_new_data.Count; i++)
+                    if (frame != null && frame.Phase == MotorStageFrame.FramePhase.TrialRunning)
                     {
-                        CurrentTrial.TrialData[i].AddRange(transformed_new_data[i]);
+                        //The stage implementation has already handled this frame: it added the new data to the trial, checked for
+                        //trial events (which were added to the trial by AddNewTrialEvents as they were found), reacted to them, and
+                        //performed its actions during the trial.
+                        EnqueueTrialActions(frame.Actions);
                     }
-                    
-                    //Check to see if the animal has succeeded up until this point in the trial, based on this stage's criterion for success.
-                    if (CurrentTrial.Result == MotorTrialResult.Unknown)
+                    else
                     {
-                        try
+                        //Add the new raw data to the trial object to be saved to disk later.
+                        for (int i = 0; i < CurrentTrial.TrialData.Count && i < transformed_new_data.StreamCount; i++)
                         {
-                            //Check to see whether any events have occurred in the trial, based on the currently selected stage
-                            //implementation.  "CheckForTrialEvent" is typically the function that will determine whether a trial
-                            //is successful or not.
-                            var new_events = CurrentSession.SelectedStage.StageImplementation.CheckForTrialEvent(
-                                CurrentTrial, number_of_new_data_points, CurrentSession.SelectedStage);
-
-                            //Add new trial events to the current trial.
-                            foreach (var n in new_events)
+                            CurrentTrial.TrialData[i].AddRange(transformed_new_data.GetStream(i));
+                        }
+
+                        //Check to see if the animal has succeeded up until this point in the trial, based on this stage's criterion for success.
+                        if (CurrentTrial.Result == MotorTrialResult.Unknown)
+                        {
+                            try
                             {
-                                MotorTrialEvent evt = new MotorTrialEvent()
-                                {
-                                    EventType = n.Item1,
-                                    EventIndex = n.Item2
-                                };
+                                //Check to see whether any events have occurred in the trial, based on the currently selected stage
+                                //implementation.  "CheckForTrialEvent" is typically the function that will determine whether a trial
+                                //is successful or not.
+                                var new_events = CurrentSession.SelectedStage.StageImplementation.CheckForTrialEvent(
+                                    CurrentTrial, number_of_new_data_points, CurrentSession.SelectedStage);
+
+                                //Add new trial events to the current trial.
+                                AddNewTrialEvents(new_events);
+                            }
+                            catch (Exception ex)
+                            {
+                                //Log the error
+                                MotoTrakMessaging.GetInstance().AddMessage("Error while checking for trial events within stage implementation");
+                            }
 
-                                bool are_multiple_events_allowed = MotorTrialEventTypeConverter.AreMultipleEventsAllowed(evt.EventType);
-                                bool does_this_event_already_exist = CurrentTrial.TrialEvents.Where(x => x.EventType == evt.EventType).FirstOrDefault() != null;
-                                if (are_multiple_events_allowed || !does_this_event_already_exist)
-                                {
-                                    CurrentTrial.TrialEvents.Add(evt);
-                                    
-                                    //Check to see if a successful trial was recorded
-                                    if (CurrentTrial.Result == MotorTrialResult.Unknown)
-                                    {
-                                        if (evt.EventType == MotorTrialEventType.SuccessfulTrial)
-                                        {
-                                            //Flag the current trial as a successful trial
-                                            CurrentTrial.Result = MotorTrialResult.Hit;
-                                            CurrentTrial.HitTimes.Add(DateTime.Now);
-                                            CurrentTrial.HitIndices.Add(evt.EventIndex);
-
-                                            //Add this event to the TrialEventsQueue, which is what the GUI can access
-                                            TrialEventsQueue.Enqueue(new Tuple<MotorTrialEventType, int>(evt.EventType, evt.EventIndex));
-                                            BackgroundPropertyChanged("TrialEventsQueue");
-
-                                            //Handle the hit tone
-                                            if (_is_tone_on_hit == 1 && _hit_tone != null)
-                                            {
-                                                if (motorboard != null)
-                                                {
-                                                    motorboard.V21_TONES_PLAY_TONE_ASYNC(_hit_tone);
-                                                }
-
-                                                _is_tone_on_hit = 2;
-                                                _is_tone_on_miss = 0;
-                                            }
-                                            else if (_is_tone_on_hit_window == 2)
-                                            {
-                                                if (motorboard != null)
-                                                {
-                                                    motorboard.V21_TONES_STOP_TONE();
-                                                }
-
-                                                _is_tone_on_hit_window = 0;
-                                            }
-                                        }
-                                    }
-                                }
+                            //Check to see what actions we need to take based on the events that occurred
+                            try
+                            {
+                                List<MotorTrialAction> event_actions = null;
+                                event_actions = CurrentSession.SelectedStage.StageImplementation.ReactToTrialEvents(
+                                    CurrentTrial, CurrentSession.SelectedStage);
+                                EnqueueTrialActions(event_actions);
+                            }
+                            catch
+                            {
+                                //Log the error
+                                MotoTrakMessaging.GetInstance().AddMessage("Error while attempting to react to trial events within stage implementation");
                             }
                         }
-                        catch (Exception ex)
-                        {
-                            //Log the error
-                            MotoTrakMessaging.GetInstance().AddMessage("Error while checking for trial events within stage implementation");
-                        }
-                        
-                        //Check to see what actions we need to take based on the events that occurred
+
                         try
                         {
-                            List<MotorTrialAction> event_actions = null;
-                            event_actions = CurrentSession.SelectedStage.StageImplementation.ReactToTrialEvents(
-                                CurrentTrial, CurrentSession.SelectedStage);
-                            if (event_actions != null)
-                            {
-                                foreach (var a in event_actions)
-                                {
-                                    if (a.ActionType == MotorTrialActionType.SendStimulationTrigger)
-                                    {
-                                        CurrentTrial.OutputTriggers.Add(DateTime.Now);
-                                    }
-
-                                    _trial_actions.Enqueue(a);
-                                }
-                            }
+                            //Perform any necessary actions that need to be taken according to the stage parameters that are unrelated to
+                            //actions that are taken given the success of a trial.
+                            List<MotorTrialAction> actions = null;
+                            actions = CurrentSession.SelectedStage.StageImplementation.PerformActionDuringTrial(CurrentTrial, CurrentSession.SelectedStage);
+                            EnqueueTrialActions(actions);
                         }
                         catch
                         {
                             //Log the error
-                            MotoTrakMessaging.GetInstance().AddMessage("Error while attempting to react to trial events within stage implementation");
+                            MotoTrakMessaging.GetInstance().AddMessage("Error in stage implementation: PerformActionDuringTrial function");
                         }
                     }
                     
-                    try
-                    {
-                        //Perform any necessary actions that need to be taken according to the stage parameters that are unrelated to
-                        //actions that are taken given the success of a trial.
-                        List<MotorTrialAction> actions = null;
-                        actions = CurrentSession.SelectedStage.StageImplementation.PerformActionDuringTrial(CurrentTrial, CurrentSession.SelectedStage);
-                        if (actions != null)
-                        {
-                            foreach (var a in actions)
-                            {
-                                if (a.ActionType == MotorTrialActionType.SendStimulationTrigger)
-                                {
-                                    CurrentTrial.OutputTriggers.Add(DateTime.Now);
-                                }
-
-                                _trial_actions.Enqueue(a);
-                            }
-                        }
-                    }
-                    catch
-                    {
-                        //Log the error
-                        MotoTrakMessaging.GetInstance().AddMessage("Error in stage implementation: PerformActionDuringTrial function");
-                    }
-                    
                     //Check to see if this trial has finished
                     int samples_collected = CurrentTrial.TrialData[0].Count;
                     if (samples_collected >= CurrentSession.SelectedStage.TotalRecordedSamplesPerTrial)
@@ -1425,6 +1432,11 @@ namespace MotoTrak
                             //Log the error
                             MotoTrakMessaging.GetInstance().AddMessage("Error while attempting to react to trial events within stage implementation");
                         }
+
+                        if (_shadow_stage != null)
+                        {
+                            _shadow_stage.EndTrial(CurrentTrial);
+                        }
                         
                         //Change the session state to end this trial.
                         TrialState = TrialRunState.TrialEnd;
@@ -1498,6 +1510,22 @@ namespace MotoTrak
                         }
                     }
                     
+                    //Calculate the features of the trial's signal once, so that the stage methods below (and the session file) can share them
+                    try
+                    {
+                        IMotorTrialFeatureCalculator feature_calculator = CurrentSession.SelectedStage.StageImplementation as IMotorTrialFeatureCalculator;
+                        if (feature_calculator != null)
+                        {
+                            CurrentTrial.Features = feature_calculator.CalculateTrialFeatures(CurrentTrial, CurrentSession.SelectedStage);
+                        }
+                    }
+                    catch (Exception e)
+                    {
+                        //If an error was encountered, log it.  The stage methods calculate whatever they need without the features.
+                        ErrorLoggingService.GetInstance().LogExceptionError(e);
+                        CurrentTrial.Features = null;
+                    }
+
                     //Get the number of minutes into the session that this trial occurred at
                     double minutes_passed = CurrentTrial.StartTime.Subtract(CurrentSession.StartTime).TotalMinutes;
 
@@ -1545,6 +1573,9 @@ namespace MotoTrak
                     //Adjust the hit threshold for adaptive stages
                     CurrentSession.SelectedStage.StageImplementation.AdjustDynamicStageParameters(CurrentSession.Trials,
                         CurrentTrial, CurrentSession.SelectedStage);
+
+                    //Save a checkpoint of the adaptive state of the session, so it can be resumed if the session is interrupted
+                    SaveSessionCheckpoint();
                     
                     //Set the current trial to null.  This will subsequently send notifications up to the UI,
                     //telling the UI that there is not currently a trial taking place.
@@ -1591,6 +1622,135 @@ namespace MotoTrak
             }
         }
 
+        /// <summary>
+        /// Handles one processing frame with a single call into the stage implementation, if the stage implementation supports it.
+        /// </summary>
+        /// <returns>The frame, with its results, or null if the stage implementation must be called one step at a time</returns>
+        private MotorStageFrame ProcessStageFrame (MotorSignalBlock new_data_block, int number_of_new_data_points,
+            MotorSignalBlock stream_data_transformed, MotorSignalBlock transformed_new_data)
+        {
+            IMotorStageFrameProcessor frame_processor = CurrentSession.SelectedStage.StageImplementation as IMotorStageFrameProcessor;
+            if (frame_processor == null)
+            {
+                return null;
+            }
+
+            MotorStageFrame frame = new MotorStageFrame(new_data_block, number_of_new_data_points, stream_data_transformed, transformed_new_data,
+                CurrentSession.SelectedStage, CurrentSession.Device);
+
+            //The trial steps of the frame are only handled here if the trial state will not be changed by a manual feed
+            //or by the session state before HandleTrialState runs.  Otherwise, only the new data is transformed.
+            if (!IsTriggerManualFeed && SessionState == SessionRunState.SessionRunning)
+            {
+                if (TrialState == TrialRunState.TrialWait)
+                {
+                    frame.Phase = MotorStageFrame.FramePhase.WaitingForTrial;
+                }
+                else if (TrialState == TrialRunState.TrialRun && CurrentTrial != null)
+                {
+                    frame.Phase = MotorStageFrame.FramePhase.TrialRunning;
+                    frame.Trial = CurrentTrial;
+                    frame.TrialEventHandler = AddNewTrialEvents;
+                }
+            }
+
+            try
+            {
+                if (!frame_processor.ProcessFrame(frame))
+                {
+                    return null;
+                }
+            }
+            catch (Exception e)
+            {
+                //The results that were stored in the frame before the error are kept
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                MotoTrakMessaging.GetInstance().AddMessage("Error in stage implementation: ProcessFrame function");
+            }
+
+            return frame;
+        }
+
+        /// <summary>
+        /// Adds new events to the current trial, and handles a successful trial.
+        /// </summary>
+        /// <param name="new_events">The new events, as returned by the stage implementation</param>
+        private void AddNewTrialEvents (List<Tuple<MotorTrialEventType, int>> new_events)
+        {
+            foreach (var n in new_events)
+            {
+                MotorTrialEvent evt = new MotorTrialEvent()
+                {
+                    EventType = n.Item1,
+                    EventIndex = n.Item2
+                };
+
+                bool are_multiple_events_allowed = MotorTrialEventTypeConverter.AreMultipleEventsAllowed(evt.EventType);
+                bool does_this_event_already_exist = CurrentTrial.TrialEvents.Where(x => x.EventType == evt.EventType).FirstOrDefault() != null;
+                if (are_multiple_events_allowed || !does_this_event_already_exist)
+                {
+                    CurrentTrial.TrialEvents.Add(evt);
+
+                    //Check to see if a successful trial was recorded
+                    if (CurrentTrial.Result == MotorTrialResult.Unknown)
+                    {
+                        if (evt.EventType == MotorTrialEventType.SuccessfulTrial)
+                        {
+                            //Flag the current trial as a successful trial
+                            CurrentTrial.Result = MotorTrialResult.Hit;
+                            CurrentTrial.HitTimes.Add(DateTime.Now);
+                            CurrentTrial.HitIndices.Add(evt.EventIndex);
+
+                            //Add this event to the TrialEventsQueue, which is what the GUI can access
+                            TrialEventsQueue.Enqueue(new Tuple<MotorTrialEventType, int>(evt.EventType, evt.EventIndex));
+                            BackgroundPropertyChanged("TrialEventsQueue");
+
+                            //Handle the hit tone
+                            if (_is_tone_on_hit == 1 && _hit_tone != null)
+                            {
+                                if (motorboard != null)
+                                {
+                                    motorboard.V21_TONES_PLAY_TONE_ASYNC(_hit_tone);
+                                }
+
+                                _is_tone_on_hit = 2;
+                                _is_tone_on_miss = 0;
+                            }
+                            else if (_is_tone_on_hit_window == 2)
+                            {
+                                if (motorboard != null)
+                                {
+                                    motorboard.V21_TONES_STOP_TONE();
+                                }
+
+                                _is_tone_on_hit_window = 0;
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        /// <summary>
+        /// Queues actions created by the stage implementation during a trial.
+        /// </summary>
+        /// <param name="actions">The actions</param>
+        private void EnqueueTrialActions (List<MotorTrialAction> actions)
+        {
+            if (actions != null)
+            {
+                foreach (var a in actions)
+                {
+                    if (a.ActionType == MotorTrialActionType.SendStimulationTrigger)
+                    {
+                        CurrentTrial.OutputTriggers.Add(DateTime.Now);
+                    }
+
+                    _trial_actions.Enqueue(a);
+                }
+            }
+        }
+
         private void HandleSessionState ( )
         {
             //Act on any changes to the session state
@@ -1632,7 +1792,11 @@ namespace MotoTrak
                     SessionOverviewValues.Clear();
                     BackgroundPropertyChanged("SessionOverviewValues");
 
+                    //If the last session of this rat on this stage was interrupted, pick up its thresholds and stage state where they were
+                    ResumeSessionFromCheckpoint();
+
                     //Open a file at all necessary save locations to save data
+                    PrimarySaveLocation = null;
                     if (!string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().DataPath))
                     {
                         MotoTrakFileSave primary_data_path = new MotoTrakFileSave(CurrentSession, MotoTrakFileSave.SavePathType.PrimaryPath);
@@ -1641,12 +1805,32 @@ namespace MotoTrak
                         {
                             primary_data_path.SaveSessionHeaders(CurrentSession);
                             PrimarySaveLocation = primary_data_path;
+
+                            //Keep a copy of the session file at the secondary data path, updated as the session is saved
+                            if (!string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().SecondaryDataPath))
+                            {
+                                string secondary_folder = Path.GetDirectoryName(MotoTrakFileSave.ResolveFullFilePathAndName(CurrentSession, MotoTrakFileSave.SavePathType.SecondaryPath));
+                                primary_data_path.StartMirroring(Path.Combine(secondary_folder, Path.GetFileName(primary_data_path.FilePath)));
+                            }
                         }
                         else
                         {
                             MotoTrakMessaging.GetInstance().AddMessage("Unable to save to primary data path!");
                         }
                     }
+
+                    //Start the shadow stage, if a second stage implementation has been chosen to run alongside this session
+                    StartShadowStage();
+
+                    //Start recording the raw data for the whole session, if that has been turned on
+                    StartStreamRecorder();
+
+                    //Start watching the signals for problems with the equipment
+                    if (MotoTrakConfiguration.GetInstance().SignalQualityMonitor)
+                    {
+                        _signal_quality_monitor = new MotoTrakSignalQualityMonitor(CurrentSession, MotoTrakConfiguration.GetInstance().FlatSignalLimitInSeconds,
+                            MotoTrakConfiguration.GetInstance().SignalClipMaximum);
+                    }
                     
                     //Set the session state to be running
                     SessionState = SessionRunState.SessionRunning;
@@ -1710,6 +1894,15 @@ namespace MotoTrak
                         MotoTrakMessaging.GetInstance().AddMessage("Unable to generate end-of-session message.");
                         ErrorLoggingService.GetInstance().LogExceptionError(e);
                     }
+
+                    //Stop the shadow stage and display how it compared with the stage implementation that ran the session
+                    CloseShadowStage();
+
+                    //Stop recording the raw data for the session
+                    CloseStreamRecorder();
+
+                    //Save the signal quality summary next to the session file
+                    CloseSignalQualityMonitor();
                     
                     //Set the end time of the current session
                     CurrentSession.EndTime = DateTime.Now;
@@ -1741,16 +1934,26 @@ namespace MotoTrak
                         PrimarySaveLocation.SaveOverallSessionNotes(CurrentSession.SessionNotes);
                         PrimarySaveLocation.SaveEvent(MotoTrakFileSave.BlockType.SessionEnd, CurrentSession.EndTime);
                         PrimarySaveLocation.CloseFileStream();
+                        if (!string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().SecondaryDataPath) && !PrimarySaveLocation.IsMirrorComplete)
+                        {
+                            MotoTrakMessaging.GetInstance().AddMessage("Unable to save to the secondary datapath!");
+                        }
+
+                        //Add this session to the hit index, so the next session can find the rat's total hits without re-reading its history
+                        MotoTrakHitIndex.RecordSession(CurrentSession, PrimarySaveLocation.FilePath);
+                        CurrentSession.SelectedStage.CumulativeHitCount = MotoTrakHitIndex.GetCumulativeHits(CurrentSession.RatName, CurrentSession.SelectedStage.StageName);
                     }
 
-                    //Save the session to the secondary data path
-                    if (!string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().SecondaryDataPath))
+                    //If the session could not be saved to the primary data path, there is nothing to mirror, so save the whole session
+                    //to the secondary data path now
+                    if (PrimarySaveLocation == null && !string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().SecondaryDataPath))
                     {
                         MotoTrakFileSave secondary_data_path = new MotoTrakFileSave(CurrentSession, MotoTrakFileSave.SavePathType.SecondaryPath);
                         bool secondary_data_path_success = secondary_data_path.OpenFileStream();
                         if (secondary_data_path_success)
                         {
                             secondary_data_path.SaveEntireSession(CurrentSession);
+                            secondary_data_path.CloseFileStream();
                         }
                         else
                         {
@@ -1758,6 +1961,12 @@ namespace MotoTrak
                         }
                     }
 
+                    //The session ended normally, so it will not need to be resumed
+                    if (!string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().DataPath))
+                    {
+                        MotoTrakSessionCheckpoint.Delete(MotoTrakSessionCheckpoint.GetCheckpointPath(CurrentSession.RatName, CurrentSession.SelectedStage.StageName));
+                    }
+
                     //Reset the stage parameters to their initial values
                     CurrentSession.SelectedStage.ResetStateToInitialValues();
 
@@ -1823,6 +2032,18 @@ namespace MotoTrak
             BackgroundPropertyChanged("MonitoredSignal");
         }
 
+        private void CopyDataToMonitoredSignal (MotorSignalBlock data)
+        {
+            MonitoredSignal.Clear();
+            for (int i = 0; i < data.StreamCount; i++)
+            {
+                var new_sync_stream = new SynchronizedCollection<double>(new object(), data.GetStream(i));
+                MonitoredSignal.Add(new_sync_stream);
+            }
+
+            BackgroundPropertyChanged("MonitoredSignal");
+        }
+
         private List<List<Int64>> ReadNewDataFromArduino()
         {
             //Read in new streaming data from the Arduino board
@@ -1830,6 +2051,183 @@ namespace MotoTrak
             return new_data_points;
         }
 
+        /// <summary>
+        /// Runs two synthetic trials through a separate instance of a stage's implementation before the session starts.  IronPython
+        /// compiles each method, and the dynamic language runtime builds the rules for each call site, the first time they are used,
+        /// which slows down the first frames of a session.  The compiled code is shared by every instance of the stage implementation,
+        /// so warming up a separate instance warms up the stage's own instance without changing its session state.
+        /// </summary>
+        /// <param name="stage">The selected stage</param>
+        private void WarmUpStageImplementation(MotorStage stage)
+        {
+            PythonStageImplementation python_stage_implementation = stage.StageImplementation as PythonStageImplementation;
+            if (!MotoTrakConfiguration.GetInstance().StageWarmUp || python_stage_implementation == null)
+            {
+                return;
+            }
+
+            try
+            {
+                PythonStageImplementation warm_up_instance = python_stage_implementation.CreateInstance();
+                warm_up_instance.PrepareShadowSession(stage);
+
+                //The first frame of the first run shows what the first frame of a session would cost without the warm-up, and the
+                //first frame of the second run shows what it costs after the warm-up
+                MotorStageSyntheticFrame.RunTimes cold_run = MotorStageSyntheticFrame.Run(warm_up_instance, stage, CurrentSession.Device);
+                MotorStageSyntheticFrame.RunTimes warm_run = MotorStageSyntheticFrame.Run(warm_up_instance, stage, CurrentSession.Device);
+
+                MotoTrakMessaging.GetInstance().AddMessage("Stage warm-up took " + cold_run.TotalMilliseconds.ToString("0") + " ms.  First frame: " +
+                    cold_run.FirstFrameMilliseconds.ToString("0.0") + " ms before warm-up, " + warm_run.FirstFrameMilliseconds.ToString("0.0") + " ms after.");
+            }
+            catch (Exception e)
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to warm up the stage implementation");
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        /// <summary>
+        /// Starts the shadow stage for a new session, if one has been set in the configuration file
+        /// </summary>
+        private void StartShadowStage()
+        {
+            _shadow_stage = null;
+
+            string shadow_stage_file_name = MotoTrakConfiguration.GetInstance().ShadowStageImplementationFileName;
+            if (string.IsNullOrEmpty(shadow_stage_file_name))
+            {
+                return;
+            }
+
+            try
+            {
+                IMotorStageImplementation shadow_stage_implementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation(shadow_stage_file_name);
+
+                //The shadow stage's log is saved next to the session file
+                string log_path = null;
+                if (PrimarySaveLocation != null)
+                {
+                    log_path = Path.ChangeExtension(PrimarySaveLocation.FilePath, "shadow.txt");
+                }
+
+                _shadow_stage = new MotoTrakShadowStage(shadow_stage_implementation, shadow_stage_file_name, CurrentSession.SelectedStage,
+                    MotoTrakConfiguration.GetInstance().ShadowQueueLength, log_path);
+            }
+            catch (Exception e)
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to start shadow stage implementation " + shadow_stage_file_name);
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                _shadow_stage = null;
+            }
+        }
+
+        /// <summary>
+        /// Stops the shadow stage at the end of a session and displays its summary
+        /// </summary>
+        private void CloseShadowStage()
+        {
+            if (_shadow_stage == null)
+            {
+                return;
+            }
+
+            try
+            {
+                _shadow_stage.Close();
+                foreach (string msg in _shadow_stage.CreateSessionSummary())
+                {
+                    MotoTrakMessaging.GetInstance().AddMessage(msg);
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+
+            _shadow_stage = null;
+        }
+
+        /// <summary>
+        /// Starts recording the raw data for the whole session to a stream file next to the session file, if that has been
+        /// turned on in the configuration file
+        /// </summary>
+        private void StartStreamRecorder()
+        {
+            _stream_recorder = null;
+
+            if (!MotoTrakConfiguration.GetInstance().StreamRecording || PrimarySaveLocation == null)
+            {
+                return;
+            }
+
+            try
+            {
+                _stream_recorder = new MotoTrakStreamRecorder(MotoTrakStreamRecorder.GetStreamFilePath(PrimarySaveLocation.FilePath),
+                    CurrentSession.SelectedStage.TotalDataStreams, CurrentSession.SelectedStage.SamplePeriodInMilliseconds,
+                    MotoTrakConfiguration.GetInstance().StreamRecordingQueueLength);
+            }
+            catch (Exception e)
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to start recording the session's data stream.");
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                _stream_recorder = null;
+            }
+        }
+
+        /// <summary>
+        /// Stops recording the raw data for the session, and reports any samples that were dropped
+        /// </summary>
+        private void CloseStreamRecorder()
+        {
+            if (_stream_recorder == null)
+            {
+                return;
+            }
+
+            try
+            {
+                _stream_recorder.Close();
+                if (_stream_recorder.SamplesDropped > 0)
+                {
+                    MotoTrakMessaging.GetInstance().AddMessage("Stream recording dropped " + _stream_recorder.SamplesDropped.ToString() +
+                        " of " + _stream_recorder.SamplesReceived.ToString() + " samples.");
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+
+            _stream_recorder = null;
+        }
+
+        /// <summary>
+        /// Stops watching the signals at the end of a session, saves the signal quality summary, and displays it if any
+        /// alerts were raised during the session
+        /// </summary>
+        private void CloseSignalQualityMonitor()
+        {
+            if (_signal_quality_monitor == null)
+            {
+                return;
+            }
+
+            if (PrimarySaveLocation != null)
+            {
+                _signal_quality_monitor.SaveSessionSummary(Path.ChangeExtension(PrimarySaveLocation.FilePath, "quality.txt"));
+            }
+
+            if (_signal_quality_monitor.HasAlerts)
+            {
+                foreach (string msg in _signal_quality_monitor.CreateSessionSummary())
+                {
+                    MotoTrakMessaging.GetInstance().AddMessage(msg);
+                }
+            }
+
+            _signal_quality_monitor = null;
+        }
+
         /// <summary>
         /// This function does some simple manipulation of the stream data upon a recognized trial initiation.
         /// If this function is called, it means a trial has been initiated.  
@@ -1848,21 +2246,21 @@ namespace MotoTrak
         /// trial_data_transformed is the data for the trial so far (only up through the trial initiation).  This is calculated
         /// by this function and returned as a reference parameter.
         /// </summary>
-        private void HandleTrialInitiation(int buffer_size, int trial_initiation_index, List<List<double>> stream_data_transformed, MotorTrial trial)
+        private void HandleTrialInitiation(int buffer_size, int trial_initiation_index, MotorSignalBlock stream_data_transformed, MotorTrial trial)
         {
             //Do some bounds checking of the trial initiation index
-            trial_initiation_index = Math.Max(0, Math.Min(stream_data_transformed[0].Count, trial_initiation_index));
+            trial_initiation_index = Math.Max(0, Math.Min(stream_data_transformed.Length, trial_initiation_index));
 
             //From the point where threshold was broken, we want to go back and grab X seconds of data from before the initiation
             //event, depending on how much data this stage asks for.
             int point_to_start_keeping_data = trial_initiation_index - CurrentSession.SelectedStage.TotalRecordedSamplesBeforeHitWindow;
 
             //Do some bounds checking
-            point_to_start_keeping_data = Math.Max(0, Math.Min(stream_data_transformed[0].Count, point_to_start_keeping_data));
+            point_to_start_keeping_data = Math.Max(0, Math.Min(stream_data_transformed.Length, point_to_start_keeping_data));
 
             //Now that we know when threshold was broken, transfer all the data that pertains to the actual trial over to the trial variables
-            trial.TrialData = stream_data_transformed.Select((x, index) =>
-                x.GetRange(point_to_start_keeping_data, trial_initiation_index - point_to_start_keeping_data + 1).ToList()).ToList();
+            trial.TrialData = Enumerable.Range(0, stream_data_transformed.StreamCount).Select(index =>
+                stream_data_transformed.CopyToList(index, point_to_start_keeping_data, trial_initiation_index - point_to_start_keeping_data + 1)).ToList();
             for (int i = 0; i < trial.TrialData.Count; i++)
             {
                 var data_from_stream = trial.TrialData[i];
@@ -1879,6 +2277,63 @@ namespace MotoTrak
             }
         }
         
+        private void SaveSessionCheckpoint ()
+        {
+            int checkpoint_interval = MotoTrakConfiguration.GetInstance().CheckpointIntervalInTrials;
+            if (checkpoint_interval <= 0 || string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().DataPath) ||
+                (CurrentSession.Trials.Count % checkpoint_interval) != 0)
+            {
+                return;
+            }
+
+            try
+            {
+                //The checkpoint is taken here, between trials, and written to disk on a background thread
+                MotoTrakSessionCheckpoint checkpoint = MotoTrakSessionCheckpoint.Capture(CurrentSession);
+                checkpoint.SaveInBackground(MotoTrakSessionCheckpoint.GetCheckpointPath(CurrentSession.RatName, CurrentSession.SelectedStage.StageName));
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        private void ResumeSessionFromCheckpoint ()
+        {
+            double resume_window = MotoTrakConfiguration.GetInstance().CheckpointResumeWindowInMinutes;
+            if (resume_window <= 0 || string.IsNullOrEmpty(MotoTrakConfiguration.GetInstance().DataPath))
+            {
+                return;
+            }
+
+            try
+            {
+                MotorStage stage = CurrentSession.SelectedStage;
+                MotoTrakSessionCheckpoint checkpoint = MotoTrakSessionCheckpoint.Load(MotoTrakSessionCheckpoint.GetCheckpointPath(CurrentSession.RatName, stage.StageName));
+                if (checkpoint == null || !checkpoint.RatName.Equals(CurrentSession.RatName) || !checkpoint.StageName.Equals(stage.StageName) ||
+                    (DateTime.Now - checkpoint.CheckpointTime).TotalMinutes > resume_window)
+                {
+                    return;
+                }
+
+                checkpoint.Restore(CurrentSession);
+
+                //Move the autopositioner back to where it was
+                if (stage.Position != null && stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable && !double.IsNaN(stage.Position.CurrentValue))
+                {
+                    stage.Autopositioner.SetPosition(stage.Position.CurrentValue);
+                }
+
+                MotoTrakMessaging.GetInstance().AddMessage("Resumed the interrupted session from " + checkpoint.CheckpointTime.ToShortTimeString() +
+                    " (" + checkpoint.TrialCount.ToString() + " trials)");
+            }
+            catch (Exception e)
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to resume the interrupted session");
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
         private void LoadNewlySelectedStageParametersOnMicrocontroller ()
         {
             //Get the current stage
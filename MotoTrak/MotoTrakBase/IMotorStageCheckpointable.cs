@@ -0,0 +1,23 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This interface is implemented by stage implementations whose session state (adaptive accumulators, pending rewards,
+    /// counters, and so on) can be saved in a session checkpoint, so that an interrupted session can be resumed where it left off.
+    /// </summary>
+    public interface IMotorStageCheckpointable
+    {
+        /// <summary>
+        /// Saves the session state of the stage implementation into a checkpoint
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being created</param>
+        void SaveCheckpointState(MotoTrakSessionCheckpoint checkpoint);
+
+        /// <summary>
+        /// Restores the session state of the stage implementation from a checkpoint
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being restored</param>
+        void RestoreCheckpointState(MotoTrakSessionCheckpoint checkpoint);
+    }
+}
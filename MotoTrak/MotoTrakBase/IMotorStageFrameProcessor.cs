@@ -0,0 +1,20 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This interface is implemented by stage implementations that can handle a whole processing frame in one call (see
+    /// MotorStageFrame), instead of being called separately to transform the new data, check for a trial initiation or for
+    /// trial events, react to those events, and perform actions during the trial.
+    /// </summary>
+    public interface IMotorStageFrameProcessor
+    {
+        /// <summary>
+        /// Handles one processing frame
+        /// </summary>
+        /// <param name="frame">The new data of the frame and the trial context.  The results are stored in the frame.</param>
+        /// <returns>True if the frame was handled, or false if the stage does not handle whole frames (in which case the
+        /// separate methods of IMotorStageImplementation should be called instead)</returns>
+        bool ProcessFrame(MotorStageFrame frame);
+    }
+}
@@ -0,0 +1,18 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This interface is implemented by stage implementations that can be run in shadow mode (see MotoTrakShadowStage), next to
+    /// the stage implementation that is actually running the session.
+    /// </summary>
+    public interface IMotorStageShadowable
+    {
+        /// <summary>
+        /// Prepares the stage implementation to shadow a session.  This is called instead of AdjustBeginningStageParameters,
+        /// so it must reset the stage implementation's own session state without changing the stage or moving the autopositioner.
+        /// </summary>
+        /// <param name="stage">The stage that is running (it belongs to the primary stage implementation)</param>
+        void PrepareShadowSession(MotorStage stage);
+    }
+}
@@ -0,0 +1,32 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This interface is implemented by stage implementations that work on signals held in MotorSignalBlock objects (one
+    /// contiguous array per stream) rather than in a list per stream.  MotoTrak reads the data from the controller board into
+    /// a block and keeps its buffered signal in a block, so a stage implementation that implements this interface is handed
+    /// the data in place.  Stage implementations that only implement IMotorStageImplementation are called through
+    /// MotorSignalBlockAdapter, which copies the blocks into lists.
+    /// </summary>
+    public interface IMotorStageSignalBlockImplementation
+    {
+        /// <summary>
+        /// Transforms new data from the MotoTrak controller board, as IMotorStageImplementation.TransformSignals does
+        /// </summary>
+        /// <param name="new_data_from_controller">The new data from the controller board</param>
+        /// <param name="transformed_new_data">The block that receives the transformed data.  Its contents are replaced.</param>
+        /// <param name="stage">The stage that is currently being used</param>
+        /// <param name="device">The device that is connected</param>
+        void TransformSignalBlock(MotorSignalBlock new_data_from_controller, MotorSignalBlock transformed_new_data, MotorStage stage, MotorDevice device);
+
+        /// <summary>
+        /// Checks the buffered signal to see if a trial initiation has occurred, as IMotorStageImplementation.CheckSignalForTrialInitiation does
+        /// </summary>
+        /// <param name="signal">The entire signal that is currently in the buffer</param>
+        /// <param name="new_datapoint_count">The number of new samples at the end of the signal</param>
+        /// <param name="stage">The stage that is currently being used</param>
+        /// <returns>The index into the signal at which a trial initiation occurred, or -1 if no trial initiation was found</returns>
+        int CheckSignalBlockForTrialInitiation(MotorSignalBlock signal, int new_datapoint_count, MotorStage stage);
+    }
+}
@@ -0,0 +1,20 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This interface is implemented by stage implementations that know which stream of a trial's data holds the device signal,
+    /// and which threshold the signal is measured against, so that the features of each trial can be calculated once when the
+    /// trial ends (see MotorTrialFeatures).
+    /// </summary>
+    public interface IMotorTrialFeatureCalculator
+    {
+        /// <summary>
+        /// Calculates the features of a trial that has just ended
+        /// </summary>
+        /// <param name="trial">The trial that has just ended</param>
+        /// <param name="stage">The stage that is currently running</param>
+        /// <returns>The features of the trial, or null if the stage does not calculate features</returns>
+        MotorTrialFeatures CalculateTrialFeatures(MotorTrial trial, MotorStage stage);
+    }
+}
@@ -7,7 +7,9 @@ using System.Threading.Tasks;
 namespace MotoTrakBase
 {
     /// <summary>
-    /// This class enapsulated functionality of the autopositioner into one object.
+    /// This class enapsulated functionality of the autopositioner into one object.  Each autopositioner moves the
+    /// autopositioner of one controller board.  MotoTrak's own board is moved by the instance returned by GetInstance; when
+    /// several booths run in one process, each booth has an autopositioner for its own board (see MotorStage.Autopositioner).
     /// </summary>
     public class MotoTrakAutopositioner
     {
@@ -17,11 +19,11 @@ namespace MotoTrakBase
 
         private MotoTrakAutopositioner()
         {
-            //empty
+            _is_default_board = true;
         }
 
         /// <summary>
-        /// Get the only instance of the MotoTrakAutopositioner that will be allowed.
+        /// Get the instance of the MotoTrakAutopositioner that moves MotoTrak's own controller board.
         /// </summary>
         /// <returns>The MotoTrakAutopositioner instance</returns>
         public static MotoTrakAutopositioner GetInstance()
@@ -36,8 +38,24 @@ namespace MotoTrakBase
 
         #endregion
 
+        #region Constructor
+
+        /// <summary>
+        /// Creates an autopositioner that moves the autopositioner of the given controller board.  If the board is null,
+        /// positions are queued but never moved to (for a stage implementation that must not move anything, such as a shadow stage).
+        /// </summary>
+        /// <param name="board">The controller board of the booth</param>
+        public MotoTrakAutopositioner(IMotorBoard board)
+        {
+            _board = board;
+        }
+
+        #endregion
+
         #region Private data members
 
+        private IMotorBoard _board = null;
+        private bool _is_default_board = false;
         private Queue<double> _positions_to_visit = new Queue<double>();
         private DateTime _most_recent_move_time = DateTime.MinValue;
         private double _time_to_wait_inbetween_moves = 5.0;
@@ -88,7 +106,12 @@ namespace MotoTrakBase
         /// </summary>
         public void RunAutopositioner ( )
         {
-            var board = MotorBoard.GetInstance();
+            var board = Board;
+            if (board == null)
+            {
+                return;
+            }
+
             bool enough_time_elapsed = DateTime.Now >= (_most_recent_move_time.AddSeconds(_time_to_wait_inbetween_moves));
             if (enough_time_elapsed)
             {
@@ -114,7 +137,25 @@ namespace MotoTrakBase
             _most_recent_move_time = DateTime.Now;
 
             //Set the autopositioner to the zero-point
-            MotorBoard.GetInstance().Autopositioner(0);
+            if (Board != null)
+            {
+                Board.Autopositioner(0);
+            }
+        }
+
+        #endregion
+
+        #region Private properties
+
+        /// <summary>
+        /// The controller board whose autopositioner is moved
+        /// </summary>
+        private IMotorBoard Board
+        {
+            get
+            {
+                return _is_default_board ? MotorBoard.GetInstance() : _board;
+            }
         }
 
         #endregion
@@ -0,0 +1,273 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Moves the autopositioner forward during a session according to a step schedule.
+    /// Stage implementations declare the schedule (for example "advance 0.5 every 50 hits, until 2.0 is reached"),
+    /// and then register each trial as it ends. The controller keeps a running hit/trial count and the set
+    /// of milestones that have already been handled, so no per-trial scan of the session's trials is needed.
+    /// </summary>
+    public class MotoTrakAutopositionerController
+    {
+        #region Private data members
+
+        private int _milestone_interval = 50;
+        private double _position_step = 0.5;
+        private double _maximum_position = 2.0;
+        private bool _count_only_hits = true;
+        private List<double> _position_schedule = new List<double>();
+
+        private int _hit_count = 0;
+        private int _trial_count = 0;
+        private HashSet<int> _handled_milestones = new HashSet<int>();
+
+        #endregion
+
+        #region Constructors
+
+        /// <summary>
+        /// Constructs a controller that advances the autopositioner by 0.5 every 50 hits, until it reaches a position of 2.0.
+        /// The schedule can be changed through the properties of this class (from Python, these can be passed as
+        /// keyword arguments to the constructor).
+        /// </summary>
+        public MotoTrakAutopositionerController()
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The number of hits (or trials, if CountOnlyHits is false) between each move of the autopositioner
+        /// </summary>
+        public int MilestoneInterval
+        {
+            get
+            {
+                return _milestone_interval;
+            }
+            set
+            {
+                _milestone_interval = Math.Max(1, value);
+            }
+        }
+
+        /// <summary>
+        /// How far the autopositioner moves at each milestone. This is ignored if a position schedule has been set.
+        /// </summary>
+        public double PositionStep
+        {
+            get
+            {
+                return _position_step;
+            }
+            set
+            {
+                _position_step = value;
+            }
+        }
+
+        /// <summary>
+        /// Once the autopositioner has reached this position, it is no longer moved. As in the step ladders that
+        /// stages used to run themselves, a step that starts below this position is taken in full, so the last
+        /// step may go past it (for example, 1.8 + 0.5 = 2.3).
+        /// </summary>
+        public double MaximumPosition
+        {
+            get
+            {
+                return _maximum_position;
+            }
+            set
+            {
+                _maximum_position = value;
+            }
+        }
+
+        /// <summary>
+        /// Whether milestones are counted in hits (true) or in trials (false)
+        /// </summary>
+        public bool CountOnlyHits
+        {
+            get
+            {
+                return _count_only_hits;
+            }
+            set
+            {
+                _count_only_hits = value;
+            }
+        }
+
+        /// <summary>
+        /// An optional list of positions to visit in order. If this list is not empty, then at each milestone
+        /// the autopositioner moves to the first position in the list that is greater than its current position,
+        /// instead of moving by PositionStep.
+        /// </summary>
+        public List<double> PositionSchedule
+        {
+            get
+            {
+                return _position_schedule;
+            }
+            set
+            {
+                _position_schedule = (value != null) ? value.OrderBy(x => x).ToList() : new List<double>();
+            }
+        }
+
+        /// <summary>
+        /// The number of hits that have been registered since the controller was last reset
+        /// </summary>
+        public int HitCount
+        {
+            get
+            {
+                return _hit_count;
+            }
+        }
+
+        /// <summary>
+        /// The number of trials that have been registered since the controller was last reset
+        /// </summary>
+        public int TrialCount
+        {
+            get
+            {
+                return _trial_count;
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Clears the running counts and the set of handled milestones. This should be called at the beginning of each session.
+        /// </summary>
+        public void Reset ()
+        {
+            _hit_count = 0;
+            _trial_count = 0;
+            _handled_milestones.Clear();
+        }
+
+        /// <summary>
+        /// Creates a new controller with the same step schedule as this one. The running counts and handled milestones
+        /// are not copied, so the new controller starts out as if it had just been reset.
+        /// </summary>
+        /// <returns>A new controller</returns>
+        public MotoTrakAutopositionerController Clone ()
+        {
+            return new MotoTrakAutopositionerController()
+            {
+                MilestoneInterval = _milestone_interval,
+                PositionStep = _position_step,
+                MaximumPosition = _maximum_position,
+                CountOnlyHits = _count_only_hits,
+                PositionSchedule = _position_schedule
+            };
+        }
+
+        /// <summary>
+        /// Saves the running counts and the handled milestones into a session checkpoint
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being created</param>
+        /// <param name="prefix">The prefix of the names of the checkpoint values</param>
+        public void SaveCheckpointState (MotoTrakSessionCheckpoint checkpoint, string prefix)
+        {
+            checkpoint.SetInteger(prefix + ".HitCount", _hit_count);
+            checkpoint.SetInteger(prefix + ".TrialCount", _trial_count);
+            checkpoint.SetNumberList(prefix + ".HandledMilestones", _handled_milestones.OrderBy(x => x).Select(x => (double)x));
+        }
+
+        /// <summary>
+        /// Restores the running counts and the handled milestones from a session checkpoint
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being restored</param>
+        /// <param name="prefix">The prefix of the names of the checkpoint values</param>
+        public void RestoreCheckpointState (MotoTrakSessionCheckpoint checkpoint, string prefix)
+        {
+            if (!checkpoint.Contains(prefix + ".HitCount"))
+            {
+                return;
+            }
+
+            _hit_count = Convert.ToInt32(checkpoint.GetInteger(prefix + ".HitCount"));
+            _trial_count = Convert.ToInt32(checkpoint.GetInteger(prefix + ".TrialCount"));
+            _handled_milestones = new HashSet<int>(checkpoint.GetNumberList(prefix + ".HandledMilestones").Select(x => Convert.ToInt32(x)));
+        }
+
+        /// <summary>
+        /// Registers a trial that has just ended. If the trial completes a milestone that has not yet been handled,
+        /// and the stage's position is adaptive, the stage position is advanced and the stage's autopositioner is told to move.
+        /// </summary>
+        /// <param name="trial">The trial that just ended</param>
+        /// <param name="stage">The stage that is currently running</param>
+        /// <returns>True if the autopositioner was moved, false otherwise</returns>
+        public bool RegisterTrial (MotorTrial trial, MotorStage stage)
+        {
+            _trial_count++;
+            if (trial != null && trial.Result == MotorTrialResult.Hit)
+            {
+                _hit_count++;
+            }
+
+            if (stage == null || stage.Position.ParameterType != MotorStageParameter.StageParameterType.Variable)
+            {
+                return false;
+            }
+
+            int count = _count_only_hits ? _hit_count : _trial_count;
+            if (count == 0 || (count % _milestone_interval) != 0 || _handled_milestones.Contains(count))
+            {
+                return false;
+            }
+
+            double current_position = stage.Position.CurrentValue;
+            if (current_position >= _maximum_position)
+            {
+                return false;
+            }
+
+            double new_position = CalculateNextPosition(current_position);
+            if (double.IsNaN(new_position))
+            {
+                return false;
+            }
+
+            _handled_milestones.Add(count);
+            stage.Position.CurrentValue = new_position;
+            stage.Autopositioner.SetPosition(new_position);
+
+            return true;
+        }
+
+        /// <summary>
+        /// Calculates the position that follows the given position, according to the step schedule.
+        /// </summary>
+        /// <param name="current_position">The current position of the autopositioner</param>
+        /// <returns>The next position, or NaN if there is no next position</returns>
+        public double CalculateNextPosition (double current_position)
+        {
+            double next_position = double.NaN;
+            if (_position_schedule.Count > 0)
+            {
+                next_position = _position_schedule.Where(x => x > current_position).DefaultIfEmpty(double.NaN).First();
+            }
+            else
+            {
+                next_position = current_position + _position_step;
+            }
+
+            return next_position;
+        }
+
+        #endregion
+    }
+}
@@ -16,6 +16,7 @@ namespace MotoTrakBase
         #region Constructors - This is a singleton class
 
         private static MotoTrakConfiguration _instance = null;
+        private static object _instance_lock = new object();
         
         /// <summary>
         /// </summary>
@@ -30,12 +31,15 @@ namespace MotoTrakBase
         /// <returns>Instance of MotoTrakConfiguration class</returns>
         public static MotoTrakConfiguration GetInstance()
         {
-            if (_instance == null)
+            lock (_instance_lock)
             {
-                _instance = new MotoTrakConfiguration();
-            }
+                if (_instance == null)
+                {
+                    _instance = new MotoTrakConfiguration();
+                }
 
-            return _instance;
+                return _instance;
+            }
         }
 
         #endregion
@@ -45,6 +49,7 @@ namespace MotoTrakBase
         private string BoothPairingsFileName = "mototrak_booth_pairings.config";
         private string ConfigurationFileName = "mototrak.config";
         private string StageImplementationsPath = "StageImplementations";
+        private string StageRuntimePath = @"StageImplementations\Runtime";
         private string DefaultLocalStagePath = "Stages";
         private string CompanyName = "Vulintus";
         private string MotoTrakAppName = "MotoTrak";
@@ -66,6 +71,26 @@ namespace MotoTrakBase
         public double TimeLimitInMinutes = Double.NaN;
 
         public string PreSpecifiedComPort = string.Empty;
+        public MotorDeviceType SimulatedDeviceType = MotorDeviceType.Pull;
+
+        public MotoTrakFileSave.FlushPolicy FileFlushPolicy = MotoTrakFileSave.FlushPolicy.FlushEachTrial;
+        public int FileFlushIntervalInMilliseconds = 1000;
+        public MotoTrakFileSave.SignalCompression FileCompression = MotoTrakFileSave.SignalCompression.None;
+        public double FileCompressionQuantum = 0.001;
+        public int SecondaryMirrorIntervalInMilliseconds = 1000;
+        public bool SecondaryMirrorVerifyFully = false;
+        public int CheckpointIntervalInTrials = 1;
+        public double CheckpointResumeWindowInMinutes = 60;
+        public string ShadowStageImplementationFileName = string.Empty;
+        public int ShadowQueueLength = 256;
+        public bool StageHotReload = false;
+        public bool StageWarmUp = true;
+        public bool StreamRecording = false;
+        public int StreamRecordingQueueLength = 1024;
+        public bool SignalQualityMonitor = true;
+        public double FlatSignalLimitInSeconds = 300;
+        public double SignalClipMaximum = 1023;
+        public int RecentHistorySessionCount = 10;
 
         #endregion
 
@@ -273,6 +298,16 @@ namespace MotoTrakBase
                     {
                         PreSpecifiedComPort = value;
                     }
+                    else if (key.Equals("SIMULATED DEVICE", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        //The device attached to the simulated controller board (used when the COM port is SIMULATED)
+                        MotorDeviceType device_type = MotorDeviceType.Pull;
+                        bool success = Enum.TryParse(value, true, out device_type);
+                        if (success)
+                        {
+                            SimulatedDeviceType = device_type;
+                        }
+                    }
                     else if (key.Equals("TIME LIMIT"))
                     {
                         double time_limit = double.NaN;
@@ -282,6 +317,152 @@ namespace MotoTrakBase
                             TimeLimitInMinutes = time_limit;
                         }
                     }
+                    else if (key.Equals("FILE FLUSH POLICY", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        if (value.Equals("PERIODIC", StringComparison.OrdinalIgnoreCase))
+                        {
+                            FileFlushPolicy = MotoTrakFileSave.FlushPolicy.FlushPeriodically;
+                        }
+                        else if (value.Equals("DISK", StringComparison.OrdinalIgnoreCase))
+                        {
+                            FileFlushPolicy = MotoTrakFileSave.FlushPolicy.FlushToDisk;
+                        }
+                        else
+                        {
+                            FileFlushPolicy = MotoTrakFileSave.FlushPolicy.FlushEachTrial;
+                        }
+                    }
+                    else if (key.Equals("FILE FLUSH INTERVAL", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int flush_interval = 0;
+                        bool success = Int32.TryParse(value, out flush_interval);
+                        if (success && flush_interval > 0)
+                        {
+                            FileFlushIntervalInMilliseconds = flush_interval;
+                        }
+                    }
+                    else if (key.Equals("FILE COMPRESSION", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        if (value.Equals("LOSSLESS", StringComparison.OrdinalIgnoreCase))
+                        {
+                            FileCompression = MotoTrakFileSave.SignalCompression.Lossless;
+                        }
+                        else if (value.Equals("QUANTIZED", StringComparison.OrdinalIgnoreCase))
+                        {
+                            FileCompression = MotoTrakFileSave.SignalCompression.Quantized;
+                        }
+                        else
+                        {
+                            FileCompression = MotoTrakFileSave.SignalCompression.None;
+                        }
+                    }
+                    else if (key.Equals("FILE COMPRESSION QUANTUM", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        double quantum = 0;
+                        bool success = Double.TryParse(value, out quantum);
+                        if (success && quantum > 0)
+                        {
+                            FileCompressionQuantum = quantum;
+                        }
+                    }
+                    else if (key.Equals("SECONDARY MIRROR INTERVAL", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int mirror_interval = 0;
+                        bool success = Int32.TryParse(value, out mirror_interval);
+                        if (success && mirror_interval > 0)
+                        {
+                            SecondaryMirrorIntervalInMilliseconds = mirror_interval;
+                        }
+                    }
+                    else if (key.Equals("SECONDARY MIRROR VERIFY", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        SecondaryMirrorVerifyFully = value.Equals("FULL", StringComparison.OrdinalIgnoreCase);
+                    }
+                    else if (key.Equals("CHECKPOINT INTERVAL", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int checkpoint_interval = 0;
+                        bool success = Int32.TryParse(value, out checkpoint_interval);
+                        if (success)
+                        {
+                            //An interval of 0 turns checkpoints off
+                            CheckpointIntervalInTrials = Math.Max(0, checkpoint_interval);
+                        }
+                    }
+                    else if (key.Equals("CHECKPOINT RESUME WINDOW", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        double resume_window = 0;
+                        bool success = Double.TryParse(value, out resume_window);
+                        if (success)
+                        {
+                            //A window of 0 minutes turns resuming off
+                            CheckpointResumeWindowInMinutes = Math.Max(0, resume_window);
+                        }
+                    }
+                    else if (key.Equals("SHADOW STAGE", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        ShadowStageImplementationFileName = value;
+                    }
+                    else if (key.Equals("SHADOW QUEUE LENGTH", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int queue_length = 0;
+                        bool success = Int32.TryParse(value, out queue_length);
+                        if (success)
+                        {
+                            ShadowQueueLength = Math.Max(1, queue_length);
+                        }
+                    }
+                    else if (key.Equals("STAGE HOT RELOAD", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        StageHotReload = value.Equals("True", StringComparison.OrdinalIgnoreCase);
+                    }
+                    else if (key.Equals("STAGE WARM UP", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        StageWarmUp = !value.Equals("False", StringComparison.OrdinalIgnoreCase);
+                    }
+                    else if (key.Equals("STREAM RECORDING", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        StreamRecording = value.Equals("True", StringComparison.OrdinalIgnoreCase);
+                    }
+                    else if (key.Equals("STREAM RECORDING QUEUE LENGTH", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int queue_length = 0;
+                        bool success = Int32.TryParse(value, out queue_length);
+                        if (success)
+                        {
+                            StreamRecordingQueueLength = Math.Max(1, queue_length);
+                        }
+                    }
+                    else if (key.Equals("SIGNAL QUALITY MONITOR", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        SignalQualityMonitor = !value.Equals("False", StringComparison.OrdinalIgnoreCase);
+                    }
+                    else if (key.Equals("FLAT SIGNAL LIMIT", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        double flat_signal_limit = 0;
+                        bool success = Double.TryParse(value, out flat_signal_limit);
+                        if (success && flat_signal_limit > 0)
+                        {
+                            FlatSignalLimitInSeconds = flat_signal_limit;
+                        }
+                    }
+                    else if (key.Equals("SIGNAL CLIP MAXIMUM", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        double clip_maximum = 0;
+                        bool success = Double.TryParse(value, out clip_maximum);
+                        if (success && clip_maximum > 0)
+                        {
+                            SignalClipMaximum = clip_maximum;
+                        }
+                    }
+                    else if (key.Equals("RECENT HISTORY SESSIONS", StringComparison.InvariantCultureIgnoreCase))
+                    {
+                        int session_count = 0;
+                        bool success = Int32.TryParse(value, out session_count);
+                        if (success)
+                        {
+                            RecentHistorySessionCount = Math.Max(1, session_count);
+                        }
+                    }
                 }
 
                 if (!isConfigVersionSet)
@@ -319,6 +500,14 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Returns the folder that stage implementations are loaded from
+        /// </summary>
+        public string GetStageImplementationsFolder ()
+        {
+            return StageImplementationsPath;
+        }
+
         /// <summary>
         /// This method loads in all stage implementations found in the standard folder containing stage implementations.
         /// </summary>
@@ -329,6 +518,9 @@ namespace MotoTrakBase
 
             try
             {
+                //Allow stage implementations to import the shared stage runtime
+                PythonEngine.GetInstance().AddSearchPath(StageRuntimePath);
+
                 //Get all files in the stage implementations folder
                 files = Directory.GetFiles(StageImplementationsPath, "*.py").ToList();
 
@@ -348,6 +540,48 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Creates a new instance of a loaded stage implementation.  Stage implementations hold the state of the session
+        /// they are running, so each stage should have its own instance rather than sharing the one that was loaded.
+        /// </summary>
+        /// <param name="file_name">The file name of the stage implementation, for example "PythonPullStageImplementation.py"</param>
+        /// <returns>A new instance of the stage implementation</returns>
+        public IMotorStageImplementation CreateStageImplementation (string file_name)
+        {
+            IMotorStageImplementation loaded_stage_implementation = PythonStageImplementations[file_name];
+            PythonStageImplementation python_stage_implementation = loaded_stage_implementation as PythonStageImplementation;
+            if (python_stage_implementation != null)
+            {
+                return python_stage_implementation.CreateInstance();
+            }
+
+            return loaded_stage_implementation;
+        }
+
+        /// <summary>
+        /// Returns the file name of the loaded stage implementation that a stage implementation was created from.
+        /// </summary>
+        /// <param name="stage_implementation">A stage implementation</param>
+        /// <returns>The file name of the stage implementation, or an empty string if it was not loaded from a file</returns>
+        public string GetStageImplementationName (IMotorStageImplementation stage_implementation)
+        {
+            PythonStageImplementation python_stage_implementation = stage_implementation as PythonStageImplementation;
+            if (python_stage_implementation != null)
+            {
+                return python_stage_implementation.ModuleFileName;
+            }
+
+            foreach (var kvp in PythonStageImplementations)
+            {
+                if (kvp.Value == stage_implementation)
+                {
+                    return kvp.Key;
+                }
+            }
+
+            return string.Empty;
+        }
+
         #endregion
     }
 }
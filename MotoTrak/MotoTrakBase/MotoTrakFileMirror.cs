@@ -0,0 +1,461 @@
+﻿using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Threading;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Keeps a copy of a file that is being appended to (such as a session file) at a second location, such as the secondary
+    /// data path.  A background thread periodically copies the bytes that have been appended to the source file since the last
+    /// copy, so the two files are never more than a few seconds apart.
+    /// 
+    /// Each chunk of bytes that is copied is recorded in a checksum log that is saved alongside the copy (with the same name as the
+    /// copy, plus the ".mirror" extension): the position of the chunk, its length, and its CRC-32.  If the destination becomes
+    /// unavailable (for example, a network drive goes down), the mirror keeps trying.  When the destination comes back, the mirror
+    /// checks the copy against the checksum log and the source file, throws away anything that doesn't match, and catches up
+    /// from there.
+    /// </summary>
+    public class MotoTrakFileMirror
+    {
+        #region Private classes
+
+        private class ChecksumLogEntry
+        {
+            public long ByteOffset = 0;
+            public int Length = 0;
+            public UInt32 Checksum = 0;
+        }
+
+        #endregion
+
+        #region Public static data members
+
+        /// <summary>
+        /// The extension that is appended to the name of the copy to get the name of its checksum log
+        /// </summary>
+        public const string ChecksumLogExtension = ".mirror";
+
+        #endregion
+
+        #region Private data members
+
+        private const int _checksum_log_entry_size = 16;
+        private const int _maximum_chunk_size = 1048576;
+        private static UInt32[] _crc_table = CreateCrcTable();
+
+        private string _source_path = string.Empty;
+        private string _destination_path = string.Empty;
+        private int _interval_in_milliseconds = 1000;
+
+        private Thread _mirror_thread = null;
+        private AutoResetEvent _wake_event = new AutoResetEvent(false);
+        private volatile bool _is_stopping = false;
+        private object _mirror_lock = new object();
+
+        private List<ChecksumLogEntry> _checksum_log = new List<ChecksumLogEntry>();
+        private long _mirrored_length = 0;
+        private bool _needs_catch_up = false;
+        private bool _has_reported_error = false;
+        private byte[] _chunk = new byte[0];
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a mirror for a file.  Mirroring begins when Start is called.
+        /// </summary>
+        /// <param name="source_path">The file to copy</param>
+        /// <param name="destination_path">Where to keep the copy</param>
+        /// <param name="interval_in_milliseconds">How often new bytes are copied</param>
+        public MotoTrakFileMirror (string source_path, string destination_path, int interval_in_milliseconds)
+        {
+            _source_path = source_path;
+            _destination_path = destination_path;
+            _interval_in_milliseconds = Math.Max(1, interval_in_milliseconds);
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The file that is being copied
+        /// </summary>
+        public string SourcePath
+        {
+            get
+            {
+                return _source_path;
+            }
+        }
+
+        /// <summary>
+        /// Where the copy is kept
+        /// </summary>
+        public string DestinationPath
+        {
+            get
+            {
+                return _destination_path;
+            }
+        }
+
+        /// <summary>
+        /// The number of bytes of the source file that have been copied
+        /// </summary>
+        public long MirroredLength
+        {
+            get
+            {
+                return Interlocked.Read(ref _mirrored_length);
+            }
+        }
+
+        /// <summary>
+        /// Whether the destination could not be written to the last time the mirror tried
+        /// </summary>
+        public bool IsBehind
+        {
+            get
+            {
+                return _needs_catch_up;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Starts the background thread that copies new bytes.  If a copy and a checksum log already exist at the destination
+        /// (for example, from before MotoTrak was restarted), the part of the copy that still matches the source is kept.
+        /// </summary>
+        public void Start ()
+        {
+            lock (_mirror_lock)
+            {
+                _needs_catch_up = File.Exists(_destination_path);
+            }
+
+            _is_stopping = false;
+            _mirror_thread = new Thread(MirrorLoop);
+            _mirror_thread.IsBackground = true;
+            _mirror_thread.Name = "MotoTrak file mirror";
+            _mirror_thread.Start();
+        }
+
+        /// <summary>
+        /// Stops the background thread, copies whatever is left of the source file, and checks the copy.
+        /// </summary>
+        /// <param name="verify_fully">True to check every chunk of the copy, false to only check the last chunk</param>
+        /// <returns>True if the copy is complete and matches the checksum log</returns>
+        public bool Stop (bool verify_fully = false)
+        {
+            _is_stopping = true;
+            _wake_event.Set();
+            if (_mirror_thread != null)
+            {
+                _mirror_thread.Join();
+                _mirror_thread = null;
+            }
+
+            lock (_mirror_lock)
+            {
+                if (!MirrorNewBytes())
+                {
+                    return false;
+                }
+
+                try
+                {
+                    return (MirroredLength == new FileInfo(_source_path).Length && Verify(verify_fully));
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    return false;
+                }
+            }
+        }
+
+        /// <summary>
+        /// Checks the copy against the checksum log.  A quick check compares the length of the copy and the checksum of the last
+        /// chunk that was copied.  A full check compares the checksum of every chunk.
+        /// </summary>
+        /// <param name="verify_fully">True to check every chunk of the copy, false to only check the last chunk</param>
+        /// <returns>True if the copy matches the checksum log</returns>
+        public bool Verify (bool verify_fully)
+        {
+            lock (_mirror_lock)
+            {
+                try
+                {
+                    using (FileStream destination = new FileStream(_destination_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite))
+                    {
+                        if (destination.Length != _mirrored_length)
+                        {
+                            return false;
+                        }
+
+                        int first_entry = verify_fully ? 0 : Math.Max(0, _checksum_log.Count - 1);
+                        for (int i = first_entry; i < _checksum_log.Count; i++)
+                        {
+                            if (ComputeChecksum(destination, _checksum_log[i]) != _checksum_log[i].Checksum)
+                            {
+                                return false;
+                            }
+                        }
+
+                        return true;
+                    }
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    return false;
+                }
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// The loop run by the background mirror thread
+        /// </summary>
+        private void MirrorLoop ()
+        {
+            while (!_is_stopping)
+            {
+                lock (_mirror_lock)
+                {
+                    MirrorNewBytes();
+                }
+
+                _wake_event.WaitOne(_interval_in_milliseconds);
+            }
+        }
+
+        /// <summary>
+        /// Copies the bytes that have been appended to the source file since the last copy.  If the last attempt failed, the copy
+        /// is checked and trimmed back to the part that can be trusted first.  Returns false if the destination could not be written.
+        /// </summary>
+        private bool MirrorNewBytes ()
+        {
+            try
+            {
+                if (_needs_catch_up)
+                {
+                    CatchUp();
+                }
+
+                using (FileStream source = new FileStream(_source_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite | FileShare.Delete))
+                {
+                    if (source.Length <= _mirrored_length)
+                    {
+                        return true;
+                    }
+
+                    new FileInfo(_destination_path).Directory.Create();
+                    using (FileStream destination = new FileStream(_destination_path, FileMode.OpenOrCreate, FileAccess.Write, FileShare.Read))
+                    using (FileStream checksum_log = new FileStream(_destination_path + ChecksumLogExtension, FileMode.OpenOrCreate, FileAccess.Write, FileShare.Read))
+                    {
+                        //Anything past the mirrored length in the copy was not recorded in the checksum log, so it is replaced
+                        destination.SetLength(_mirrored_length);
+                        destination.Seek(_mirrored_length, SeekOrigin.Begin);
+                        checksum_log.SetLength(_checksum_log.Count * _checksum_log_entry_size);
+                        checksum_log.Seek(0, SeekOrigin.End);
+                        BinaryWriter checksum_writer = new BinaryWriter(checksum_log);
+
+                        source.Seek(_mirrored_length, SeekOrigin.Begin);
+                        long source_length = source.Length;
+                        while (_mirrored_length < source_length)
+                        {
+                            ChecksumLogEntry entry = new ChecksumLogEntry();
+                            entry.ByteOffset = _mirrored_length;
+                            entry.Length = ReadChunk(source, (int)Math.Min(_maximum_chunk_size, source_length - _mirrored_length));
+                            if (entry.Length == 0)
+                            {
+                                break;
+                            }
+
+                            entry.Checksum = ComputeChecksum(_chunk, entry.Length);
+
+                            //The chunk is on the disk before it is recorded in the checksum log
+                            destination.Write(_chunk, 0, entry.Length);
+                            destination.Flush(true);
+
+                            checksum_writer.Write(entry.ByteOffset);
+                            checksum_writer.Write(entry.Length);
+                            checksum_writer.Write(entry.Checksum);
+                            checksum_writer.Flush();
+
+                            _checksum_log.Add(entry);
+                            Interlocked.Add(ref _mirrored_length, entry.Length);
+                        }
+                    }
+                }
+
+                if (_has_reported_error)
+                {
+                    MotoTrakMessaging.GetInstance().AddMessage("The secondary data path is available again.");
+                    _has_reported_error = false;
+                }
+
+                return true;
+            }
+            catch (Exception e)
+            {
+                //The destination will be checked and caught up the next time the mirror tries
+                _needs_catch_up = true;
+                if (!_has_reported_error)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    MotoTrakMessaging.GetInstance().AddMessage("Unable to save to the secondary datapath!  MotoTrak will keep trying.");
+                    _has_reported_error = true;
+                }
+
+                return false;
+            }
+        }
+
+        /// <summary>
+        /// Finds how much of the copy can be trusted after the destination has been unavailable: the chunks in the checksum log whose
+        /// checksums match both the copy and the source file, up to the first chunk that doesn't match.  The mirror continues from there.
+        /// </summary>
+        private void CatchUp ()
+        {
+            List<ChecksumLogEntry> logged_entries = ReadChecksumLog();
+
+            _checksum_log.Clear();
+            long verified_length = 0;
+
+            if (File.Exists(_destination_path))
+            {
+                using (FileStream source = new FileStream(_source_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite | FileShare.Delete))
+                using (FileStream destination = new FileStream(_destination_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite))
+                {
+                    foreach (var entry in logged_entries)
+                    {
+                        if (entry.ByteOffset != verified_length ||
+                            entry.ByteOffset + entry.Length > source.Length ||
+                            entry.ByteOffset + entry.Length > destination.Length ||
+                            ComputeChecksum(destination, entry) != entry.Checksum ||
+                            ComputeChecksum(source, entry) != entry.Checksum)
+                        {
+                            break;
+                        }
+
+                        _checksum_log.Add(entry);
+                        verified_length += entry.Length;
+                    }
+                }
+            }
+
+            Interlocked.Exchange(ref _mirrored_length, verified_length);
+            _needs_catch_up = false;
+        }
+
+        /// <summary>
+        /// Reads the checksum log that is saved alongside the copy
+        /// </summary>
+        private List<ChecksumLogEntry> ReadChecksumLog ()
+        {
+            List<ChecksumLogEntry> entries = new List<ChecksumLogEntry>();
+            string checksum_log_path = _destination_path + ChecksumLogExtension;
+            if (!File.Exists(checksum_log_path))
+            {
+                return entries;
+            }
+
+            byte[] checksum_log_bytes = File.ReadAllBytes(checksum_log_path);
+            using (BinaryReader reader = new BinaryReader(new MemoryStream(checksum_log_bytes)))
+            {
+                while (reader.BaseStream.Length - reader.BaseStream.Position >= _checksum_log_entry_size)
+                {
+                    ChecksumLogEntry entry = new ChecksumLogEntry();
+                    entry.ByteOffset = reader.ReadInt64();
+                    entry.Length = reader.ReadInt32();
+                    entry.Checksum = reader.ReadUInt32();
+                    entries.Add(entry);
+                }
+            }
+
+            return entries;
+        }
+
+        /// <summary>
+        /// Reads up to the given number of bytes from a file into the chunk buffer.  Returns the number of bytes read.
+        /// </summary>
+        private int ReadChunk (FileStream file, int length)
+        {
+            if (_chunk.Length < length)
+            {
+                _chunk = new byte[length];
+            }
+
+            int total = 0;
+            while (total < length)
+            {
+                int n = file.Read(_chunk, total, length - total);
+                if (n == 0)
+                {
+                    break;
+                }
+
+                total += n;
+            }
+
+            return total;
+        }
+
+        /// <summary>
+        /// Computes the checksum of the part of a file described by a checksum log entry
+        /// </summary>
+        private UInt32 ComputeChecksum (FileStream file, ChecksumLogEntry entry)
+        {
+            file.Seek(entry.ByteOffset, SeekOrigin.Begin);
+            int length = ReadChunk(file, entry.Length);
+            return ComputeChecksum(_chunk, length);
+        }
+
+        /// <summary>
+        /// Computes the CRC-32 (the same checksum used by zip files) of the first bytes of a buffer
+        /// </summary>
+        private static UInt32 ComputeChecksum (byte[] buffer, int length)
+        {
+            UInt32 crc = 0xFFFFFFFF;
+            for (int i = 0; i < length; i++)
+            {
+                crc = _crc_table[(crc ^ buffer[i]) & 0xFF] ^ (crc >> 8);
+            }
+
+            return ~crc;
+        }
+
+        /// <summary>
+        /// Creates the lookup table used to compute CRC-32 checksums
+        /// </summary>
+        private static UInt32[] CreateCrcTable ()
+        {
+            UInt32[] table = new UInt32[256];
+            for (UInt32 i = 0; i < 256; i++)
+            {
+                UInt32 crc = i;
+                for (int bit = 0; bit < 8; bit++)
+                {
+                    crc = ((crc & 1) != 0) ? (0xEDB88320 ^ (crc >> 1)) : (crc >> 1);
+                }
+
+                table[i] = crc;
+            }
+
+            return table;
+        }
+
+        #endregion
+    }
+}
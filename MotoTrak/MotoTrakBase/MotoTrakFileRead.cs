@@ -14,37 +14,53 @@ namespace MotoTrakBase
     public static class MotoTrakFileRead
     {
         /// <summary>
-        /// This function is intended to read in all sessions the the specified rat has performed
+        /// This function is intended to read in the most recent sessions the the specified rat has performed
         /// on the specified stage.  Its primary intended use is to load recent performance data
         /// for a rat.  It loads the data based on the primary data path specified in the MotoTrak
         /// configuration file.
         /// </summary>
         /// <param name="rat_name">The rat to load data for</param>
         /// <param name="stage_name">The stage to load data for</param>
-        /// <returns>All MotoTrak sessions found for the specified rat and stage</returns>
-        public static List<MotoTrakSession> ReadHistory (string rat_name, string stage_name)
+        /// <param name="maximum_session_count">The largest number of sessions to load (by default, all of them)</param>
+        /// <returns>The most recent MotoTrak sessions found for the specified rat and stage, from oldest to newest</returns>
+        public static List<MotoTrakSession> ReadHistory (string rat_name, string stage_name, int maximum_session_count = Int32.MaxValue)
+        {
+            return ReadHistoryFiles(rat_name, stage_name, maximum_session_count).Select(x => x.Item2).ToList();
+        }
+
+        /// <summary>
+        /// Reads in the most recent sessions the specified rat has performed on the specified stage, as ReadHistory does,
+        /// and returns each session along with the path of the file it was read from.  Only the most recent files are
+        /// opened.  They are found by file name, which holds the time at which the session started.
+        /// </summary>
+        /// <param name="rat_name">The rat to load data for</param>
+        /// <param name="stage_name">The stage to load data for</param>
+        /// <param name="maximum_session_count">The largest number of sessions to load</param>
+        /// <returns>The path of each file and the session read from it, from oldest to newest</returns>
+        public static List<Tuple<string, MotoTrakSession>> ReadHistoryFiles (string rat_name, string stage_name, int maximum_session_count)
         {
             //Create the list that we will return to the caller
-            List<MotoTrakSession> session_history = new List<MotoTrakSession>();
+            List<Tuple<string, MotoTrakSession>> session_history = new List<Tuple<string, MotoTrakSession>>();
 
             //Get the full path where we will search for files to load
             string full_path = MotoTrakFileRead.ResolveFullPath(rat_name, stage_name);
 
-            //Load all MotoTrak sessions found in the path
+            //Load the most recent MotoTrak sessions found in the path
             DirectoryInfo folder_info = new DirectoryInfo(full_path);
 
-            if (folder_info.Exists)
+            if (folder_info.Exists && maximum_session_count > 0)
             {
-                //Get the list of all the files that exist at the path
-                List<FileInfo> all_file_info = folder_info.EnumerateFiles("*.MotoTrak").ToList();
+                //Get the list of all the files that exist at the path, and keep the most recent ones
+                List<FileInfo> all_file_info = folder_info.EnumerateFiles("*.MotoTrak").OrderBy(x => x.Name, StringComparer.OrdinalIgnoreCase).ToList();
+                List<FileInfo> recent_file_info = all_file_info.Skip(Math.Max(0, all_file_info.Count - maximum_session_count)).ToList();
 
                 //Load each file
-                foreach (var session_file in all_file_info)
+                foreach (var session_file in recent_file_info)
                 {
                     MotoTrakSession new_session = MotoTrakFileRead.ReadFile(session_file.FullName);
                     if (new_session != null)
                     {
-                        session_history.Add(new_session);
+                        session_history.Add(new Tuple<string, MotoTrakSession>(session_file.FullName, new_session));
                     }
                 }
             }
@@ -102,7 +118,7 @@ namespace MotoTrakBase
                 {
                     return ReadArdyMotorVersion2File(file_bytes);
                 }
-                if (version == -5 || version == -6)
+                if (version == -5 || version == -6 || version == -7)
                 {
                     return ReadMotoTrakFile(file_bytes, version);
                 }
@@ -117,6 +133,154 @@ namespace MotoTrakBase
             return null;
         }
 
+        /// <summary>
+        /// Returns the location, result, and number of samples of every trial in a MotoTrak session file, without reading
+        /// the trial signals.  The trial index file that is saved alongside the session file is used if it exists.  Trials that
+        /// are missing from the trial index (or every trial, if the trial index is missing or does not match the session file)
+        /// are found by scanning the session file, skipping over the trial signals.
+        /// ArdyMotor files are not supported, and an empty list is returned for them.
+        /// </summary>
+        /// <param name="fully_qualified_path">The path of the session file (including the file name)</param>
+        /// <returns>One entry for each trial in the session file, in the order the trials were saved</returns>
+        public static List<MotoTrakTrialIndexEntry> ReadTrialIndex (string fully_qualified_path)
+        {
+            List<MotoTrakTrialIndexEntry> entries = new List<MotoTrakTrialIndexEntry>();
+
+            try
+            {
+                using (FileStream stream = new FileStream(fully_qualified_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite))
+                {
+                    BinaryReader reader = new BinaryReader(stream);
+
+                    //Read in the MotoTrak file header, which tells us how many streams of data are in each trial
+                    MotoTrakSession session = new MotoTrakSession();
+                    SByte version = 0;
+                    if (ReadMotoTrakFileHeaderForSeeking(session, reader, out version) == null)
+                    {
+                        return entries;
+                    }
+
+                    long scan_position = stream.Position;
+
+                    //Load the trial index.  The last entry in it must point to a trial block with the same trial number,
+                    //otherwise the trial index does not belong to this version of the session file.
+                    entries = MotoTrakTrialIndexEntry.ReadIndexFile(MotoTrakTrialIndexEntry.GetIndexFilePath(fully_qualified_path), stream.Length);
+                    if (entries.Count > 0)
+                    {
+                        MotoTrakTrialIndexEntry last_entry = entries[entries.Count - 1];
+                        if (IsTrialBlockAt(reader, last_entry))
+                        {
+                            scan_position = last_entry.ByteOffset + last_entry.BlockLength;
+                        }
+                        else
+                        {
+                            entries.Clear();
+                        }
+                    }
+
+                    //Scan the rest of the file for trials that are not in the trial index
+                    stream.Seek(scan_position, SeekOrigin.Begin);
+                    while (stream.Position < stream.Length)
+                    {
+                        MotoTrakTrialIndexEntry entry = ScanMotoTrakFileEvent(reader, version, session.SelectedStage.TotalDataStreams);
+                        if (stream.Position > stream.Length)
+                        {
+                            //The last block in the file is incomplete
+                            break;
+                        }
+
+                        if (entry != null)
+                        {
+                            entries.Add(entry);
+                        }
+                    }
+                }
+            }
+            catch (EndOfStreamException)
+            {
+                //The last block in the file is incomplete, so return the trials that were found before it
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+
+            return entries;
+        }
+
+        /// <summary>
+        /// Returns the features (peak value, time to peak, hit latency, and so on) of every trial in a MotoTrak session file, as they
+        /// were calculated when each trial ended.  These are read from the features file that is saved alongside the session file, so
+        /// an empty list is returned for sessions that were saved without one.
+        /// </summary>
+        /// <param name="fully_qualified_path">The path of the session file (including the file name)</param>
+        /// <returns>The features of each trial, in the order the trials were saved</returns>
+        public static List<MotorTrialFeatures> ReadTrialFeatures (string fully_qualified_path)
+        {
+            return MotorTrialFeatures.ReadFeaturesFile(MotorTrialFeatures.GetFeaturesFilePath(fully_qualified_path));
+        }
+
+        /// <summary>
+        /// Reads a single trial from a MotoTrak session file, by seeking directly to the trial block described by a trial index entry.
+        /// The session returned contains the session headers and the one trial that was read.
+        /// </summary>
+        /// <param name="fully_qualified_path">The path of the session file (including the file name)</param>
+        /// <param name="entry">The trial index entry of the trial to read (see ReadTrialIndex)</param>
+        /// <returns>A session containing the trial, or null if the trial could not be read</returns>
+        public static MotoTrakSession ReadTrial (string fully_qualified_path, MotoTrakTrialIndexEntry entry)
+        {
+            if (entry == null)
+            {
+                return null;
+            }
+
+            try
+            {
+                using (FileStream stream = new FileStream(fully_qualified_path, FileMode.Open, FileAccess.Read, FileShare.ReadWrite))
+                {
+                    BinaryReader reader = new BinaryReader(stream);
+
+                    MotoTrakSession session = new MotoTrakSession();
+                    SByte version = 0;
+                    var stage_params = ReadMotoTrakFileHeaderForSeeking(session, reader, out version);
+
+                    if (stage_params != null && IsTrialBlockAt(reader, entry))
+                    {
+                        stream.Seek(entry.ByteOffset + sizeof(Int32), SeekOrigin.Begin);
+
+                        MotorTrial trial = new MotorTrial();
+                        ReadMotoTrakFileTrial(session, trial, reader, version, stage_params);
+                        session.Trials.Add(trial);
+                        return session;
+                    }
+                }
+            }
+            catch
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to read MotoTrak trial!");
+            }
+
+            return null;
+        }
+
+        /// <summary>
+        /// Reads a single trial from a MotoTrak session file.  The trial index is read first (see ReadTrialIndex), so callers that
+        /// read many trials from the same file should call ReadTrialIndex once and then read each trial from its index entry.
+        /// </summary>
+        /// <param name="fully_qualified_path">The path of the session file (including the file name)</param>
+        /// <param name="trial_index">The zero-based position of the trial within the session</param>
+        /// <returns>A session containing the trial, or null if the trial could not be read</returns>
+        public static MotoTrakSession ReadTrial (string fully_qualified_path, int trial_index)
+        {
+            List<MotoTrakTrialIndexEntry> entries = ReadTrialIndex(fully_qualified_path);
+            if (trial_index >= 0 && trial_index < entries.Count)
+            {
+                return ReadTrial(fully_qualified_path, entries[trial_index]);
+            }
+
+            return null;
+        }
+
         private static MotoTrakSession ReadMotoTrakFile (byte[] file_bytes, SByte version)
         {
             //Create a session object that will be returned to the caller
@@ -170,7 +334,7 @@ namespace MotoTrakBase
                 //First, read the file version
                 SByte file_version = reader.ReadSByte();
 
-                if (file_version == -5 || file_version == -6)
+                if (file_version == -5 || file_version == -6 || file_version == -7)
                 {
                     //Next, read the session start time
                     double session_start_time = reader.ReadDouble();
@@ -264,7 +428,7 @@ namespace MotoTrakBase
                     List<string> nominal_params_list = new List<string>();
 
                     //The following code is for file version -6
-                    if (file_version == -6)
+                    if (file_version <= -6)
                     {
                         //Read in the number of NOMINAL stage parameters that exist
                         UInt32 n_nominal_params = reader.ReadUInt32();
@@ -350,7 +514,7 @@ namespace MotoTrakBase
                 }
 
                 //Read in the number of nominal parameters that exist for this trial
-                if (version == -6)
+                if (version <= -6)
                 {
                     N = reader.ReadByte();
                     List<string> nominal_params = stage_params[1];
@@ -399,6 +563,13 @@ namespace MotoTrakBase
                 trial.TrialData = new List<List<double>>();
                 for (int i = 0; i < session.SelectedStage.TotalDataStreams; i++)
                 {
+                    if (version == -7)
+                    {
+                        //Each stream of a compressed file is decoded with the codec it was saved with
+                        trial.TrialData.Add(MotoTrakSignalCodec.Decode(reader, n_samples));
+                        continue;
+                    }
+
                     //Add a new list of doubles for this stream of data
                     trial.TrialData.Add(new List<double>());
 
@@ -488,6 +659,138 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Reads the MotoTrak file header into a session, for readers that seek within the file.  Returns null if the file is
+        /// not a MotoTrak file that can be read this way.
+        /// </summary>
+        private static List<List<string>> ReadMotoTrakFileHeaderForSeeking (MotoTrakSession session, BinaryReader reader, out SByte version)
+        {
+            version = (sbyte)reader.BaseStream.ReadByte();
+            reader.BaseStream.Seek(0, SeekOrigin.Begin);
+            if (version != -5 && version != -6 && version != -7)
+            {
+                return null;
+            }
+
+            return ReadMotoTrakFileHeader(session, reader);
+        }
+
+        /// <summary>
+        /// Checks whether a trial block with the trial number of a trial index entry begins at the position given by the entry.
+        /// </summary>
+        private static bool IsTrialBlockAt (BinaryReader reader, MotoTrakTrialIndexEntry entry)
+        {
+            if (entry.ByteOffset < 0 || entry.ByteOffset + sizeof(Int32) + sizeof(UInt32) > reader.BaseStream.Length)
+            {
+                return false;
+            }
+
+            reader.BaseStream.Seek(entry.ByteOffset, SeekOrigin.Begin);
+            MotoTrakFileSave.BlockType block_type = (MotoTrakFileSave.BlockType)reader.ReadInt32();
+            UInt32 trial_number = reader.ReadUInt32();
+
+            return (block_type == MotoTrakFileSave.BlockType.Trial && trial_number == entry.TrialNumber);
+        }
+
+        /// <summary>
+        /// Steps over one block of a MotoTrak file without reading the trial signal.  If the block is a trial, a trial index
+        /// entry describing it is returned.  Otherwise, null is returned.
+        /// </summary>
+        private static MotoTrakTrialIndexEntry ScanMotoTrakFileEvent (BinaryReader reader, SByte version, int total_data_streams)
+        {
+            Stream stream = reader.BaseStream;
+            long block_position = stream.Position;
+
+            //Get the event type
+            MotoTrakFileSave.BlockType event_type = (MotoTrakFileSave.BlockType)reader.ReadInt32();
+
+            switch (event_type)
+            {
+                case MotoTrakFileSave.BlockType.Trial:
+
+                    MotoTrakTrialIndexEntry entry = new MotoTrakTrialIndexEntry();
+                    entry.ByteOffset = block_position;
+                    entry.TrialNumber = reader.ReadUInt32();
+
+                    //Skip the trial start time
+                    stream.Seek(sizeof(double), SeekOrigin.Current);
+
+                    //Read the trial result, and skip the trial end time (for pause trials)
+                    entry.Result = MotorTrialResultConverter.ConvertResultCodeToEnumeratedType(reader.ReadByte());
+                    if (entry.Result == MotorTrialResult.Pause)
+                    {
+                        stream.Seek(sizeof(double), SeekOrigin.Current);
+                    }
+
+                    //Skip the hit window, pre-trial, post-trial, and timeout durations, and the device position
+                    stream.Seek(5 * sizeof(float), SeekOrigin.Current);
+
+                    //Skip the quantitative parameters
+                    Byte N = reader.ReadByte();
+                    stream.Seek(N * sizeof(float), SeekOrigin.Current);
+
+                    //Skip the nominal parameters
+                    if (version <= -6)
+                    {
+                        N = reader.ReadByte();
+                        for (Byte i = 0; i < N; i++)
+                        {
+                            Byte n_chars = reader.ReadByte();
+                            stream.Seek(n_chars, SeekOrigin.Current);
+                        }
+                    }
+
+                    //Skip the hit times and the output trigger times
+                    N = reader.ReadByte();
+                    stream.Seek(N * sizeof(double), SeekOrigin.Current);
+                    N = reader.ReadByte();
+                    stream.Seek(N * sizeof(double), SeekOrigin.Current);
+
+                    //Read the number of samples, and skip the signal
+                    entry.SampleCount = reader.ReadUInt32();
+                    if (version == -7)
+                    {
+                        for (int i = 0; i < total_data_streams; i++)
+                        {
+                            MotoTrakSignalCodec.Skip(reader);
+                        }
+                    }
+                    else
+                    {
+                        stream.Seek((long)entry.SampleCount * total_data_streams * sizeof(float), SeekOrigin.Current);
+                    }
+
+                    entry.BlockLength = Convert.ToInt32(stream.Position - block_position);
+                    return entry;
+
+                case MotoTrakFileSave.BlockType.ManualFeed:
+                case MotoTrakFileSave.BlockType.PauseStart:
+                case MotoTrakFileSave.BlockType.PauseFinish:
+                case MotoTrakFileSave.BlockType.SessionEnd:
+
+                    stream.Seek(sizeof(double), SeekOrigin.Current);
+                    break;
+
+                case MotoTrakFileSave.BlockType.TimestampedNote:
+
+                    stream.Seek(sizeof(double), SeekOrigin.Current);
+                    UInt16 note_length = reader.ReadUInt16();
+                    stream.Seek(note_length, SeekOrigin.Current);
+                    break;
+
+                case MotoTrakFileSave.BlockType.GeneralSessionNotes:
+
+                    UInt16 session_note_length = reader.ReadUInt16();
+                    stream.Seek(session_note_length, SeekOrigin.Current);
+                    break;
+
+                default:
+                    break;
+            }
+
+            return null;
+        }
+
         private static MotoTrakSession ReadArdyMotorVersion2File (byte[] file_bytes)
         {
             //Create a session object which will be returned to the caller
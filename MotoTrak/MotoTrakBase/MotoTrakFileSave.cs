@@ -10,6 +10,9 @@ namespace MotoTrakBase
 {
     /// <summary>
     /// This class handles saving MotoTrak sessions to disk.  You can either save a session one trial at a time, or all in one chunk.
+    /// Each block (session headers, a trial, an event, a note) is serialized into memory on the calling thread, and then handed
+    /// to a MotoTrakFileWriteQueue, which writes it to the file on a background thread.  As each trial is saved, an entry
+    /// is also added to the session's trial index file (see MotoTrakTrialIndexEntry), which records where the trial begins in the file.
     /// </summary>
     public class MotoTrakFileSave
     {
@@ -20,6 +23,11 @@ namespace MotoTrakBase
         /// </summary>
         public const int FileVersion = -6;
 
+        /// <summary>
+        /// The MotoTrak file version that is used when the trial data is compressed (see MotoTrakSignalCodec)
+        /// </summary>
+        public const int CompressedFileVersion = -7;
+
         #endregion
 
         #region Public enumerations
@@ -41,16 +49,73 @@ namespace MotoTrakBase
             SessionEnd = 6
         }
 
+        /// <summary>
+        /// How often a session file is flushed as it is written
+        /// </summary>
+        public enum FlushPolicy
+        {
+            /// <summary>
+            /// Flush to the operating system after the session headers and after each trial
+            /// </summary>
+            FlushEachTrial,
+
+            /// <summary>
+            /// Flush to the operating system at a fixed interval
+            /// </summary>
+            FlushPeriodically,
+
+            /// <summary>
+            /// Flush all the way to the disk after the session headers and after each trial
+            /// </summary>
+            FlushToDisk
+        }
+
+        /// <summary>
+        /// How the streams of trial data are compressed as they are saved
+        /// </summary>
+        public enum SignalCompression
+        {
+            /// <summary>
+            /// Save every sample as a float32 (file version -6)
+            /// </summary>
+            None,
+
+            /// <summary>
+            /// Compress streams of whole numbers, and save every other stream as float32 (file version -7)
+            /// </summary>
+            Lossless,
+
+            /// <summary>
+            /// Compress streams of whole numbers, and round every other stream to a fixed quantum and compress it (file version -7)
+            /// </summary>
+            Quantized
+        }
+
         #endregion
 
         #region Private data members
         
         private string _file_path = string.Empty;
-        private FileStream _file_stream = null;
+        private MotoTrakFileWriteQueue _file_writer = null;
+        private MotoTrakFileWriteQueue _index_writer = null;
+        private MotoTrakFileWriteQueue _features_writer = null;
+        private long _bytes_committed = 0;
+        private MemoryStream _block_buffer = null;
         private BinaryWriter _binary_writer = null;
+        private float[] _sample_buffer = new float[0];
+        private byte[] _sample_bytes = new byte[0];
         private List<string> quantitative_keys = new List<string>();
         private List<string> nominal_keys = new List<string>();
 
+        private FlushPolicy _flush_policy = MotoTrakConfiguration.GetInstance().FileFlushPolicy;
+        private int _flush_interval_in_milliseconds = MotoTrakConfiguration.GetInstance().FileFlushIntervalInMilliseconds;
+        private SignalCompression _compression = MotoTrakConfiguration.GetInstance().FileCompression;
+        private double _compression_quantum = MotoTrakConfiguration.GetInstance().FileCompressionQuantum;
+        private MotoTrakSignalCodec _signal_codec = new MotoTrakSignalCodec();
+        private bool _is_file_compressed = false;
+        private List<MotoTrakFileMirror> _mirrors = new List<MotoTrakFileMirror>();
+        private bool _is_mirror_complete = false;
+
         #endregion
 
         #region Constructor
@@ -97,6 +162,115 @@ namespace MotoTrakBase
 
         #endregion
 
+        #region Properties
+
+        /// <summary>
+        /// The fully-qualified path (including the file name) that the session is saved to
+        /// </summary>
+        public string FilePath
+        {
+            get
+            {
+                return _file_path;
+            }
+        }
+
+        /// <summary>
+        /// How often the file is flushed as it is written.  This must be set before the file stream is opened.
+        /// </summary>
+        public FlushPolicy DurabilityPolicy
+        {
+            get
+            {
+                return _flush_policy;
+            }
+            set
+            {
+                _flush_policy = value;
+            }
+        }
+
+        /// <summary>
+        /// The flush interval used by the FlushPeriodically policy.  This must be set before the file stream is opened.
+        /// </summary>
+        public int FlushIntervalInMilliseconds
+        {
+            get
+            {
+                return _flush_interval_in_milliseconds;
+            }
+            set
+            {
+                _flush_interval_in_milliseconds = value;
+            }
+        }
+
+        /// <summary>
+        /// How the streams of trial data are compressed.  This must be set before the session headers are saved.
+        /// </summary>
+        public SignalCompression Compression
+        {
+            get
+            {
+                return _compression;
+            }
+            set
+            {
+                _compression = value;
+            }
+        }
+
+        /// <summary>
+        /// The quantum that calibrated streams are rounded to when the Quantized compression is used.  This must be set before
+        /// the session headers are saved.
+        /// </summary>
+        public double CompressionQuantum
+        {
+            get
+            {
+                return _compression_quantum;
+            }
+            set
+            {
+                _compression_quantum = value;
+            }
+        }
+
+        /// <summary>
+        /// The number of blocks that have been saved but not yet written to the file
+        /// </summary>
+        public int PendingBlockCount
+        {
+            get
+            {
+                return (_file_writer != null) ? _file_writer.PendingBlockCount : 0;
+            }
+        }
+
+        /// <summary>
+        /// Whether the copies kept by StartMirroring were complete and matched their checksum logs when the file stream was closed
+        /// </summary>
+        public bool IsMirrorComplete
+        {
+            get
+            {
+                return _is_mirror_complete;
+            }
+        }
+
+        /// <summary>
+        /// Whether a file stream is open and can be saved to
+        /// </summary>
+        private bool IsOpen
+        {
+            get
+            {
+                return (_file_writer != null && _file_writer.IsOpen && _binary_writer != null);
+            }
+        }
+
+        #endregion
+
         #region Static public methods
 
         /// <summary>
@@ -181,9 +355,18 @@ namespace MotoTrakBase
                 //Create directory if it doesn't exist
                 new FileInfo(_file_path).Directory.Create();
 
-                //Open a file at the path location to write to
-                _file_stream = new FileStream(_file_path, FileMode.Create);
-                _binary_writer = new BinaryWriter(_file_stream, Encoding.ASCII);
+                //Open a file at the path location to write to, and start the background thread that writes to it
+                FileStream file_stream = new FileStream(_file_path, FileMode.Create);
+                _file_writer = new MotoTrakFileWriteQueue(file_stream, _flush_policy, _flush_interval_in_milliseconds);
+                _bytes_committed = 0;
+
+                //Open the trial index file and the trial features file that go along with the session file
+                OpenIndexFileStream();
+                OpenFeaturesFileStream();
+
+                //Each block is serialized into this buffer before it is handed to the file writer
+                _block_buffer = new MemoryStream();
+                _binary_writer = new BinaryWriter(_block_buffer, Encoding.ASCII);
                 return true;
             }
             catch
@@ -203,13 +386,69 @@ namespace MotoTrakBase
         }
 
         /// <summary>
-        /// Closes the currently open file stream
+        /// Starts keeping a copy of the session file (and its trial index and features files) at a second location, such as the secondary data path.
+        /// The copy is updated in the background as the session is saved (see MotoTrakFileMirror).  This must be called after the
+        /// file stream is opened.
+        /// </summary>
+        /// <param name="mirror_path">The fully-qualified path (including the file name) of the copy</param>
+        public void StartMirroring (string mirror_path)
+        {
+            if (!IsOpen || string.IsNullOrEmpty(mirror_path))
+            {
+                return;
+            }
+
+            int interval = MotoTrakConfiguration.GetInstance().SecondaryMirrorIntervalInMilliseconds;
+            _mirrors.Add(new MotoTrakFileMirror(_file_path, mirror_path, interval));
+            if (_index_writer != null)
+            {
+                _mirrors.Add(new MotoTrakFileMirror(MotoTrakTrialIndexEntry.GetIndexFilePath(_file_path),
+                    MotoTrakTrialIndexEntry.GetIndexFilePath(mirror_path), interval));
+            }
+
+            if (_features_writer != null)
+            {
+                _mirrors.Add(new MotoTrakFileMirror(MotorTrialFeatures.GetFeaturesFilePath(_file_path),
+                    MotorTrialFeatures.GetFeaturesFilePath(mirror_path), interval));
+            }
+
+            foreach (var mirror in _mirrors)
+            {
+                mirror.Start();
+            }
+        }
+
+        /// <summary>
+        /// Closes the currently open file stream.  This waits until every block that has been saved has been written to the file,
+        /// and, if the file is being mirrored, until the copy has caught up with the file.
         /// </summary>
         public void CloseFileStream ()
         {
-            if (_file_stream != null)
+            if (_file_writer != null)
+            {
+                _file_writer.Close();
+            }
+
+            if (_index_writer != null)
+            {
+                _index_writer.Close();
+            }
+
+            if (_features_writer != null)
             {
-                _file_stream.Close();
+                _features_writer.Close();
+            }
+
+            if (_mirrors.Count > 0)
+            {
+                bool verify_fully = MotoTrakConfiguration.GetInstance().SecondaryMirrorVerifyFully;
+                _is_mirror_complete = true;
+                foreach (var mirror in _mirrors)
+                {
+                    _is_mirror_complete &= mirror.Stop(verify_fully);
+                }
+
+                _mirrors.Clear();
             }
         }
 
@@ -219,7 +458,7 @@ namespace MotoTrakBase
         /// <param name="current_session">The session currently in memory</param>
         public void SaveEntireSession ( MotoTrakSession current_session )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null && current_session != null)
+            if (IsOpen && current_session != null)
             {
                 //Save the session headers
                 SaveSessionHeaders(current_session);
@@ -263,10 +502,12 @@ namespace MotoTrakBase
         /// <param name="current_session">The session currently in memory</param>
         public void SaveSessionHeaders ( MotoTrakSession current_session )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null && current_session != null)
+            if (IsOpen && current_session != null)
             {
-                //First, save the file version to the file
-                _binary_writer.Write(Convert.ToSByte(MotoTrakFileSave.FileVersion));
+                //First, save the file version to the file.  The trial data is only compressed if the file version says so.
+                _is_file_compressed = (_compression != SignalCompression.None);
+                int file_version = _is_file_compressed ? MotoTrakFileSave.CompressedFileVersion : MotoTrakFileSave.FileVersion;
+                _binary_writer.Write(Convert.ToSByte(file_version));
 
                 //Next, save the session start time (as an 8-byte double, in Matlab datecode format)
                 double session_start_time = MotorMath.ConvertDateTimeToMatlabDatenum(current_session.StartTime);
@@ -388,8 +629,8 @@ namespace MotoTrakBase
                     }
                 }
 
-                //Make sure the data is actually written to the file before continuing
-                _file_stream.Flush();
+                //Hand the headers to the file writer, and flush them according to the flush policy
+                CommitBlock(true);
             }
         }
 
@@ -399,7 +640,7 @@ namespace MotoTrakBase
         /// <param name="trial">An individual MotorTrial object</param>
         public void SaveTrial ( MotorTrial trial, UInt32 trial_number )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null && trial != null)
+            if (IsOpen && trial != null)
             {
                 //Write a number indicating that the following block will be a trial
                 _binary_writer.Write(Convert.ToInt32(MotoTrakFileSave.BlockType.Trial));
@@ -450,13 +691,13 @@ namespace MotoTrakBase
                 foreach (var k in quantitative_keys)
                 {
                     //Save the parameter value
-                    float parameter_value = float.NaN;
-                    if (trial.QuantitativeParameters.Keys.Contains(k))
+                    double parameter_value = double.NaN;
+                    if (!trial.QuantitativeParameters.TryGetValue(k, out parameter_value))
                     {
-                        parameter_value = Convert.ToSingle(trial.QuantitativeParameters[k]);
+                        parameter_value = double.NaN;
                     }
                     
-                    _binary_writer.Write(parameter_value);
+                    _binary_writer.Write(Convert.ToSingle(parameter_value));
                 }
 
                 //Save the number of nominal parameters that exist for this trial
@@ -468,9 +709,8 @@ namespace MotoTrakBase
                 {
                     //Save the parameter value
                     string nominal_value = string.Empty;
-                    if (trial.NominalParameters.Keys.Contains(k))
+                    if (trial.NominalParameters.TryGetValue(k, out nominal_value))
                     {
-                        nominal_value = trial.NominalParameters[k];
                         N = Convert.ToByte(nominal_value.Length);
 
                         _binary_writer.Write(N);
@@ -504,17 +744,58 @@ namespace MotoTrakBase
                 UInt32 n_samples = Convert.ToUInt32(trial.TrialData[0].Count);
                 _binary_writer.Write(n_samples);
 
-                //Save the data from each stream
-                for (int i = 0; i < trial.TrialData.Count; i++)
+                if (_is_file_compressed)
                 {
-                    for (int x = 0; x < trial.TrialData[i].Count; x++)
+                    //Save the data from each stream, each with the codec that suits it best
+                    for (int i = 0; i < trial.TrialData.Count; i++)
                     {
-                        _binary_writer.Write(Convert.ToSingle(trial.TrialData[i][x]));
+                        _signal_codec.Encode(_binary_writer, trial.TrialData[i], _compression, _compression_quantum);
                     }
                 }
+                else
+                {
+                    //Save the data from each stream.  The samples are converted to single precision in one pass, and then written in one call.
+                    int total_samples = trial.TrialData.Sum(x => x.Count);
+                    if (_sample_buffer.Length < total_samples)
+                    {
+                        _sample_buffer = new float[total_samples];
+                        _sample_bytes = new byte[total_samples * sizeof(float)];
+                    }
 
-                //Make sure the data is actually written to the file before continuing
-                _file_stream.Flush();
+                    int sample_index = 0;
+                    for (int i = 0; i < trial.TrialData.Count; i++)
+                    {
+                        List<double> stream = trial.TrialData[i];
+                        for (int x = 0; x < stream.Count; x++)
+                        {
+                            _sample_buffer[sample_index++] = (float)stream[x];
+                        }
+                    }
+
+                    Buffer.BlockCopy(_sample_buffer, 0, _sample_bytes, 0, total_samples * sizeof(float));
+                    _binary_writer.Write(_sample_bytes, 0, total_samples * sizeof(float));
+                }
+
+                //Hand the trial to the file writer, and flush it according to the flush policy
+                long trial_byte_offset = _bytes_committed;
+                CommitBlock(true);
+
+                //Record where the trial begins in the trial index
+                SaveTrialIndexEntry(new MotoTrakTrialIndexEntry()
+                {
+                    TrialNumber = trial_number,
+                    ByteOffset = trial_byte_offset,
+                    BlockLength = Convert.ToInt32(_bytes_committed - trial_byte_offset),
+                    Result = trial.Result,
+                    SampleCount = n_samples
+                });
+
+                //Save the features of the trial (if they were calculated) to the features file
+                if (trial.Features != null)
+                {
+                    trial.Features.TrialNumber = trial_number;
+                    SaveTrialFeatures(trial.Features);
+                }
             }
         }
 
@@ -524,7 +805,7 @@ namespace MotoTrakBase
         /// <param name="note">The tuple representing the timestamped note</param>
         public void SaveTimestampedNote ( Tuple<DateTime, string> note )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null && !string.IsNullOrEmpty(note.Item2))
+            if (IsOpen && !string.IsNullOrEmpty(note.Item2))
             {
                 //Write a value indicating a block of timestamped notes.
                 _binary_writer.Write(Convert.ToInt32(MotoTrakFileSave.BlockType.TimestampedNote));
@@ -539,6 +820,8 @@ namespace MotoTrakBase
 
                 //Write the note itself
                 _binary_writer.Write(note.Item2.ToCharArray());
+
+                CommitBlock(false);
             }
         }
 
@@ -548,7 +831,7 @@ namespace MotoTrakBase
         /// <param name="session_notes">The string holding the general session notes</param>
         public void SaveOverallSessionNotes ( string session_notes )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null && !string.IsNullOrEmpty(session_notes))
+            if (IsOpen && !string.IsNullOrEmpty(session_notes))
             {
                 //Write a value of indicating a block of general session notes.
                 _binary_writer.Write(Convert.ToInt32(MotoTrakFileSave.BlockType.GeneralSessionNotes));
@@ -559,6 +842,8 @@ namespace MotoTrakBase
 
                 //Write the note itself
                 _binary_writer.Write(session_notes.ToCharArray());
+
+                CommitBlock(false);
             }
         }
 
@@ -569,7 +854,7 @@ namespace MotoTrakBase
         /// <param name="event_timestamp">The timestamp at which the event takes place</param>
         public void SaveEvent ( MotoTrakFileSave.BlockType event_type, DateTime event_timestamp )
         {
-            if (_file_stream != null && _file_stream.CanWrite && _binary_writer != null)
+            if (IsOpen)
             {
                 //Write a value indicating the next block is a manual feed
                 _binary_writer.Write(Convert.ToInt32(event_type));
@@ -577,9 +862,89 @@ namespace MotoTrakBase
                 //Write a timestamp as a 64-bit double value
                 double matlab_timestamp = MotorMath.ConvertDateTimeToMatlabDatenum(event_timestamp);
                 _binary_writer.Write(matlab_timestamp);
+
+                CommitBlock(false);
             }
         }
         
         #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Hands the block that has been serialized into the block buffer to the file writer, and empties the block buffer.
+        /// </summary>
+        /// <param name="is_end_of_record">True if the file should be flushed (according to the flush policy) after this block is written</param>
+        private void CommitBlock (bool is_end_of_record)
+        {
+            _binary_writer.Flush();
+            _file_writer.Enqueue(_block_buffer.ToArray(), is_end_of_record);
+            _bytes_committed += _block_buffer.Length;
+            _block_buffer.SetLength(0);
+        }
+
+        /// <summary>
+        /// Opens the trial index file that goes along with the session file, and writes its header.  The session can still be
+        /// saved if the trial index file cannot be opened, because readers fall back to scanning the session file.
+        /// </summary>
+        private void OpenIndexFileStream ()
+        {
+            try
+            {
+                string index_path = MotoTrakTrialIndexEntry.GetIndexFilePath(_file_path);
+                FileStream index_stream = new FileStream(index_path, FileMode.Create);
+                _index_writer = new MotoTrakFileWriteQueue(index_stream, _flush_policy, _flush_interval_in_milliseconds);
+                _index_writer.Enqueue(MotoTrakTrialIndexEntry.GetFileHeaderBytes(), true);
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                _index_writer = null;
+            }
+        }
+
+        /// <summary>
+        /// Hands an entry to the trial index file writer
+        /// </summary>
+        private void SaveTrialIndexEntry (MotoTrakTrialIndexEntry entry)
+        {
+            if (_index_writer != null && _index_writer.IsOpen)
+            {
+                _index_writer.Enqueue(entry.GetBytes(), true);
+            }
+        }
+
+        /// <summary>
+        /// Opens the features file that goes along with the session file, and writes its header.  The session can still be
+        /// saved if the features file cannot be opened, because the features can be calculated again from the trial signals.
+        /// </summary>
+        private void OpenFeaturesFileStream ()
+        {
+            try
+            {
+                string features_path = MotorTrialFeatures.GetFeaturesFilePath(_file_path);
+                FileStream features_stream = new FileStream(features_path, FileMode.Create);
+                _features_writer = new MotoTrakFileWriteQueue(features_stream, _flush_policy, _flush_interval_in_milliseconds);
+                _features_writer.Enqueue(MotorTrialFeatures.GetFileHeaderBytes(), true);
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                _features_writer = null;
+            }
+        }
+
+        /// <summary>
+        /// Hands the features of a trial to the features file writer
+        /// </summary>
+        private void SaveTrialFeatures (MotorTrialFeatures features)
+        {
+            if (_features_writer != null && _features_writer.IsOpen)
+            {
+                _features_writer.Enqueue(features.GetBytes(), true);
+            }
+        }
+
+        #endregion
     }
 }
\ No newline at end of file
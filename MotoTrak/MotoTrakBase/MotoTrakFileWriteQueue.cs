@@ -0,0 +1,257 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Diagnostics;
+using System.IO;
+using System.Threading;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Writes blocks of bytes to a file on a background thread.  The session thread serializes each block (a trial, an event,
+    /// a note, etc.) into memory and hands it to this queue, so that it never waits on the disk.  How often the file is flushed
+    /// is controlled by a flush policy.
+    /// </summary>
+    public class MotoTrakFileWriteQueue
+    {
+        #region Private data members
+
+        private FileStream _file_stream = null;
+        private BlockingCollection<Tuple<byte[], bool>> _pending_blocks = new BlockingCollection<Tuple<byte[], bool>>();
+        private Thread _writer_thread = null;
+
+        private MotoTrakFileSave.FlushPolicy _flush_policy = MotoTrakFileSave.FlushPolicy.FlushEachTrial;
+        private int _flush_interval_in_milliseconds = 1000;
+        private Stopwatch _time_since_flush = new Stopwatch();
+        private bool _has_unflushed_data = false;
+
+        private long _bytes_written = 0;
+        private long _bytes_flushed = 0;
+        private bool _has_write_error = false;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a write queue for a file stream that has already been opened, and starts the background writer thread.
+        /// The write queue takes ownership of the file stream, and closes it when the queue is closed.
+        /// </summary>
+        /// <param name="file_stream">The file stream to write to</param>
+        /// <param name="flush_policy">How often the file should be flushed</param>
+        /// <param name="flush_interval_in_milliseconds">The flush interval, used by the FlushPeriodically policy</param>
+        public MotoTrakFileWriteQueue (FileStream file_stream, MotoTrakFileSave.FlushPolicy flush_policy, int flush_interval_in_milliseconds)
+        {
+            _file_stream = file_stream;
+            _flush_policy = flush_policy;
+            _flush_interval_in_milliseconds = Math.Max(1, flush_interval_in_milliseconds);
+
+            _writer_thread = new Thread(WriteBlocks);
+            _writer_thread.IsBackground = true;
+            _writer_thread.Name = "MotoTrak file writer";
+            _writer_thread.Start();
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// Whether the queue is still accepting blocks
+        /// </summary>
+        public bool IsOpen
+        {
+            get
+            {
+                return !_pending_blocks.IsAddingCompleted;
+            }
+        }
+
+        /// <summary>
+        /// The number of blocks that are waiting to be written
+        /// </summary>
+        public int PendingBlockCount
+        {
+            get
+            {
+                return _pending_blocks.Count;
+            }
+        }
+
+        /// <summary>
+        /// The number of bytes that have been written to the file stream
+        /// </summary>
+        public long BytesWritten
+        {
+            get
+            {
+                return Interlocked.Read(ref _bytes_written);
+            }
+        }
+
+        /// <summary>
+        /// The number of bytes that have been flushed from the file stream to the operating system (or to the disk, for the FlushToDisk policy)
+        /// </summary>
+        public long BytesFlushed
+        {
+            get
+            {
+                return Interlocked.Read(ref _bytes_flushed);
+            }
+        }
+
+        /// <summary>
+        /// Whether an error has occurred while writing to the file
+        /// </summary>
+        public bool HasWriteError
+        {
+            get
+            {
+                return _has_write_error;
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Adds a block of bytes to the end of the queue.
+        /// </summary>
+        /// <param name="block">The bytes to write</param>
+        /// <param name="is_end_of_record">True if the file should be flushed (according to the flush policy) after this block is written</param>
+        public void Enqueue (byte[] block, bool is_end_of_record)
+        {
+            try
+            {
+                _pending_blocks.Add(new Tuple<byte[], bool>(block, is_end_of_record));
+            }
+            catch (InvalidOperationException)
+            {
+                ErrorLoggingService.GetInstance().LogStringError("A block was saved after the session file was closed.");
+            }
+        }
+
+        /// <summary>
+        /// Stops accepting new blocks, waits for every pending block to be written, and then flushes and closes the file.
+        /// </summary>
+        public void Close ()
+        {
+            if (!_pending_blocks.IsAddingCompleted)
+            {
+                _pending_blocks.CompleteAdding();
+            }
+
+            if (_writer_thread != null)
+            {
+                _writer_thread.Join();
+                _writer_thread = null;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// The loop run by the background writer thread
+        /// </summary>
+        private void WriteBlocks ()
+        {
+            _time_since_flush.Start();
+
+            while (!_pending_blocks.IsCompleted)
+            {
+                //Wait for the next block.  If there is data waiting to be flushed periodically, only wait until it is due.
+                int timeout = Timeout.Infinite;
+                if (_has_unflushed_data && _flush_policy == MotoTrakFileSave.FlushPolicy.FlushPeriodically)
+                {
+                    timeout = Math.Max(0, _flush_interval_in_milliseconds - Convert.ToInt32(_time_since_flush.ElapsedMilliseconds));
+                }
+
+                Tuple<byte[], bool> block = null;
+                if (_pending_blocks.TryTake(out block, timeout))
+                {
+                    WriteBlock(block.Item1);
+
+                    if (block.Item2 && _flush_policy != MotoTrakFileSave.FlushPolicy.FlushPeriodically)
+                    {
+                        Flush();
+                    }
+                }
+
+                if (_has_unflushed_data && _flush_policy == MotoTrakFileSave.FlushPolicy.FlushPeriodically &&
+                    _time_since_flush.ElapsedMilliseconds >= _flush_interval_in_milliseconds)
+                {
+                    Flush();
+                }
+            }
+
+            //Everything has been written, so flush and close the file
+            Flush();
+            try
+            {
+                _file_stream.Close();
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        /// <summary>
+        /// Writes a single block to the file stream
+        /// </summary>
+        private void WriteBlock (byte[] block)
+        {
+            if (_has_write_error)
+            {
+                return;
+            }
+
+            try
+            {
+                _file_stream.Write(block, 0, block.Length);
+                Interlocked.Add(ref _bytes_written, block.Length);
+                _has_unflushed_data = true;
+            }
+            catch (Exception e)
+            {
+                ReportWriteError(e);
+            }
+        }
+
+        /// <summary>
+        /// Flushes the file stream, all the way to the disk if the flush policy requires it
+        /// </summary>
+        private void Flush ()
+        {
+            if (!_has_write_error && _has_unflushed_data)
+            {
+                try
+                {
+                    _file_stream.Flush(_flush_policy == MotoTrakFileSave.FlushPolicy.FlushToDisk);
+                    Interlocked.Exchange(ref _bytes_flushed, Interlocked.Read(ref _bytes_written));
+                }
+                catch (Exception e)
+                {
+                    ReportWriteError(e);
+                }
+            }
+
+            _has_unflushed_data = false;
+            _time_since_flush.Restart();
+        }
+
+        /// <summary>
+        /// Logs a write error and tells the user.  After an error, the remaining blocks are discarded.
+        /// </summary>
+        private void ReportWriteError (Exception e)
+        {
+            _has_write_error = true;
+            ErrorLoggingService.GetInstance().LogExceptionError(e);
+            MotoTrakMessaging.GetInstance().AddMessage("Unable to write to the session file!");
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,266 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Globalization;
+using System.IO;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// This static class maintains a small index file in each rat/stage data folder that records the number of
+    /// trials and hits in each saved session.  The index is updated when a session is saved, so that the total
+    /// number of hits a rat has on a stage can be found without loading every session file in the folder.
+    /// Session files that are not yet in the index (or that have changed since they were indexed) are read
+    /// once and then added to the index.
+    /// </summary>
+    public static class MotoTrakHitIndex
+    {
+        #region Private classes
+
+        private class HitIndexEntry
+        {
+            public string FileName = string.Empty;
+            public long FileLength = 0;
+            public long LastWriteTimeTicks = 0;
+            public int HitCount = 0;
+            public int TrialCount = 0;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private const string _index_file_name = "MotoTrakHitIndex.txt";
+        private static object _index_lock = new object();
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Returns the total number of hits that the specified rat has performed on the specified stage, across all sessions
+        /// saved at the primary data path.  The index is brought up to date with the session files on disk before the total
+        /// is calculated.
+        /// </summary>
+        /// <param name="rat_name">The rat name</param>
+        /// <param name="stage_name">The stage name</param>
+        /// <param name="sessions_already_read">Sessions that the caller has already read, with the paths of their files (as returned
+        /// by MotoTrakFileRead.ReadHistoryFiles).  If any of these files need to be added to the index, their hits are counted from
+        /// these sessions, so the files are not read again.</param>
+        /// <returns>The total number of hits in all saved sessions</returns>
+        public static int GetCumulativeHits (string rat_name, string stage_name, IEnumerable<Tuple<string, MotoTrakSession>> sessions_already_read = null)
+        {
+            string full_path = MotoTrakFileRead.ResolveFullPath(rat_name, stage_name);
+
+            Dictionary<string, MotoTrakSession> sessions_by_file_name = new Dictionary<string, MotoTrakSession>(StringComparer.OrdinalIgnoreCase);
+            if (sessions_already_read != null)
+            {
+                foreach (var s in sessions_already_read)
+                {
+                    sessions_by_file_name[Path.GetFileName(s.Item1)] = s.Item2;
+                }
+            }
+
+            lock (_index_lock)
+            {
+                List<HitIndexEntry> entries = UpdateIndex(full_path, sessions_by_file_name);
+                return entries.Sum(x => x.HitCount);
+            }
+        }
+
+        /// <summary>
+        /// Records a session that has just been saved and closed in the index of the folder that holds the session file.
+        /// </summary>
+        /// <param name="session">The session that was saved</param>
+        /// <param name="fully_qualified_path">The path of the file (including the file name) that the session was saved to</param>
+        public static void RecordSession (MotoTrakSession session, string fully_qualified_path)
+        {
+            if (session == null || string.IsNullOrEmpty(fully_qualified_path))
+            {
+                return;
+            }
+
+            try
+            {
+                FileInfo session_file = new FileInfo(fully_qualified_path);
+                if (!session_file.Exists)
+                {
+                    return;
+                }
+
+                HitIndexEntry new_entry = new HitIndexEntry()
+                {
+                    FileName = session_file.Name,
+                    FileLength = session_file.Length,
+                    LastWriteTimeTicks = session_file.LastWriteTimeUtc.Ticks,
+                    HitCount = session.Trials.Count(x => x.Result == MotorTrialResult.Hit),
+                    TrialCount = session.Trials.Count
+                };
+
+                lock (_index_lock)
+                {
+                    string folder = session_file.DirectoryName;
+                    List<HitIndexEntry> entries = LoadIndex(folder);
+                    entries.RemoveAll(x => string.Equals(x.FileName, new_entry.FileName, StringComparison.OrdinalIgnoreCase));
+                    entries.Add(new_entry);
+                    SaveIndex(folder, entries);
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Reconciles the index in a folder with the session files that are actually in the folder.  Files that are new
+        /// or have changed since they were indexed are read and counted, and entries for files that no longer exist are
+        /// dropped.  The index is only re-written if something changed.
+        /// </summary>
+        private static List<HitIndexEntry> UpdateIndex (string folder, Dictionary<string, MotoTrakSession> sessions_by_file_name)
+        {
+            List<HitIndexEntry> result = new List<HitIndexEntry>();
+
+            DirectoryInfo folder_info = new DirectoryInfo(folder);
+            if (!folder_info.Exists)
+            {
+                return result;
+            }
+
+            Dictionary<string, HitIndexEntry> indexed_entries = new Dictionary<string, HitIndexEntry>(StringComparer.OrdinalIgnoreCase);
+            foreach (var e in LoadIndex(folder))
+            {
+                indexed_entries[e.FileName] = e;
+            }
+
+            bool index_changed = false;
+            List<FileInfo> all_file_info = folder_info.EnumerateFiles("*.MotoTrak").ToList();
+            foreach (var session_file in all_file_info)
+            {
+                HitIndexEntry entry = null;
+                if (indexed_entries.TryGetValue(session_file.Name, out entry) &&
+                    entry.FileLength == session_file.Length &&
+                    entry.LastWriteTimeTicks == session_file.LastWriteTimeUtc.Ticks)
+                {
+                    result.Add(entry);
+                    continue;
+                }
+
+                //This file has not been indexed yet (or it has changed), so count its hits.  If the caller has already read the
+                //session, its trials are counted.  Otherwise, the trial results are taken from the session's trial index, so that
+                //the trial signals do not need to be read.  Files that the trial index does not support (ArdyMotor files) are read
+                //in full.
+                entry = new HitIndexEntry()
+                {
+                    FileName = session_file.Name,
+                    FileLength = session_file.Length,
+                    LastWriteTimeTicks = session_file.LastWriteTimeUtc.Ticks
+                };
+
+                MotoTrakSession session = null;
+                List<MotoTrakTrialIndexEntry> trial_index = new List<MotoTrakTrialIndexEntry>();
+                if (!sessions_by_file_name.TryGetValue(session_file.Name, out session))
+                {
+                    trial_index = MotoTrakFileRead.ReadTrialIndex(session_file.FullName);
+                    if (trial_index.Count == 0)
+                    {
+                        session = MotoTrakFileRead.ReadFile(session_file.FullName);
+                    }
+                }
+
+                if (trial_index.Count > 0)
+                {
+                    entry.HitCount = trial_index.Count(x => x.Result == MotorTrialResult.Hit);
+                    entry.TrialCount = trial_index.Count;
+                }
+                else
+                {
+                    entry.HitCount = (session != null) ? session.Trials.Count(x => x.Result == MotorTrialResult.Hit) : 0;
+                    entry.TrialCount = (session != null) ? session.Trials.Count : 0;
+                }
+
+                result.Add(entry);
+                index_changed = true;
+            }
+
+            if (index_changed || result.Count != indexed_entries.Count)
+            {
+                SaveIndex(folder, result);
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Loads the index file from a folder.  Lines that cannot be parsed are skipped, which causes the
+        /// corresponding session files to be re-read the next time the index is updated.
+        /// </summary>
+        private static List<HitIndexEntry> LoadIndex (string folder)
+        {
+            List<HitIndexEntry> entries = new List<HitIndexEntry>();
+            string index_path = Path.Combine(folder, _index_file_name);
+
+            try
+            {
+                if (File.Exists(index_path))
+                {
+                    foreach (var line in File.ReadAllLines(index_path))
+                    {
+                        string[] parts = line.Split('\t');
+                        if (parts.Length < 5)
+                        {
+                            continue;
+                        }
+
+                        HitIndexEntry entry = new HitIndexEntry();
+                        entry.FileName = parts[0];
+                        if (long.TryParse(parts[1], NumberStyles.Integer, CultureInfo.InvariantCulture, out entry.FileLength) &&
+                            long.TryParse(parts[2], NumberStyles.Integer, CultureInfo.InvariantCulture, out entry.LastWriteTimeTicks) &&
+                            int.TryParse(parts[3], NumberStyles.Integer, CultureInfo.InvariantCulture, out entry.HitCount) &&
+                            int.TryParse(parts[4], NumberStyles.Integer, CultureInfo.InvariantCulture, out entry.TrialCount))
+                        {
+                            entries.Add(entry);
+                        }
+                    }
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                entries.Clear();
+            }
+
+            return entries;
+        }
+
+        /// <summary>
+        /// Saves the index file to a folder
+        /// </summary>
+        private static void SaveIndex (string folder, List<HitIndexEntry> entries)
+        {
+            string index_path = Path.Combine(folder, _index_file_name);
+
+            try
+            {
+                List<string> lines = entries.Select(x => string.Join("\t",
+                    x.FileName,
+                    x.FileLength.ToString(CultureInfo.InvariantCulture),
+                    x.LastWriteTimeTicks.ToString(CultureInfo.InvariantCulture),
+                    x.HitCount.ToString(CultureInfo.InvariantCulture),
+                    x.TrialCount.ToString(CultureInfo.InvariantCulture))).ToList();
+
+                File.WriteAllLines(index_path, lines);
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,502 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Globalization;
+using System.IO;
+using System.Linq;
+using System.Text;
+using System.Threading.Tasks;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// A snapshot of the adaptive state of a running session: the current value and history of each stage parameter, and the
+    /// session state of the stage implementation (see IMotorStageCheckpointable).  A checkpoint is taken after each trial and saved
+    /// in the background to the rat/stage data folder.  If the session is interrupted (for example, if the booth computer crashes),
+    /// the next session for the same rat and stage restores the checkpoint, so that thresholds pick up exactly where they were
+    /// instead of warming up again.  The checkpoint is deleted when a session is finalized normally.
+    /// 
+    /// Values are stored by name, each with a kind.  Numbers are saved in round-trip format and times are saved as ticks, so a
+    /// restored value is identical to the value that was saved.
+    /// </summary>
+    public class MotoTrakSessionCheckpoint
+    {
+        #region Public enumerations
+
+        /// <summary>
+        /// The kinds of value that a checkpoint can hold
+        /// </summary>
+        public enum ValueKind
+        {
+            Number,
+            Integer,
+            Boolean,
+            Text,
+            Time,
+            NumberList,
+            TimeList
+        }
+
+        #endregion
+
+        #region Public static data members
+
+        /// <summary>
+        /// The name of the checkpoint file in each rat/stage data folder
+        /// </summary>
+        public const string FileName = "MotoTrakCheckpoint.txt";
+
+        #endregion
+
+        #region Private data members
+
+        private const string _file_signature = "MotoTrak checkpoint 1";
+
+        private static object _save_lock = new object();
+        private static long _save_sequence_number = 0;
+        private static Dictionary<string, long> _latest_save_sequence_numbers = new Dictionary<string, long>(StringComparer.OrdinalIgnoreCase);
+
+        private SortedDictionary<string, Tuple<ValueKind, List<string>>> _values = new SortedDictionary<string, Tuple<ValueKind, List<string>>>(StringComparer.Ordinal);
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates an empty checkpoint
+        /// </summary>
+        public MotoTrakSessionCheckpoint ( )
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The rat whose session the checkpoint was taken from
+        /// </summary>
+        public string RatName
+        {
+            get
+            {
+                return Contains("Session.RatName") ? GetText("Session.RatName") : string.Empty;
+            }
+        }
+
+        /// <summary>
+        /// The stage that the session was running
+        /// </summary>
+        public string StageName
+        {
+            get
+            {
+                return Contains("Session.StageName") ? GetText("Session.StageName") : string.Empty;
+            }
+        }
+
+        /// <summary>
+        /// The number of trials that had been completed when the checkpoint was taken
+        /// </summary>
+        public int TrialCount
+        {
+            get
+            {
+                return Contains("Session.TrialCount") ? Convert.ToInt32(GetInteger("Session.TrialCount")) : 0;
+            }
+        }
+
+        /// <summary>
+        /// When the checkpoint was taken
+        /// </summary>
+        public DateTime CheckpointTime
+        {
+            get
+            {
+                return Contains("Session.CheckpointTime") ? GetTime("Session.CheckpointTime") : DateTime.MinValue;
+            }
+        }
+
+        #endregion
+
+        #region Methods - values
+
+        /// <summary>
+        /// Whether the checkpoint holds a value with the given name
+        /// </summary>
+        public bool Contains (string name)
+        {
+            return _values.ContainsKey(name);
+        }
+
+        /// <summary>
+        /// Returns the kind of the value with the given name
+        /// </summary>
+        public ValueKind GetKind (string name)
+        {
+            return _values[name].Item1;
+        }
+
+        /// <summary>
+        /// Returns the names of all values whose names begin with the given prefix
+        /// </summary>
+        public List<string> GetNames (string prefix)
+        {
+            return _values.Keys.Where(x => x.StartsWith(prefix, StringComparison.Ordinal)).ToList();
+        }
+
+        public void SetNumber (string name, double value)
+        {
+            SetValue(name, ValueKind.Number, new List<string>() { FormatNumber(value) });
+        }
+
+        public void SetInteger (string name, long value)
+        {
+            SetValue(name, ValueKind.Integer, new List<string>() { value.ToString(CultureInfo.InvariantCulture) });
+        }
+
+        public void SetBoolean (string name, bool value)
+        {
+            SetValue(name, ValueKind.Boolean, new List<string>() { value ? "1" : "0" });
+        }
+
+        public void SetText (string name, string value)
+        {
+            SetValue(name, ValueKind.Text, new List<string>() { Convert.ToBase64String(Encoding.UTF8.GetBytes(value ?? string.Empty)) });
+        }
+
+        public void SetTime (string name, DateTime value)
+        {
+            SetValue(name, ValueKind.Time, new List<string>() { value.Ticks.ToString(CultureInfo.InvariantCulture) });
+        }
+
+        public void SetNumberList (string name, IEnumerable<double> values)
+        {
+            SetValue(name, ValueKind.NumberList, values.Select(x => FormatNumber(x)).ToList());
+        }
+
+        public void SetTimeList (string name, IEnumerable<DateTime> values)
+        {
+            SetValue(name, ValueKind.TimeList, values.Select(x => x.Ticks.ToString(CultureInfo.InvariantCulture)).ToList());
+        }
+
+        public double GetNumber (string name)
+        {
+            return ParseNumber(_values[name].Item2[0]);
+        }
+
+        public long GetInteger (string name)
+        {
+            return long.Parse(_values[name].Item2[0], CultureInfo.InvariantCulture);
+        }
+
+        public bool GetBoolean (string name)
+        {
+            return _values[name].Item2[0] == "1";
+        }
+
+        public string GetText (string name)
+        {
+            return Encoding.UTF8.GetString(Convert.FromBase64String(_values[name].Item2[0]));
+        }
+
+        public DateTime GetTime (string name)
+        {
+            return new DateTime(long.Parse(_values[name].Item2[0], CultureInfo.InvariantCulture));
+        }
+
+        public List<double> GetNumberList (string name)
+        {
+            return _values[name].Item2.Select(x => ParseNumber(x)).ToList();
+        }
+
+        public List<DateTime> GetTimeList (string name)
+        {
+            return _values[name].Item2.Select(x => new DateTime(long.Parse(x, CultureInfo.InvariantCulture))).ToList();
+        }
+
+        #endregion
+
+        #region Methods - capture and restore
+
+        /// <summary>
+        /// Takes a checkpoint of a running session
+        /// </summary>
+        /// <param name="session">The running session</param>
+        /// <returns>The checkpoint</returns>
+        public static MotoTrakSessionCheckpoint Capture (MotoTrakSession session)
+        {
+            MotoTrakSessionCheckpoint checkpoint = new MotoTrakSessionCheckpoint();
+            MotorStage stage = session.SelectedStage;
+
+            checkpoint.SetText("Session.RatName", session.RatName);
+            checkpoint.SetText("Session.StageName", stage.StageName);
+            checkpoint.SetInteger("Session.TrialCount", session.Trials.Count);
+            checkpoint.SetTime("Session.StartTime", session.StartTime);
+            checkpoint.SetTime("Session.CheckpointTime", DateTime.Now);
+
+            //Save the adaptive state of each stage parameter
+            foreach (var stage_parameter in stage.StageParameters)
+            {
+                checkpoint.SaveStageParameter("Parameter." + stage_parameter.Key, stage_parameter.Value);
+            }
+
+            if (stage.Position != null)
+            {
+                checkpoint.SaveStageParameter("Position", stage.Position);
+            }
+
+            //Save the session state of the stage implementation
+            IMotorStageCheckpointable stage_implementation = stage.StageImplementation as IMotorStageCheckpointable;
+            if (stage_implementation != null)
+            {
+                stage_implementation.SaveCheckpointState(checkpoint);
+            }
+
+            return checkpoint;
+        }
+
+        /// <summary>
+        /// Restores a checkpoint into a session that is about to begin.  Stage parameters that are not in the checkpoint are left alone.
+        /// </summary>
+        /// <param name="session">The session</param>
+        public void Restore (MotoTrakSession session)
+        {
+            MotorStage stage = session.SelectedStage;
+
+            foreach (var stage_parameter in stage.StageParameters)
+            {
+                RestoreStageParameter("Parameter." + stage_parameter.Key, stage_parameter.Value);
+            }
+
+            if (stage.Position != null)
+            {
+                RestoreStageParameter("Position", stage.Position);
+            }
+
+            IMotorStageCheckpointable stage_implementation = stage.StageImplementation as IMotorStageCheckpointable;
+            if (stage_implementation != null)
+            {
+                stage_implementation.RestoreCheckpointState(this);
+            }
+        }
+
+        /// <summary>
+        /// Carries the session state of a stage implementation over to another instance, for example when a stage implementation is
+        /// reloaded in the middle of a session.  A value is only carried over if the new instance has a value with the same name and
+        /// kind.  Values that the new instance does not have are dropped, and values that only the new instance has keep their
+        /// starting values.
+        /// </summary>
+        /// <param name="old_stage_implementation">The stage implementation whose state is carried over</param>
+        /// <param name="new_stage_implementation">The stage implementation that receives the state</param>
+        /// <returns>The number of values that were carried over</returns>
+        public static int CarryOverStageImplementationState (IMotorStageCheckpointable old_stage_implementation, IMotorStageCheckpointable new_stage_implementation)
+        {
+            MotoTrakSessionCheckpoint old_state = new MotoTrakSessionCheckpoint();
+            old_stage_implementation.SaveCheckpointState(old_state);
+
+            MotoTrakSessionCheckpoint new_state = new MotoTrakSessionCheckpoint();
+            new_stage_implementation.SaveCheckpointState(new_state);
+
+            int carried_over_count = 0;
+            foreach (var kvp in old_state._values)
+            {
+                Tuple<ValueKind, List<string>> new_value = null;
+                if (new_state._values.TryGetValue(kvp.Key, out new_value) && new_value.Item1 == kvp.Value.Item1)
+                {
+                    new_state._values[kvp.Key] = kvp.Value;
+                    carried_over_count++;
+                }
+            }
+
+            new_stage_implementation.RestoreCheckpointState(new_state);
+
+            return carried_over_count;
+        }
+
+        #endregion
+
+        #region Methods - files
+
+        /// <summary>
+        /// Returns the path of the checkpoint file for a rat and stage
+        /// </summary>
+        public static string GetCheckpointPath (string rat_name, string stage_name)
+        {
+            return Path.Combine(MotoTrakFileRead.ResolveFullPath(rat_name, stage_name), FileName);
+        }
+
+        /// <summary>
+        /// Saves the checkpoint on a background thread.  The file is replaced in one step, so a crash during the save leaves the
+        /// previous checkpoint intact.  If several saves to the same file are waiting, only the most recent one is written.
+        /// </summary>
+        /// <param name="path">The path of the checkpoint file</param>
+        public void SaveInBackground (string path)
+        {
+            long sequence_number = 0;
+            lock (_save_lock)
+            {
+                sequence_number = ++_save_sequence_number;
+                _latest_save_sequence_numbers[path] = sequence_number;
+            }
+
+            List<string> lines = ToLines();
+            Task.Run(() =>
+            {
+                lock (_save_lock)
+                {
+                    long latest_sequence_number = 0;
+                    if (_latest_save_sequence_numbers.TryGetValue(path, out latest_sequence_number) && latest_sequence_number == sequence_number)
+                    {
+                        WriteLines(path, lines);
+                    }
+                }
+            });
+        }
+
+        /// <summary>
+        /// Deletes the checkpoint file for a rat and stage, and cancels any saves to it that are still waiting
+        /// </summary>
+        public static void Delete (string path)
+        {
+            lock (_save_lock)
+            {
+                _latest_save_sequence_numbers[path] = ++_save_sequence_number;
+
+                try
+                {
+                    if (File.Exists(path))
+                    {
+                        File.Delete(path);
+                    }
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                }
+            }
+        }
+
+        /// <summary>
+        /// Loads a checkpoint file.  Returns null if the file does not exist or cannot be read.
+        /// </summary>
+        public static MotoTrakSessionCheckpoint Load (string path)
+        {
+            try
+            {
+                if (!File.Exists(path))
+                {
+                    return null;
+                }
+
+                string[] lines = File.ReadAllLines(path);
+                if (lines.Length == 0 || !lines[0].Equals(_file_signature))
+                {
+                    return null;
+                }
+
+                MotoTrakSessionCheckpoint checkpoint = new MotoTrakSessionCheckpoint();
+                foreach (string line in lines.Skip(1))
+                {
+                    string[] parts = line.Split('\t');
+                    ValueKind kind;
+                    if (parts.Length >= 2 && Enum.TryParse(parts[1], out kind))
+                    {
+                        checkpoint.SetValue(parts[0], kind, parts.Skip(2).ToList());
+                    }
+                }
+
+                return checkpoint;
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                return null;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private void SetValue (string name, ValueKind kind, List<string> values)
+        {
+            _values[name] = new Tuple<ValueKind, List<string>>(kind, values);
+        }
+
+        private void SaveStageParameter (string name, MotorStageParameter parameter)
+        {
+            SetNumber(name + ".CurrentValue", parameter.CurrentValue);
+            SetText(name + ".NominalValue", parameter.NominalValue);
+            SetNumberList(name + ".History", parameter.History.ListClone);
+        }
+
+        private void RestoreStageParameter (string name, MotorStageParameter parameter)
+        {
+            if (Contains(name + ".CurrentValue"))
+            {
+                parameter.CurrentValue = GetNumber(name + ".CurrentValue");
+            }
+
+            if (Contains(name + ".NominalValue"))
+            {
+                parameter.NominalValue = GetText(name + ".NominalValue");
+            }
+
+            if (Contains(name + ".History"))
+            {
+                parameter.History.Clear();
+                foreach (double value in GetNumberList(name + ".History"))
+                {
+                    parameter.History.Enqueue(value);
+                }
+            }
+        }
+
+        private List<string> ToLines ()
+        {
+            List<string> lines = new List<string>() { _file_signature };
+            foreach (var value in _values)
+            {
+                lines.Add(string.Join("\t", new[] { value.Key, value.Value.Item1.ToString() }.Concat(value.Value.Item2)));
+            }
+
+            return lines;
+        }
+
+        private static void WriteLines (string path, List<string> lines)
+        {
+            try
+            {
+                new FileInfo(path).Directory.Create();
+
+                string temporary_path = path + ".tmp";
+                File.WriteAllLines(temporary_path, lines);
+                if (File.Exists(path))
+                {
+                    File.Replace(temporary_path, path, null);
+                }
+                else
+                {
+                    File.Move(temporary_path, path);
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        private static string FormatNumber (double value)
+        {
+            return value.ToString("R", CultureInfo.InvariantCulture);
+        }
+
+        private static double ParseNumber (string value)
+        {
+            return double.Parse(value, NumberStyles.Float, CultureInfo.InvariantCulture);
+        }
+
+        #endregion
+    }
+}
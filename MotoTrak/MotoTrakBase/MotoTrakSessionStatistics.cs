@@ -0,0 +1,346 @@
+﻿using MotoTrakUtilities;
+using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Accumulates summary statistics for a session as each trial ends. Stage implementations add one
+    /// value per trial to named series (for example "Peak Force" or "Force Threshold"), and the
+    /// end-of-session message (or any live display) can then query counts, medians, percentiles, and
+    /// the fraction of values beyond a threshold without re-scanning the trials of the session.
+    /// </summary>
+    public class MotoTrakSessionStatistics
+    {
+        #region Private classes
+
+        private class StatisticsSeries
+        {
+            public OrderStatisticsTree Values = new OrderStatisticsTree();
+            public double Sum = 0;
+            public double SumOfSquares = 0;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private object _statistics_lock = new object();
+        private Dictionary<string, StatisticsSeries> _series = new Dictionary<string, StatisticsSeries>();
+        private int _trial_count = 0;
+        private int _hit_count = 0;
+
+        #endregion
+
+        #region Constructors
+
+        /// <summary>
+        /// Constructs an empty session statistics accumulator.
+        /// </summary>
+        public MotoTrakSessionStatistics()
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The number of trials that have been added to the accumulator
+        /// </summary>
+        public int TrialCount
+        {
+            get
+            {
+                lock (_statistics_lock)
+                {
+                    return _trial_count;
+                }
+            }
+        }
+
+        /// <summary>
+        /// The number of trials added to the accumulator that were hits
+        /// </summary>
+        public int HitCount
+        {
+            get
+            {
+                lock (_statistics_lock)
+                {
+                    return _hit_count;
+                }
+            }
+        }
+
+        /// <summary>
+        /// The names of all series that currently hold values
+        /// </summary>
+        public List<string> SeriesNames
+        {
+            get
+            {
+                lock (_statistics_lock)
+                {
+                    return _series.Keys.ToList();
+                }
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Counts a trial that has just ended.
+        /// </summary>
+        /// <param name="trial">The trial that ended</param>
+        public void AddTrial (MotorTrial trial)
+        {
+            lock (_statistics_lock)
+            {
+                _trial_count++;
+                if (trial != null && trial.Result == MotorTrialResult.Hit)
+                {
+                    _hit_count++;
+                }
+            }
+        }
+
+        /// <summary>
+        /// Adds a value to a named series. The series is created if it does not already exist.
+        /// NaN values are ignored.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="value">The value to add</param>
+        public void AddValue (string series_name, double value)
+        {
+            if (double.IsNaN(value))
+            {
+                return;
+            }
+
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                if (!_series.TryGetValue(series_name, out series))
+                {
+                    series = new StatisticsSeries();
+                    _series[series_name] = series;
+                }
+
+                series.Values.Add(value);
+                series.Sum += value;
+                series.SumOfSquares += value * value;
+            }
+        }
+
+        /// <summary>
+        /// Returns the number of values in a named series.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <returns>The number of values in the series, or 0 if the series does not exist</returns>
+        public int Count (string series_name)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                return _series.TryGetValue(series_name, out series) ? series.Values.Count : 0;
+            }
+        }
+
+        /// <summary>
+        /// Returns the median of a named series.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <returns>The median, or NaN if the series is empty</returns>
+        public double Median (string series_name)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                return _series.TryGetValue(series_name, out series) ? series.Values.Median() : double.NaN;
+            }
+        }
+
+        /// <summary>
+        /// Returns the Nth percentile of a named series, using the same interpolation as MotorMath.Percentile.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="excelPercentile">Desired percentile between 0 and 1</param>
+        /// <returns>The value at the Nth percentile, or NaN if the series is empty</returns>
+        public double Percentile (string series_name, double excelPercentile)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                return _series.TryGetValue(series_name, out series) ? series.Values.Percentile(excelPercentile) : double.NaN;
+            }
+        }
+
+        /// <summary>
+        /// Returns the mean of a named series.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <returns>The mean, or NaN if the series is empty</returns>
+        public double Mean (string series_name)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                if (_series.TryGetValue(series_name, out series) && series.Values.Count > 0)
+                {
+                    return series.Sum / series.Values.Count;
+                }
+
+                return double.NaN;
+            }
+        }
+
+        /// <summary>
+        /// Returns the standard deviation of a named series around a given center value.
+        /// This returns the same result as MotorMath.StdDevAroundMean.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="center">The value around which the deviation is measured</param>
+        /// <returns>The standard deviation, or NaN if the series has fewer than 2 values</returns>
+        public double StdDevAround (string series_name, double center)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                if (_series.TryGetValue(series_name, out series) && series.Values.Count > 1)
+                {
+                    int n = series.Values.Count;
+                    double sum_of_squared_deviations = series.SumOfSquares - (2 * center * series.Sum) + (n * center * center);
+                    return Math.Sqrt(Math.Max(0, sum_of_squared_deviations) / (n - 1));
+                }
+
+                return double.NaN;
+            }
+        }
+
+        /// <summary>
+        /// Returns the fraction (0 to 1) of values in a named series that are greater than or equal to a threshold.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="threshold">The threshold to compare against</param>
+        /// <returns>The fraction of values at or above the threshold, or 0 if the series is empty</returns>
+        public double FractionAtOrAbove (string series_name, double threshold)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                if (_series.TryGetValue(series_name, out series) && series.Values.Count > 0)
+                {
+                    return Convert.ToDouble(series.Values.CountGreaterThanOrEqual(threshold)) / series.Values.Count;
+                }
+
+                return 0;
+            }
+        }
+
+        /// <summary>
+        /// Returns the number of values in a named series that are greater than or equal to a threshold.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="threshold">The threshold to compare against</param>
+        /// <returns>The number of values at or above the threshold</returns>
+        public int CountAtOrAbove (string series_name, double threshold)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                return _series.TryGetValue(series_name, out series) ? series.Values.CountGreaterThanOrEqual(threshold) : 0;
+            }
+        }
+
+        /// <summary>
+        /// Returns the number of values in a named series that are less than or equal to a threshold.
+        /// </summary>
+        /// <param name="series_name">The name of the series</param>
+        /// <param name="threshold">The threshold to compare against</param>
+        /// <returns>The number of values at or below the threshold</returns>
+        public int CountAtOrBelow (string series_name, double threshold)
+        {
+            lock (_statistics_lock)
+            {
+                StatisticsSeries series = null;
+                return _series.TryGetValue(series_name, out series) ? series.Values.CountLessThanOrEqual(threshold) : 0;
+            }
+        }
+
+        /// <summary>
+        /// Removes all series and resets the trial and hit counters.
+        /// </summary>
+        public void Clear ()
+        {
+            lock (_statistics_lock)
+            {
+                _series.Clear();
+                _trial_count = 0;
+                _hit_count = 0;
+            }
+        }
+
+        /// <summary>
+        /// Saves the counters and all series into a session checkpoint.
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being created</param>
+        /// <param name="prefix">The prefix of the names of the checkpoint values</param>
+        public void SaveCheckpointState (MotoTrakSessionCheckpoint checkpoint, string prefix)
+        {
+            lock (_statistics_lock)
+            {
+                checkpoint.SetInteger(prefix + ".TrialCount", _trial_count);
+                checkpoint.SetInteger(prefix + ".HitCount", _hit_count);
+                foreach (var series in _series)
+                {
+                    checkpoint.SetNumberList(prefix + ".Series." + series.Key + ".Values", series.Value.Values.ToSortedList());
+                    checkpoint.SetNumber(prefix + ".Series." + series.Key + ".Sum", series.Value.Sum);
+                    checkpoint.SetNumber(prefix + ".Series." + series.Key + ".SumOfSquares", series.Value.SumOfSquares);
+                }
+            }
+        }
+
+        /// <summary>
+        /// Replaces the counters and all series with those saved in a session checkpoint.
+        /// </summary>
+        /// <param name="checkpoint">The checkpoint being restored</param>
+        /// <param name="prefix">The prefix of the names of the checkpoint values</param>
+        public void RestoreCheckpointState (MotoTrakSessionCheckpoint checkpoint, string prefix)
+        {
+            if (!checkpoint.Contains(prefix + ".TrialCount"))
+            {
+                return;
+            }
+
+            lock (_statistics_lock)
+            {
+                _series.Clear();
+                _trial_count = Convert.ToInt32(checkpoint.GetInteger(prefix + ".TrialCount"));
+                _hit_count = Convert.ToInt32(checkpoint.GetInteger(prefix + ".HitCount"));
+
+                string series_prefix = prefix + ".Series.";
+                foreach (string name in checkpoint.GetNames(series_prefix).Where(x => x.EndsWith(".Values")))
+                {
+                    string series_name = name.Substring(series_prefix.Length, name.Length - series_prefix.Length - ".Values".Length);
+                    StatisticsSeries series = new StatisticsSeries();
+                    foreach (double value in checkpoint.GetNumberList(name))
+                    {
+                        series.Values.Add(value);
+                    }
+
+                    //The sums are restored as they were saved (rather than summed again) so that means and deviations are unchanged
+                    series.Sum = checkpoint.GetNumber(series_prefix + series_name + ".Sum");
+                    series.SumOfSquares = checkpoint.GetNumber(series_prefix + series_name + ".SumOfSquares");
+                    _series[series_name] = series;
+                }
+            }
+        }
+
+        #endregion
+    }
+}
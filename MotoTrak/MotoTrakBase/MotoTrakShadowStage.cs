@@ -0,0 +1,649 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Globalization;
+using System.IO;
+using System.Linq;
+using System.Threading;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Runs a second stage implementation in shadow mode, so that new stage logic can be compared against the stage that is
+    /// running the session on live animals.  The session thread hands each frame's transformed data, and the start and end of
+    /// each of the primary stage's trials, to a bounded queue.  A worker thread feeds them to the shadow stage implementation,
+    /// which looks for trial initiations and trial events as the primary stage does, but whose events and actions are only
+    /// logged, never carried out.  The shadow stage implementation is given its own copy of the stage, with an autopositioner
+    /// that is not connected to a controller board, so that any parameter it changes, or any position it sets, does not
+    /// reach the session.  At the end of the session, the disagreements between the two stages are summarized.
+    /// 
+    /// The session thread never waits for the shadow stage: if the queue is full, the item is dropped.  Trials whose data
+    /// may be incomplete because of a dropped item are not compared.
+    /// </summary>
+    public class MotoTrakShadowStage
+    {
+        #region Private classes
+
+        private enum ShadowItemType
+        {
+            Frame,
+            TrialStart,
+            TrialEnd
+        }
+
+        private class ShadowItem
+        {
+            public ShadowItemType ItemType = ShadowItemType.Frame;
+            public long Sequence = 0;
+            public MotorSignalBlock Data = null;
+            public int NewDatapointCount = 0;
+            public int BufferSize = 0;
+            public bool IsWaitingForTrial = false;
+            public int TrialInitiationIndex = -1;
+            public MotorTrialResult PrimaryResult = MotorTrialResult.Unknown;
+            public int PrimaryHitIndex = -1;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private IMotorStageImplementation _stage_implementation = null;
+        private string _stage_implementation_name = string.Empty;
+        private MotorStage _stage = null;
+        private BlockingCollection<ShadowItem> _pending_items = null;
+        private Thread _worker_thread = null;
+        private StreamWriter _log_writer = null;
+
+        //Counted by the session thread
+        private long _next_sequence = 0;
+        private long _items_dropped = 0;
+        private int _maximum_queue_depth = 0;
+
+        //Everything below is only used by the worker thread (and read for the summary once it has finished)
+        private long _expected_sequence = 0;
+        private MotorSignalBlock _signal = new MotorSignalBlock();
+        private bool _is_signal_complete = true;
+        private int _samples_since_drop = 0;
+        private int _shadow_initiation_index = -1;
+        private MotorTrial _trial = null;
+        private bool _is_trial_comparable = false;
+        private int _trial_count = 0;
+        private List<double> _processing_milliseconds = new List<double>();
+        private int _error_count = 0;
+
+        private int _trials_compared = 0;
+        private int _trials_skipped = 0;
+        private int _both_hit = 0;
+        private int _both_miss = 0;
+        private int _primary_only_hit = 0;
+        private int _shadow_only_hit = 0;
+        private double _hit_index_difference_sum = 0;
+        private int _initiations_agreed = 0;
+        private int _initiations_missed_by_shadow = 0;
+        private int _shadow_only_initiations = 0;
+        private double _initiation_index_difference_sum = 0;
+        private int _shadow_feed_count = 0;
+        private int _shadow_stimulation_count = 0;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a shadow stage and starts its worker thread
+        /// </summary>
+        /// <param name="stage_implementation">The shadow stage implementation (a separate instance from the primary stage implementation)</param>
+        /// <param name="stage_implementation_name">The name of the shadow stage implementation, for the log and summary</param>
+        /// <param name="stage">The stage that is running.  It is copied, so the shadow stage never changes it.</param>
+        /// <param name="queue_length">The maximum number of items that may wait for the worker thread</param>
+        /// <param name="log_path">The file to which the shadow stage's events and actions are logged, or null for no log file</param>
+        public MotoTrakShadowStage(IMotorStageImplementation stage_implementation, string stage_implementation_name, MotorStage stage,
+            int queue_length, string log_path)
+        {
+            _stage_implementation = stage_implementation;
+            _stage_implementation_name = stage_implementation_name;
+            _stage = stage.Clone();
+            _stage.Autopositioner = new MotoTrakAutopositioner(null);
+            _pending_items = new BlockingCollection<ShadowItem>(Math.Max(1, queue_length));
+
+            if (!string.IsNullOrEmpty(log_path))
+            {
+                try
+                {
+                    _log_writer = new StreamWriter(log_path, false);
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    _log_writer = null;
+                }
+            }
+
+            //The shadow stage must not slow down the session thread
+            _worker_thread = new Thread(ProcessItems);
+            _worker_thread.IsBackground = true;
+            _worker_thread.Priority = ThreadPriority.BelowNormal;
+            _worker_thread.Name = "MotoTrak shadow stage";
+            _worker_thread.Start();
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The name of the shadow stage implementation
+        /// </summary>
+        public string StageImplementationName
+        {
+            get
+            {
+                return _stage_implementation_name;
+            }
+        }
+
+        /// <summary>
+        /// The number of items that were dropped because the queue was full
+        /// </summary>
+        public long ItemsDropped
+        {
+            get
+            {
+                return Interlocked.Read(ref _items_dropped);
+            }
+        }
+
+        #endregion
+
+        #region Methods called by the session thread
+
+        /// <summary>
+        /// Hands the transformed data of a frame to the shadow stage.  This is called after the new data has been transformed,
+        /// and before the primary stage checks for a trial initiation or for trial events.
+        /// </summary>
+        /// <param name="transformed_new_data">The transformed new data (it is copied)</param>
+        /// <param name="new_datapoint_count">The number of new samples</param>
+        /// <param name="buffer_size">The number of samples that the buffered signal keeps</param>
+        /// <param name="is_waiting_for_trial">Whether MotoTrak is waiting for a trial to be initiated</param>
+        public void AddFrame (MotorSignalBlock transformed_new_data, int new_datapoint_count, int buffer_size, bool is_waiting_for_trial)
+        {
+            MotorSignalBlock data = new MotorSignalBlock();
+            data.CopyFrom(transformed_new_data);
+
+            Post(new ShadowItem()
+            {
+                ItemType = ShadowItemType.Frame,
+                Data = data,
+                NewDatapointCount = new_datapoint_count,
+                BufferSize = buffer_size,
+                IsWaitingForTrial = is_waiting_for_trial
+            });
+        }
+
+        /// <summary>
+        /// Tells the shadow stage that the primary stage initiated a trial during the current frame
+        /// </summary>
+        /// <param name="trial_initiation_index">The index into the buffered signal at which the trial was initiated</param>
+        public void StartTrial (int trial_initiation_index)
+        {
+            Post(new ShadowItem()
+            {
+                ItemType = ShadowItemType.TrialStart,
+                TrialInitiationIndex = trial_initiation_index
+            });
+        }
+
+        /// <summary>
+        /// Tells the shadow stage that the primary stage's trial has ended
+        /// </summary>
+        /// <param name="primary_trial">The trial, as run by the primary stage</param>
+        public void EndTrial (MotorTrial primary_trial)
+        {
+            Post(new ShadowItem()
+            {
+                ItemType = ShadowItemType.TrialEnd,
+                PrimaryResult = primary_trial.Result,
+                PrimaryHitIndex = (primary_trial.HitIndices.Count > 0) ? primary_trial.HitIndices[0] : -1
+            });
+        }
+
+        /// <summary>
+        /// Stops accepting items, and waits (for a limited time) for the worker thread to finish the items in the queue
+        /// </summary>
+        /// <param name="timeout_in_milliseconds">The longest time to wait for the worker thread</param>
+        public void Close (int timeout_in_milliseconds = 5000)
+        {
+            if (!_pending_items.IsAddingCompleted)
+            {
+                _pending_items.CompleteAdding();
+            }
+
+            if (_worker_thread != null)
+            {
+                if (!_worker_thread.Join(timeout_in_milliseconds))
+                {
+                    ErrorLoggingService.GetInstance().LogStringError("The shadow stage did not finish its queue before the session ended.");
+                }
+
+                _worker_thread = null;
+            }
+        }
+
+        /// <summary>
+        /// Summarizes how the shadow stage compared with the primary stage over the session.  Call Close first.
+        /// </summary>
+        /// <returns>A list of messages</returns>
+        public List<string> CreateSessionSummary ()
+        {
+            List<string> messages = new List<string>();
+            int results_agreed = _both_hit + _both_miss;
+
+            messages.Add("Shadow stage " + _stage_implementation_name + ": " + results_agreed.ToString() + " of " + _trials_compared.ToString() +
+                " trials agreed (" + _both_hit.ToString() + " hits, " + _both_miss.ToString() + " misses); " +
+                _primary_only_hit.ToString() + " hits by the session stage only, " + _shadow_only_hit.ToString() + " hits by the shadow stage only, " +
+                _trials_skipped.ToString() + " trials not compared.");
+
+            if (_both_hit > 0)
+            {
+                messages.Add("Shadow stage hit timing: mean difference of " + FormatNumber(_hit_index_difference_sum / _both_hit) +
+                    " samples over " + _both_hit.ToString() + " shared hits.");
+            }
+
+            string initiation_message = "Shadow stage initiations: " + _initiations_agreed.ToString() + " agreed, " +
+                _initiations_missed_by_shadow.ToString() + " missed by the shadow stage, " + _shadow_only_initiations.ToString() + " by the shadow stage only";
+            if (_initiations_agreed > 0)
+            {
+                initiation_message += " (mean index difference of " + FormatNumber(_initiation_index_difference_sum / _initiations_agreed) + " samples)";
+            }
+
+            messages.Add(initiation_message + ".");
+            messages.Add("Shadow stage actions (not carried out): " + _shadow_feed_count.ToString() + " feeds, " + _shadow_stimulation_count.ToString() + " stimulations.");
+
+            string load_message = "Shadow stage load: " + _processing_milliseconds.Count.ToString() + " items, " + ItemsDropped.ToString() + " dropped, " +
+                "deepest queue " + _maximum_queue_depth.ToString() + ", " + _error_count.ToString() + " errors";
+            if (_processing_milliseconds.Count > 0)
+            {
+                load_message += ", mean " + FormatNumber(_processing_milliseconds.Average()) + " ms and maximum " + FormatNumber(_processing_milliseconds.Max()) + " ms per item";
+            }
+
+            messages.Add(load_message + ".");
+
+            return messages;
+        }
+
+        #endregion
+
+        #region Private methods (session thread)
+
+        private void Post (ShadowItem item)
+        {
+            item.Sequence = _next_sequence++;
+
+            bool success = false;
+            try
+            {
+                success = _pending_items.TryAdd(item);
+            }
+            catch (InvalidOperationException)
+            {
+                //The shadow stage has been closed
+                success = false;
+            }
+
+            if (success)
+            {
+                _maximum_queue_depth = Math.Max(_maximum_queue_depth, _pending_items.Count);
+            }
+            else
+            {
+                Interlocked.Increment(ref _items_dropped);
+            }
+        }
+
+        #endregion
+
+        #region Private methods (worker thread)
+
+        /// <summary>
+        /// The loop run by the worker thread
+        /// </summary>
+        private void ProcessItems ()
+        {
+            try
+            {
+                IMotorStageShadowable shadowable = _stage_implementation as IMotorStageShadowable;
+                if (shadowable != null)
+                {
+                    shadowable.PrepareShadowSession(_stage);
+                }
+            }
+            catch (Exception e)
+            {
+                ReportError(e);
+            }
+
+            Stopwatch stopwatch = new Stopwatch();
+            foreach (ShadowItem item in _pending_items.GetConsumingEnumerable())
+            {
+                stopwatch.Restart();
+
+                //A gap in the sequence means items were dropped, so the shadow stage's signal is missing samples
+                if (item.Sequence != _expected_sequence)
+                {
+                    _is_signal_complete = false;
+                    _samples_since_drop = 0;
+                    _is_trial_comparable = false;
+                    Log("Items dropped: " + (item.Sequence - _expected_sequence).ToString());
+                }
+
+                _expected_sequence = item.Sequence + 1;
+
+                try
+                {
+                    switch (item.ItemType)
+                    {
+                        case ShadowItemType.Frame:
+                            ProcessFrame(item);
+                            break;
+                        case ShadowItemType.TrialStart:
+                            ProcessTrialStart(item);
+                            break;
+                        case ShadowItemType.TrialEnd:
+                            ProcessTrialEnd(item);
+                            break;
+                    }
+                }
+                catch (Exception e)
+                {
+                    ReportError(e);
+                    _is_trial_comparable = false;
+                }
+
+                _processing_milliseconds.Add(stopwatch.Elapsed.TotalMilliseconds);
+            }
+
+            if (_log_writer != null)
+            {
+                try
+                {
+                    foreach (string msg in CreateSessionSummary())
+                    {
+                        _log_writer.WriteLine(msg);
+                    }
+
+                    _log_writer.Close();
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                }
+
+                _log_writer = null;
+            }
+        }
+
+        private void ProcessFrame (ShadowItem item)
+        {
+            //An initiation found by the shadow stage in the previous frame was not matched by the primary stage
+            if (_shadow_initiation_index > -1)
+            {
+                _shadow_only_initiations++;
+                Log("Trial initiated by the shadow stage only, at index " + _shadow_initiation_index.ToString());
+                _shadow_initiation_index = -1;
+            }
+
+            //The buffer starts out zero-filled, as the session's buffer does, so the two match from the first frame
+            _signal.WindowLength = item.BufferSize;
+            if (_signal.StreamCount == 0)
+            {
+                _signal.Reset(item.Data.StreamCount, item.BufferSize);
+            }
+
+            _signal.Append(item.Data);
+            if (!_is_signal_complete)
+            {
+                _samples_since_drop += item.Data.Length;
+                _is_signal_complete = (_samples_since_drop >= _signal.Length);
+            }
+
+            if (_trial != null)
+            {
+                for (int i = 0; i < _trial.TrialData.Count && i < item.Data.StreamCount; i++)
+                {
+                    _trial.TrialData[i].AddRange(item.Data.GetStream(i));
+                }
+
+                if (_trial.Result == MotorTrialResult.Unknown)
+                {
+                    AddTrialEvents(_stage_implementation.CheckForTrialEvent(_trial, item.NewDatapointCount, _stage));
+                    LogActions(_stage_implementation.ReactToTrialEvents(_trial, _stage));
+                }
+
+                LogActions(_stage_implementation.PerformActionDuringTrial(_trial, _stage));
+            }
+            else if (item.IsWaitingForTrial)
+            {
+                _shadow_initiation_index = MotorSignalBlockAdapter.For(_stage_implementation).CheckSignalBlockForTrialInitiation(
+                    _signal, item.NewDatapointCount, _stage);
+            }
+        }
+
+        private void ProcessTrialStart (ShadowItem item)
+        {
+            if (_trial != null)
+            {
+                //The end of the previous trial was dropped
+                _trials_skipped++;
+                _trial = null;
+            }
+
+            if (_shadow_initiation_index > -1)
+            {
+                _initiations_agreed++;
+                _initiation_index_difference_sum += Math.Abs(_shadow_initiation_index - item.TrialInitiationIndex);
+            }
+            else
+            {
+                _initiations_missed_by_shadow++;
+                Log("Trial initiation missed by the shadow stage, at index " + item.TrialInitiationIndex.ToString());
+            }
+
+            _shadow_initiation_index = -1;
+
+            //The trial is only compared if the shadow stage's signal has been complete for the whole buffer
+            _is_trial_comparable = _is_signal_complete;
+            _trial_count++;
+            _trial = CreateTrial(item.TrialInitiationIndex);
+            _trial.TrialEvents.Add(new MotorTrialEvent()
+            {
+                EventType = MotorTrialEventType.TrialInitiation,
+                EventIndex = _stage.TotalRecordedSamplesBeforeHitWindow
+            });
+        }
+
+        private void ProcessTrialEnd (ShadowItem item)
+        {
+            if (_trial == null)
+            {
+                //The start of the trial was dropped
+                _trials_skipped++;
+                return;
+            }
+
+            MotorTrial trial = _trial;
+            _trial = null;
+
+            trial.TrialEvents.Add(new MotorTrialEvent()
+            {
+                EventType = MotorTrialEventType.TrialEnd,
+                EventIndex = trial.TrialData[0].Count - 1
+            });
+            LogActions(_stage_implementation.ReactToTrialEvents(trial, _stage));
+
+            if (trial.Result == MotorTrialResult.Unknown)
+            {
+                trial.Result = MotorTrialResult.Miss;
+            }
+
+            int shadow_hit_index = (trial.HitIndices.Count > 0) ? trial.HitIndices[0] : -1;
+            Log("Trial " + _trial_count.ToString() + " ended: session stage " + DescribeResult(item.PrimaryResult, item.PrimaryHitIndex) +
+                ", shadow stage " + DescribeResult(trial.Result, shadow_hit_index));
+
+            if (!_is_trial_comparable)
+            {
+                _trials_skipped++;
+                return;
+            }
+
+            _trials_compared++;
+            bool primary_hit = (item.PrimaryResult == MotorTrialResult.Hit);
+            bool shadow_hit = (trial.Result == MotorTrialResult.Hit);
+            if (primary_hit && shadow_hit)
+            {
+                _both_hit++;
+                _hit_index_difference_sum += Math.Abs(shadow_hit_index - item.PrimaryHitIndex);
+            }
+            else if (primary_hit)
+            {
+                _primary_only_hit++;
+            }
+            else if (shadow_hit)
+            {
+                _shadow_only_hit++;
+            }
+            else
+            {
+                _both_miss++;
+            }
+        }
+
+        /// <summary>
+        /// Creates the shadow stage's trial from its own signal, as MotoTrak does when a trial is initiated
+        /// </summary>
+        private MotorTrial CreateTrial (int trial_initiation_index)
+        {
+            int samples_before_hit_window = _stage.TotalRecordedSamplesBeforeHitWindow;
+            trial_initiation_index = Math.Max(0, Math.Min(_signal.Length - 1, trial_initiation_index));
+            int point_to_start_keeping_data = Math.Max(0, trial_initiation_index - samples_before_hit_window);
+
+            MotorTrial trial = new MotorTrial();
+            trial.StartTime = DateTime.Now;
+            trial.TrialData = new List<List<double>>();
+            for (int i = 0; i < _signal.StreamCount; i++)
+            {
+                List<double> data_from_stream = _signal.CopyToList(i, point_to_start_keeping_data, trial_initiation_index - point_to_start_keeping_data + 1);
+                if (data_from_stream.Count < samples_before_hit_window)
+                {
+                    //Zero-pad if needed
+                    data_from_stream.InsertRange(0, Enumerable.Repeat<double>(0, samples_before_hit_window - data_from_stream.Count));
+                }
+
+                trial.TrialData.Add(data_from_stream);
+            }
+
+            return trial;
+        }
+
+        /// <summary>
+        /// Adds new events to the shadow stage's trial, as MotoTrak adds them to the primary stage's trial
+        /// </summary>
+        private void AddTrialEvents (List<Tuple<MotorTrialEventType, int>> new_events)
+        {
+            if (new_events == null)
+            {
+                return;
+            }
+
+            foreach (var n in new_events)
+            {
+                bool are_multiple_events_allowed = MotorTrialEventTypeConverter.AreMultipleEventsAllowed(n.Item1);
+                bool does_this_event_already_exist = _trial.TrialEvents.Any(x => x.EventType == n.Item1);
+                if (are_multiple_events_allowed || !does_this_event_already_exist)
+                {
+                    _trial.TrialEvents.Add(new MotorTrialEvent() { EventType = n.Item1, EventIndex = n.Item2 });
+                    Log("Trial " + _trial_count.ToString() + ", event " + n.Item1.ToString() + " at index " + n.Item2.ToString());
+
+                    if (n.Item1 == MotorTrialEventType.SuccessfulTrial && _trial.Result == MotorTrialResult.Unknown)
+                    {
+                        _trial.Result = MotorTrialResult.Hit;
+                        _trial.HitTimes.Add(DateTime.Now);
+                        _trial.HitIndices.Add(n.Item2);
+                    }
+                }
+            }
+        }
+
+        /// <summary>
+        /// Logs the actions of the shadow stage.  They are never carried out.
+        /// </summary>
+        private void LogActions (List<MotorTrialAction> actions)
+        {
+            if (actions == null)
+            {
+                return;
+            }
+
+            foreach (var a in actions)
+            {
+                if (a.ActionType == MotorTrialActionType.TriggerFeeder)
+                {
+                    _shadow_feed_count++;
+                }
+                else if (a.ActionType == MotorTrialActionType.SendStimulationTrigger)
+                {
+                    _shadow_stimulation_count++;
+                }
+
+                Log("Trial " + _trial_count.ToString() + ", action " + a.ActionType.ToString() + " (not carried out)");
+            }
+        }
+
+        private void ReportError (Exception e)
+        {
+            _error_count++;
+            Log("Error: " + e.Message);
+
+            //Only the first error is reported, so a failing shadow stage does not flood the log
+            if (_error_count == 1)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                MotoTrakMessaging.GetInstance().AddMessage("Error in shadow stage implementation " + _stage_implementation_name);
+            }
+        }
+
+        private void Log (string message)
+        {
+            if (_log_writer != null)
+            {
+                try
+                {
+                    _log_writer.WriteLine(DateTime.Now.ToString("HH:mm:ss.fff", CultureInfo.InvariantCulture) + " " + message);
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    _log_writer = null;
+                }
+            }
+        }
+
+        private static string DescribeResult (MotorTrialResult result, int hit_index)
+        {
+            if (result == MotorTrialResult.Hit)
+            {
+                return "hit at index " + hit_index.ToString();
+            }
+
+            return result.ToString().ToLower();
+        }
+
+        private static string FormatNumber (double value)
+        {
+            return value.ToString("0.##", CultureInfo.InvariantCulture);
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,265 @@
+﻿using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Encodes and decodes the streams of trial data in compressed MotoTrak files (file version -7).  Each stream is saved as a
+    /// codec identifier (one byte), the number of bytes that follow (a UInt32), and then the encoded samples:
+    /// 
+    /// Raw: each sample as a float32, exactly as in file versions -5 and -6.
+    /// DeltaVarint: used for streams in which every sample is a whole number (timestamps, the IR sensor, raw device counts).  The
+    ///     difference between each sample and the previous sample is zigzag-encoded and saved as a variable-length integer.
+    /// QuantizedDeltaVarint: used for calibrated streams.  The quantum is saved as a float32, and then each sample is rounded to a
+    ///     whole number of quanta and saved the same way as DeltaVarint.  This is lossy: each sample is within half a quantum
+    ///     of its float32 value.
+    /// 
+    /// Samples are always converted to float32 before they are encoded, so the lossless codecs reproduce exactly the values
+    /// that an uncompressed file would hold.  If an encoded stream would be larger than the raw stream, the raw codec is used.
+    /// </summary>
+    public class MotoTrakSignalCodec
+    {
+        #region Public enumerations
+
+        /// <summary>
+        /// The codecs that a stream of trial data can be saved with
+        /// </summary>
+        public enum Codec : byte
+        {
+            Raw = 0,
+            DeltaVarint = 1,
+            QuantizedDeltaVarint = 2
+        }
+
+        #endregion
+
+        #region Private data members
+
+        //Whole numbers can only be encoded exactly up to this magnitude, because the decoder works in double precision
+        private const double _largest_exact_integer = 9007199254740992.0;
+
+        private byte[] _buffer = new byte[0];
+        private long[] _quantized_samples = new long[0];
+        private float[] _float_samples = new float[0];
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a codec.  The codec holds the buffers used for encoding, so one codec should be kept for each file being saved.
+        /// </summary>
+        public MotoTrakSignalCodec ( )
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Encodes one stream of trial data and writes it out
+        /// </summary>
+        /// <param name="writer">The writer to save the stream to</param>
+        /// <param name="samples">The samples of the stream</param>
+        /// <param name="compression">The kind of compression that is allowed</param>
+        /// <param name="quantum">The quantum used by the QuantizedDeltaVarint codec</param>
+        public void Encode (BinaryWriter writer, List<double> samples, MotoTrakFileSave.SignalCompression compression, double quantum)
+        {
+            int n = samples.Count;
+
+            //The quantum is saved as a float32, so the samples are quantized using the float32 value of the quantum
+            quantum = (float)quantum;
+            if (_quantized_samples.Length < n)
+            {
+                _quantized_samples = new long[n];
+                _float_samples = new float[n];
+                _buffer = new byte[Math.Max(n * 10 + 4, n * sizeof(float))];
+            }
+
+            //Pick the codec for this stream
+            Codec codec = Codec.Raw;
+            if (compression != MotoTrakFileSave.SignalCompression.None)
+            {
+                if (Quantize(samples, 1.0, true))
+                {
+                    codec = Codec.DeltaVarint;
+                }
+                else if (compression == MotoTrakFileSave.SignalCompression.Quantized && quantum > 0 && Quantize(samples, quantum, false))
+                {
+                    codec = Codec.QuantizedDeltaVarint;
+                }
+            }
+
+            //Encode the stream
+            int length = 0;
+            if (codec == Codec.QuantizedDeltaVarint)
+            {
+                Buffer.BlockCopy(BitConverter.GetBytes((float)quantum), 0, _buffer, 0, sizeof(float));
+                length = sizeof(float);
+            }
+
+            if (codec != Codec.Raw)
+            {
+                long previous = 0;
+                for (int i = 0; i < n; i++)
+                {
+                    long delta = _quantized_samples[i] - previous;
+                    previous = _quantized_samples[i];
+                    length = WriteVarint(_buffer, length, (ulong)((delta << 1) ^ (delta >> 63)));
+                }
+
+                //Fall back to the raw codec if nothing was gained
+                if (length >= n * sizeof(float))
+                {
+                    codec = Codec.Raw;
+                }
+            }
+
+            if (codec == Codec.Raw)
+            {
+                for (int i = 0; i < n; i++)
+                {
+                    _float_samples[i] = (float)samples[i];
+                }
+
+                Buffer.BlockCopy(_float_samples, 0, _buffer, 0, n * sizeof(float));
+                length = n * sizeof(float);
+            }
+
+            writer.Write((byte)codec);
+            writer.Write(Convert.ToUInt32(length));
+            writer.Write(_buffer, 0, length);
+        }
+
+        /// <summary>
+        /// Reads and decodes one stream of trial data
+        /// </summary>
+        /// <param name="reader">The reader, positioned at the start of the stream</param>
+        /// <param name="n_samples">The number of samples in the stream</param>
+        /// <returns>The samples of the stream</returns>
+        public static List<double> Decode (BinaryReader reader, UInt32 n_samples)
+        {
+            Codec codec = (Codec)reader.ReadByte();
+            int length = Convert.ToInt32(reader.ReadUInt32());
+            byte[] payload = reader.ReadBytes(length);
+            if (payload.Length < length)
+            {
+                throw new EndOfStreamException();
+            }
+
+            List<double> samples = new List<double>((int)n_samples);
+            switch (codec)
+            {
+                case Codec.Raw:
+
+                    for (int i = 0; i < n_samples; i++)
+                    {
+                        samples.Add(BitConverter.ToSingle(payload, i * sizeof(float)));
+                    }
+
+                    break;
+                case Codec.DeltaVarint:
+                case Codec.QuantizedDeltaVarint:
+
+                    int position = 0;
+                    double quantum = 1.0;
+                    if (codec == Codec.QuantizedDeltaVarint)
+                    {
+                        quantum = BitConverter.ToSingle(payload, 0);
+                        position = sizeof(float);
+                    }
+
+                    long value = 0;
+                    for (int i = 0; i < n_samples; i++)
+                    {
+                        ulong zigzag = ReadVarint(payload, ref position);
+                        value += (long)(zigzag >> 1) ^ -(long)(zigzag & 1);
+                        samples.Add(value * quantum);
+                    }
+
+                    break;
+                default:
+                    throw new InvalidDataException("Unknown signal codec: " + codec.ToString());
+            }
+
+            return samples;
+        }
+
+        /// <summary>
+        /// Skips over one stream of trial data without decoding it
+        /// </summary>
+        /// <param name="reader">The reader, positioned at the start of the stream</param>
+        public static void Skip (BinaryReader reader)
+        {
+            reader.ReadByte();
+            UInt32 length = reader.ReadUInt32();
+            reader.BaseStream.Seek(length, SeekOrigin.Current);
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Rounds each sample (as a float32) to a whole number of quanta, and saves the results in the quantized sample buffer.
+        /// Returns false if a sample is not finite, is too large, or (if exact is true) is not already a whole number of quanta.
+        /// </summary>
+        private bool Quantize (List<double> samples, double quantum, bool exact)
+        {
+            for (int i = 0; i < samples.Count; i++)
+            {
+                double value = (float)samples[i] / quantum;
+                double rounded = Math.Round(value);
+                if (double.IsNaN(value) || Math.Abs(rounded) >= _largest_exact_integer || (exact && rounded != value))
+                {
+                    return false;
+                }
+
+                _quantized_samples[i] = (long)rounded;
+            }
+
+            return true;
+        }
+
+        /// <summary>
+        /// Writes an unsigned integer 7 bits at a time, least-significant group first, with the high bit of each byte set if more
+        /// bytes follow.  Returns the position after the last byte written.
+        /// </summary>
+        private static int WriteVarint (byte[] buffer, int position, ulong value)
+        {
+            while (value >= 0x80)
+            {
+                buffer[position++] = (byte)(value | 0x80);
+                value >>= 7;
+            }
+
+            buffer[position++] = (byte)value;
+            return position;
+        }
+
+        /// <summary>
+        /// Reads an unsigned integer that was written by WriteVarint
+        /// </summary>
+        private static ulong ReadVarint (byte[] buffer, ref int position)
+        {
+            ulong value = 0;
+            int shift = 0;
+            byte b;
+            do
+            {
+                b = buffer[position++];
+                value |= (ulong)(b & 0x7F) << shift;
+                shift += 7;
+            }
+            while ((b & 0x80) != 0);
+
+            return value;
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,598 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Globalization;
+using System.IO;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Watches the signals of a session for problems with the equipment that the stage implementation would not notice (a
+    /// loose cable or a saturated load cell just looks like an animal that never initiates a trial).  Each frame of data is
+    /// checked as it arrives, with a constant amount of work for each sample:
+    /// 
+    /// The rolling standard deviation of each stream, over the last few seconds.
+    /// Flat signals: the device signal staying within one analog-to-digital converter count, or the range of the IR sensor
+    ///     signal collapsing below 1 (the case that the swipe sensor stages handle), for longer than the flat signal limit.
+    ///     A resting knob or an unloaded pull handle reads the same converter count for as long as the animal leaves it alone,
+    ///     so a signal only counts as flat while the animal shows no other sign of being there: no trial initiations, and no
+    ///     swipes across the IR sensor.
+    /// Clipping: raw device values at the limits of the analog-to-digital converter.  The knob is read from a rotary encoder,
+    ///     which has no such limits, so it is not checked for clipping.
+    /// Sample rate drift: the mean interval between timestamps, compared with the stage's sample period, along with gaps in
+    ///     the timestamps and timestamps that go backwards (the board being reset).
+    /// 
+    /// An alert is posted to the MotoTrak messages when a problem starts, and another when it clears.  At the end of the
+    /// session, the statistics are summarized.
+    /// </summary>
+    public class MotoTrakSignalQualityMonitor
+    {
+        #region Public static data members
+
+        /// <summary>
+        /// The length of the window that the rolling statistics are calculated over
+        /// </summary>
+        public const double RollingWindowInSeconds = 5;
+
+        /// <summary>
+        /// The largest difference between the mean interval between timestamps and the sample period, as a fraction of the
+        /// sample period, before an alert is raised
+        /// </summary>
+        public const double SampleRateDriftLimit = 0.05;
+
+        /// <summary>
+        /// How far the IR sensor signal must move to count as a swipe.  This is the range that the stage runtime waits for
+        /// before it sets a swipe sensor threshold.
+        /// </summary>
+        public const double SwipeSensorTransitionRange = 25;
+
+        #endregion
+
+        #region Private classes
+
+        private class StreamQuality
+        {
+            public string Name = string.Empty;
+            public MotorBoardDataStreamType StreamType = MotorBoardDataStreamType.Unknown;
+            public long SampleCount = 0;
+
+            //The last window of samples, relative to the first sample of the session.  The sums are recalculated from the
+            //window each time it wraps around, so that rounding errors do not build up.
+            public double[] Window = null;
+            public int WindowCount = 0;
+            public int WindowPosition = 0;
+            public double Reference = double.NaN;
+            public double Sum = 0;
+            public double SumOfSquares = 0;
+            public double MinimumStdDev = double.NaN;
+            public double MaximumStdDev = double.NaN;
+
+            //The current run of samples whose range is less than the flat tolerance
+            public double FlatTolerance = 1;
+            public double RunMinimum = double.NaN;
+            public double RunMaximum = double.NaN;
+            public long RunLength = 0;
+            public long LongestRun = 0;
+            public long LastActiveSample = 0;
+            public bool IsFlat = false;
+            public int FlatAlertCount = 0;
+
+            //Raw samples at the limits of the analog-to-digital converter
+            public long ClippedSamples = 0;
+            public long ClippedRunLength = 0;
+            public bool IsClipping = false;
+            public int ClippingAlertCount = 0;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private string _booth_label = string.Empty;
+        private double _sample_period_in_milliseconds = 0;
+        private double _clip_maximum = 0;
+        private bool _is_clipping_checked = true;
+        private long _flat_alert_samples = 0;
+        private long _clipping_alert_samples = 0;
+        private List<StreamQuality> _streams = new List<StreamQuality>();
+        private int _timestamp_stream_index = -1;
+
+        //The range of the IR sensor signal since the last swipe
+        private int _ir_stream_index = -1;
+        private double _ir_minimum = double.NaN;
+        private double _ir_maximum = double.NaN;
+
+        //Timestamp statistics
+        private double _previous_timestamp = double.NaN;
+        private double[] _interval_window = null;
+        private int _interval_count = 0;
+        private int _interval_position = 0;
+        private double _interval_sum = 0;
+        private double _total_interval_sum = 0;
+        private long _total_interval_count = 0;
+        private double _largest_drift = 0;
+        private long _gap_count = 0;
+        private long _missing_sample_count = 0;
+        private long _timestamp_reset_count = 0;
+        private bool _is_drifting = false;
+        private int _drift_alert_count = 0;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a signal quality monitor for a session
+        /// </summary>
+        /// <param name="session">The session that is being monitored</param>
+        /// <param name="flat_signal_limit_in_seconds">How long a signal may stay flat before an alert is raised</param>
+        /// <param name="clip_maximum">The largest raw value of the analog-to-digital converter</param>
+        public MotoTrakSignalQualityMonitor(MotoTrakSession session, double flat_signal_limit_in_seconds, double clip_maximum)
+        {
+            MotorStage stage = session.SelectedStage;
+            MotorDevice device = session.Device;
+
+            _booth_label = session.BoothLabel;
+            _sample_period_in_milliseconds = Math.Max(1, stage.SamplePeriodInMilliseconds);
+            _clip_maximum = clip_maximum;
+            _is_clipping_checked = (device == null || device.DeviceType != MotorDeviceType.Knob);
+
+            double samples_per_second = 1000.0 / _sample_period_in_milliseconds;
+            int window_length = Math.Max(2, Convert.ToInt32(RollingWindowInSeconds * samples_per_second));
+            _flat_alert_samples = Math.Max(1, Convert.ToInt64(flat_signal_limit_in_seconds * samples_per_second));
+            _clipping_alert_samples = Math.Max(1, Convert.ToInt64(samples_per_second));
+            _interval_window = new double[window_length];
+
+            for (int i = 0; i < stage.TotalDataStreams; i++)
+            {
+                MotorBoardDataStreamType stream_type = (i < stage.DataStreamTypes.Count) ? stage.DataStreamTypes[i] : MotorBoardDataStreamType.Unknown;
+                StreamQuality stream = new StreamQuality();
+                stream.Name = MotorBoardDataStreamTypeConverter.ConvertToDescription(stream_type);
+                stream.StreamType = stream_type;
+                stream.Window = new double[window_length];
+
+                //The device signal is flat if it stays within one converter count, which is the slope in calibrated units
+                if (stream_type == MotorBoardDataStreamType.DeviceValue && device != null && device.Slope != 0)
+                {
+                    stream.FlatTolerance = 0.5 * Math.Abs(device.Slope);
+                }
+
+                if (stream_type == MotorBoardDataStreamType.Timestamp && _timestamp_stream_index < 0)
+                {
+                    _timestamp_stream_index = i;
+                }
+
+                if (stream_type == MotorBoardDataStreamType.IRSensorValue && _ir_stream_index < 0)
+                {
+                    _ir_stream_index = i;
+                }
+
+                _streams.Add(stream);
+            }
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// Whether any alerts have been raised during the session
+        /// </summary>
+        public bool HasAlerts
+        {
+            get
+            {
+                return (AlertCount > 0);
+            }
+        }
+
+        /// <summary>
+        /// The number of problems that have been alerted during the session (alerts that a problem has cleared are not counted)
+        /// </summary>
+        public int AlertCount
+        {
+            get
+            {
+                int alert_count = _drift_alert_count;
+                foreach (StreamQuality stream in _streams)
+                {
+                    alert_count += stream.FlatAlertCount + stream.ClippingAlertCount;
+                }
+
+                return alert_count;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Checks a frame of new data.  This is called by the session thread.
+        /// </summary>
+        /// <param name="raw_block">The new data from the controller board</param>
+        /// <param name="transformed_block">The new data after it has been transformed by the stage implementation</param>
+        public void AddFrame (MotorSignalBlock raw_block, MotorSignalBlock transformed_block)
+        {
+            if (raw_block == null)
+            {
+                return;
+            }
+
+            bool has_transformed_data = (transformed_block != null && transformed_block.Length == raw_block.Length);
+            if (has_transformed_data && CheckForSwipe(transformed_block))
+            {
+                MarkAnimalActive();
+            }
+
+            for (int s = 0; s < _streams.Count && s < raw_block.StreamCount; s++)
+            {
+                StreamQuality stream = _streams[s];
+                ArraySegment<double> raw = raw_block.GetStream(s);
+
+                if (s == _timestamp_stream_index)
+                {
+                    for (int i = 0; i < raw.Count; i++)
+                    {
+                        AddTimestamp(raw.Array[raw.Offset + i]);
+                    }
+
+                    continue;
+                }
+
+                if (stream.StreamType == MotorBoardDataStreamType.DeviceValue && _is_clipping_checked)
+                {
+                    for (int i = 0; i < raw.Count; i++)
+                    {
+                        CheckClipping(stream, raw.Array[raw.Offset + i]);
+                    }
+                }
+
+                if (has_transformed_data && s < transformed_block.StreamCount)
+                {
+                    ArraySegment<double> transformed = transformed_block.GetStream(s);
+                    for (int i = 0; i < transformed.Count; i++)
+                    {
+                        double value = transformed.Array[transformed.Offset + i];
+                        if (!double.IsNaN(value))
+                        {
+                            stream.SampleCount++;
+                            AddToWindow(stream, value);
+                            CheckFlatSignal(stream, value);
+                        }
+                    }
+                }
+            }
+        }
+
+        /// <summary>
+        /// Tells the monitor that a trial has been initiated.  The animal is at the device, so whatever the signals have been
+        /// doing up to now is not a fault of the equipment.  This is called by the session thread.
+        /// </summary>
+        public void NotifyTrialInitiation ()
+        {
+            MarkAnimalActive();
+        }
+
+        /// <summary>
+        /// Creates the signal quality summary for the session
+        /// </summary>
+        /// <returns>A list of messages</returns>
+        public List<string> CreateSessionSummary ()
+        {
+            List<string> messages = new List<string>();
+            double seconds_per_sample = _sample_period_in_milliseconds / 1000.0;
+
+            messages.Add("Signal quality for booth " + _booth_label + ":");
+            foreach (StreamQuality stream in _streams)
+            {
+                if (stream.StreamType == MotorBoardDataStreamType.Timestamp)
+                {
+                    continue;
+                }
+
+                string message = stream.Name + ": " + stream.SampleCount.ToString() + " samples, rolling standard deviation " +
+                    FormatNumber(stream.MinimumStdDev) + " to " + FormatNumber(stream.MaximumStdDev) + ", longest flat stretch " +
+                    FormatNumber(stream.LongestRun * seconds_per_sample) + " s, " + stream.FlatAlertCount.ToString() + " flat signal alerts";
+                if (stream.StreamType == MotorBoardDataStreamType.DeviceValue && _is_clipping_checked)
+                {
+                    message += ", " + stream.ClippedSamples.ToString() + " clipped samples, " + stream.ClippingAlertCount.ToString() + " clipping alerts";
+                }
+
+                messages.Add(message + ".");
+            }
+
+            if (_timestamp_stream_index >= 0)
+            {
+                string mean_interval = (_total_interval_count > 0) ? FormatNumber(_total_interval_sum / _total_interval_count) : "NaN";
+                messages.Add("Sample rate: mean interval " + mean_interval + " ms (sample period " + FormatNumber(_sample_period_in_milliseconds) +
+                    " ms), largest drift " + FormatNumber(_largest_drift * 100) + "%, " + _gap_count.ToString() + " gaps (" +
+                    _missing_sample_count.ToString() + " missing samples), " + _timestamp_reset_count.ToString() + " timestamp resets, " +
+                    _drift_alert_count.ToString() + " drift alerts.");
+            }
+
+            return messages;
+        }
+
+        /// <summary>
+        /// Saves the signal quality summary for the session to a text file
+        /// </summary>
+        /// <param name="file_path">The path of the text file</param>
+        public void SaveSessionSummary (string file_path)
+        {
+            try
+            {
+                File.WriteAllLines(file_path, CreateSessionSummary());
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Adds a sample to the rolling window of a stream, and updates the range of its rolling standard deviation
+        /// </summary>
+        private void AddToWindow (StreamQuality stream, double value)
+        {
+            if (double.IsNaN(stream.Reference))
+            {
+                stream.Reference = value;
+            }
+
+            double x = value - stream.Reference;
+            if (stream.WindowCount == stream.Window.Length)
+            {
+                double oldest = stream.Window[stream.WindowPosition];
+                stream.Sum -= oldest;
+                stream.SumOfSquares -= oldest * oldest;
+            }
+            else
+            {
+                stream.WindowCount++;
+            }
+
+            stream.Window[stream.WindowPosition] = x;
+            stream.Sum += x;
+            stream.SumOfSquares += x * x;
+            stream.WindowPosition = (stream.WindowPosition + 1) % stream.Window.Length;
+
+            if (stream.WindowCount < stream.Window.Length)
+            {
+                return;
+            }
+
+            if (stream.WindowPosition == 0)
+            {
+                stream.Sum = 0;
+                stream.SumOfSquares = 0;
+                for (int i = 0; i < stream.Window.Length; i++)
+                {
+                    stream.Sum += stream.Window[i];
+                    stream.SumOfSquares += stream.Window[i] * stream.Window[i];
+                }
+            }
+
+            int n = stream.WindowCount;
+            double variance = Math.Max(0, (stream.SumOfSquares - stream.Sum * stream.Sum / n) / (n - 1));
+            double std_dev = Math.Sqrt(variance);
+            if (double.IsNaN(stream.MinimumStdDev) || std_dev < stream.MinimumStdDev)
+            {
+                stream.MinimumStdDev = std_dev;
+            }
+
+            if (double.IsNaN(stream.MaximumStdDev) || std_dev > stream.MaximumStdDev)
+            {
+                stream.MaximumStdDev = std_dev;
+            }
+        }
+
+        /// <summary>
+        /// Extends the current flat stretch of a stream, or starts a new one, and raises or clears the flat signal alert
+        /// </summary>
+        private void CheckFlatSignal (StreamQuality stream, double value)
+        {
+            if (stream.RunLength == 0 || Math.Max(stream.RunMaximum, value) - Math.Min(stream.RunMinimum, value) >= stream.FlatTolerance)
+            {
+                stream.RunMinimum = value;
+                stream.RunMaximum = value;
+                stream.RunLength = 1;
+            }
+            else
+            {
+                stream.RunMinimum = Math.Min(stream.RunMinimum, value);
+                stream.RunMaximum = Math.Max(stream.RunMaximum, value);
+                stream.RunLength++;
+            }
+
+            stream.LongestRun = Math.Max(stream.LongestRun, stream.RunLength);
+
+            //An alert is raised when the signal has been flat, and the animal has been away, for the whole flat signal limit.
+            //It is cleared only when the signal itself changes.
+            if (!stream.IsFlat)
+            {
+                long samples_since_activity = stream.SampleCount - stream.LastActiveSample;
+                if (stream.RunLength >= _flat_alert_samples && samples_since_activity >= _flat_alert_samples)
+                {
+                    stream.IsFlat = true;
+                    stream.FlatAlertCount++;
+                    string seconds = FormatNumber(_flat_alert_samples * _sample_period_in_milliseconds / 1000.0);
+                    if (stream.StreamType == MotorBoardDataStreamType.IRSensorValue)
+                    {
+                        AddAlert(stream.Name + " range has been less than 1 for " + seconds + " seconds without a trial.  Check the IR sensor.");
+                    }
+                    else
+                    {
+                        AddAlert(stream.Name + " has not changed for " + seconds + " seconds without a trial or a swipe.  Check the device and its cable.");
+                    }
+                }
+            }
+            else if (stream.RunLength < _flat_alert_samples)
+            {
+                stream.IsFlat = false;
+                AddAlert(stream.Name + " is changing again.");
+            }
+        }
+
+        /// <summary>
+        /// Follows the range of the IR sensor signal, and returns true if it has moved far enough to be a swipe
+        /// </summary>
+        private bool CheckForSwipe (MotorSignalBlock transformed_block)
+        {
+            if (_ir_stream_index < 0 || _ir_stream_index >= transformed_block.StreamCount)
+            {
+                return false;
+            }
+
+            bool swipe_found = false;
+            ArraySegment<double> ir = transformed_block.GetStream(_ir_stream_index);
+            for (int i = 0; i < ir.Count; i++)
+            {
+                double value = ir.Array[ir.Offset + i];
+                if (double.IsNaN(value))
+                {
+                    continue;
+                }
+
+                if (double.IsNaN(_ir_minimum))
+                {
+                    _ir_minimum = value;
+                    _ir_maximum = value;
+                }
+
+                _ir_minimum = Math.Min(_ir_minimum, value);
+                _ir_maximum = Math.Max(_ir_maximum, value);
+                if (_ir_maximum - _ir_minimum >= SwipeSensorTransitionRange)
+                {
+                    swipe_found = true;
+                    _ir_minimum = value;
+                    _ir_maximum = value;
+                }
+            }
+
+            return swipe_found;
+        }
+
+        /// <summary>
+        /// Starts the time that each stream must stay flat before an alert is raised over again
+        /// </summary>
+        private void MarkAnimalActive ()
+        {
+            foreach (StreamQuality stream in _streams)
+            {
+                stream.LastActiveSample = stream.SampleCount;
+            }
+        }
+
+        /// <summary>
+        /// Counts a raw device value that is at the limits of the analog-to-digital converter, and raises or clears the clipping alert
+        /// </summary>
+        private void CheckClipping (StreamQuality stream, double raw_value)
+        {
+            if (raw_value <= 0 || raw_value >= _clip_maximum)
+            {
+                stream.ClippedSamples++;
+                stream.ClippedRunLength++;
+            }
+            else
+            {
+                stream.ClippedRunLength = 0;
+            }
+
+            bool is_clipping = (stream.ClippedRunLength >= _clipping_alert_samples);
+            if (is_clipping && !stream.IsClipping)
+            {
+                stream.ClippingAlertCount++;
+                AddAlert(stream.Name + " is at the limit of its range (" + FormatNumber(raw_value) + ").  The sensor may be saturated or disconnected.");
+            }
+            else if (!is_clipping && stream.IsClipping)
+            {
+                AddAlert(stream.Name + " is back within its range.");
+            }
+
+            stream.IsClipping = is_clipping;
+        }
+
+        /// <summary>
+        /// Checks the interval since the previous timestamp, and raises or clears the sample rate drift alert
+        /// </summary>
+        private void AddTimestamp (double timestamp)
+        {
+            double previous_timestamp = _previous_timestamp;
+            _previous_timestamp = timestamp;
+            if (double.IsNaN(previous_timestamp) || double.IsNaN(timestamp))
+            {
+                return;
+            }
+
+            double interval = timestamp - previous_timestamp;
+            if (interval <= 0)
+            {
+                _timestamp_reset_count++;
+                return;
+            }
+
+            if (interval > 1.5 * _sample_period_in_milliseconds)
+            {
+                _gap_count++;
+                _missing_sample_count += Convert.ToInt64(Math.Round(interval / _sample_period_in_milliseconds)) - 1;
+            }
+
+            _total_interval_sum += interval;
+            _total_interval_count++;
+
+            if (_interval_count == _interval_window.Length)
+            {
+                _interval_sum -= _interval_window[_interval_position];
+            }
+            else
+            {
+                _interval_count++;
+            }
+
+            _interval_window[_interval_position] = interval;
+            _interval_sum += interval;
+            _interval_position = (_interval_position + 1) % _interval_window.Length;
+
+            if (_interval_count < _interval_window.Length)
+            {
+                return;
+            }
+
+            double drift = (_interval_sum / _interval_count - _sample_period_in_milliseconds) / _sample_period_in_milliseconds;
+            if (Math.Abs(drift) > Math.Abs(_largest_drift))
+            {
+                _largest_drift = drift;
+            }
+
+            bool is_drifting = (Math.Abs(drift) > SampleRateDriftLimit);
+            if (is_drifting && !_is_drifting)
+            {
+                _drift_alert_count++;
+                AddAlert("Mean interval between samples is " + FormatNumber(_interval_sum / _interval_count) + " ms, but the sample period is " +
+                    FormatNumber(_sample_period_in_milliseconds) + " ms.  Check the connection to the controller board.");
+            }
+            else if (!is_drifting && _is_drifting)
+            {
+                AddAlert("Sample rate is back to normal.");
+            }
+
+            _is_drifting = is_drifting;
+        }
+
+        private void AddAlert (string message)
+        {
+            MotoTrakMessaging.GetInstance().AddMessage("Signal quality (booth " + _booth_label + "): " + message);
+        }
+
+        private static string FormatNumber (double value)
+        {
+            return value.ToString("0.##", CultureInfo.InvariantCulture);
+        }
+
+        #endregion
+    }
+}
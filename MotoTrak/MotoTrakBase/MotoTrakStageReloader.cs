@@ -0,0 +1,241 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Threading;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Reloads Python stage implementations when their files change, so that stage code can be changed without restarting MotoTrak.
+    /// A file system watcher notes each change, and a worker thread loads the changed file once it has stopped changing.  The new
+    /// stage implementation is checked by running a synthetic trial through it (see MotorStageSyntheticFrame) with a stage that
+    /// uses it, and is only kept if this succeeds.  New stages are created from it from then on.
+    /// 
+    /// The stages that are already using the old stage implementation are switched over by SwapReloadedStageImplementations,
+    /// which MotoTrak calls on the session thread between trials.  The running stage keeps the session state of its old instance,
+    /// wherever the state of the old and new instances match (see MotoTrakSessionCheckpoint.CarryOverStageImplementationState).
+    /// 
+    /// Only the stage implementation files themselves are watched.  Changes to the shared stage runtime still need a restart.
+    /// </summary>
+    public class MotoTrakStageReloader
+    {
+        #region Private data members
+
+        private const int _quiet_period_in_milliseconds = 500;
+
+        private FileSystemWatcher _watcher = null;
+        private ConcurrentDictionary<string, DateTime> _changed_files = new ConcurrentDictionary<string, DateTime>(StringComparer.OrdinalIgnoreCase);
+        private ConcurrentQueue<PythonStageImplementation> _reloaded_stage_implementations = new ConcurrentQueue<PythonStageImplementation>();
+        private AutoResetEvent _change_signal = new AutoResetEvent(false);
+        private volatile bool _is_closing = false;
+        private Thread _worker_thread = null;
+        private List<MotorStage> _stages = new List<MotorStage>();
+        private MotorDevice _device = null;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Starts watching a folder of stage implementations
+        /// </summary>
+        /// <param name="folder">The folder of stage implementations</param>
+        /// <param name="stages">The stages that may use the stage implementations.  Reloaded stage implementations are checked with these stages.</param>
+        /// <param name="device">The device that is connected to the booth</param>
+        public MotoTrakStageReloader(string folder, IEnumerable<MotorStage> stages, MotorDevice device)
+        {
+            if (stages != null)
+            {
+                _stages = stages.ToList();
+            }
+
+            _device = device;
+
+            _worker_thread = new Thread(ReloadChangedFiles);
+            _worker_thread.IsBackground = true;
+            _worker_thread.Priority = ThreadPriority.BelowNormal;
+            _worker_thread.Name = "MotoTrak stage reloader";
+            _worker_thread.Start();
+
+            _watcher = new FileSystemWatcher(folder, "*.py");
+            _watcher.NotifyFilter = NotifyFilters.LastWrite | NotifyFilters.FileName;
+            _watcher.Changed += HandleFileChanged;
+            _watcher.Created += HandleFileChanged;
+            _watcher.Renamed += HandleFileChanged;
+            _watcher.EnableRaisingEvents = true;
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Switches each stage that uses a reloaded stage implementation over to a new instance of it.  This must be called on the
+        /// session thread, and only between trials.
+        /// </summary>
+        /// <param name="stages">The stages</param>
+        /// <param name="running_stage">The stage that is running, whose session state is carried over (or null)</param>
+        public void SwapReloadedStageImplementations (IEnumerable<MotorStage> stages, MotorStage running_stage)
+        {
+            PythonStageImplementation reloaded_stage_implementation = null;
+            while (_reloaded_stage_implementations.TryDequeue(out reloaded_stage_implementation))
+            {
+                string file_name = reloaded_stage_implementation.ModuleFileName;
+                int swapped_count = 0;
+
+                foreach (MotorStage stage in stages)
+                {
+                    if (!file_name.Equals(MotoTrakConfiguration.GetInstance().GetStageImplementationName(stage.StageImplementation), StringComparison.OrdinalIgnoreCase))
+                    {
+                        continue;
+                    }
+
+                    try
+                    {
+                        PythonStageImplementation new_stage_implementation = reloaded_stage_implementation.CreateInstance();
+                        if (stage == running_stage)
+                        {
+                            //Give the new instance its starting session state without touching the stage or the autopositioner,
+                            //and then carry over whatever the old instance had built up during the session
+                            new_stage_implementation.PrepareShadowSession(stage);
+
+                            IMotorStageCheckpointable old_stage_implementation = stage.StageImplementation as IMotorStageCheckpointable;
+                            if (old_stage_implementation != null)
+                            {
+                                MotoTrakSessionCheckpoint.CarryOverStageImplementationState(old_stage_implementation, new_stage_implementation);
+                            }
+                        }
+
+                        stage.StageImplementation = new_stage_implementation;
+                        swapped_count++;
+                    }
+                    catch (Exception e)
+                    {
+                        ErrorLoggingService.GetInstance().LogExceptionError(e);
+                        MotoTrakMessaging.GetInstance().AddMessage("Unable to switch stage " + stage.StageName + " to the reloaded " + file_name);
+                    }
+                }
+
+                MotoTrakMessaging.GetInstance().AddMessage("Reloaded " + file_name + " (" + swapped_count.ToString() + " stages switched over)");
+            }
+        }
+
+        /// <summary>
+        /// Stops watching the folder and stops the worker thread
+        /// </summary>
+        public void Close ()
+        {
+            _is_closing = true;
+
+            if (_watcher != null)
+            {
+                _watcher.EnableRaisingEvents = false;
+                _watcher.Dispose();
+                _watcher = null;
+            }
+
+            _change_signal.Set();
+            if (_worker_thread != null)
+            {
+                _worker_thread.Join(1000);
+                _worker_thread = null;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private void HandleFileChanged (object sender, FileSystemEventArgs e)
+        {
+            //Editors often write a file several times when it is saved, so each change restarts the file's quiet period
+            _changed_files[e.FullPath] = DateTime.Now;
+            _change_signal.Set();
+        }
+
+        /// <summary>
+        /// The loop run by the worker thread
+        /// </summary>
+        private void ReloadChangedFiles ()
+        {
+            while (!_is_closing)
+            {
+                _change_signal.WaitOne(_quiet_period_in_milliseconds);
+
+                DateTime quiet_since = DateTime.Now - TimeSpan.FromMilliseconds(_quiet_period_in_milliseconds);
+                foreach (var kvp in _changed_files.ToList())
+                {
+                    if (_is_closing || kvp.Value > quiet_since)
+                    {
+                        continue;
+                    }
+
+                    DateTime change_time;
+                    _changed_files.TryRemove(kvp.Key, out change_time);
+                    if (File.Exists(kvp.Key))
+                    {
+                        ReloadFile(kvp.Key);
+                    }
+                }
+            }
+        }
+
+        /// <summary>
+        /// Loads a stage implementation file and checks the new stage implementation
+        /// </summary>
+        private void ReloadFile (string path)
+        {
+            string file_name = Path.GetFileName(path);
+
+            PythonStageImplementation new_stage_implementation = null;
+            try
+            {
+                new_stage_implementation = new PythonStageImplementation(path);
+            }
+            catch (IOException)
+            {
+                //The file is still being written, so try again after another quiet period
+                _changed_files.TryAdd(path, DateTime.Now);
+                return;
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to reload " + file_name + ": " + e.Message);
+                return;
+            }
+
+            if (!new_stage_implementation.IsStageClassFound)
+            {
+                MotoTrakMessaging.GetInstance().AddMessage("Unable to reload " + file_name + ": no stage implementation class was found");
+                return;
+            }
+
+            //Run a synthetic trial through a separate instance, with a stage that uses this stage implementation
+            MotorStage stage = _stages.FirstOrDefault(x =>
+                file_name.Equals(MotoTrakConfiguration.GetInstance().GetStageImplementationName(x.StageImplementation), StringComparison.OrdinalIgnoreCase));
+            if (stage != null)
+            {
+                try
+                {
+                    PythonStageImplementation test_stage_implementation = new_stage_implementation.CreateInstance();
+                    test_stage_implementation.PrepareShadowSession(stage);
+                    MotorStageSyntheticFrame.Run(test_stage_implementation, stage, _device);
+                }
+                catch (Exception e)
+                {
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    MotoTrakMessaging.GetInstance().AddMessage("Not reloading " + file_name + ", because it failed on a synthetic trial: " + e.Message);
+                    return;
+                }
+            }
+
+            MotoTrakConfiguration.GetInstance().PythonStageImplementations[file_name] = new_stage_implementation;
+            _reloaded_stage_implementations.Enqueue(new_stage_implementation);
+        }
+
+        #endregion
+    }
+}
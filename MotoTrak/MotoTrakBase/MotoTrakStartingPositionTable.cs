@@ -0,0 +1,116 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// A declarative table that maps the number of hits a rat has accumulated on a stage in previous sessions
+    /// to the autopositioner position at which the next session should begin. Stage implementations declare
+    /// the table (for example "start at -1.0, move to -0.5 after 50 hits, 0.0 after 100 hits, ..."), and then
+    /// look up the starting position from the stage's cumulative hit count.
+    /// </summary>
+    public class MotoTrakStartingPositionTable
+    {
+        #region Private data members
+
+        private double _default_position = -1.0;
+        private List<int> _hit_thresholds = new List<int>();
+        private List<double> _positions = new List<double>();
+
+        #endregion
+
+        #region Constructors
+
+        /// <summary>
+        /// Constructs an empty table, which always returns the default position of -1.0.
+        /// The table can be filled in through the properties of this class (from Python, these can be passed as
+        /// keyword arguments to the constructor).
+        /// </summary>
+        public MotoTrakStartingPositionTable()
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The position that is used when the rat has fewer hits than the smallest hit threshold in the table
+        /// </summary>
+        public double DefaultPosition
+        {
+            get
+            {
+                return _default_position;
+            }
+            set
+            {
+                _default_position = value;
+            }
+        }
+
+        /// <summary>
+        /// The hit counts at which the starting position changes, in ascending order.
+        /// Each hit threshold is paired with the position at the same index in the Positions list.
+        /// </summary>
+        public List<int> HitThresholds
+        {
+            get
+            {
+                return _hit_thresholds;
+            }
+            set
+            {
+                _hit_thresholds = (value != null) ? value.ToList() : new List<int>();
+            }
+        }
+
+        /// <summary>
+        /// The starting positions that go along with each hit threshold
+        /// </summary>
+        public List<double> Positions
+        {
+            get
+            {
+                return _positions;
+            }
+            set
+            {
+                _positions = (value != null) ? value.ToList() : new List<double>();
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Returns the starting position for a rat that has accumulated the given number of hits.
+        /// This is the position paired with the largest hit threshold that is less than or equal to the hit count,
+        /// or the default position if the hit count is below every threshold.
+        /// </summary>
+        /// <param name="cumulative_hits">The total number of hits in previous sessions</param>
+        /// <returns>The position at which to start the session</returns>
+        public double Lookup (int cumulative_hits)
+        {
+            double position = _default_position;
+            int best_threshold = int.MinValue;
+
+            int entry_count = Math.Min(_hit_thresholds.Count, _positions.Count);
+            for (int i = 0; i < entry_count; i++)
+            {
+                if (_hit_thresholds[i] <= cumulative_hits && _hit_thresholds[i] >= best_threshold)
+                {
+                    best_threshold = _hit_thresholds[i];
+                    position = _positions[i];
+                }
+            }
+
+            return position;
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,377 @@
+﻿using System;
+using System.Collections.Concurrent;
+using System.Collections.Generic;
+using System.IO;
+using System.IO.MemoryMappedFiles;
+using System.Text;
+using System.Threading;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Records the raw data from the controller board for a whole session, including the data between trials, to a stream file
+    /// that is saved alongside the session file (with the same name as the session file, plus the ".stream" extension).  The
+    /// session thread hands each frame of new data to a bounded queue, and a background thread writes it into the file through
+    /// a memory-mapped view.  If the queue is full, the frame is dropped and counted, so the session thread never waits.
+    /// 
+    /// The file begins with a header (see FileHeaderSize), followed by chunks of equal size.  Each chunk holds up to
+    /// SamplesPerChunk samples of every stream, after a chunk header that gives the index of the chunk's first sample (counted
+    /// from the start of the recording, including any samples that were dropped), the time at which the first sample was taken
+    /// (as DateTime ticks), and the number of samples in the chunk.  Within a chunk, the samples of each stream are stored
+    /// together, as Int64 values.  A new chunk is started whenever samples have been dropped, so the samples within a chunk
+    /// are always consecutive, and the chunk headers serve as an index of the recording by sample and by time.
+    /// </summary>
+    public class MotoTrakStreamRecorder
+    {
+        #region Public static data members
+
+        /// <summary>
+        /// The extension that is appended to the name of a session file to get the name of its stream file
+        /// </summary>
+        public const string FileExtension = ".stream";
+
+        /// <summary>
+        /// The stream file version
+        /// </summary>
+        public const int FileVersion = 1;
+
+        /// <summary>
+        /// The number of bytes in the stream file header: the characters "MTRS", the file version, the number of streams, the number
+        /// of samples per chunk, the sample period in milliseconds, and the number of chunks (each an Int32), followed by the time
+        /// at which the recording started (as DateTime ticks, an Int64)
+        /// </summary>
+        public const int FileHeaderSize = 32;
+
+        /// <summary>
+        /// The number of bytes in each chunk header: the index of the first sample and the time of the first sample (each an Int64),
+        /// the number of samples in the chunk (an Int32), and 4 reserved bytes
+        /// </summary>
+        public const int ChunkHeaderSize = 24;
+
+        /// <summary>
+        /// The number of samples of each stream that a chunk holds
+        /// </summary>
+        public const int SamplesPerChunk = 4096;
+
+        #endregion
+
+        #region Private classes
+
+        private class StreamFrame
+        {
+            public long FirstSampleIndex = 0;
+            public long FirstSampleTimeTicks = 0;
+            public int SampleCount = 0;
+
+            //The values of each stream, one stream after another
+            public long[] Values = null;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private static readonly byte[] _file_signature = Encoding.ASCII.GetBytes("MTRS");
+        private const int _chunk_count_offset = 20;
+        private const int _chunks_per_mapping = 16;
+
+        private int _stream_count = 0;
+        private int _sample_period_in_milliseconds = 0;
+        private long _chunk_size = 0;
+        private BlockingCollection<StreamFrame> _pending_frames = null;
+        private Thread _writer_thread = null;
+
+        //Used by the session thread
+        private long _samples_received = 0;
+        private long _samples_dropped = 0;
+
+        //Used by the writer thread
+        private FileStream _file_stream = null;
+        private MemoryMappedFile _mapped_file = null;
+        private MemoryMappedViewAccessor _accessor = null;
+        private long _mapped_length = 0;
+        private int _chunk_count = 0;
+        private int _current_chunk_sample_count = SamplesPerChunk;
+        private long _next_sample_index = -1;
+        private long[] _stream_values = new long[SamplesPerChunk];
+        private long _samples_written = 0;
+        private bool _has_write_error = false;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a stream file and starts the background writer thread
+        /// </summary>
+        /// <param name="file_path">The path of the stream file</param>
+        /// <param name="stream_count">The number of streams from the controller board</param>
+        /// <param name="sample_period_in_milliseconds">The sample period of the controller board</param>
+        /// <param name="queue_length">The maximum number of frames that may wait for the writer thread</param>
+        public MotoTrakStreamRecorder(string file_path, int stream_count, int sample_period_in_milliseconds, int queue_length)
+        {
+            _stream_count = Math.Max(1, stream_count);
+            _sample_period_in_milliseconds = sample_period_in_milliseconds;
+            _chunk_size = ChunkHeaderSize + (long)_stream_count * SamplesPerChunk * sizeof(long);
+            _pending_frames = new BlockingCollection<StreamFrame>(Math.Max(1, queue_length));
+
+            _file_stream = new FileStream(file_path, FileMode.Create, FileAccess.ReadWrite, FileShare.Read);
+            byte[] header = new byte[FileHeaderSize];
+            using (BinaryWriter writer = new BinaryWriter(new MemoryStream(header)))
+            {
+                writer.Write(_file_signature);
+                writer.Write(FileVersion);
+                writer.Write(_stream_count);
+                writer.Write(SamplesPerChunk);
+                writer.Write(_sample_period_in_milliseconds);
+                writer.Write(0);
+                writer.Write(DateTime.Now.Ticks);
+            }
+
+            _file_stream.Write(header, 0, header.Length);
+            _file_stream.Flush();
+
+            _writer_thread = new Thread(WriteFrames);
+            _writer_thread.IsBackground = true;
+            _writer_thread.Name = "MotoTrak stream recorder";
+            _writer_thread.Start();
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The number of samples that have been handed to the recorder
+        /// </summary>
+        public long SamplesReceived
+        {
+            get
+            {
+                return Interlocked.Read(ref _samples_received);
+            }
+        }
+
+        /// <summary>
+        /// The number of samples that were dropped because the queue was full
+        /// </summary>
+        public long SamplesDropped
+        {
+            get
+            {
+                return Interlocked.Read(ref _samples_dropped);
+            }
+        }
+
+        /// <summary>
+        /// Whether an error has occurred while writing the stream file
+        /// </summary>
+        public bool HasWriteError
+        {
+            get
+            {
+                return _has_write_error;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Returns the path of the stream file that belongs to a session file
+        /// </summary>
+        /// <param name="session_file_path">The path of the session file (including the file name)</param>
+        /// <returns>The path of the stream file</returns>
+        public static string GetStreamFilePath (string session_file_path)
+        {
+            return session_file_path + FileExtension;
+        }
+
+        /// <summary>
+        /// Hands a frame of new data from the controller board to the recorder.  This is called by the session thread, and
+        /// never waits.
+        /// </summary>
+        /// <param name="new_data_points">The new data, with one row per sample and one value per stream</param>
+        public void Add (List<List<Int64>> new_data_points)
+        {
+            int sample_count = new_data_points.Count;
+            if (sample_count == 0)
+            {
+                return;
+            }
+
+            //The data was read just after its last sample was taken
+            StreamFrame frame = new StreamFrame();
+            frame.FirstSampleIndex = _samples_received;
+            frame.FirstSampleTimeTicks = DateTime.Now.Ticks - (sample_count - 1) * _sample_period_in_milliseconds * TimeSpan.TicksPerMillisecond;
+            frame.SampleCount = sample_count;
+            frame.Values = new long[_stream_count * sample_count];
+            for (int i = 0; i < sample_count; i++)
+            {
+                List<Int64> row = new_data_points[i];
+                for (int s = 0; s < _stream_count && s < row.Count; s++)
+                {
+                    frame.Values[s * sample_count + i] = row[s];
+                }
+            }
+
+            Interlocked.Add(ref _samples_received, sample_count);
+
+            bool success = false;
+            try
+            {
+                success = _pending_frames.TryAdd(frame);
+            }
+            catch (InvalidOperationException)
+            {
+                //The recorder has been closed
+                success = false;
+            }
+
+            if (!success)
+            {
+                Interlocked.Add(ref _samples_dropped, sample_count);
+            }
+        }
+
+        /// <summary>
+        /// Stops accepting frames, waits for the writer thread to write the frames in the queue, and closes the stream file
+        /// </summary>
+        public void Close ()
+        {
+            if (!_pending_frames.IsAddingCompleted)
+            {
+                _pending_frames.CompleteAdding();
+            }
+
+            if (_writer_thread != null)
+            {
+                _writer_thread.Join();
+                _writer_thread = null;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// The loop run by the writer thread
+        /// </summary>
+        private void WriteFrames ()
+        {
+            foreach (StreamFrame frame in _pending_frames.GetConsumingEnumerable())
+            {
+                if (_has_write_error)
+                {
+                    continue;
+                }
+
+                try
+                {
+                    WriteFrame(frame);
+                }
+                catch (Exception e)
+                {
+                    _has_write_error = true;
+                    ErrorLoggingService.GetInstance().LogExceptionError(e);
+                    MotoTrakMessaging.GetInstance().AddMessage("Unable to write to the stream file!");
+                }
+            }
+
+            try
+            {
+                if (_accessor != null)
+                {
+                    _accessor.Write(_chunk_count_offset, _chunk_count);
+                    _accessor.Flush();
+                    _accessor.Dispose();
+                    _accessor = null;
+                }
+
+                if (_mapped_file != null)
+                {
+                    _mapped_file.Dispose();
+                    _mapped_file = null;
+                }
+
+                //Remove the room that was reserved for chunks that were never started
+                _file_stream.SetLength(FileHeaderSize + _chunk_count * _chunk_size);
+                _file_stream.Close();
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+            }
+        }
+
+        /// <summary>
+        /// Writes a frame into the stream file, starting new chunks as needed
+        /// </summary>
+        private void WriteFrame (StreamFrame frame)
+        {
+            int written = 0;
+            while (written < frame.SampleCount)
+            {
+                //Start a new chunk if the current chunk is full, or if samples were dropped before this frame
+                long first_sample_index = frame.FirstSampleIndex + written;
+                if (_current_chunk_sample_count >= SamplesPerChunk || first_sample_index != _next_sample_index)
+                {
+                    StartChunk(first_sample_index, frame.FirstSampleTimeTicks + written * _sample_period_in_milliseconds * TimeSpan.TicksPerMillisecond);
+                }
+
+                int count = Math.Min(frame.SampleCount - written, SamplesPerChunk - _current_chunk_sample_count);
+                long chunk_offset = FileHeaderSize + (_chunk_count - 1) * _chunk_size;
+                for (int s = 0; s < _stream_count; s++)
+                {
+                    Array.Copy(frame.Values, s * frame.SampleCount + written, _stream_values, 0, count);
+                    long position = chunk_offset + ChunkHeaderSize + ((long)s * SamplesPerChunk + _current_chunk_sample_count) * sizeof(long);
+                    _accessor.WriteArray(position, _stream_values, 0, count);
+                }
+
+                _current_chunk_sample_count += count;
+                _accessor.Write(chunk_offset + 16, _current_chunk_sample_count);
+
+                written += count;
+                _next_sample_index = frame.FirstSampleIndex + written;
+                _samples_written += count;
+            }
+        }
+
+        /// <summary>
+        /// Starts a new chunk, and extends the file (and its memory-mapped view) if there is no room for it
+        /// </summary>
+        private void StartChunk (long first_sample_index, long first_sample_time_ticks)
+        {
+            long required_length = FileHeaderSize + (_chunk_count + 1) * _chunk_size;
+            if (required_length > _mapped_length)
+            {
+                if (_accessor != null)
+                {
+                    _accessor.Flush();
+                    _accessor.Dispose();
+                    _mapped_file.Dispose();
+                }
+
+                _mapped_length = FileHeaderSize + (_chunk_count + _chunks_per_mapping) * _chunk_size;
+                _file_stream.SetLength(_mapped_length);
+                _mapped_file = MemoryMappedFile.CreateFromFile(_file_stream, null, _mapped_length, MemoryMappedFileAccess.ReadWrite,
+                    null, HandleInheritability.None, true);
+                _accessor = _mapped_file.CreateViewAccessor(0, _mapped_length);
+            }
+
+            long chunk_offset = FileHeaderSize + _chunk_count * _chunk_size;
+            _accessor.Write(chunk_offset, first_sample_index);
+            _accessor.Write(chunk_offset + 8, first_sample_time_ticks);
+            _accessor.Write(chunk_offset + 16, 0);
+            _accessor.Write(chunk_offset + 20, 0);
+
+            _chunk_count++;
+            _current_chunk_sample_count = 0;
+            _accessor.Write(_chunk_count_offset, _chunk_count);
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,232 @@
+﻿using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// One entry of a MotoTrak trial index.  The trial index is a small file that is saved alongside each session file (with the
+    /// same name as the session file, plus the ".index" extension), and it records where each trial block begins in the session file.
+    /// This allows any single trial to be read by seeking directly to it, rather than reading every trial that comes before it.
+    /// The session file itself is unchanged, so readers that do not know about the trial index are not affected by it.
+    /// </summary>
+    public class MotoTrakTrialIndexEntry
+    {
+        #region Public static data members
+
+        /// <summary>
+        /// The extension that is appended to the name of a session file to get the name of its trial index file
+        /// </summary>
+        public const string FileExtension = ".index";
+
+        /// <summary>
+        /// The trial index file version
+        /// </summary>
+        public const int FileVersion = 1;
+
+        /// <summary>
+        /// The number of bytes in the trial index file header: the characters "MTIX", followed by the index file version as an Int32
+        /// </summary>
+        public const int FileHeaderSize = 8;
+
+        /// <summary>
+        /// The number of bytes in each entry of the trial index file
+        /// </summary>
+        public const int EntrySize = 21;
+
+        #endregion
+
+        #region Private data members
+
+        private static readonly byte[] _file_signature = Encoding.ASCII.GetBytes("MTIX");
+
+        private UInt32 _trial_number = 0;
+        private long _byte_offset = 0;
+        private int _block_length = 0;
+        private MotorTrialResult _result = MotorTrialResult.Unknown;
+        private UInt32 _sample_count = 0;
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The trial number, as it was saved in the session file
+        /// </summary>
+        public UInt32 TrialNumber
+        {
+            get
+            {
+                return _trial_number;
+            }
+            set
+            {
+                _trial_number = value;
+            }
+        }
+
+        /// <summary>
+        /// The position in the session file at which the trial block begins (this is the position of the block type)
+        /// </summary>
+        public long ByteOffset
+        {
+            get
+            {
+                return _byte_offset;
+            }
+            set
+            {
+                _byte_offset = value;
+            }
+        }
+
+        /// <summary>
+        /// The total number of bytes in the trial block, including the block type
+        /// </summary>
+        public int BlockLength
+        {
+            get
+            {
+                return _block_length;
+            }
+            set
+            {
+                _block_length = value;
+            }
+        }
+
+        /// <summary>
+        /// The result of the trial
+        /// </summary>
+        public MotorTrialResult Result
+        {
+            get
+            {
+                return _result;
+            }
+            set
+            {
+                _result = value;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples in each stream of the trial's signal
+        /// </summary>
+        public UInt32 SampleCount
+        {
+            get
+            {
+                return _sample_count;
+            }
+            set
+            {
+                _sample_count = value;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Returns the path of the trial index file that belongs to a session file
+        /// </summary>
+        /// <param name="session_file_path">The path of the session file (including the file name)</param>
+        /// <returns>The path of the trial index file</returns>
+        public static string GetIndexFilePath (string session_file_path)
+        {
+            return session_file_path + FileExtension;
+        }
+
+        /// <summary>
+        /// Returns the bytes of the trial index file header
+        /// </summary>
+        public static byte[] GetFileHeaderBytes ()
+        {
+            byte[] header = new byte[FileHeaderSize];
+            Buffer.BlockCopy(_file_signature, 0, header, 0, _file_signature.Length);
+            Buffer.BlockCopy(BitConverter.GetBytes(FileVersion), 0, header, _file_signature.Length, sizeof(int));
+            return header;
+        }
+
+        /// <summary>
+        /// Returns the bytes of this entry, as it is saved in the trial index file
+        /// </summary>
+        public byte[] GetBytes ()
+        {
+            byte[] entry = new byte[EntrySize];
+            using (BinaryWriter writer = new BinaryWriter(new MemoryStream(entry)))
+            {
+                writer.Write(TrialNumber);
+                writer.Write(ByteOffset);
+                writer.Write(BlockLength);
+                writer.Write(MotorTrialResultConverter.ConvertToTrialResultCode(Result));
+                writer.Write(SampleCount);
+            }
+
+            return entry;
+        }
+
+        /// <summary>
+        /// Reads the entries of a trial index file.  An empty list is returned if the index file does not exist or has an
+        /// unrecognized header.  Reading stops at the first entry that is incomplete (for example, if the session was
+        /// interrupted while the entry was being written) or that points beyond the end of the session file.
+        /// </summary>
+        /// <param name="index_file_path">The path of the trial index file</param>
+        /// <param name="session_file_length">The length (in bytes) of the session file that the index belongs to</param>
+        /// <returns>The entries of the trial index file</returns>
+        public static List<MotoTrakTrialIndexEntry> ReadIndexFile (string index_file_path, long session_file_length)
+        {
+            List<MotoTrakTrialIndexEntry> entries = new List<MotoTrakTrialIndexEntry>();
+
+            try
+            {
+                if (!File.Exists(index_file_path))
+                {
+                    return entries;
+                }
+
+                byte[] index_bytes = File.ReadAllBytes(index_file_path);
+                if (index_bytes.Length < FileHeaderSize ||
+                    !index_bytes.Take(_file_signature.Length).SequenceEqual(_file_signature) ||
+                    BitConverter.ToInt32(index_bytes, _file_signature.Length) != FileVersion)
+                {
+                    return entries;
+                }
+
+                using (BinaryReader reader = new BinaryReader(new MemoryStream(index_bytes)))
+                {
+                    reader.BaseStream.Seek(FileHeaderSize, SeekOrigin.Begin);
+                    while (reader.BaseStream.Length - reader.BaseStream.Position >= EntrySize)
+                    {
+                        MotoTrakTrialIndexEntry entry = new MotoTrakTrialIndexEntry();
+                        entry.TrialNumber = reader.ReadUInt32();
+                        entry.ByteOffset = reader.ReadInt64();
+                        entry.BlockLength = reader.ReadInt32();
+                        entry.Result = MotorTrialResultConverter.ConvertResultCodeToEnumeratedType(reader.ReadByte());
+                        entry.SampleCount = reader.ReadUInt32();
+
+                        if (entry.ByteOffset < 0 || entry.BlockLength <= 0 || entry.ByteOffset + entry.BlockLength > session_file_length)
+                        {
+                            break;
+                        }
+
+                        entries.Add(entry);
+                    }
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                entries.Clear();
+            }
+
+            return entries;
+        }
+
+        #endregion
+    }
+}
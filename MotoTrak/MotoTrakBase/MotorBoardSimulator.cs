@@ -1,14 +1,26 @@
 ﻿using System;
 using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
 using System.IO.Ports;
 using System.Linq;
 using System.Text;
+using System.Threading;
 using System.Threading.Tasks;
 
 namespace MotoTrakBase
 {
     /// <summary>
-    /// A class that simulates a motor board connection
+    /// A class that simulates a motor board connection.
+    /// 
+    /// The simulator streams samples in real time, one sample per streaming period, in the same raw units (and with the same
+    /// calibration) as a real controller board.  The simulated animal makes pulls, knob turns, or lever presses (depending on
+    /// the device type) at random intervals, usually sweeping through the swipe sensor just before it does.  Noise is added to
+    /// every sample, and the connection can be made to deliver data in bursts (as a busy USB connection does) or to stall and
+    /// drop samples.  After each feeding, the animal pauses to eat before it moves again.
+    /// 
+    /// The simulator can be used directly as an IMotorBoard (set the COM port to SIMULATED in the configuration file), or it can
+    /// stand in for a controller board on a serial line (see ServeSerialConnection).
     /// </summary>
     public class MotorBoardSimulator : NotifyPropertyChangedObject, IMotorBoard
     {
@@ -17,11 +29,6 @@ namespace MotoTrakBase
         private static MotorBoardSimulator _instance;
         private static object _instance_lock = new object();
 
-        private MotorBoardSimulator()
-        {
-            //empty
-        }
-
         public static MotorBoardSimulator GetInstance()
         {
             if (_instance == null)
@@ -30,7 +37,7 @@ namespace MotoTrakBase
                 {
                     if (_instance == null)
                     {
-                        _instance = new MotorBoardSimulator();
+                        _instance = new MotorBoardSimulator(MotoTrakConfiguration.GetInstance().SimulatedDeviceType, Environment.TickCount);
                     }
                 }
             }
@@ -40,17 +47,369 @@ namespace MotoTrakBase
 
         #endregion
 
+        #region Constructor
+
+        /// <summary>
+        /// Creates a simulated controller board with a device of the given type attached to it.  Several simulators can run at
+        /// once (for example, to simulate several booths).
+        /// </summary>
+        /// <param name="device_type">The device attached to the simulated board (pull, knob, or lever)</param>
+        /// <param name="seed">The seed of the random number generator, so that a simulation can be repeated</param>
+        public MotorBoardSimulator(MotorDeviceType device_type, int seed)
+        {
+            _device_type = device_type;
+            _random = new Random(seed);
+
+            switch (device_type)
+            {
+                case MotorDeviceType.Knob:
+                    _board_device_value = 300;
+                    _baseline = 0;
+                    _peak_amplitude = 60;
+                    _movement_duration_in_milliseconds = 700;
+                    _noise_amplitude = 0.25;
+                    break;
+                case MotorDeviceType.Lever:
+                    _board_device_value = 75;
+                    _baseline = 600;
+                    _cal_grams = 15;
+                    _n_per_cal_grams = 300;
+                    _peak_amplitude = 12;
+                    _movement_duration_in_milliseconds = 250;
+                    _noise_amplitude = 0.1;
+                    break;
+                default:
+                    _device_type = MotorDeviceType.Pull;
+                    break;
+            }
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private const int _ir_clear_value = 900;
+        private const int _ir_blocked_value = 150;
+        private const double _ir_noise_amplitude = 3;
+        private const double _maximum_backlog_in_milliseconds = 10000;
+
+        private object _simulator_lock = new object();
+        private Random _random;
+        private Stopwatch _stream_clock = new Stopwatch();
+
+        private MotorDeviceType _device_type = MotorDeviceType.Pull;
+        private int _board_device_value = 550;
+        private int _baseline = 100;
+        private int _cal_grams = 500;
+        private int _n_per_cal_grams = 1000;
         private int _streaming_mode = 0;
+        private int _streaming_period = 10;
+        private int _feed_duration = 10;
+        private int _stimulus_duration = 10;
+        private int _booth_number = 1;
+        private double _autopositioner_offset = 0;
+        private double _autopositioner_position = 0;
+
+        private double _peak_amplitude = 120;
+        private double _peak_amplitude_variation = 0.35;
+        private double _movement_duration_in_milliseconds = 400;
+        private int _maximum_presses_per_movement = 3;
+        private double _mean_movement_interval_in_milliseconds = 3000;
+        private double _noise_amplitude = 1.5;
+        private double _swipe_probability = 0.8;
+        private double _swipe_duration_in_milliseconds = 200;
+        private double _reward_consumption_in_milliseconds = 2000;
+        private double _bursts_per_second = 0;
+        private double _burst_duration_in_milliseconds = 200;
+        private double _stalls_per_second = 0;
+        private double _stall_duration_in_milliseconds = 500;
+
+        private long _next_sample_index = 0;
+        private double _held_until_milliseconds = 0;
+        private long _movement_start_sample = long.MaxValue;
+        private long _movement_end_sample = long.MinValue;
+        private long _next_movement_sample = 0;
+        private long _swipe_start_sample = long.MaxValue;
+        private long _swipe_end_sample = long.MinValue;
+        private double _movement_amplitude = 0;
+        private int _movement_presses = 1;
+        private bool _is_eating = false;
+
+        private int _feed_count = 0;
+        private int _stimulation_count = 0;
+        private long _samples_streamed = 0;
+        private long _samples_dropped = 0;
+
+        private Dictionary<byte, int> _v2p0_registers = new Dictionary<byte, int>();
+
+        #endregion
+
+        #region Simulation properties
+
+        /// <summary>
+        /// The largest signal (in grams for a pull, or degrees for a knob or lever) that a typical movement reaches
+        /// </summary>
+        public double PeakAmplitude
+        {
+            get
+            {
+                return _peak_amplitude;
+            }
+            set
+            {
+                _peak_amplitude = value;
+            }
+        }
+
+        /// <summary>
+        /// How much the peak of each movement varies, as a fraction of PeakAmplitude (the standard deviation)
+        /// </summary>
+        public double PeakAmplitudeVariation
+        {
+            get
+            {
+                return _peak_amplitude_variation;
+            }
+            set
+            {
+                _peak_amplitude_variation = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The duration of each pull or knob turn, or of each lever press
+        /// </summary>
+        public double MovementDurationInMilliseconds
+        {
+            get
+            {
+                return _movement_duration_in_milliseconds;
+            }
+            set
+            {
+                _movement_duration_in_milliseconds = Math.Max(1, value);
+            }
+        }
+
+        /// <summary>
+        /// The largest number of presses that the animal makes each time it goes to the lever
+        /// </summary>
+        public int MaximumPressesPerMovement
+        {
+            get
+            {
+                return _maximum_presses_per_movement;
+            }
+            set
+            {
+                _maximum_presses_per_movement = Math.Max(1, value);
+            }
+        }
+
+        /// <summary>
+        /// The average time from the end of one movement to the start of the next (the intervals are exponentially distributed)
+        /// </summary>
+        public double MeanMovementIntervalInMilliseconds
+        {
+            get
+            {
+                return _mean_movement_interval_in_milliseconds;
+            }
+            set
+            {
+                _mean_movement_interval_in_milliseconds = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The standard deviation of the noise added to the device signal (in grams or degrees)
+        /// </summary>
+        public double NoiseAmplitude
+        {
+            get
+            {
+                return _noise_amplitude;
+            }
+            set
+            {
+                _noise_amplitude = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The probability that the animal sweeps through the swipe sensor before a movement
+        /// </summary>
+        public double SwipeProbability
+        {
+            get
+            {
+                return _swipe_probability;
+            }
+            set
+            {
+                _swipe_probability = Math.Max(0, Math.Min(1, value));
+            }
+        }
+
+        /// <summary>
+        /// How long the swipe sensor is blocked during each swipe.  The swipe ends as the movement begins.
+        /// </summary>
+        public double SwipeDurationInMilliseconds
+        {
+            get
+            {
+                return _swipe_duration_in_milliseconds;
+            }
+            set
+            {
+                _swipe_duration_in_milliseconds = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// How long the animal pauses to eat after each feeding
+        /// </summary>
+        public double RewardConsumptionInMilliseconds
+        {
+            get
+            {
+                return _reward_consumption_in_milliseconds;
+            }
+            set
+            {
+                _reward_consumption_in_milliseconds = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The average number of times per second that the connection holds data back and then delivers it all at once
+        /// </summary>
+        public double BurstsPerSecond
+        {
+            get
+            {
+                return _bursts_per_second;
+            }
+            set
+            {
+                _bursts_per_second = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// How long data is held back in each burst
+        /// </summary>
+        public double BurstDurationInMilliseconds
+        {
+            get
+            {
+                return _burst_duration_in_milliseconds;
+            }
+            set
+            {
+                _burst_duration_in_milliseconds = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The average number of times per second that the board stalls.  Samples are not recorded during a stall, so the
+        /// timestamps skip ahead when streaming resumes.
+        /// </summary>
+        public double StallsPerSecond
+        {
+            get
+            {
+                return _stalls_per_second;
+            }
+            set
+            {
+                _stalls_per_second = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// How long each stall lasts
+        /// </summary>
+        public double StallDurationInMilliseconds
+        {
+            get
+            {
+                return _stall_duration_in_milliseconds;
+            }
+            set
+            {
+                _stall_duration_in_milliseconds = Math.Max(0, value);
+            }
+        }
+
+        /// <summary>
+        /// The number of times the feeder has been triggered
+        /// </summary>
+        public int FeedCount
+        {
+            get
+            {
+                return _feed_count;
+            }
+        }
+
+        /// <summary>
+        /// The number of times stimulation has been triggered
+        /// </summary>
+        public int StimulationCount
+        {
+            get
+            {
+                return _stimulation_count;
+            }
+        }
+
+        /// <summary>
+        /// The most recent position sent to the autopositioner
+        /// </summary>
+        public double AutopositionerPosition
+        {
+            get
+            {
+                return _autopositioner_position;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples that have been streamed since streaming was last enabled
+        /// </summary>
+        public long SamplesStreamed
+        {
+            get
+            {
+                return _samples_streamed;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples that were dropped by stalls since streaming was last enabled
+        /// </summary>
+        public long SamplesDropped
+        {
+            get
+            {
+                return _samples_dropped;
+            }
+        }
+
+        #endregion
+
+        #region IMotorBoard properties
 
         public double AutopositionerOffset
         {
             get
             {
-                return 0;
+                return _autopositioner_offset;
             }
             set
             {
-                //empty
+                _autopositioner_offset = value;
             }
         }
 
@@ -78,14 +437,18 @@ namespace MotoTrakBase
             }
         }
 
+        #endregion
+
+        #region IMotorBoard methods
+
         public void Autopositioner(double pos)
         {
-            //empty
+            _autopositioner_position = pos;
         }
 
         public int CalGrams()
         {
-            return 32767;
+            return _cal_grams;
         }
 
         public int CheckVersion()
@@ -95,7 +458,14 @@ namespace MotoTrakBase
 
         public void ClearStream()
         {
-            //empty
+            lock (_simulator_lock)
+            {
+                //Discard every sample that is already due
+                if (_streaming_mode != 0)
+                {
+                    GenerateDueSamples(false);
+                }
+            }
         }
 
         public bool ConnectToArduino(string portName)
@@ -105,7 +475,7 @@ namespace MotoTrakBase
 
         public void DisconnectFromArduino()
         {
-            //empty
+            EnableStreaming(0);
         }
 
         public bool DoesSketchMeetMinimumRequirements()
@@ -115,22 +485,43 @@ namespace MotoTrakBase
 
         public void EnableStreaming(int streamingMode)
         {
-            _streaming_mode = streamingMode;
+            lock (_simulator_lock)
+            {
+                _streaming_mode = streamingMode;
+                if (streamingMode != 0)
+                {
+                    _next_sample_index = 0;
+                    _held_until_milliseconds = 0;
+                    _movement_start_sample = long.MaxValue;
+                    _movement_end_sample = long.MinValue;
+                    _swipe_start_sample = long.MaxValue;
+                    _swipe_end_sample = long.MinValue;
+                    _is_eating = false;
+                    _samples_streamed = 0;
+                    _samples_dropped = 0;
+                    ScheduleNextMovement(0);
+                    _stream_clock.Restart();
+                }
+                else
+                {
+                    _stream_clock.Stop();
+                }
+            }
         }
 
         public void Feed()
         {
-            //empty
+            TriggerFeeder();
         }
 
         public int GetBaseline()
         {
-            return 0;
+            return _baseline;
         }
 
         public int GetBoardDeviceValue()
         {
-            return 550;
+            return _board_device_value;
         }
 
         public string GetBoothLabel()
@@ -140,27 +531,23 @@ namespace MotoTrakBase
 
         public int GetFeedDuration()
         {
-            return 10;
+            return _feed_duration;
         }
 
         public MotorDevice GetMotorDevice()
         {
-            MotorDevice dev = new MotorDevice();
-            dev.Baseline = 0;
-            dev.Slope = 1;
-            dev.DeviceType = MotorDeviceType.Pull;
-
-            return dev;
+            //The calibration is given to the device directly, so that the device does not query the board singleton
+            return new MotorDevice(_device_type, 1, new Dictionary<int, double>() { { 0, _baseline }, { 1, GetSlope() } });
         }
 
         public int GetStimulusDuration()
         {
-            return 10;
+            return _stimulus_duration;
         }
 
         public int GetStreamingPeriod()
         {
-            return 10;
+            return _streaming_period;
         }
 
         public bool IsArduinoSketchValid()
@@ -175,48 +562,81 @@ namespace MotoTrakBase
 
         public int NPerCalGrams()
         {
-            return 32767;
+            return _n_per_cal_grams;
         }
 
         public int ReadDevice()
         {
-            return 0;
+            return _baseline;
+        }
+
+        /// <summary>
+        /// Returns the next samples of the stream straight away, without waiting for their time to come, so that a simulated
+        /// session can be run faster than real time.  Bursts and stalls are not simulated.
+        /// </summary>
+        /// <param name="sample_count">The number of samples to return</param>
+        public List<List<Int64>> ReadNextSamples(int sample_count)
+        {
+            lock (_simulator_lock)
+            {
+                List<List<Int64>> result = new List<List<Int64>>();
+                if (_streaming_mode == 0)
+                {
+                    return result;
+                }
+
+                for (int i = 0; i < sample_count; i++)
+                {
+                    result.Add(GenerateSample(_next_sample_index));
+                    _next_sample_index++;
+                    _samples_streamed++;
+                }
+
+                return result;
+            }
         }
 
+        /// <summary>
+        /// Returns the samples that have come due since the last call, in the format of the controller board:
+        /// one row per sample, each holding a timestamp (in milliseconds), the device value, and the swipe sensor value.
+        /// </summary>
         public List<List<Int64>> ReadStream()
         {
-            Random gen = new Random(DateTime.Now.Millisecond);
-            List<List<Int64>> result = new List<List<Int64>>();
-            result.Add(new List<Int64>() { 0, Convert.ToInt64(gen.Next(0, 10)), 0 });
-            result.Add(new List<Int64>() { 0, Convert.ToInt64(gen.Next(0, 10)), 0 });
-            result.Add(new List<Int64>() { 0, Convert.ToInt64(gen.Next(0, 10)), 0 });
+            lock (_simulator_lock)
+            {
+                if (_streaming_mode == 0)
+                {
+                    return new List<List<Int64>>();
+                }
 
-            return result;
+                return GenerateDueSamples(true);
+            }
         }
 
         public bool SerialConnectionHasCharactersToRead()
         {
-            return false;
+            //A real board answers the knob toggle with a message, which the knob device waits for
+            return true;
         }
 
         public void SetBaseline(int baseline)
         {
-            //empty
+            _baseline = baseline;
         }
 
         public void SetBoothNumber(int boothNumber)
         {
-            //empty
+            _booth_number = boothNumber;
         }
 
         public void SetCalGrams(int cal_grams)
         {
-            //empty
+            _cal_grams = cal_grams;
         }
 
         public void SetFeedDuration(int duration)
         {
-            //empty
+            _feed_duration = duration;
         }
 
         public void SetLights(int input)
@@ -226,32 +646,419 @@ namespace MotoTrakBase
 
         public void SetNPerCalGrams(int n_per_cal_grams)
         {
-            //empty
+            _n_per_cal_grams = n_per_cal_grams;
         }
 
         public void SetStimulusDuration(int duration)
         {
-            //empty
+            _stimulus_duration = duration;
         }
 
         public void SetStreamingPeriod(int period)
         {
-            //empty
+            lock (_simulator_lock)
+            {
+                _streaming_period = Math.Max(1, period);
+            }
         }
 
         public void Stimulate()
         {
-            //empty
+            TriggerStim();
         }
 
         public void TriggerFeeder()
         {
-            //empty
+            lock (_simulator_lock)
+            {
+                _feed_count++;
+
+                //The animal stops to eat.  If it is between movements, its next movement is put off until it has finished eating;
+                //otherwise, the pause is added when the next movement is scheduled.
+                if (_streaming_mode != 0 && _next_movement_sample != long.MaxValue)
+                {
+                    long consumption_samples = Convert.ToInt64(_reward_consumption_in_milliseconds / _streaming_period);
+                    _next_movement_sample += consumption_samples;
+                    if (_swipe_end_sample > _next_sample_index)
+                    {
+                        _swipe_start_sample += consumption_samples;
+                        _swipe_end_sample += consumption_samples;
+                    }
+                }
+                else
+                {
+                    _is_eating = true;
+                }
+            }
         }
 
         public void TriggerStim()
         {
-            //empty
+            Interlocked.Increment(ref _stimulation_count);
         }
+
+        #endregion
+
+        #region Serial stand-in
+
+        /// <summary>
+        /// Serves the controller board's serial protocol: commands are read from the input stream, and replies and streaming
+        /// data are written to the output stream, until the input stream ends or cancellation is requested.
+        /// 
+        /// On Linux, a pair of linked pseudo-terminals stands in for the serial port.  For example:
+        ///     socat -d -d pty,raw,echo=0,link=/tmp/motorboard pty,raw,echo=0,link=/tmp/mototrak
+        /// The simulator opens /tmp/motorboard, and MotoTrak connects to /tmp/mototrak as if it were a COM port.
+        /// Start the simulator before MotoTrak connects, so that the READY message is waiting.
+        /// </summary>
+        /// <param name="input">The stream that commands are read from</param>
+        /// <param name="output">The stream that replies and streaming data are written to</param>
+        /// <param name="cancellation_token">Stops the stand-in</param>
+        public void ServeSerialConnection(Stream input, Stream output, CancellationToken cancellation_token)
+        {
+            object output_lock = new object();
+            Action<byte[]> write = (bytes) =>
+            {
+                lock (output_lock)
+                {
+                    output.Write(bytes, 0, bytes.Length);
+                    output.Flush();
+                }
+            };
+
+            write(Encoding.ASCII.GetBytes("READY\n"));
+
+            Task command_reader = Task.Run(() =>
+            {
+                while (!cancellation_token.IsCancellationRequested)
+                {
+                    byte[] command = ReadSerialCommand(input);
+                    if (command == null)
+                    {
+                        break;
+                    }
+
+                    byte[] reply = HandleSerialCommand(command);
+                    if (reply != null)
+                    {
+                        write(reply);
+                    }
+                }
+            });
+
+            StringBuilder lines = new StringBuilder();
+            while (!cancellation_token.IsCancellationRequested && !command_reader.IsCompleted)
+            {
+                lines.Clear();
+                foreach (var sample in ReadStream())
+                {
+                    lines.Append(sample[0]).Append(' ').Append(sample[1]).Append(' ').Append(sample[2]).Append('\n');
+                }
+
+                if (lines.Length > 0)
+                {
+                    write(Encoding.ASCII.GetBytes(lines.ToString()));
+                }
+
+                Thread.Sleep(Math.Max(1, _streaming_period / 2));
+            }
+
+            EnableStreaming(0);
+        }
+
+        /// <summary>
+        /// Reads one command from the serial line.  The length of each command is known from its first byte.
+        /// Returns null when the stream ends.
+        /// </summary>
+        private static byte[] ReadSerialCommand(Stream input)
+        {
+            int first_byte = input.ReadByte();
+            if (first_byte < 0)
+            {
+                return null;
+            }
+
+            int command_length = GetSerialCommandLength((byte)first_byte);
+            byte[] command = new byte[command_length];
+            command[0] = (byte)first_byte;
+            for (int i = 1; i < command_length; i++)
+            {
+                int next_byte = input.ReadByte();
+                if (next_byte < 0)
+                {
+                    return null;
+                }
+
+                command[i] = (byte)next_byte;
+            }
+
+            return command;
+        }
+
+        private static int GetSerialCommandLength(byte first_byte)
+        {
+            switch ((char)first_byte)
+            {
+                case 'C': case 'O': case 'Q': case 'S': case '0': case 'e': case '5': case '8':
+                    //Commands with a two-byte parameter
+                    return 3;
+                case 'R':
+                    return 4;
+                case 'B': case 'D': case 'P': case 'M': case 'N': case 'W': case 'X': case 'g': case '3': case '9': case 'E':
+                    return 2;
+                default:
+                    //Version 2 commands: the setters carry a one or two byte parameter
+                    if (first_byte == 180 || first_byte == 183 || first_byte == 189 || first_byte == 191)
+                    {
+                        return 2;
+                    }
+                    else if (first_byte == 185 || first_byte == 187 || first_byte == 193)
+                    {
+                        return 3;
+                    }
+
+                    return 1;
+            }
+        }
+
+        private byte[] HandleSerialCommand(byte[] command)
+        {
+            int long_parameter = (command.Length == 3) ? ((command[1] << 8) | command[2]) : 0;
+            int simple_parameter = (command.Length == 2) ? (command[1] - '0') : 0;
+
+            switch ((char)command[0])
+            {
+                case 'A': return SerialReply(111);
+                case 'Z': return SerialReply(CheckVersion());
+                case 'B': return SerialReply(_booth_number);
+                case 'C': SetBoothNumber(long_parameter); return null;
+                case 'D': return SerialReply(GetBoardDeviceValue());
+                case 'P': return SerialReply(CalGrams());
+                case 'R': return SerialReply(NPerCalGrams());
+                case 'M': return SerialReply(ReadDevice());
+                case 'N': return SerialReply(GetBaseline());
+                case 'O': SetBaseline(long_parameter); return null;
+                case 'Q': SetCalGrams(long_parameter); return null;
+                case 'S': SetNPerCalGrams(long_parameter); return null;
+                case 'W': case '3': TriggerFeeder(); return null;
+                case 'X': case '6': TriggerStim(); return null;
+                case '0': Autopositioner(long_parameter); return null;
+                case 'g': EnableStreaming(simple_parameter); return null;
+                case 'e': SetStreamingPeriod(long_parameter); return null;
+                case 'f': return SerialReply(GetStreamingPeriod());
+                case '4': return SerialReply(GetFeedDuration());
+                case '5': SetFeedDuration(long_parameter); return null;
+                case '7': return SerialReply(GetStimulusDuration());
+                case '8': SetStimulusDuration(long_parameter); return null;
+                case '9': return null;
+                case 'E': return (simple_parameter != 0) ? Encoding.ASCII.GetBytes("KNOB\n") : null;
+            }
+
+            //Version 2 tone commands.  Each setter (an odd command number) stores its value for the getter that precedes it.
+            byte command_number = command[0];
+            if (command_number == 180 || command_number == 181)
+            {
+                return null;
+            }
+            else if (command_number >= 183 && (command_number % 2) == 1)
+            {
+                _v2p0_registers[(byte)(command_number - 1)] = (command.Length == 3) ? BitConverter.ToInt16(command, 1) : command[1];
+                return null;
+            }
+            else if (command_number >= 182)
+            {
+                int value = 0;
+                _v2p0_registers.TryGetValue(command_number, out value);
+                bool is_two_bytes = (command_number == 184 || command_number == 186 || command_number == 192);
+                return is_two_bytes ? BitConverter.GetBytes((Int16)value) : new byte[] { (byte)value };
+            }
+
+            return null;
+        }
+
+        private static byte[] SerialReply(int value)
+        {
+            return Encoding.ASCII.GetBytes(value.ToString() + "\n");
+        }
+
+        #endregion
+
+        #region Private methods - signal generation
+
+        /// <summary>
+        /// The calibration slope of the simulated device (in grams or degrees per raw unit)
+        /// </summary>
+        private double GetSlope()
+        {
+            switch (_device_type)
+            {
+                case MotorDeviceType.Knob:
+                    return 0.25;
+                case MotorDeviceType.Lever:
+                    return -(Convert.ToDouble(_cal_grams) / Convert.ToDouble(_n_per_cal_grams));
+                default:
+                    return Convert.ToDouble(_cal_grams) / Convert.ToDouble(_n_per_cal_grams);
+            }
+        }
+
+        /// <summary>
+        /// Generates every sample whose time has come since the last call.  If a burst begins, the remaining samples are held
+        /// back until the burst ends, and are then delivered together with their original timestamps.
+        /// </summary>
+        private List<List<Int64>> GenerateDueSamples(bool keep_samples)
+        {
+            List<List<Int64>> result = new List<List<Int64>>();
+
+            double now = _stream_clock.Elapsed.TotalMilliseconds;
+            if (now < _held_until_milliseconds)
+            {
+                return result;
+            }
+
+            //If the reader has fallen far behind, drop the oldest samples, as the board's serial buffer would
+            long oldest_sample_to_keep = Convert.ToInt64(Math.Floor((now - _maximum_backlog_in_milliseconds) / _streaming_period));
+            if (_next_sample_index < oldest_sample_to_keep)
+            {
+                _samples_dropped += oldest_sample_to_keep - _next_sample_index;
+                _next_sample_index = oldest_sample_to_keep;
+            }
+
+            double burst_probability = _bursts_per_second * _streaming_period / 1000.0;
+            double stall_probability = _stalls_per_second * _streaming_period / 1000.0;
+
+            while (_next_sample_index * _streaming_period <= now)
+            {
+                long sample_index = _next_sample_index;
+                _next_sample_index++;
+
+                List<Int64> sample = GenerateSample(sample_index);
+                _samples_streamed++;
+                if (keep_samples)
+                {
+                    result.Add(sample);
+                }
+
+                if (stall_probability > 0 && _random.NextDouble() < stall_probability)
+                {
+                    long stall_samples = Convert.ToInt64(_stall_duration_in_milliseconds / _streaming_period);
+                    _next_sample_index += stall_samples;
+                    _samples_dropped += stall_samples;
+                }
+
+                if (burst_probability > 0 && _random.NextDouble() < burst_probability)
+                {
+                    _held_until_milliseconds = now + _burst_duration_in_milliseconds;
+                    break;
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Generates one sample: its timestamp, the raw device value, and the raw swipe sensor value.
+        /// </summary>
+        private List<Int64> GenerateSample(long sample_index)
+        {
+            //Begin the next movement when it is due
+            if (sample_index >= _next_movement_sample && sample_index > _movement_end_sample)
+            {
+                StartMovement(sample_index);
+            }
+
+            //Find the value of the device signal (in grams or degrees)
+            double value = 0;
+            if (sample_index >= _movement_start_sample && sample_index <= _movement_end_sample)
+            {
+                double phase = Convert.ToDouble(sample_index - _movement_start_sample) / Convert.ToDouble(_movement_end_sample - _movement_start_sample + 1);
+                value = CalculateMovementValue(phase);
+            }
+            else if (sample_index == _movement_end_sample + 1)
+            {
+                //Schedule the next movement once this one has ended, allowing time to eat if the animal was fed
+                ScheduleNextMovement(sample_index);
+            }
+
+            value += _noise_amplitude * NextGaussian();
+
+            //Find the value of the swipe sensor
+            bool is_swipe_blocked = (sample_index >= _swipe_start_sample && sample_index < _swipe_end_sample);
+            double ir_value = (is_swipe_blocked ? _ir_blocked_value : _ir_clear_value) + _ir_noise_amplitude * NextGaussian();
+
+            Int64 timestamp = sample_index * _streaming_period;
+            Int64 device_value = Convert.ToInt64(Math.Round(_baseline + value / GetSlope()));
+            return new List<Int64>() { timestamp, device_value, Convert.ToInt64(Math.Round(ir_value)) };
+        }
+
+        /// <summary>
+        /// The value of the device signal at a point in the current movement (phase runs from 0 to 1)
+        /// </summary>
+        private double CalculateMovementValue(double phase)
+        {
+            switch (_device_type)
+            {
+                case MotorDeviceType.Knob:
+
+                    //A quick turn, followed by a slower return
+                    if (phase < 0.4)
+                    {
+                        return _movement_amplitude * Math.Pow(Math.Sin(Math.PI / 2 * phase / 0.4), 2);
+                    }
+
+                    return _movement_amplitude * Math.Pow(Math.Cos(Math.PI / 2 * (phase - 0.4) / 0.6), 2);
+
+                case MotorDeviceType.Lever:
+
+                    //One or more presses, each of which flattens out at the lever's stop
+                    double press_phase = (phase * _movement_presses) % 1.0;
+                    return _movement_amplitude * Math.Min(1.0, 1.5 * Math.Sin(Math.PI * press_phase));
+
+                default:
+
+                    //A smooth pull that rises and falls
+                    return _movement_amplitude * Math.Pow(Math.Sin(Math.PI * phase), 2);
+            }
+        }
+
+        private void StartMovement(long sample_index)
+        {
+            _movement_amplitude = Math.Max(0, _peak_amplitude * (1 + _peak_amplitude_variation * NextGaussian()));
+            _movement_presses = (_device_type == MotorDeviceType.Lever) ? _random.Next(1, _maximum_presses_per_movement + 1) : 1;
+
+            long movement_samples = Math.Max(2, Convert.ToInt64(_movement_duration_in_milliseconds * _movement_presses / _streaming_period));
+            _movement_start_sample = sample_index;
+            _movement_end_sample = sample_index + movement_samples - 1;
+            _next_movement_sample = long.MaxValue;
+        }
+
+        private void ScheduleNextMovement(long sample_index)
+        {
+            double interval = -Math.Log(1.0 - _random.NextDouble()) * _mean_movement_interval_in_milliseconds;
+            if (_is_eating)
+            {
+                interval += _reward_consumption_in_milliseconds;
+                _is_eating = false;
+            }
+
+            long swipe_samples = Convert.ToInt64(_swipe_duration_in_milliseconds / _streaming_period);
+            _next_movement_sample = sample_index + Math.Max(swipe_samples + 1, Convert.ToInt64(interval / _streaming_period));
+
+            if (_random.NextDouble() < _swipe_probability)
+            {
+                _swipe_start_sample = _next_movement_sample - swipe_samples;
+                _swipe_end_sample = _next_movement_sample;
+            }
+        }
+
+        /// <summary>
+        /// A normally distributed random number with a mean of 0 and a standard deviation of 1
+        /// </summary>
+        private double NextGaussian()
+        {
+            double u1 = 1.0 - _random.NextDouble();
+            double u2 = _random.NextDouble();
+            return Math.Sqrt(-2.0 * Math.Log(u1)) * Math.Cos(2.0 * Math.PI * u2);
+        }
+
+        #endregion
     }
 }
@@ -0,0 +1,583 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// A block of signal data held as one contiguous array per stream (a struct of arrays).  The samples of each stream
+    /// begin at Offset within that stream's array and run for Length samples, so that a stage implementation can read the
+    /// data in place, without copying it into lists or boxing each value.  Indices passed to the methods of this class are
+    /// relative to the first sample of the block, just as indices into the lists of IMotorStageImplementation are.
+    /// 
+    /// A block may also be used as a sliding window: when WindowLength is set, appending new samples drops the oldest
+    /// samples so that the block keeps at most WindowLength samples.  Each array has room for twice the window, so the
+    /// samples only need to be moved back to the start of the arrays once every window's worth of new samples.
+    /// 
+    /// Raw values from the controller board are held as doubles, which represent every integer up to 2^53 exactly.
+    /// </summary>
+    public class MotorSignalBlock
+    {
+        #region Private data members
+
+        private double[][] _streams = new double[0][];
+        private int _stream_count = 0;
+        private int _offset = 0;
+        private int _length = 0;
+        private int _window_length = 0;
+
+        #endregion
+
+        #region Constructors
+
+        /// <summary>
+        /// Creates an empty block
+        /// </summary>
+        public MotorSignalBlock()
+        {
+            //empty
+        }
+
+        /// <summary>
+        /// Creates an empty block with room for the specified number of streams and samples
+        /// </summary>
+        /// <param name="stream_count">The number of streams</param>
+        /// <param name="window_length">The maximum number of samples the block keeps (0 for no maximum)</param>
+        public MotorSignalBlock(int stream_count, int window_length)
+        {
+            _window_length = Math.Max(0, window_length);
+            Reset(stream_count, 0);
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The number of streams in the block
+        /// </summary>
+        public int StreamCount
+        {
+            get
+            {
+                return _stream_count;
+            }
+        }
+
+        /// <summary>
+        /// The index, within each stream's array, of the first sample of the block
+        /// </summary>
+        public int Offset
+        {
+            get
+            {
+                return _offset;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples in each stream of the block
+        /// </summary>
+        public int Length
+        {
+            get
+            {
+                return _length;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples that each stream's array has room for
+        /// </summary>
+        public int Capacity
+        {
+            get
+            {
+                return (_streams.Length > 0) ? _streams[0].Length : 0;
+            }
+        }
+
+        /// <summary>
+        /// The maximum number of samples the block keeps when new samples are appended, or 0 if there is no maximum.
+        /// If the window is made shorter than the block, the oldest samples are dropped.
+        /// </summary>
+        public int WindowLength
+        {
+            get
+            {
+                return _window_length;
+            }
+            set
+            {
+                _window_length = Math.Max(0, value);
+                if (_window_length > 0 && _length > _window_length)
+                {
+                    _offset += _length - _window_length;
+                    _length = _window_length;
+                }
+            }
+        }
+
+        /// <summary>
+        /// Gets or sets one sample of the block
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="index">The index of the sample, relative to the first sample of the block</param>
+        public double this[int stream, int index]
+        {
+            get
+            {
+                CheckIndex(stream, index);
+                return _streams[stream][_offset + index];
+            }
+            set
+            {
+                CheckIndex(stream, index);
+                _streams[stream][_offset + index] = value;
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Returns the array that holds a stream.  The samples of the block begin at Offset and run for Length samples;
+        /// the rest of the array is not part of the block.
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <returns>The stream's array</returns>
+        public double[] GetStreamArray (int stream)
+        {
+            CheckStream(stream);
+            return _streams[stream];
+        }
+
+        /// <summary>
+        /// Returns the samples of a stream, without copying them
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <returns>The samples of the stream</returns>
+        public ArraySegment<double> GetStream (int stream)
+        {
+            CheckStream(stream);
+            return new ArraySegment<double>(_streams[stream], _offset, _length);
+        }
+
+        /// <summary>
+        /// Empties the block and sets its size.  Every sample of the block is set to zero.
+        /// </summary>
+        /// <param name="stream_count">The number of streams</param>
+        /// <param name="length">The number of samples in each stream</param>
+        public void Reset (int stream_count, int length)
+        {
+            stream_count = Math.Max(0, stream_count);
+            length = Math.Max(0, length);
+
+            EnsureStreamCount(stream_count);
+            EnsureCapacity(length, false);
+
+            _stream_count = stream_count;
+            _offset = 0;
+            _length = length;
+            for (int i = 0; i < _stream_count; i++)
+            {
+                Array.Clear(_streams[i], 0, _length);
+            }
+        }
+
+        /// <summary>
+        /// Fills the block with data from the controller board, which is read as one list of stream values per sample.
+        /// The block has as many streams as the longest sample, and missing values are set to zero (as MotorMath.Transpose does).
+        /// </summary>
+        /// <param name="rows">The samples, in the format [ [a1,b1,c1] [a2,b2,c2] [a3,b3,c3] ]</param>
+        public void SetFromRows (List<List<Int64>> rows)
+        {
+            int stream_count = 0;
+            for (int j = 0; j < rows.Count; j++)
+            {
+                stream_count = Math.Max(stream_count, rows[j].Count);
+            }
+
+            Reset(stream_count, rows.Count);
+            for (int j = 0; j < rows.Count; j++)
+            {
+                List<Int64> row = rows[j];
+                for (int i = 0; i < row.Count; i++)
+                {
+                    _streams[i][j] = row[i];
+                }
+            }
+        }
+
+        /// <summary>
+        /// Fills the block from a list per stream.  The block is as long as the shortest list.
+        /// </summary>
+        /// <param name="lists">The streams, in the format [ [a1 ... a_n] [b1 ... b_n] [c1 ... c_n] ]</param>
+        public void SetFromLists (List<List<double>> lists)
+        {
+            int length = (lists.Count > 0) ? lists.Min(x => x.Count) : 0;
+            Reset(lists.Count, length);
+            for (int i = 0; i < lists.Count; i++)
+            {
+                lists[i].CopyTo(0, _streams[i], 0, length);
+            }
+        }
+
+        /// <summary>
+        /// Makes this block a copy of another block
+        /// </summary>
+        /// <param name="source">The block to copy</param>
+        public void CopyFrom (MotorSignalBlock source)
+        {
+            Reset(source.StreamCount, source.Length);
+            for (int i = 0; i < _stream_count; i++)
+            {
+                Array.Copy(source._streams[i], source._offset, _streams[i], 0, _length);
+            }
+        }
+
+        /// <summary>
+        /// Adds the samples of another block to the end of this block, dropping the oldest samples if the block would be
+        /// longer than its window.  Streams of this block that the other block does not have are extended with zeros, and
+        /// streams of the other block that this block does not have are ignored.
+        /// </summary>
+        /// <param name="source">The block holding the new samples</param>
+        public void Append (MotorSignalBlock source)
+        {
+            int count = source.Length;
+            int source_offset = source._offset;
+            if (_window_length > 0 && count > _window_length)
+            {
+                //Only the most recent samples will be kept
+                source_offset += count - _window_length;
+                count = _window_length;
+            }
+
+            if (count == 0)
+            {
+                return;
+            }
+
+            //Drop the samples that will fall out of the window
+            if (_window_length > 0 && _length + count > _window_length)
+            {
+                int samples_to_drop = _length + count - _window_length;
+                _offset += samples_to_drop;
+                _length -= samples_to_drop;
+            }
+
+            //Make room at the end of the arrays, moving the samples back to the start of the arrays if needed
+            if (_offset + _length + count > Capacity)
+            {
+                EnsureCapacity(_length + count, true);
+            }
+
+            for (int i = 0; i < _stream_count; i++)
+            {
+                if (i < source._stream_count)
+                {
+                    Array.Copy(source._streams[i], source_offset, _streams[i], _offset + _length, count);
+                }
+                else
+                {
+                    Array.Clear(_streams[i], _offset + _length, count);
+                }
+            }
+
+            _length += count;
+        }
+
+        /// <summary>
+        /// Copies a range of samples from a stream into a new list
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="start_index">The index of the first sample to copy</param>
+        /// <param name="count">The number of samples to copy</param>
+        /// <returns>A list holding the samples</returns>
+        public List<double> CopyToList (int stream, int start_index, int count)
+        {
+            CheckStream(stream);
+            if (start_index < 0 || count < 0 || start_index + count > _length)
+            {
+                throw new ArgumentOutOfRangeException("count");
+            }
+
+            List<double> result = new List<double>(count);
+            result.AddRange(new ArraySegment<double>(_streams[stream], _offset + start_index, count));
+            return result;
+        }
+
+        /// <summary>
+        /// Copies the block into a list per stream, as the signals are passed by IMotorStageImplementation
+        /// </summary>
+        /// <returns>The streams, in the format [ [a1 ... a_n] [b1 ... b_n] [c1 ... c_n] ]</returns>
+        public List<List<double>> ToLists ()
+        {
+            List<List<double>> result = new List<List<double>>(_stream_count);
+            for (int i = 0; i < _stream_count; i++)
+            {
+                result.Add(CopyToList(i, 0, _length));
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Copies the block into a list of integers per stream, as the new data from the controller board is passed
+        /// by IMotorStageImplementation
+        /// </summary>
+        /// <returns>The streams, in the format [ [a1 ... a_n] [b1 ... b_n] [c1 ... c_n] ]</returns>
+        public List<List<Int64>> ToInt64Lists ()
+        {
+            List<List<Int64>> result = new List<List<Int64>>(_stream_count);
+            for (int i = 0; i < _stream_count; i++)
+            {
+                double[] stream_data = _streams[i];
+                List<Int64> stream_list = new List<Int64>(_length);
+                for (int j = _offset; j < _offset + _length; j++)
+                {
+                    stream_list.Add(Convert.ToInt64(stream_data[j]));
+                }
+
+                result.Add(stream_list);
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Transforms every sample of a stream in place, as the device stream is calibrated:
+        /// value = polarity * (slope * (value - baseline)) - offset.
+        /// Nothing is done if the block does not have the stream.
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="slope">The slope of the device</param>
+        /// <param name="baseline">The baseline of the device</param>
+        /// <param name="polarity">The polarity of the signal (-1.0 inverts the signal)</param>
+        /// <param name="offset">The offset that is subtracted from the signal</param>
+        public void TransformStream (int stream, double slope, double baseline, double polarity, double offset)
+        {
+            if (stream < 0 || stream >= _stream_count)
+            {
+                return;
+            }
+
+            double[] stream_data = _streams[stream];
+            for (int j = _offset; j < _offset + _length; j++)
+            {
+                stream_data[j] = polarity * (slope * (stream_data[j] - baseline)) - offset;
+            }
+        }
+
+        /// <summary>
+        /// Calculates the maximum of a range of a stream, as MotorMath.MaxInRange does.  The range is clipped to the bounds of the block.
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="start_index">The index at which the range begins</param>
+        /// <param name="count">The number of samples in the range</param>
+        /// <param name="absolute">Whether the absolute value of each sample is used</param>
+        /// <returns>The maximum found in the range, or NaN if the range is empty</returns>
+        public double MaxInRange (int stream, int start_index, int count, bool absolute = false)
+        {
+            CheckStream(stream);
+            double[] stream_data = _streams[stream];
+            int first = _offset + Math.Max(0, start_index);
+            int last = _offset + Math.Min(_length, start_index + count);
+
+            double result = double.NaN;
+            for (int i = first; i < last; i++)
+            {
+                double value = absolute ? Math.Abs(stream_data[i]) : stream_data[i];
+                if (value > result || double.IsNaN(result))
+                {
+                    result = value;
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Calculates the minimum of a range of a stream, as MotorMath.MinInRange does.  The range is clipped to the bounds of the block.
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="start_index">The index at which the range begins</param>
+        /// <param name="count">The number of samples in the range</param>
+        /// <param name="absolute">Whether the absolute value of each sample is used</param>
+        /// <returns>The minimum found in the range, or NaN if the range is empty</returns>
+        public double MinInRange (int stream, int start_index, int count, bool absolute = false)
+        {
+            CheckStream(stream);
+            double[] stream_data = _streams[stream];
+            int first = _offset + Math.Max(0, start_index);
+            int last = _offset + Math.Min(_length, start_index + count);
+
+            double result = double.NaN;
+            for (int i = first; i < last; i++)
+            {
+                double value = absolute ? Math.Abs(stream_data[i]) : stream_data[i];
+                if (value < result || double.IsNaN(result))
+                {
+                    result = value;
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Finds the first sample of a stream, at or after a starting index, that is equal to a value (as List.IndexOf does,
+        /// so NaN is found if it is searched for).
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="value">The value to find</param>
+        /// <param name="start_index">The index at which the search begins</param>
+        /// <param name="absolute">Whether the absolute value of each sample is compared</param>
+        /// <returns>The index of the sample, or -1 if the value is not found</returns>
+        public int IndexOf (int stream, double value, int start_index, bool absolute = false)
+        {
+            CheckStream(stream);
+            if (start_index < 0 || start_index > _length)
+            {
+                throw new ArgumentOutOfRangeException("start_index");
+            }
+
+            double[] stream_data = _streams[stream];
+            for (int i = start_index; i < _length; i++)
+            {
+                double sample = absolute ? Math.Abs(stream_data[_offset + i]) : stream_data[_offset + i];
+                if (sample.Equals(value))
+                {
+                    return i;
+                }
+            }
+
+            return -1;
+        }
+
+        /// <summary>
+        /// Finds the first sample within a range of a stream that is greater than or equal to a threshold, as
+        /// MotorMath.FindFirstIndexAtOrAbove does.  The range is clipped to the bounds of the block.
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <param name="threshold">The threshold</param>
+        /// <param name="start_index">The index at which the range begins</param>
+        /// <param name="count">The number of samples in the range</param>
+        /// <param name="absolute">Whether the absolute value of each sample is compared</param>
+        /// <returns>The index of the first sample at or above the threshold, or -1 if there is none</returns>
+        public int FindFirstIndexAtOrAbove (int stream, double threshold, int start_index, int count, bool absolute = false)
+        {
+            CheckStream(stream);
+            double[] stream_data = _streams[stream];
+            int first = Math.Max(0, start_index);
+            int last = Math.Min(_length, start_index + count);
+
+            for (int i = first; i < last; i++)
+            {
+                double sample = absolute ? Math.Abs(stream_data[_offset + i]) : stream_data[_offset + i];
+                if (sample >= threshold)
+                {
+                    return i;
+                }
+            }
+
+            return -1;
+        }
+
+        /// <summary>
+        /// Calculates the mean of a stream
+        /// </summary>
+        /// <param name="stream">The index of the stream</param>
+        /// <returns>The mean, or NaN if the block is empty</returns>
+        public double Mean (int stream)
+        {
+            CheckStream(stream);
+            if (_length == 0)
+            {
+                return double.NaN;
+            }
+
+            double[] stream_data = _streams[stream];
+            double sum = 0;
+            for (int j = _offset; j < _offset + _length; j++)
+            {
+                sum += stream_data[j];
+            }
+
+            return sum / _length;
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private void CheckStream (int stream)
+        {
+            if (stream < 0 || stream >= _stream_count)
+            {
+                throw new ArgumentOutOfRangeException("stream");
+            }
+        }
+
+        private void CheckIndex (int stream, int index)
+        {
+            CheckStream(stream);
+            if (index < 0 || index >= _length)
+            {
+                throw new ArgumentOutOfRangeException("index");
+            }
+        }
+
+        private void EnsureStreamCount (int stream_count)
+        {
+            if (_streams.Length < stream_count)
+            {
+                int capacity = Capacity;
+                int old_stream_count = _streams.Length;
+                Array.Resize(ref _streams, stream_count);
+                for (int i = old_stream_count; i < stream_count; i++)
+                {
+                    _streams[i] = new double[capacity];
+                }
+            }
+        }
+
+        /// <summary>
+        /// Makes sure the arrays have room for the specified number of samples after the first sample of the block,
+        /// moving the samples of the block back to the start of the arrays
+        /// </summary>
+        private void EnsureCapacity (int length, bool keep_samples)
+        {
+            int capacity = Capacity;
+            if (length > capacity)
+            {
+                //Sliding windows get room for two windows' worth of samples, so the samples are moved less often
+                capacity = Math.Max(length, (_window_length > 0) ? 2 * _window_length : 2 * capacity);
+                for (int i = 0; i < _streams.Length; i++)
+                {
+                    double[] new_stream = new double[capacity];
+                    if (keep_samples)
+                    {
+                        Array.Copy(_streams[i], _offset, new_stream, 0, _length);
+                    }
+
+                    _streams[i] = new_stream;
+                }
+
+                _offset = 0;
+            }
+            else if (keep_samples && _offset > 0)
+            {
+                for (int i = 0; i < _stream_count; i++)
+                {
+                    Array.Copy(_streams[i], _offset, _streams[i], 0, _length);
+                }
+
+                _offset = 0;
+            }
+        }
+
+        #endregion
+    }
+}
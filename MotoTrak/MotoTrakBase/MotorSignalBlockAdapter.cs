@@ -0,0 +1,113 @@
+﻿using System;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Lets a stage implementation that only implements IMotorStageImplementation be called through
+    /// IMotorStageSignalBlockImplementation.  The blocks are copied into lists, the list-based method is called, and its
+    /// result is copied back into a block, so existing stage implementations keep working unchanged.
+    /// </summary>
+    public class MotorSignalBlockAdapter : IMotorStageSignalBlockImplementation
+    {
+        #region Private data members
+
+        private IMotorStageImplementation _stage_implementation = null;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates an adapter for a stage implementation
+        /// </summary>
+        /// <param name="stage_implementation">The stage implementation</param>
+        public MotorSignalBlockAdapter(IMotorStageImplementation stage_implementation)
+        {
+            _stage_implementation = stage_implementation;
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The stage implementation that is called through this adapter
+        /// </summary>
+        public IMotorStageImplementation StageImplementation
+        {
+            get
+            {
+                return _stage_implementation;
+            }
+        }
+
+        #endregion
+
+        #region Static methods
+
+        /// <summary>
+        /// Returns a stage implementation's own IMotorStageSignalBlockImplementation, or an adapter if it does not have one
+        /// </summary>
+        /// <param name="stage_implementation">The stage implementation</param>
+        /// <returns>An object through which the stage implementation can be called with blocks</returns>
+        public static IMotorStageSignalBlockImplementation For (IMotorStageImplementation stage_implementation)
+        {
+            IMotorStageSignalBlockImplementation block_implementation = stage_implementation as IMotorStageSignalBlockImplementation;
+            if (block_implementation != null)
+            {
+                return block_implementation;
+            }
+
+            return new MotorSignalBlockAdapter(stage_implementation);
+        }
+
+        /// <summary>
+        /// Transforms new data in a block by calling the list-based TransformSignals method of a stage implementation
+        /// </summary>
+        public static void TransformSignals (IMotorStageImplementation stage_implementation, MotorSignalBlock new_data_from_controller,
+            MotorSignalBlock transformed_new_data, MotorStage stage, MotorDevice device)
+        {
+            var result = stage_implementation.TransformSignals(new_data_from_controller.ToInt64Lists(), stage, device);
+            if (result != null)
+            {
+                transformed_new_data.SetFromLists(result);
+            }
+            else
+            {
+                transformed_new_data.Reset(0, 0);
+            }
+        }
+
+        /// <summary>
+        /// Checks a block for a trial initiation by calling the list-based CheckSignalForTrialInitiation method of a stage implementation
+        /// </summary>
+        public static int CheckSignalForTrialInitiation (IMotorStageImplementation stage_implementation, MotorSignalBlock signal,
+            int new_datapoint_count, MotorStage stage)
+        {
+            return stage_implementation.CheckSignalForTrialInitiation(signal.ToLists(), new_datapoint_count, stage);
+        }
+
+        #endregion
+
+        #region IMotorStageSignalBlockImplementation
+
+        /// <summary>
+        /// Transforms new data from the controller board by calling the stage implementation's TransformSignals method
+        /// </summary>
+        public void TransformSignalBlock (MotorSignalBlock new_data_from_controller, MotorSignalBlock transformed_new_data,
+            MotorStage stage, MotorDevice device)
+        {
+            TransformSignals(_stage_implementation, new_data_from_controller, transformed_new_data, stage, device);
+        }
+
+        /// <summary>
+        /// Checks the buffered signal for a trial initiation by calling the stage implementation's CheckSignalForTrialInitiation method
+        /// </summary>
+        public int CheckSignalBlockForTrialInitiation (MotorSignalBlock signal, int new_datapoint_count, MotorStage stage)
+        {
+            return CheckSignalForTrialInitiation(_stage_implementation, signal, new_datapoint_count, stage);
+        }
+
+        #endregion
+    }
+}
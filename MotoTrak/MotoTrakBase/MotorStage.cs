@@ -85,6 +85,8 @@ namespace MotoTrakBase
         private List<MotorStageParameterTone> _tone_stage_parameters = new List<MotorStageParameterTone>();
 
         private string _output_trigger_type = string.Empty;
+        private int _cumulative_hit_count = 0;
+        private MotoTrakAutopositioner _autopositioner = null;
         
         private List<MotorBoardDataStreamType> _data_streams = new List<MotorBoardDataStreamType>()
         {
@@ -283,6 +285,23 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// The autopositioner that moves the device of the booth that this stage is running in.  Stage implementations should
+        /// move the device through this autopositioner, so that each booth moves its own.  Unless it has been set, this is the
+        /// autopositioner of MotoTrak's own controller board.
+        /// </summary>
+        public MotoTrakAutopositioner Autopositioner
+        {
+            get
+            {
+                return (_autopositioner != null) ? _autopositioner : MotoTrakAutopositioner.GetInstance();
+            }
+            set
+            {
+                _autopositioner = value;
+            }
+        }
+
         /// <summary>
         /// The duration of the hit window (in units of seconds)
         /// </summary>
@@ -447,6 +466,23 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// The total number of hits that the current rat has performed on this stage in previously saved sessions.
+        /// This is looked up from the hit index when the rat's history is loaded, and stage implementations
+        /// can use it to choose the position at which a session begins.
+        /// </summary>
+        public int CumulativeHitCount
+        {
+            get
+            {
+                return _cumulative_hit_count;
+            }
+            set
+            {
+                _cumulative_hit_count = value;
+            }
+        }
+
         #endregion
 
         #region Public methods
@@ -468,6 +504,42 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Creates a copy of this stage whose parameters can be changed without changing this stage's parameters.  The copy
+        /// shares this stage's implementation and autopositioner.
+        /// </summary>
+        /// <returns>The copy</returns>
+        public MotorStage Clone ()
+        {
+            MotorStage copy = new MotorStage()
+            {
+                StageName = StageName,
+                Description = Description,
+                DeviceType = DeviceType,
+                SamplePeriodInMilliseconds = SamplePeriodInMilliseconds,
+                StageFilePath = StageFilePath,
+                StageFileName = StageFileName,
+                StageImplementation = StageImplementation,
+                OutputTriggerType = OutputTriggerType,
+                CumulativeHitCount = CumulativeHitCount,
+                DataStreamTypes = DataStreamTypes.ToList(),
+                ToneStageParameters = ToneStageParameters.ToList(),
+                Position = Position.Clone(),
+                PreTrialSamplingPeriodInSeconds = PreTrialSamplingPeriodInSeconds.Clone(),
+                HitWindowInSeconds = HitWindowInSeconds.Clone(),
+                PostTrialSamplingPeriodInSeconds = PostTrialSamplingPeriodInSeconds.Clone(),
+                PostTrialTimeoutInSeconds = PostTrialTimeoutInSeconds.Clone()
+            };
+
+            copy._autopositioner = _autopositioner;
+            foreach (var sp in StageParameters)
+            {
+                copy.StageParameters[sp.Key] = sp.Value.Clone();
+            }
+
+            return copy;
+        }
+
         #endregion
 
         #region Static Methods
@@ -559,15 +631,7 @@ namespace MotoTrakBase
                 writer.WriteLine("Stage Description: " + stage.Description);
 
                 //Save the name of the stage implementation file
-                var stage_impls = MotoTrakConfiguration.GetInstance().PythonStageImplementations;
-                string stage_impl_name = string.Empty;
-                foreach (var kvp in stage_impls)
-                {
-                    if (kvp.Value == stage.StageImplementation)
-                    {
-                        stage_impl_name = kvp.Key;
-                    }
-                }
+                string stage_impl_name = MotoTrakConfiguration.GetInstance().GetStageImplementationName(stage.StageImplementation);
                 
                 writer.WriteLine("Stage Implementation: " + stage_impl_name);
 
@@ -669,7 +733,7 @@ namespace MotoTrakBase
                             }
                             else if (parameter.Equals("Stage Implementation"))
                             {
-                                stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations[parameter_string_parts[1].Trim()];
+                                stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation(parameter_string_parts[1].Trim());
                             }
                             else if (parameter.Equals("Stage Output Trigger"))
                             {
@@ -1051,7 +1115,7 @@ namespace MotoTrakBase
             {
                 if(MotoTrakConfiguration.GetInstance().PythonStageImplementations.ContainsKey(user_defined_task_definition))
                 {
-                    stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations[user_defined_task_definition];
+                    stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation(user_defined_task_definition);
                 }
                 else
                 {
@@ -1092,7 +1156,7 @@ namespace MotoTrakBase
                         //Set the implementation of this stage
                         if (string.IsNullOrEmpty(user_defined_task_definition))
                         {
-                            stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations["PythonPullStageImplementation_FWIR.py"];
+                            stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation("PythonPullStageImplementation_FWIR.py");
                         }
                         else if (user_defined_task_definition.Equals("PythonPullStageImplementation_TXBDC_PullWindowEric.py"))
                         {
@@ -1127,7 +1191,7 @@ namespace MotoTrakBase
                         //Set the implementation of this stage
                         if (string.IsNullOrEmpty(user_defined_task_definition))
                         {
-                            stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations["PythonPullStageImplementation.py"];
+                            stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation("PythonPullStageImplementation.py");
                         }
                             
                         //Set the parameters of this stage
@@ -1146,7 +1210,7 @@ namespace MotoTrakBase
                     //Set the implementation of this stage
                     if (string.IsNullOrEmpty(user_defined_task_definition))
                     {
-                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations["PythonSustainedPullStageImplementation.py"];
+                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation("PythonSustainedPullStageImplementation.py");
                     }
                         
                     hit_thresh.ParameterName = "Hold Duration";
@@ -1175,7 +1239,7 @@ namespace MotoTrakBase
                         stage.StageParameters["Hit Threshold"] = hit_thresh;
 
                         //Set the base knob implementation as the task definition
-                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations["PythonKnobStageImplementation.py"];
+                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation("PythonKnobStageImplementation.py");
                     }
                     else if (user_defined_task_definition.Equals("PythonKnobStageImplementation_TXBDC_KnobWindow.py"))
                     {
@@ -1211,7 +1275,7 @@ namespace MotoTrakBase
                     //Set the implementation of this stage
                     if (string.IsNullOrEmpty(user_defined_task_definition))
                     {
-                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().PythonStageImplementations["PythonLeverStageImplementation.py"];
+                        stage.StageImplementation = MotoTrakConfiguration.GetInstance().CreateStageImplementation("PythonLeverStageImplementation.py");
                     }
                         
                     //Set the parameters for this stage
@@ -0,0 +1,374 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// One processing frame of the session loop, as it is handed to a stage implementation that implements
+    /// IMotorStageFrameProcessor.  The frame holds the raw data read from the controller board and the trial context, and it
+    /// collects the results of the frame: the transformed data, the trial initiation index, new trial events, and actions.
+    /// 
+    /// The stage implementation calls back into the frame as it goes, so that the buffered signal and the trial's data are
+    /// up to date before it looks for a trial initiation or for trial events, and so that new trial events have been added
+    /// to the trial (by MotoTrak) before it reacts to them.  This gives the same results, in the same order, as calling
+    /// the separate methods of IMotorStageImplementation.
+    /// 
+    /// The data is held in MotorSignalBlock objects owned by MotoTrak's session loop, which are handed to the stage
+    /// implementation in place.  The list properties (NewData, Signal, and TransformedData) copy the blocks into lists for
+    /// stage implementations that work with lists.
+    /// </summary>
+    public class MotorStageFrame
+    {
+        #region Enumerations
+
+        /// <summary>
+        /// What the session loop is doing during this frame
+        /// </summary>
+        public enum FramePhase
+        {
+            /// <summary>
+            /// No trial is running or about to run: only the new data needs to be transformed
+            /// </summary>
+            TransformOnly,
+
+            /// <summary>
+            /// MotoTrak is waiting for a trial to be initiated
+            /// </summary>
+            WaitingForTrial,
+
+            /// <summary>
+            /// A trial is running
+            /// </summary>
+            TrialRunning
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private FramePhase _phase = FramePhase.TransformOnly;
+        private MotorSignalBlock _new_data = null;
+        private int _new_datapoint_count = 0;
+        private MotorSignalBlock _signal = null;
+        private MotorSignalBlock _transformed_data = null;
+        private MotorStage _stage = null;
+        private MotorDevice _device = null;
+        private MotorTrial _trial = null;
+
+        private bool _is_transformed = false;
+        private List<List<Int64>> _new_data_lists = null;
+        private List<List<double>> _signal_lists = null;
+        private List<List<double>> _transformed_data_lists = null;
+        private int _trial_initiation_index = -1;
+        private List<Tuple<MotorTrialEventType, int>> _new_events = new List<Tuple<MotorTrialEventType, int>>();
+        private List<MotorTrialAction> _actions = new List<MotorTrialAction>();
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a frame
+        /// </summary>
+        /// <param name="new_data">The new data from the controller board</param>
+        /// <param name="new_datapoint_count">The number of new samples</param>
+        /// <param name="signal">The buffered (transformed) signal, whose window is the number of samples the buffer keeps.
+        /// The new data is added to it in place.</param>
+        /// <param name="transformed_data">The block that receives the transformed new data.  Its contents are replaced.</param>
+        /// <param name="stage">The stage that is running</param>
+        /// <param name="device">The device that is connected</param>
+        public MotorStageFrame(MotorSignalBlock new_data, int new_datapoint_count, MotorSignalBlock signal, MotorSignalBlock transformed_data,
+            MotorStage stage, MotorDevice device)
+        {
+            _new_data = new_data;
+            _new_datapoint_count = new_datapoint_count;
+            _signal = signal;
+            _transformed_data = transformed_data;
+            _stage = stage;
+            _device = device;
+
+            _transformed_data.Reset(0, 0);
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// What the session loop is doing during this frame
+        /// </summary>
+        public FramePhase Phase
+        {
+            get
+            {
+                return _phase;
+            }
+            set
+            {
+                _phase = value;
+            }
+        }
+
+        /// <summary>
+        /// The new data from the controller board
+        /// </summary>
+        public MotorSignalBlock NewDataBlock
+        {
+            get
+            {
+                return _new_data;
+            }
+        }
+
+        /// <summary>
+        /// A copy of the new data from the controller board, with one list per stream
+        /// </summary>
+        public List<List<Int64>> NewData
+        {
+            get
+            {
+                if (_new_data_lists == null)
+                {
+                    _new_data_lists = _new_data.ToInt64Lists();
+                }
+
+                return _new_data_lists;
+            }
+        }
+
+        /// <summary>
+        /// The number of new samples
+        /// </summary>
+        public int NewDatapointCount
+        {
+            get
+            {
+                return _new_datapoint_count;
+            }
+        }
+
+        /// <summary>
+        /// The buffered (transformed) signal
+        /// </summary>
+        public MotorSignalBlock SignalBlock
+        {
+            get
+            {
+                return _signal;
+            }
+        }
+
+        /// <summary>
+        /// A copy of the buffered (transformed) signal, with one list per stream
+        /// </summary>
+        public List<List<double>> Signal
+        {
+            get
+            {
+                if (_signal_lists == null)
+                {
+                    _signal_lists = _signal.ToLists();
+                }
+
+                return _signal_lists;
+            }
+        }
+
+        /// <summary>
+        /// The stage that is running
+        /// </summary>
+        public MotorStage Stage
+        {
+            get
+            {
+                return _stage;
+            }
+        }
+
+        /// <summary>
+        /// The device that is connected
+        /// </summary>
+        public MotorDevice Device
+        {
+            get
+            {
+                return _device;
+            }
+        }
+
+        /// <summary>
+        /// The trial that is running, or null if no trial is running
+        /// </summary>
+        public MotorTrial Trial
+        {
+            get
+            {
+                return _trial;
+            }
+            set
+            {
+                _trial = value;
+            }
+        }
+
+        /// <summary>
+        /// Called by MotoTrak's session loop when the stage implementation reports new trial events, so that the events are
+        /// added to the trial (and a hit is handled) before the stage implementation reacts to them
+        /// </summary>
+        public Action<List<Tuple<MotorTrialEventType, int>>> TrialEventHandler { get; set; }
+
+        /// <summary>
+        /// The block that receives the new data after it has been transformed by the stage implementation.  The stage
+        /// implementation may fill it in place and then call CommitTransformedData.
+        /// </summary>
+        public MotorSignalBlock TransformedDataBlock
+        {
+            get
+            {
+                return _transformed_data;
+            }
+        }
+
+        /// <summary>
+        /// Whether the transformed data has been added to the buffered signal
+        /// </summary>
+        public bool IsTransformed
+        {
+            get
+            {
+                return _is_transformed;
+            }
+        }
+
+        /// <summary>
+        /// A copy of the transformed new data, with one list per stream, or null if the new data has not been transformed
+        /// </summary>
+        public List<List<double>> TransformedData
+        {
+            get
+            {
+                if (_is_transformed && _transformed_data_lists == null)
+                {
+                    _transformed_data_lists = _transformed_data.ToLists();
+                }
+
+                return _transformed_data_lists;
+            }
+        }
+
+        /// <summary>
+        /// The index into the buffered signal at which a trial was initiated, or -1 if no trial was initiated
+        /// </summary>
+        public int TrialInitiationIndex
+        {
+            get
+            {
+                return _trial_initiation_index;
+            }
+            set
+            {
+                _trial_initiation_index = value;
+            }
+        }
+
+        /// <summary>
+        /// The trial events that were found during this frame
+        /// </summary>
+        public List<Tuple<MotorTrialEventType, int>> NewEvents
+        {
+            get
+            {
+                return _new_events;
+            }
+        }
+
+        /// <summary>
+        /// The actions that MotoTrak should take, in the order that the stage implementation created them
+        /// </summary>
+        public List<MotorTrialAction> Actions
+        {
+            get
+            {
+                return _actions;
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Stores the transformed data, adds it to the end of the buffered signal (dropping the oldest samples so that the
+        /// buffer keeps its size), and adds it to the data of the running trial.
+        /// </summary>
+        /// <param name="transformed_data">The transformed data, with one list per stream</param>
+        public void SetTransformedData (List<List<double>> transformed_data)
+        {
+            if (transformed_data == null || _is_transformed)
+            {
+                return;
+            }
+
+            _transformed_data.SetFromLists(transformed_data);
+            CommitTransformedData();
+            _transformed_data_lists = transformed_data;
+        }
+
+        /// <summary>
+        /// Adds the data in TransformedDataBlock, which the stage implementation has filled in place, to the end of the buffered
+        /// signal (dropping the oldest samples so that the buffer keeps its size), and to the data of the running trial.
+        /// </summary>
+        public void CommitTransformedData ()
+        {
+            if (_is_transformed)
+            {
+                return;
+            }
+
+            _is_transformed = true;
+            _signal.Append(_transformed_data);
+            _signal_lists = null;
+
+            if (_phase == FramePhase.TrialRunning && _trial != null)
+            {
+                for (int i = 0; i < _trial.TrialData.Count && i < _transformed_data.StreamCount; i++)
+                {
+                    _trial.TrialData[i].AddRange(_transformed_data.GetStream(i));
+                }
+            }
+        }
+
+        /// <summary>
+        /// Adds trial events that were found during this frame, and passes them to MotoTrak so they are added to the trial.
+        /// </summary>
+        /// <param name="new_events">The new events</param>
+        public void AddTrialEvents (List<Tuple<MotorTrialEventType, int>> new_events)
+        {
+            if (new_events == null)
+            {
+                return;
+            }
+
+            _new_events.AddRange(new_events);
+            if (TrialEventHandler != null)
+            {
+                TrialEventHandler(new_events);
+            }
+        }
+
+        /// <summary>
+        /// Adds actions that MotoTrak should take
+        /// </summary>
+        /// <param name="actions">The actions</param>
+        public void AddActions (List<MotorTrialAction> actions)
+        {
+            if (actions != null)
+            {
+                _actions.AddRange(actions);
+            }
+        }
+
+        #endregion
+    }
+}
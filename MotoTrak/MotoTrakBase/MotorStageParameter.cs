@@ -113,9 +113,10 @@ namespace MotoTrakBase
 
         /// <summary>
         /// The history of this parameter.  The size of this history is the same as the value of Increment.
-        /// Default size is 10.
+        /// Default size is 10.  The history keeps its values sorted as they are added, so the median and percentiles
+        /// used by adaptive changes are found without sorting (stage implementations can also query them directly).
         /// </summary>
-        public FixedSizedQueue<double> History = new FixedSizedQueue<double>() { Limit = 10 };
+        public SlidingWindowOrderStatistics History = new SlidingWindowOrderStatistics() { Limit = 10 };
 
         /// <summary>
         /// The type of adaptive change that will be used for this motor parameter
@@ -126,6 +127,36 @@ namespace MotoTrakBase
 
         #region Methods
 
+        /// <summary>
+        /// Creates a copy of this parameter, including its history, which can be changed without changing this parameter
+        /// </summary>
+        /// <returns>The copy</returns>
+        public MotorStageParameter Clone ()
+        {
+            MotorStageParameter copy = new MotorStageParameter()
+            {
+                IsQuantitative = IsQuantitative,
+                NominalValue = NominalValue,
+                ParameterName = ParameterName,
+                ParameterUnits = ParameterUnits,
+                ParameterType = ParameterType,
+                InitialValue = InitialValue,
+                MinimumValue = MinimumValue,
+                MaximumValue = MaximumValue,
+                CurrentValue = CurrentValue,
+                Increment = Increment,
+                AdaptiveThresholdType = AdaptiveThresholdType
+            };
+
+            copy.History.Limit = History.Limit;
+            foreach (double value in History.ListClone)
+            {
+                copy.History.Enqueue(value);
+            }
+
+            return copy;
+        }
+
         /// <summary>
         /// Clears the stage parameter history
         /// </summary>
@@ -174,18 +205,16 @@ namespace MotoTrakBase
                 {
                     if (History.IsFull)
                     {
-                        List<double> clone = History.ListClone;
-
                         switch (AdaptiveThresholdType)
                         {
                             case MotorStageAdaptiveThresholdType.Median:
-                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, MotorMath.Median(clone)));
+                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, History.Median()));
                                 break;
                             case MotorStageAdaptiveThresholdType.Percentile25:
-                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, MotorMath.Percentile(clone.ToArray(), 0.25)));
+                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, History.Percentile(0.25)));
                                 break;
                             case MotorStageAdaptiveThresholdType.Percentile75:
-                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, MotorMath.Percentile(clone.ToArray(), 0.75)));
+                                CurrentValue = Math.Max(MinimumValue, Math.Min(MaximumValue, History.Percentile(0.75)));
                                 break;
                         }
 
@@ -0,0 +1,315 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Linq;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Drives a stage implementation through one synthetic trial, using data laid out in the same streams as the stage's data
+    /// from the controller board.  The device signal sits at its baseline for the first half of the data, and then rises, so that
+    /// the stage implementation's trial initiation and hit code is run.  The stage implementation is called as it would be during
+    /// a session, a few samples at a time, but its actions are not carried out and the stage's parameters are not adjusted.
+    /// Any exception thrown by the stage implementation is passed on to the caller.
+    /// </summary>
+    public static class MotorStageSyntheticFrame
+    {
+        #region Public classes
+
+        /// <summary>
+        /// How long a synthetic run took
+        /// </summary>
+        public class RunTimes
+        {
+            /// <summary>
+            /// The time taken by the first frame of data
+            /// </summary>
+            public double FirstFrameMilliseconds = double.NaN;
+
+            /// <summary>
+            /// The time taken by the whole run
+            /// </summary>
+            public double TotalMilliseconds = double.NaN;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private const int _samples_per_frame = 10;
+        private const double _synthetic_peak_value = 500;
+
+        #endregion
+
+        #region Static methods
+
+        /// <summary>
+        /// Creates synthetic data from the controller board, with one row per sample and one value per stream of the stage
+        /// </summary>
+        /// <param name="stage">The stage, which defines the streams</param>
+        /// <param name="device">The device, whose calibration is used to scale the device signal</param>
+        /// <param name="sample_count">The number of samples</param>
+        /// <returns>The synthetic data</returns>
+        public static List<List<Int64>> CreateRawData (MotorStage stage, MotorDevice device, int sample_count)
+        {
+            //Scale the rise of the device signal so that it reaches the same transformed value whatever the device's calibration
+            double baseline = (device != null) ? device.Baseline : 0;
+            double slope = (device != null && device.Slope != 0) ? device.Slope : 1;
+            double rise = _synthetic_peak_value / slope;
+
+            int rise_start = sample_count / 2;
+            int rise_end = Math.Max(rise_start + 1, (sample_count * 3) / 4);
+
+            List<List<Int64>> data = new List<List<Int64>>();
+            for (int i = 0; i < sample_count; i++)
+            {
+                double rise_fraction = Math.Max(0, Math.Min(1, (i - rise_start) / (double)(rise_end - rise_start)));
+
+                List<Int64> row = new List<Int64>();
+                foreach (var stream_type in stage.DataStreamTypes)
+                {
+                    switch (stream_type)
+                    {
+                        case MotorBoardDataStreamType.Timestamp:
+                            row.Add(Convert.ToInt64(i) * stage.SamplePeriodInMilliseconds);
+                            break;
+                        case MotorBoardDataStreamType.DeviceValue:
+                            row.Add(Convert.ToInt64(Math.Round(baseline + rise_fraction * rise)));
+                            break;
+                        case MotorBoardDataStreamType.IRSensorValue:
+                            //The swipe sensor is blocked when the device signal starts to rise
+                            row.Add((i < rise_start) ? 1000 : 0);
+                            break;
+                        default:
+                            row.Add(0);
+                            break;
+                    }
+                }
+
+                data.Add(row);
+            }
+
+            return data;
+        }
+
+        /// <summary>
+        /// Runs a synthetic trial through a stage implementation.  If the stage implementation handles whole processing frames,
+        /// the trial is run through ProcessFrame first, and then through the separate methods, since MotoTrak calls both.
+        /// </summary>
+        /// <param name="stage_implementation">The stage implementation.  Its session state is changed, so this should not be the
+        /// instance that is running a session.</param>
+        /// <param name="stage">The stage whose parameters are used</param>
+        /// <param name="device">The device whose calibration is used</param>
+        /// <returns>How long the run took</returns>
+        public static RunTimes Run (IMotorStageImplementation stage_implementation, MotorStage stage, MotorDevice device)
+        {
+            RunTimes run_times = new RunTimes();
+            Stopwatch stopwatch = Stopwatch.StartNew();
+
+            IMotorStageFrameProcessor frame_processor = stage_implementation as IMotorStageFrameProcessor;
+            if (frame_processor != null)
+            {
+                RunTrial(stage_implementation, frame_processor, stage, device, stopwatch, run_times);
+            }
+
+            MotorTrial trial = RunTrial(stage_implementation, null, stage, device, stopwatch, run_times);
+            if (trial != null)
+            {
+                MotoTrakSession session = new MotoTrakSession();
+                session.SelectedStage = stage;
+                session.Trials.Add(trial);
+                stage_implementation.CreateEndOfSessionMessage(session);
+            }
+
+            run_times.TotalMilliseconds = stopwatch.Elapsed.TotalMilliseconds;
+
+            return run_times;
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Runs one synthetic trial, either through ProcessFrame (if a frame processor is given) or through the separate methods
+        /// </summary>
+        /// <returns>The trial, or null if the frame processor does not handle whole frames</returns>
+        private static MotorTrial RunTrial (IMotorStageImplementation stage_implementation, IMotorStageFrameProcessor frame_processor,
+            MotorStage stage, MotorDevice device, Stopwatch stopwatch, RunTimes run_times)
+        {
+            IMotorStageSignalBlockImplementation block_implementation = MotorSignalBlockAdapter.For(stage_implementation);
+            int buffer_size = Math.Max(1, stage.TotalRecordedSamplesPerTrial);
+            List<List<Int64>> raw_data = CreateRawData(stage, device, 2 * buffer_size);
+
+            MotorSignalBlock new_data = new MotorSignalBlock();
+            MotorSignalBlock transformed_new_data = new MotorSignalBlock();
+            MotorSignalBlock signal = new MotorSignalBlock(stage.TotalDataStreams, buffer_size);
+            MotorTrial trial = null;
+
+            for (int start = 0; start < raw_data.Count; start += _samples_per_frame)
+            {
+                int new_datapoint_count = Math.Min(_samples_per_frame, raw_data.Count - start);
+                new_data.SetFromRows(raw_data.GetRange(start, new_datapoint_count));
+
+                int trial_initiation_index = -1;
+                if (frame_processor != null)
+                {
+                    MotorStageFrame frame = new MotorStageFrame(new_data, new_datapoint_count, signal, transformed_new_data, stage, device);
+                    if (trial == null)
+                    {
+                        frame.Phase = MotorStageFrame.FramePhase.WaitingForTrial;
+                    }
+                    else
+                    {
+                        MotorTrial running_trial = trial;
+                        frame.Phase = MotorStageFrame.FramePhase.TrialRunning;
+                        frame.Trial = running_trial;
+                        frame.TrialEventHandler = (new_events) => AddTrialEvents(running_trial, new_events);
+                    }
+
+                    if (!frame_processor.ProcessFrame(frame))
+                    {
+                        return null;
+                    }
+
+                    trial_initiation_index = frame.TrialInitiationIndex;
+                }
+                else
+                {
+                    block_implementation.TransformSignalBlock(new_data, transformed_new_data, stage, device);
+                    signal.Append(transformed_new_data);
+
+                    if (trial == null)
+                    {
+                        trial_initiation_index = block_implementation.CheckSignalBlockForTrialInitiation(signal, new_datapoint_count, stage);
+                    }
+                    else
+                    {
+                        for (int i = 0; i < trial.TrialData.Count && i < transformed_new_data.StreamCount; i++)
+                        {
+                            trial.TrialData[i].AddRange(transformed_new_data.GetStream(i));
+                        }
+
+                        if (trial.Result == MotorTrialResult.Unknown)
+                        {
+                            AddTrialEvents(trial, stage_implementation.CheckForTrialEvent(trial, new_datapoint_count, stage));
+                            stage_implementation.ReactToTrialEvents(trial, stage);
+                        }
+
+                        stage_implementation.PerformActionDuringTrial(trial, stage);
+                    }
+                }
+
+                if (double.IsNaN(run_times.FirstFrameMilliseconds))
+                {
+                    run_times.FirstFrameMilliseconds = stopwatch.Elapsed.TotalMilliseconds;
+                }
+
+                if (trial == null)
+                {
+                    //If the stage implementation did not initiate a trial by the time the device signal starts to rise, one is
+                    //initiated anyway, so that the rest of the stage implementation is run
+                    if (trial_initiation_index < 0 && start + new_datapoint_count >= raw_data.Count / 2)
+                    {
+                        trial_initiation_index = signal.Length - 1;
+                    }
+
+                    if (trial_initiation_index > -1)
+                    {
+                        trial = CreateTrial(signal, trial_initiation_index, stage);
+                    }
+                }
+                else if (trial.TrialData[0].Count >= stage.TotalRecordedSamplesPerTrial)
+                {
+                    break;
+                }
+            }
+
+            if (trial != null)
+            {
+                EndTrial(stage_implementation, trial, stage);
+            }
+
+            return trial;
+        }
+
+        private static MotorTrial CreateTrial (MotorSignalBlock signal, int trial_initiation_index, MotorStage stage)
+        {
+            int samples_before_hit_window = stage.TotalRecordedSamplesBeforeHitWindow;
+            trial_initiation_index = Math.Max(0, Math.Min(signal.Length - 1, trial_initiation_index));
+            int point_to_start_keeping_data = Math.Max(0, trial_initiation_index - samples_before_hit_window);
+
+            MotorTrial trial = new MotorTrial();
+            trial.StartTime = DateTime.Now;
+            trial.TrialData = new List<List<double>>();
+            for (int i = 0; i < signal.StreamCount; i++)
+            {
+                List<double> data_from_stream = signal.CopyToList(i, point_to_start_keeping_data, trial_initiation_index - point_to_start_keeping_data + 1);
+                if (data_from_stream.Count < samples_before_hit_window)
+                {
+                    data_from_stream.InsertRange(0, Enumerable.Repeat<double>(0, samples_before_hit_window - data_from_stream.Count));
+                }
+
+                trial.TrialData.Add(data_from_stream);
+            }
+
+            trial.TrialEvents.Add(new MotorTrialEvent()
+            {
+                EventType = MotorTrialEventType.TrialInitiation,
+                EventIndex = samples_before_hit_window
+            });
+
+            return trial;
+        }
+
+        private static void AddTrialEvents (MotorTrial trial, List<Tuple<MotorTrialEventType, int>> new_events)
+        {
+            if (new_events == null)
+            {
+                return;
+            }
+
+            foreach (var n in new_events)
+            {
+                if (MotorTrialEventTypeConverter.AreMultipleEventsAllowed(n.Item1) || !trial.TrialEvents.Any(x => x.EventType == n.Item1))
+                {
+                    trial.TrialEvents.Add(new MotorTrialEvent() { EventType = n.Item1, EventIndex = n.Item2 });
+
+                    if (n.Item1 == MotorTrialEventType.SuccessfulTrial && trial.Result == MotorTrialResult.Unknown)
+                    {
+                        trial.Result = MotorTrialResult.Hit;
+                        trial.HitTimes.Add(DateTime.Now);
+                        trial.HitIndices.Add(n.Item2);
+                    }
+                }
+            }
+        }
+
+        private static void EndTrial (IMotorStageImplementation stage_implementation, MotorTrial trial, MotorStage stage)
+        {
+            if (trial.Result == MotorTrialResult.Unknown)
+            {
+                trial.Result = MotorTrialResult.Miss;
+            }
+
+            trial.TrialEvents.Add(new MotorTrialEvent()
+            {
+                EventType = MotorTrialEventType.TrialEnd,
+                EventIndex = trial.TrialData[0].Count - 1
+            });
+            stage_implementation.ReactToTrialEvents(trial, stage);
+
+            trial.EndTime = DateTime.Now;
+            IMotorTrialFeatureCalculator feature_calculator = stage_implementation as IMotorTrialFeatureCalculator;
+            if (feature_calculator != null)
+            {
+                trial.Features = feature_calculator.CalculateTrialFeatures(trial, stage);
+            }
+
+            stage_implementation.CalculateYValueForSessionOverviewPlot(trial, stage);
+            stage_implementation.CreateEndOfTrialMessage(1, trial, stage);
+        }
+
+        #endregion
+    }
+}
@@ -35,6 +35,8 @@ namespace MotoTrakBase
         private Dictionary<string, string> _nominal_parameters = new Dictionary<string, string>();
 
         private List<MotorTrialEvent> _trial_events = new List<MotorTrialEvent>();
+
+        private MotorTrialFeatures _features = null;
         
         #endregion
 
@@ -295,6 +297,23 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Features of the device signal of this trial (peak value, time to peak, hit latency, and so on).  These are calculated
+        /// once, when the trial ends, and are shared by the stage methods that run at the end of the trial.  This is null until
+        /// the trial has ended, and when the stage does not calculate features.
+        /// </summary>
+        public MotorTrialFeatures Features
+        {
+            get
+            {
+                return _features;
+            }
+            set
+            {
+                _features = value;
+            }
+        }
+
         #endregion
 
         #region Methods
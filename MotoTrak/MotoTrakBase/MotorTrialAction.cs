@@ -119,7 +119,20 @@ namespace MotoTrakBase
 
         #region Public methods
 
+        /// <summary>
+        /// Carries out the action, if it is due, on MotoTrak's own controller board and autopositioner
+        /// </summary>
         public void ExecuteAction()
+        {
+            ExecuteAction(MotorBoard.GetInstance(), MotoTrakAutopositioner.GetInstance());
+        }
+
+        /// <summary>
+        /// Carries out the action, if it is due, on the controller board and autopositioner of a booth
+        /// </summary>
+        /// <param name="board">The controller board of the booth</param>
+        /// <param name="autopositioner">The autopositioner of the booth</param>
+        public void ExecuteAction(IMotorBoard board, MotoTrakAutopositioner autopositioner)
         {
             if (DateTime.Now >= ActionTime)
             {
@@ -133,7 +146,7 @@ namespace MotoTrakBase
                         double position = (double)this.ActionParameters[AutopositionerParameterType.Position];
 
                         //Perform the autopositioner action
-                        MotoTrakAutopositioner.GetInstance().SetPosition(position);
+                        autopositioner.SetPosition(position);
 
                         break;
                     case MotorTrialActionType.PlaySound:
@@ -154,7 +167,7 @@ namespace MotoTrakBase
                         }
 
                         //Perform the stimulation trigger
-                        MotorBoard.GetInstance().TriggerStim();
+                        board.TriggerStim();
 
                         break;
                     case MotorTrialActionType.TriggerFeeder:
@@ -165,7 +178,7 @@ namespace MotoTrakBase
                         }
 
                         //Perform the feed
-                        MotorBoard.GetInstance().TriggerFeeder();
+                        board.TriggerFeeder();
 
                         break;
                 }                
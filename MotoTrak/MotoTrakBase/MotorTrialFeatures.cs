@@ -0,0 +1,435 @@
+﻿using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace MotoTrakBase
+{
+    /// <summary>
+    /// Features of the device signal of a single trial (peak value, time to peak, time above threshold, hit latency, and so on).
+    /// The features are calculated once, in a single pass over the hit window, when the trial ends, and are then shared by every
+    /// stage method that needs them (the end-of-trial message, the session overview plot, and adaptive thresholds), so that the
+    /// trial signal does not need to be scanned again by each of them.
+    ///
+    /// Each feature is found on the signal as recorded, and also on its absolute value (for stages, such as the unweighted knob
+    /// task, that compare the magnitude of the signal against their thresholds).
+    ///
+    /// The features of each trial are also saved alongside the session file, in a features file (with the same name as the
+    /// session file, plus the ".features" extension), for offline analysis.  The session file itself is unchanged, so readers
+    /// that do not know about the features file are not affected by it.
+    /// </summary>
+    public class MotorTrialFeatures
+    {
+        #region Public static data members
+
+        /// <summary>
+        /// The extension that is appended to the name of a session file to get the name of its features file
+        /// </summary>
+        public const string FileExtension = ".features";
+
+        /// <summary>
+        /// The features file version
+        /// </summary>
+        public const int FileVersion = 1;
+
+        /// <summary>
+        /// The number of bytes in the features file header: the characters "MTFX", followed by the features file version as an Int32
+        /// </summary>
+        public const int FileHeaderSize = 8;
+
+        /// <summary>
+        /// The number of bytes in each entry of the features file
+        /// </summary>
+        public const int EntrySize = 44;
+
+        #endregion
+
+        #region Private data members
+
+        private static readonly byte[] _file_signature = Encoding.ASCII.GetBytes("MTFX");
+
+        private UInt32 _trial_number = 0;
+        private double _threshold = double.NaN;
+        private double _peak_value = double.NaN;
+        private int _peak_index = -1;
+        private double _time_to_peak_in_milliseconds = double.NaN;
+        private double _time_above_threshold_in_milliseconds = 0;
+        private double _absolute_peak_value = double.NaN;
+        private int _absolute_peak_index = -1;
+        private double _absolute_time_to_peak_in_milliseconds = double.NaN;
+        private double _absolute_time_above_threshold_in_milliseconds = 0;
+        private double _hit_latency_in_milliseconds = double.NaN;
+
+        #endregion
+
+        #region Constructors
+
+        /// <summary>
+        /// Constructs an empty set of trial features
+        /// </summary>
+        public MotorTrialFeatures()
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The trial number, as it was saved in the session file
+        /// </summary>
+        public UInt32 TrialNumber
+        {
+            get
+            {
+                return _trial_number;
+            }
+            set
+            {
+                _trial_number = value;
+            }
+        }
+
+        /// <summary>
+        /// The threshold that the time above threshold was measured against (normally the hit threshold of the trial)
+        /// </summary>
+        public double Threshold
+        {
+            get
+            {
+                return _threshold;
+            }
+            set
+            {
+                _threshold = value;
+            }
+        }
+
+        /// <summary>
+        /// The largest value of the signal within the hit window, or NaN if the hit window is empty
+        /// </summary>
+        public double PeakValue
+        {
+            get
+            {
+                return _peak_value;
+            }
+            set
+            {
+                _peak_value = value;
+            }
+        }
+
+        /// <summary>
+        /// The index into the trial data at which the peak value first occurs, or -1 if the hit window is empty
+        /// </summary>
+        public int PeakIndex
+        {
+            get
+            {
+                return _peak_index;
+            }
+            set
+            {
+                _peak_index = value;
+            }
+        }
+
+        /// <summary>
+        /// The time from the beginning of the hit window to the peak value
+        /// </summary>
+        public double TimeToPeakInMilliseconds
+        {
+            get
+            {
+                return _time_to_peak_in_milliseconds;
+            }
+            set
+            {
+                _time_to_peak_in_milliseconds = value;
+            }
+        }
+
+        /// <summary>
+        /// The total time within the hit window during which the signal was at or above the threshold
+        /// </summary>
+        public double TimeAboveThresholdInMilliseconds
+        {
+            get
+            {
+                return _time_above_threshold_in_milliseconds;
+            }
+            set
+            {
+                _time_above_threshold_in_milliseconds = value;
+            }
+        }
+
+        /// <summary>
+        /// The largest absolute value of the signal within the hit window, or NaN if the hit window is empty
+        /// </summary>
+        public double AbsolutePeakValue
+        {
+            get
+            {
+                return _absolute_peak_value;
+            }
+            set
+            {
+                _absolute_peak_value = value;
+            }
+        }
+
+        /// <summary>
+        /// The index into the trial data at which the absolute peak value first occurs, or -1 if the hit window is empty
+        /// </summary>
+        public int AbsolutePeakIndex
+        {
+            get
+            {
+                return _absolute_peak_index;
+            }
+            set
+            {
+                _absolute_peak_index = value;
+            }
+        }
+
+        /// <summary>
+        /// The time from the beginning of the hit window to the absolute peak value
+        /// </summary>
+        public double AbsoluteTimeToPeakInMilliseconds
+        {
+            get
+            {
+                return _absolute_time_to_peak_in_milliseconds;
+            }
+            set
+            {
+                _absolute_time_to_peak_in_milliseconds = value;
+            }
+        }
+
+        /// <summary>
+        /// The total time within the hit window during which the absolute value of the signal was at or above the threshold
+        /// </summary>
+        public double AbsoluteTimeAboveThresholdInMilliseconds
+        {
+            get
+            {
+                return _absolute_time_above_threshold_in_milliseconds;
+            }
+            set
+            {
+                _absolute_time_above_threshold_in_milliseconds = value;
+            }
+        }
+
+        /// <summary>
+        /// The time from the beginning of the hit window to the first hit of the trial, or NaN if the trial was not a hit
+        /// </summary>
+        public double HitLatencyInMilliseconds
+        {
+            get
+            {
+                return _hit_latency_in_milliseconds;
+            }
+            set
+            {
+                _hit_latency_in_milliseconds = value;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Calculates the features of one stream of a trial's data, within the hit window of the stage.
+        /// </summary>
+        /// <param name="trial">The trial</param>
+        /// <param name="stage">The stage that the trial was run on</param>
+        /// <param name="stream_index">The index of the device stream within the trial data</param>
+        /// <param name="threshold">The threshold that the time above threshold is measured against</param>
+        /// <returns>The features of the trial</returns>
+        public static MotorTrialFeatures Calculate (MotorTrial trial, MotorStage stage, int stream_index, double threshold)
+        {
+            List<double> stream = (trial != null && stream_index >= 0 && stream_index < trial.TrialData.Count) ?
+                trial.TrialData[stream_index] : new List<double>();
+            int hit_index = (trial != null && trial.HitIndices.Count > 0) ? trial.HitIndices[0] : -1;
+
+            return Calculate(stream, stage.TotalRecordedSamplesBeforeHitWindow, stage.TotalRecordedSamplesDuringHitWindow,
+                threshold, hit_index, stage.SamplePeriodInMilliseconds);
+        }
+
+        /// <summary>
+        /// Calculates the features of a signal within a range of samples (the hit window).  The range is clipped to the bounds of the signal.
+        /// </summary>
+        /// <param name="signal">The signal</param>
+        /// <param name="start_index">The index at which the hit window begins</param>
+        /// <param name="count">The number of samples in the hit window</param>
+        /// <param name="threshold">The threshold that the time above threshold is measured against</param>
+        /// <param name="hit_index">The index at which the first hit occurred, or -1 if there was no hit</param>
+        /// <param name="sample_period_in_milliseconds">The time between samples</param>
+        /// <returns>The features of the signal</returns>
+        public static MotorTrialFeatures Calculate (List<double> signal, int start_index, int count, double threshold,
+            int hit_index, double sample_period_in_milliseconds)
+        {
+            MotorTrialFeatures features = new MotorTrialFeatures();
+            features.Threshold = threshold;
+
+            int first = Math.Max(0, start_index);
+            int last = Math.Min(signal.Count, start_index + count);
+            int samples_above_threshold = 0;
+            int samples_above_threshold_absolute = 0;
+            for (int i = first; i < last; i++)
+            {
+                double value = signal[i];
+                double absolute_value = Math.Abs(value);
+
+                if (value > features._peak_value || double.IsNaN(features._peak_value))
+                {
+                    features._peak_value = value;
+                    features._peak_index = i;
+                }
+
+                if (absolute_value > features._absolute_peak_value || double.IsNaN(features._absolute_peak_value))
+                {
+                    features._absolute_peak_value = absolute_value;
+                    features._absolute_peak_index = i;
+                }
+
+                if (value >= threshold)
+                {
+                    samples_above_threshold++;
+                }
+
+                if (absolute_value >= threshold)
+                {
+                    samples_above_threshold_absolute++;
+                }
+            }
+
+            if (features._peak_index >= 0)
+            {
+                features._time_to_peak_in_milliseconds = (features._peak_index - start_index) * sample_period_in_milliseconds;
+                features._absolute_time_to_peak_in_milliseconds = (features._absolute_peak_index - start_index) * sample_period_in_milliseconds;
+            }
+
+            features._time_above_threshold_in_milliseconds = samples_above_threshold * sample_period_in_milliseconds;
+            features._absolute_time_above_threshold_in_milliseconds = samples_above_threshold_absolute * sample_period_in_milliseconds;
+
+            if (hit_index >= 0)
+            {
+                features._hit_latency_in_milliseconds = (hit_index - start_index) * sample_period_in_milliseconds;
+            }
+
+            return features;
+        }
+
+        /// <summary>
+        /// Returns the path of the features file that belongs to a session file
+        /// </summary>
+        /// <param name="session_file_path">The path of the session file (including the file name)</param>
+        /// <returns>The path of the features file</returns>
+        public static string GetFeaturesFilePath (string session_file_path)
+        {
+            return session_file_path + FileExtension;
+        }
+
+        /// <summary>
+        /// Returns the bytes of the features file header
+        /// </summary>
+        public static byte[] GetFileHeaderBytes ()
+        {
+            byte[] header = new byte[FileHeaderSize];
+            Buffer.BlockCopy(_file_signature, 0, header, 0, _file_signature.Length);
+            Buffer.BlockCopy(BitConverter.GetBytes(FileVersion), 0, header, _file_signature.Length, sizeof(int));
+            return header;
+        }
+
+        /// <summary>
+        /// Returns the bytes of these features, as they are saved in the features file
+        /// </summary>
+        public byte[] GetBytes ()
+        {
+            byte[] entry = new byte[EntrySize];
+            using (BinaryWriter writer = new BinaryWriter(new MemoryStream(entry)))
+            {
+                writer.Write(TrialNumber);
+                writer.Write(Convert.ToSingle(Threshold));
+                writer.Write(Convert.ToSingle(PeakValue));
+                writer.Write(PeakIndex);
+                writer.Write(Convert.ToSingle(TimeToPeakInMilliseconds));
+                writer.Write(Convert.ToSingle(TimeAboveThresholdInMilliseconds));
+                writer.Write(Convert.ToSingle(AbsolutePeakValue));
+                writer.Write(AbsolutePeakIndex);
+                writer.Write(Convert.ToSingle(AbsoluteTimeToPeakInMilliseconds));
+                writer.Write(Convert.ToSingle(AbsoluteTimeAboveThresholdInMilliseconds));
+                writer.Write(Convert.ToSingle(HitLatencyInMilliseconds));
+            }
+
+            return entry;
+        }
+
+        /// <summary>
+        /// Reads the entries of a features file.  An empty list is returned if the features file does not exist or has an
+        /// unrecognized header.  Reading stops at the first entry that is incomplete (for example, if the session was
+        /// interrupted while the entry was being written).
+        /// </summary>
+        /// <param name="features_file_path">The path of the features file</param>
+        /// <returns>The features of each trial, in the order the trials were saved</returns>
+        public static List<MotorTrialFeatures> ReadFeaturesFile (string features_file_path)
+        {
+            List<MotorTrialFeatures> entries = new List<MotorTrialFeatures>();
+
+            try
+            {
+                if (!File.Exists(features_file_path))
+                {
+                    return entries;
+                }
+
+                byte[] features_bytes = File.ReadAllBytes(features_file_path);
+                if (features_bytes.Length < FileHeaderSize ||
+                    !features_bytes.Take(_file_signature.Length).SequenceEqual(_file_signature) ||
+                    BitConverter.ToInt32(features_bytes, _file_signature.Length) != FileVersion)
+                {
+                    return entries;
+                }
+
+                using (BinaryReader reader = new BinaryReader(new MemoryStream(features_bytes)))
+                {
+                    reader.BaseStream.Seek(FileHeaderSize, SeekOrigin.Begin);
+                    while (reader.BaseStream.Length - reader.BaseStream.Position >= EntrySize)
+                    {
+                        MotorTrialFeatures entry = new MotorTrialFeatures();
+                        entry.TrialNumber = reader.ReadUInt32();
+                        entry.Threshold = reader.ReadSingle();
+                        entry.PeakValue = reader.ReadSingle();
+                        entry.PeakIndex = reader.ReadInt32();
+                        entry.TimeToPeakInMilliseconds = reader.ReadSingle();
+                        entry.TimeAboveThresholdInMilliseconds = reader.ReadSingle();
+                        entry.AbsolutePeakValue = reader.ReadSingle();
+                        entry.AbsolutePeakIndex = reader.ReadInt32();
+                        entry.AbsoluteTimeToPeakInMilliseconds = reader.ReadSingle();
+                        entry.AbsoluteTimeAboveThresholdInMilliseconds = reader.ReadSingle();
+                        entry.HitLatencyInMilliseconds = reader.ReadSingle();
+                        entries.Add(entry);
+                    }
+                }
+            }
+            catch (Exception e)
+            {
+                ErrorLoggingService.GetInstance().LogExceptionError(e);
+                entries.Clear();
+            }
+
+            return entries;
+        }
+
+        #endregion
+    }
+}
@@ -1,6 +1,8 @@
 ﻿using IronPython.Hosting;
 using Microsoft.Scripting.Hosting;
 using System.Collections.Generic;
+using System.IO;
+using System.Linq;
 
 namespace MotoTrakBase
 {
@@ -18,6 +20,7 @@ namespace MotoTrakBase
         #region Singleton class
 
         private static PythonEngine _instance = null;
+        private static object _instance_lock = new object();
 
         private PythonEngine()
         {
@@ -27,14 +30,21 @@ namespace MotoTrakBase
             PythonScriptingEngine = Python.CreateEngine(options);
         }
 
+        /// <summary>
+        /// Gets the one and only instance of this class.  The engine is shared by every session running in this process,
+        /// so it may be requested from several threads at once.
+        /// </summary>
         public static PythonEngine GetInstance()
         {
-            if (_instance == null)
+            lock (_instance_lock)
             {
-                _instance = new PythonEngine();
-            }
+                if (_instance == null)
+                {
+                    _instance = new PythonEngine();
+                }
 
-            return _instance;
+                return _instance;
+            }
         }
 
         #endregion
@@ -57,5 +67,26 @@ namespace MotoTrakBase
         }
 
         #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Adds a folder to the list of folders that the python engine searches when a module is imported.
+        /// Modules imported from these folders are compiled once, and then shared by every script that imports them.
+        /// </summary>
+        /// <param name="path">The folder to add</param>
+        public void AddSearchPath (string path)
+        {
+            string full_path = Path.GetFullPath(path);
+            ICollection<string> search_paths = PythonScriptingEngine.GetSearchPaths();
+            if (!search_paths.Contains(full_path))
+            {
+                List<string> new_search_paths = search_paths.ToList();
+                new_search_paths.Add(full_path);
+                PythonScriptingEngine.SetSearchPaths(new_search_paths);
+            }
+        }
+
+        #endregion
     }
 }
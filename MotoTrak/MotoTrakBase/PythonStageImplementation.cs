@@ -12,15 +12,63 @@ namespace MotoTrakBase
     /// <summary>
     /// A shell class that implements IMotorStageImplementation and calls into IronPython code to execute the methods.
     /// </summary>
-    public class PythonStageImplementation : IMotorStageImplementation
+    public class PythonStageImplementation : IMotorStageImplementation, IMotorStageCheckpointable, IMotorTrialFeatureCalculator, IMotorStageFrameProcessor,
+        IMotorStageSignalBlockImplementation, IMotorStageShadowable
     {
         #region Private data members
 
         private ConcurrentDictionary<string, Tuple<string, string, bool>> _required_stage_parameters = new ConcurrentDictionary<string, Tuple<string, string, bool>>();
 
         private ScriptScope _pythonScriptScope = null;
+        private dynamic _pythonStageImplementationClass = null;
         private dynamic _pythonStageImplementationInstance;
 
+        //Each method of the Python instance is bound once, when the instance is created, so that calls do not look up the
+        //method by name.  Optional methods that the Python class does not define are left null.
+        private Action<List<MotoTrakSession>, MotorStage> _adjust_beginning_stage_parameters = null;
+        private Func<List<List<Int64>>, MotorStage, MotorDevice, List<List<double>>> _transform_signals = null;
+        private Func<List<List<double>>, int, MotorStage, int> _check_signal_for_trial_initiation = null;
+        private Func<MotorTrial, int, MotorStage, List<Tuple<MotorTrialEventType, int>>> _check_for_trial_event = null;
+        private Func<MotorTrial, MotorStage, List<MotorTrialAction>> _react_to_trial_events = null;
+        private Func<MotorTrial, MotorStage, List<MotorTrialAction>> _perform_action_during_trial = null;
+        private Func<int, MotorTrial, MotorStage, string> _create_end_of_trial_message = null;
+        private Func<MotorTrial, MotorStage, double> _calculate_y_value_for_session_overview_plot = null;
+        private Action<List<MotorTrial>, MotorTrial, MotorStage> _adjust_dynamic_stage_parameters = null;
+        private Func<MotoTrakSession, List<string>> _create_end_of_session_message = null;
+        private Action<MotoTrakSessionCheckpoint> _save_checkpoint_state = null;
+        private Action<MotoTrakSessionCheckpoint> _restore_checkpoint_state = null;
+        private Func<MotorTrial, MotorStage, MotorTrialFeatures> _calculate_trial_features = null;
+        private Action<MotorStageFrame> _process_frame = null;
+        private Action<MotorSignalBlock, MotorSignalBlock, MotorStage, MotorDevice> _transform_signal_block = null;
+        private Func<MotorSignalBlock, int, MotorStage, int> _check_signal_block_for_trial_initiation = null;
+        private Action<MotorStage> _prepare_shadow_session = null;
+
+        #endregion
+
+        #region Enumerations
+
+        /// <summary>
+        /// The ways in which a method of the Python instance can be called (see InvokePythonMethod)
+        /// </summary>
+        public enum DispatchStrategy
+        {
+            /// <summary>
+            /// ObjectOperations.InvokeMember of the script engine, which looks up the method by name on every call
+            /// </summary>
+            ScriptEngineOperations,
+
+            /// <summary>
+            /// Dynamitey's Dynamic.InvokeMember, which looks up the method by name on every call through a cached call site
+            /// </summary>
+            DynamiteyInvokeMember,
+
+            /// <summary>
+            /// A delegate that was bound to the method when the Python instance was created.  This is what the methods of this
+            /// class use.
+            /// </summary>
+            CachedDelegate
+        }
+
         #endregion
 
         #region Public properties
@@ -29,13 +77,35 @@ namespace MotoTrakBase
         /// The task definition as defined in the Python file
         /// </summary>
         public MotorTaskDefinition TaskDefinition = new MotorTaskDefinition();
+
+        /// <summary>
+        /// The name of the Python file (without its folder) that this stage implementation was loaded from
+        /// </summary>
+        public string ModuleFileName { get; private set; }
+
+        /// <summary>
+        /// Whether a stage implementation class was found in the Python file
+        /// </summary>
+        public bool IsStageClassFound
+        {
+            get
+            {
+                return (_pythonStageImplementationClass != null);
+            }
+        }
         
         #endregion
 
         #region Constructors
 
+        /// <summary>
+        /// Loads a stage implementation from a Python file, and creates an instance of the stage implementation class found in the file.
+        /// </summary>
+        /// <param name="python_script_file_path">The path of the Python file</param>
         public PythonStageImplementation(string python_script_file_path)
         {
+            ModuleFileName = System.IO.Path.GetFileName(python_script_file_path);
+
             PythonEngine engine = PythonEngine.GetInstance();
             _pythonScriptScope = engine.PythonScriptingEngine.CreateScope();
 
@@ -46,6 +116,11 @@ namespace MotoTrakBase
             var all_python_script_items = _pythonScriptScope.GetItems();
             var python_script_items = all_python_script_items.Where(x => x.Value is IronPython.Runtime.Types.PythonType);
 
+            //Find every class in the script that implements IMotorStageImplementation.  This includes any base classes
+            //that the script has imported (such as the shared stage runtime), so we take the most-derived class, which
+            //is the one that has the longest method resolution order.
+            dynamic python_stage_impl_class = null;
+            int python_stage_impl_mro_length = 0;
             foreach (var item in python_script_items)
             {
                 //Get the type of the python object
@@ -58,36 +133,27 @@ namespace MotoTrakBase
                     //Check to see if this type implements IMotorStageImplementation
                     if (implemented_interfaces.ToList().Contains(typeof(IMotorStageImplementation)))
                     {
-                        //If so, it is the class that we want
-                        var python_stage_impl_class = item.Value;
-                        _pythonStageImplementationInstance = python_stage_impl_class();
-
-                        //var class_to_instantiate = _pythonScriptScope.GetVariable(item.Key);
-                        //_pythonStageImplementationInstance = class_to_instantiate();
-                        
-                        var list_of_members = Dynamic.GetMemberNames(_pythonStageImplementationInstance);
-                        foreach (string member_name in list_of_members)
+                        var mro = _pythonScriptScope.Engine.Operations.GetMember(item.Value, "__mro__") as System.Collections.ICollection;
+                        int mro_length = (mro != null) ? mro.Count : 0;
+                        if (python_stage_impl_class == null || mro_length > python_stage_impl_mro_length)
                         {
-                            object member_object = null;
-                            bool success = _pythonScriptScope.Engine.Operations.TryGetMember(_pythonStageImplementationInstance, member_name, out member_object);
-                            if (success)
-                            {
-                                if (member_name.Equals("TaskDefinition"))
-                                {
-                                    TaskDefinition = member_object as MotorTaskDefinition;
-                                }                                
-                            }
+                            python_stage_impl_class = item.Value;
+                            python_stage_impl_mro_length = mro_length;
                         }
-                        
-                        //Set the class_found flag to be true
-                        class_found = true;
-
-                        //Break out of the loop.  Our work is finished.
-                        break;
                     }
                 }
             }
 
+            if (python_stage_impl_class != null)
+            {
+                //Instantiate the class that we want
+                _pythonStageImplementationClass = python_stage_impl_class;
+                InstantiatePythonClass();
+
+                //Set the class_found flag to be true
+                class_found = true;
+            }
+
             //If we couldn't find the python class, log the error and inform the user
             if (!class_found)
             {
@@ -96,63 +162,297 @@ namespace MotoTrakBase
             }
         }
 
+        /// <summary>
+        /// Creates a new instance of a stage implementation that has already been loaded.  The new instance shares the
+        /// compiled Python code of the loaded stage implementation, but holds its own session state.
+        /// </summary>
+        /// <param name="loaded_stage_implementation">The stage implementation that was loaded from a Python file</param>
+        private PythonStageImplementation(PythonStageImplementation loaded_stage_implementation)
+        {
+            ModuleFileName = loaded_stage_implementation.ModuleFileName;
+            _pythonScriptScope = loaded_stage_implementation._pythonScriptScope;
+            _pythonStageImplementationClass = loaded_stage_implementation._pythonStageImplementationClass;
+
+            if (_pythonStageImplementationClass != null)
+            {
+                InstantiatePythonClass();
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Creates a new instance of this stage implementation.  Stage implementations keep session state (adaptive
+        /// accumulators, pending rewards, session statistics, and so on), so each stage that runs in a session needs
+        /// its own instance.  The Python file is not loaded again.
+        /// </summary>
+        /// <returns>A new stage implementation</returns>
+        public PythonStageImplementation CreateInstance ()
+        {
+            return new PythonStageImplementation(this);
+        }
+
+        /// <summary>
+        /// Instantiates the Python stage implementation class, and retrieves the task definition from the new instance.
+        /// </summary>
+        private void InstantiatePythonClass ()
+        {
+            _pythonStageImplementationInstance = _pythonStageImplementationClass();
+
+            BindPythonMethods();
+
+            var list_of_members = Dynamic.GetMemberNames(_pythonStageImplementationInstance);
+            foreach (string member_name in list_of_members)
+            {
+                object member_object = null;
+                bool success = _pythonScriptScope.Engine.Operations.TryGetMember(_pythonStageImplementationInstance, member_name, out member_object);
+                if (success)
+                {
+                    if (member_name.Equals("TaskDefinition"))
+                    {
+                        TaskDefinition = member_object as MotorTaskDefinition;
+                    }
+                }
+            }
+        }
+
+        /// <summary>
+        /// Binds each method of the Python instance to a delegate.  This is done each time the Python class is instantiated,
+        /// so the delegates always belong to the current instance (and to the current version of the module).
+        /// </summary>
+        private void BindPythonMethods ()
+        {
+            _adjust_beginning_stage_parameters = BindPythonMethod<Action<List<MotoTrakSession>, MotorStage>>("AdjustBeginningStageParameters");
+            _transform_signals = BindPythonMethod<Func<List<List<Int64>>, MotorStage, MotorDevice, List<List<double>>>>("TransformSignals");
+            _check_signal_for_trial_initiation = BindPythonMethod<Func<List<List<double>>, int, MotorStage, int>>("CheckSignalForTrialInitiation");
+            _check_for_trial_event = BindPythonMethod<Func<MotorTrial, int, MotorStage, List<Tuple<MotorTrialEventType, int>>>>("CheckForTrialEvent");
+            _react_to_trial_events = BindPythonMethod<Func<MotorTrial, MotorStage, List<MotorTrialAction>>>("ReactToTrialEvents");
+            _perform_action_during_trial = BindPythonMethod<Func<MotorTrial, MotorStage, List<MotorTrialAction>>>("PerformActionDuringTrial");
+            _create_end_of_trial_message = BindPythonMethod<Func<int, MotorTrial, MotorStage, string>>("CreateEndOfTrialMessage");
+            _calculate_y_value_for_session_overview_plot = BindPythonMethod<Func<MotorTrial, MotorStage, double>>("CalculateYValueForSessionOverviewPlot");
+            _adjust_dynamic_stage_parameters = BindPythonMethod<Action<List<MotorTrial>, MotorTrial, MotorStage>>("AdjustDynamicStageParameters");
+            _create_end_of_session_message = BindPythonMethod<Func<MotoTrakSession, List<string>>>("CreateEndOfSessionMessage");
+            _calculate_trial_features = BindPythonMethod<Func<MotorTrial, MotorStage, MotorTrialFeatures>>("CalculateTrialFeatures");
+            _process_frame = BindPythonMethod<Action<MotorStageFrame>>("ProcessFrame");
+            _transform_signal_block = BindPythonMethod<Action<MotorSignalBlock, MotorSignalBlock, MotorStage, MotorDevice>>("TransformSignalBlock");
+            _check_signal_block_for_trial_initiation = BindPythonMethod<Func<MotorSignalBlock, int, MotorStage, int>>("CheckSignalBlockForTrialInitiation");
+            _prepare_shadow_session = BindPythonMethod<Action<MotorStage>>("PrepareShadowSession");
+
+            //Checkpoints are only supported if both methods are defined
+            _save_checkpoint_state = BindPythonMethod<Action<MotoTrakSessionCheckpoint>>("SaveCheckpointState");
+            _restore_checkpoint_state = BindPythonMethod<Action<MotoTrakSessionCheckpoint>>("RestoreCheckpointState");
+            if (_save_checkpoint_state == null || _restore_checkpoint_state == null)
+            {
+                _save_checkpoint_state = null;
+                _restore_checkpoint_state = null;
+            }
+        }
+
+        /// <summary>
+        /// Binds a method of the Python instance to a delegate of the given type.
+        /// </summary>
+        /// <typeparam name="T">The type of the delegate</typeparam>
+        /// <param name="method_name">The name of the method</param>
+        /// <returns>The delegate, or null if the Python instance does not have the method</returns>
+        private T BindPythonMethod<T> (string method_name) where T : class
+        {
+            object python_method = null;
+            if (_pythonScriptScope.Engine.Operations.TryGetMember(_pythonStageImplementationInstance, method_name, out python_method) &&
+                _pythonScriptScope.Engine.Operations.IsCallable(python_method))
+            {
+                return _pythonScriptScope.Engine.Operations.ConvertTo<T>(python_method);
+            }
+
+            return null;
+        }
+
+        /// <summary>
+        /// Calls a method of the Python instance by name, using the given dispatch strategy.  This is used to compare the cost
+        /// of each strategy (see the stage dispatch benchmark in SessionRunner); the methods of this class always use the
+        /// cached delegates.  The CachedDelegate strategy is only supported for the methods of IMotorStageImplementation
+        /// that are called on every frame.
+        /// </summary>
+        /// <param name="strategy">The dispatch strategy</param>
+        /// <param name="method_name">The name of the method</param>
+        /// <param name="args">The arguments of the method</param>
+        /// <returns>The return value of the method</returns>
+        public object InvokePythonMethod (DispatchStrategy strategy, string method_name, params object[] args)
+        {
+            switch (strategy)
+            {
+                case DispatchStrategy.ScriptEngineOperations:
+                    return _pythonScriptScope.Engine.Operations.InvokeMember(_pythonStageImplementationInstance, method_name, args);
+                case DispatchStrategy.DynamiteyInvokeMember:
+                    return Dynamic.InvokeMember(_pythonStageImplementationInstance, method_name, args);
+                default:
+                    switch (method_name)
+                    {
+                        case "TransformSignals":
+                            return TransformSignals((List<List<Int64>>)args[0], (MotorStage)args[1], (MotorDevice)args[2]);
+                        case "CheckSignalForTrialInitiation":
+                            return CheckSignalForTrialInitiation((List<List<double>>)args[0], (int)args[1], (MotorStage)args[2]);
+                        case "CheckForTrialEvent":
+                            return CheckForTrialEvent((MotorTrial)args[0], (int)args[1], (MotorStage)args[2]);
+                        case "ReactToTrialEvents":
+                            return ReactToTrialEvents((MotorTrial)args[0], (MotorStage)args[1]);
+                        case "PerformActionDuringTrial":
+                            return PerformActionDuringTrial((MotorTrial)args[0], (MotorStage)args[1]);
+                        default:
+                            throw new NotSupportedException("No cached delegate is available for " + method_name);
+                    }
+            }
+        }
+
         #endregion
 
         #region Implementation of IMotorStageImplementation
 
         public void AdjustBeginningStageParameters(List<MotoTrakSession> recent_behavior_sessions, MotorStage current_session_stage)
         {
-            Dynamic.InvokeMemberAction(_pythonStageImplementationInstance, "AdjustBeginningStageParameters",
-                recent_behavior_sessions, current_session_stage);
+            _adjust_beginning_stage_parameters(recent_behavior_sessions, current_session_stage);
         }
 
         public List<List<double>> TransformSignals(List<List<Int64>> new_data_from_controller, MotorStage stage, MotorDevice device)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "TransformSignals", new_data_from_controller, stage, device);
+            return _transform_signals(new_data_from_controller, stage, device);
         }
 
         public int CheckSignalForTrialInitiation(List<List<double>> signal, int new_datapoint_count, MotorStage stage)
         {
-            //Option 1 (slower):
-            //return PythonEngine.GetInstance().PythonScriptingEngine.Operations.InvokeMember(_pythonStageImplementationInstance, "CheckSignalForTrialInitiation",
-            //    signal, new_datapoint_count, stage);   
-            //Option 2 (faster):
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "CheckSignalForTrialInitiation", signal, new_datapoint_count, stage);
+            //Looking the method up by name on each call is slower (with either Operations.InvokeMember or Dynamic.InvokeMember)
+            //than calling the delegate that was bound when the instance was created
+            return _check_signal_for_trial_initiation(signal, new_datapoint_count, stage);
         }
 
         public List<Tuple<MotorTrialEventType, int>> CheckForTrialEvent(MotorTrial trial, int new_datapoint_count, MotorStage stage)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "CheckForTrialEvent", trial, new_datapoint_count, stage);
+            return _check_for_trial_event(trial, new_datapoint_count, stage);
         }
 
         public List<MotorTrialAction> ReactToTrialEvents(MotorTrial trial, MotorStage stage)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "ReactToTrialEvents", trial, stage);
+            return _react_to_trial_events(trial, stage);
         }
 
         public List<MotorTrialAction> PerformActionDuringTrial(MotorTrial trial, MotorStage stage)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "PerformActionDuringTrial", trial, stage);
+            return _perform_action_during_trial(trial, stage);
         }
 
         public string CreateEndOfTrialMessage(int trial_number, MotorTrial trial, MotorStage stage)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "CreateEndOfTrialMessage", trial_number, trial, stage);
+            return _create_end_of_trial_message(trial_number, trial, stage);
         }
 
         public double CalculateYValueForSessionOverviewPlot(MotorTrial trial, MotorStage stage)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "CalculateYValueForSessionOverviewPlot", trial, stage);
+            return _calculate_y_value_for_session_overview_plot(trial, stage);
         }
 
         public void AdjustDynamicStageParameters(List<MotorTrial> all_trials, MotorTrial current_trial, MotorStage stage)
         {
-            Dynamic.InvokeMemberAction(_pythonStageImplementationInstance, "AdjustDynamicStageParameters", all_trials, current_trial, stage);
+            _adjust_dynamic_stage_parameters(all_trials, current_trial, stage);
         }
 
         public List<string> CreateEndOfSessionMessage(MotoTrakSession current_session)
         {
-            return Dynamic.InvokeMember(_pythonStageImplementationInstance, "CreateEndOfSessionMessage", current_session);
+            return _create_end_of_session_message(current_session);
+        }
+
+        #endregion
+
+        #region Implementation of IMotorStageCheckpointable
+
+        public void SaveCheckpointState(MotoTrakSessionCheckpoint checkpoint)
+        {
+            //Stage implementations that do not derive from the shared stage runtime have no checkpoint state of their own
+            if (_save_checkpoint_state != null)
+            {
+                _save_checkpoint_state(checkpoint);
+            }
+        }
+
+        public void RestoreCheckpointState(MotoTrakSessionCheckpoint checkpoint)
+        {
+            if (_restore_checkpoint_state != null)
+            {
+                _restore_checkpoint_state(checkpoint);
+            }
+        }
+
+        #endregion
+
+        #region Implementation of IMotorStageShadowable
+
+        public void PrepareShadowSession(MotorStage stage)
+        {
+            //AdjustBeginningStageParameters is never called for a shadow stage, because it may change the stage or move the
+            //autopositioner, so stage implementations that do not define this method start from their initial state
+            if (_prepare_shadow_session != null)
+            {
+                _prepare_shadow_session(stage);
+            }
+        }
+
+        #endregion
+
+        #region Implementation of IMotorTrialFeatureCalculator
+
+        public MotorTrialFeatures CalculateTrialFeatures(MotorTrial trial, MotorStage stage)
+        {
+            //Stage implementations that do not derive from the shared stage runtime do not calculate trial features
+            if (_calculate_trial_features != null)
+            {
+                return _calculate_trial_features(trial, stage);
+            }
+
+            return null;
+        }
+
+        #endregion
+
+        #region Implementation of IMotorStageFrameProcessor
+
+        public bool ProcessFrame(MotorStageFrame frame)
+        {
+            //One call into Python handles the whole frame, instead of one call for each step of the frame.  Stage implementations
+            //that do not derive from the shared stage runtime are called one step at a time by MotoTrak instead.
+            if (_process_frame != null)
+            {
+                _process_frame(frame);
+                return true;
+            }
+
+            return false;
+        }
+
+        #endregion
+
+        #region Implementation of IMotorStageSignalBlockImplementation
+
+        public void TransformSignalBlock(MotorSignalBlock new_data_from_controller, MotorSignalBlock transformed_new_data, MotorStage stage, MotorDevice device)
+        {
+            //Stage implementations that do not derive from the shared stage runtime are handed the data as lists
+            if (_transform_signal_block != null)
+            {
+                _transform_signal_block(new_data_from_controller, transformed_new_data, stage, device);
+            }
+            else
+            {
+                MotorSignalBlockAdapter.TransformSignals(this, new_data_from_controller, transformed_new_data, stage, device);
+            }
+        }
+
+        public int CheckSignalBlockForTrialInitiation(MotorSignalBlock signal, int new_datapoint_count, MotorStage stage)
+        {
+            if (_check_signal_block_for_trial_initiation != null)
+            {
+                return _check_signal_block_for_trial_initiation(signal, new_datapoint_count, stage);
+            }
+
+            return MotorSignalBlockAdapter.CheckSignalForTrialInitiation(this, signal, new_datapoint_count, stage);
         }
 
         #endregion
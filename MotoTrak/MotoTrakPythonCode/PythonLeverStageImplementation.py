@@ -5,58 +5,46 @@ from System import Tuple
 
 import System
 clr.ImportExtensions(System.Linq)
-from System.Linq import Enumerable
 
 clr.AddReference('MotoTrakBase')
-from MotoTrakBase import IMotorStageImplementation
-from MotoTrakBase import MotorStage
 from MotoTrakBase import MotorTrialResult
-from MotoTrakBase import MotorTrialAction
-from MotoTrakBase import MotorTrialActionType
-from MotoTrakBase import MotorStageStimulationType
-from MotoTrakBase import MotorStageAdaptiveThresholdType
 from MotoTrakBase import MotoTrak_V1_CommonParameters
 from MotoTrakBase import MotorTrialEventType
 from MotoTrakBase import MotorDeviceType
-from MotoTrakBase import MotoTrakAutopositioner
+from MotoTrakBase import MotoTrakAutopositionerController
 from MotoTrakBase import MotorStageParameter
-from MotoTrakBase import MotorTaskDefinition
 from MotoTrakBase import MotorTaskParameter
 
 clr.AddReference('MotoTrakUtilities')
 from MotoTrakUtilities import MotorMath
 
-class PythonLeverStageImplementation (IMotorStageImplementation):
+from MotoTrakStageRuntime import PythonStageImplementationBase
+
+class PythonLeverStageImplementation (PythonStageImplementationBase):
 
     #Variables needed for this task to operate
-    Inter_Press_Interval_List = []
-    Inter_Press_Interval_Threshold_List = []
-    Press_Count_List = []
     
     inter_press_interval = 0
     press_count = 0
 
     Minimum_Trial_Count_To_Consider_Previous_Session = 10
     Autopositioner_Between_Session_Trial_Interval = 40
-    Autopositioner_Trial_Interval = 30
-    Autopositioner_Trial_Count_Handled = []
+    Autopositioner_Controller = MotoTrakAutopositionerController(MilestoneInterval = 30, PositionSchedule = List[System.Double]([0.5, 1.0, 1.5, 2.0]), MaximumPosition = 2.0)
 
-    #Declare string parameters for this stage
-    TaskDefinition = MotorTaskDefinition()
-    
     def __init__(self):
+        PythonStageImplementationBase.__init__(self)
 
-        PythonLeverStageImplementation.TaskDefinition.TaskName = "Lever Task"
-        PythonLeverStageImplementation.TaskDefinition.TaskDescription = "The lever task requires an animal to press a lever (once or multiple times) to receive a reward."
-        PythonLeverStageImplementation.TaskDefinition.RequiredDeviceType = MotorDeviceType.Lever
-        PythonLeverStageImplementation.TaskDefinition.OutputTriggerOptions = List[System.String](["Off", "On", "Beginning of every trial"])
+        self.TaskDefinition.TaskName = "Lever Task"
+        self.TaskDefinition.TaskDescription = "The lever task requires an animal to press a lever (once or multiple times) to receive a reward."
+        self.TaskDefinition.RequiredDeviceType = MotorDeviceType.Lever
+        self.TaskDefinition.OutputTriggerOptions = List[System.String](["Off", "On", "Beginning of every trial"])
 
-        PythonLeverStageImplementation.TaskDefinition.HitWindowDuration.IsAdaptive = True
-        PythonLeverStageImplementation.TaskDefinition.HitWindowDuration.IsAdaptabilityCustomizeable = True
-        PythonLeverStageImplementation.TaskDefinition.HitWindowDuration.ParameterDescription = "In the lever task, the hit window can adaptively shrink or grow based on an animal's inter-press interval performance."
+        self.TaskDefinition.HitWindowDuration.IsAdaptive = True
+        self.TaskDefinition.HitWindowDuration.IsAdaptabilityCustomizeable = True
+        self.TaskDefinition.HitWindowDuration.ParameterDescription = "In the lever task, the hit window can adaptively shrink or grow based on an animal's inter-press interval performance."
 
-        PythonLeverStageImplementation.TaskDefinition.DevicePosition.IsAdaptive = True
-        PythonLeverStageImplementation.TaskDefinition.DevicePosition.IsAdaptabilityCustomizeable = False
+        self.TaskDefinition.DevicePosition.IsAdaptive = True
+        self.TaskDefinition.DevicePosition.IsAdaptabilityCustomizeable = False
 
         hit_threshold_parameter = MotorTaskParameter(MotoTrak_V1_CommonParameters.HitThreshold, "presses", False, True, True)
         initiation_threshold_parameter = MotorTaskParameter(MotoTrak_V1_CommonParameters.InitiationThreshold, "degrees", True, False, False)
@@ -65,25 +53,22 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         press_counting_parameter = MotorTaskParameter("Method for counting presses", "0 = count on downward motion; 1 = count on release motion", False, False, False)
         use_previous_session_final_threshold = MotorTaskParameter("Use the previous session's final hit threshold as the starting threshold", "nominal", False, False, False, False, List[System.String](["No", "Yes"]), 0, "No")        
 
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(hit_threshold_parameter)
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(initiation_threshold_parameter)
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(lever_full_press_parameter)
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(lever_release_point_parameter)
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(press_counting_parameter)
-        PythonLeverStageImplementation.TaskDefinition.TaskParameters.Add(use_previous_session_final_threshold)
+        self.TaskDefinition.TaskParameters.Add(hit_threshold_parameter)
+        self.TaskDefinition.TaskParameters.Add(initiation_threshold_parameter)
+        self.TaskDefinition.TaskParameters.Add(lever_full_press_parameter)
+        self.TaskDefinition.TaskParameters.Add(lever_release_point_parameter)
+        self.TaskDefinition.TaskParameters.Add(press_counting_parameter)
+        self.TaskDefinition.TaskParameters.Add(use_previous_session_final_threshold)
         
         return
 
     def AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage):
 
-        PythonLeverStageImplementation.Inter_Press_Interval_List = []
-        PythonLeverStageImplementation.Inter_Press_Interval_Threshold_List = []
-        PythonLeverStageImplementation.Press_Count_List = []
-        PythonLeverStageImplementation.Autopositioner_Trial_Count_Handled = []
+        self.ResetSessionState()
 
         position_to_set = -1.0
 
-        behavior_sessions_to_test = recent_behavior_sessions.Where(lambda x: x.Trials.Count >= PythonLeverStageImplementation.Autopositioner_Between_Session_Trial_Interval).ToList()
+        behavior_sessions_to_test = recent_behavior_sessions.Where(lambda x: x.Trials.Count >= self.Autopositioner_Between_Session_Trial_Interval).ToList()
         last_behavior_session = behavior_sessions_to_test.LastOrDefault()
         next_to_last_behavior_session = None
         if (behavior_sessions_to_test.Count > 1):
@@ -101,13 +86,13 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         #Set the position of the autopositioner if it is supposed to be adaptively set
         if current_session_stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable:
             current_session_stage.Position.CurrentValue = position_to_set
-            MotoTrakAutopositioner.GetInstance().SetPosition(position_to_set)
+            current_session_stage.Autopositioner.SetPosition(position_to_set)
 
         #Set the beginning degree threshold based on the previous session if the stage requires it
-        behavior_sessions_to_test = recent_behavior_sessions.Where(lambda x: x.Trials.Count >= PythonLeverStageImplementation.Minimum_Trial_Count_To_Consider_Previous_Session).ToList()
+        behavior_sessions_to_test = recent_behavior_sessions.Where(lambda x: x.Trials.Count >= self.Minimum_Trial_Count_To_Consider_Previous_Session).ToList()
         last_behavior_session = behavior_sessions_to_test.LastOrDefault()
-        lever_full_press_threshold_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[2].ParameterName
-        use_previous_session_final_threshold_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[5].ParameterName
+        lever_full_press_threshold_parameter_name = self.TaskDefinition.TaskParameters[2].ParameterName
+        use_previous_session_final_threshold_parameter_name = self.TaskDefinition.TaskParameters[5].ParameterName
         if current_session_stage.StageParameters.ContainsKey(use_previous_session_final_threshold_parameter_name):
             if last_behavior_session is not None:
                 last_trial = last_behavior_session.Trials.LastOrDefault()
@@ -120,24 +105,12 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
             
         return
 
-    def TransformSignals(self, new_data_from_controller, stage, device):
-        result = List[List[System.Double]]()
-        for i in range(0, new_data_from_controller.Count):
-            stream_data = new_data_from_controller[i]
-            transformed_stream_data = List[System.Double]()
-            if (i is 1):
-                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: System.Double(device.Slope * (x - device.Baseline))).ToList())
-            else:
-                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: System.Double(x)).ToList())
-            result.Add(transformed_stream_data)
-        return result
-
     def CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage):
         #Create the value that will be our return value
         return_value = -1
 
         #Get the name of the initiation threshold parameter
-        initiation_threshold_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[1].ParameterName
+        initiation_threshold_name = self.TaskDefinition.TaskParameters[1].ParameterName
 
         #Look to see if the Initiation Threshold key exists
         if stage.StageParameters.ContainsKey(initiation_threshold_name):
@@ -166,7 +139,7 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
                 if did_cross_initiation_threshold:
                     #Reset the inter-press-interval for the upcoming trial
-                    PythonLeverStageImplementation.inter_press_interval = 0
+                    self.inter_press_interval = 0
 
                     #Set the return value
                     return_value = stream_data_to_use.IndexOf(maximal_value) + difference_in_size
@@ -178,16 +151,16 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         result = List[Tuple[MotorTrialEventType, System.Int32]]()
 
         #Get the name of the hit threshold parameter
-        hit_threshold_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[0].ParameterName
+        hit_threshold_parameter_name = self.TaskDefinition.TaskParameters[0].ParameterName
 
         #Get the name of the lever full press parameter
-        full_press_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[2].ParameterName
+        full_press_parameter_name = self.TaskDefinition.TaskParameters[2].ParameterName
 
         #Get the name of the lever release point parameter
-        release_point_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[3].ParameterName
+        release_point_parameter_name = self.TaskDefinition.TaskParameters[3].ParameterName
 
         #Get the name of the feed-on-press/feed-on-release parameter
-        press_counting_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[4].ParameterName
+        press_counting_parameter_name = self.TaskDefinition.TaskParameters[4].ParameterName
 
         #Get the value of the press counting parameter
         press_counting_parameter_value = 0
@@ -209,7 +182,7 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
                 #We must analyze the signal to determine how many "presses" have occurred
 
                 #Let's keep a press count, as well as indices of each press, and a current state.
-                PythonLeverStageImplementation.press_count = 0
+                self.press_count = 0
                 indices_of_presses = List[System.Int32]()
                 press_state = 0;   #0 = released, 1 = pressed
 
@@ -224,7 +197,7 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
                                 #If we are counting presses based on downward motion
                                 if (press_counting_parameter_value != 1):
-                                    PythonLeverStageImplementation.press_count = PythonLeverStageImplementation.press_count + 1
+                                    self.press_count = self.press_count + 1
                                     indices_of_presses.Add(i)
 
                         elif (press_state == 1):
@@ -234,18 +207,18 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
                                 #If we are counting presses based on releasing motion
                                 if (press_counting_parameter_value == 1):
-                                    PythonLeverStageImplementation.press_count = PythonLeverStageImplementation.press_count + 1
+                                    self.press_count = self.press_count + 1
                                     indices_of_presses.Add(i)
 
                 #If 2 hits have been detected, add a result to return to the caller
-                if (PythonLeverStageImplementation.press_count >= stage.StageParameters[hit_threshold_parameter_name].CurrentValue):
+                if (self.press_count >= stage.StageParameters[hit_threshold_parameter_name].CurrentValue):
                     #Create a successful trial result
                     result.Add(Tuple[MotorTrialEventType, int](MotorTrialEventType.SuccessfulTrial, indices_of_presses[indices_of_presses.Count-1]))
 
                     #Calculate the inter-press interval for this trial
                     indices_between_presses = MotorMath.DiffInt(indices_of_presses)
                     avg_indices_bw_presses = indices_between_presses.Average();
-                    PythonLeverStageImplementation.inter_press_interval = avg_indices_bw_presses * stage.SamplePeriodInMilliseconds
+                    self.inter_press_interval = avg_indices_bw_presses * stage.SamplePeriodInMilliseconds
 
             except ValueError:
                 pass
@@ -253,43 +226,10 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         #Return the result
         return result
 
-    def ReactToTrialEvents(self, trial, stage):
-        result = List[MotorTrialAction]()
-        trial_events = trial.TrialEvents.Where(lambda x: x.Handled is False)
-        for evt in trial_events:
-            event_type = evt.EventType
-            evt.Handled = True
-
-            #If a trial has been initiated, and the output trigger type is set to trigger on every trial initiation,
-            #then send an output trigger
-            if event_type.value__ is MotorTrialEventType.TrialInitiation.value__:
-                output_trigger_type = str(stage.OutputTriggerType)
-                if output_trigger_type.lower() == "Beginning of every trial".lower():
-                    new_stim_action = MotorTrialAction()
-                    new_stim_action.ActionType = MotorTrialActionType.SendStimulationTrigger
-                    result.Add(new_stim_action)
-
-            #If a successful trial occurred
-            if event_type.value__ is MotorTrialEventType.SuccessfulTrial.value__:
-                #If a successful trial happened, then feed the animal
-                new_action = MotorTrialAction()
-                new_action.ActionType = MotorTrialActionType.TriggerFeeder
-                result.Add(new_action)
-
-                #If stimulation is on for this stage, stimulate the animal
-                output_trigger_type = str(stage.OutputTriggerType)
-                if output_trigger_type.lower() == "On".lower():
-                    new_stim_action = MotorTrialAction()
-                    new_stim_action.ActionType = MotorTrialActionType.SendStimulationTrigger
-                    result.Add(new_stim_action)
-
-        return result
-
-    def PerformActionDuringTrial(self, trial, stage):
-        result = List[MotorTrialAction]()
-        return result
-
     def CreateEndOfTrialMessage(self, trial_number, trial, stage):
+        #Count this trial in the session statistics
+        self.Session_Statistics.AddTrial(trial)
+
         msg = ""
         msg += System.DateTime.Now.ToShortTimeString() + ", "
         msg += "Trial " + str(trial_number) + " "
@@ -299,46 +239,46 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
             msg += "MISS"
 
         #Add the number of presses from this trial to the press count list
-        PythonLeverStageImplementation.Press_Count_List.Add(PythonLeverStageImplementation.press_count)
+        self.Session_Statistics.AddValue("Press Count", self.press_count)
 
         #Add the press count to the message to the user
-        if (PythonLeverStageImplementation.press_count is 1):
-            msg += ", " + str(PythonLeverStageImplementation.press_count) + " press"
+        if (self.press_count is 1):
+            msg += ", " + str(self.press_count) + " press"
         else:
-            msg += ", " + str(PythonLeverStageImplementation.press_count) + " presses"
+            msg += ", " + str(self.press_count) + " presses"
 
         #If the number of presses is greater than 1, add the isi to the isi list
-        if PythonLeverStageImplementation.press_count > 1:
-            PythonLeverStageImplementation.Inter_Press_Interval_List.Add(PythonLeverStageImplementation.inter_press_interval)
+        if self.press_count > 1:
+            self.Session_Statistics.AddValue("Inter-Press Interval", self.inter_press_interval)
 
             #Finish the message to display to the user
-            msg += ", inter-press interval: " + str(PythonLeverStageImplementation.inter_press_interval) + " ms"
+            msg += ", inter-press interval: " + str(self.inter_press_interval) + " ms"
 
         #Add the inter-press interval threshold for the trial to the threshold list
-        PythonLeverStageImplementation.Inter_Press_Interval_Threshold_List.Add(stage.HitWindowInSeconds.CurrentValue * 1000)
+        self.Session_Statistics.AddValue("Inter-Press Interval Threshold", stage.HitWindowInSeconds.CurrentValue * 1000)
 
         return msg
 
     def CalculateYValueForSessionOverviewPlot(self, trial, stage):
-        return PythonLeverStageImplementation.inter_press_interval
+        return self.inter_press_interval
 
     def AdjustDynamicStageParameters(self, all_trials, current_trial, stage):        
 
         was_successful_trial = current_trial.Result == MotorTrialResult.Hit
 
         #Get the name of the hit threshold parameter
-        hit_threshold_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[0].ParameterName
+        hit_threshold_parameter_name = self.TaskDefinition.TaskParameters[0].ParameterName
 
         #Get the name of the lever full press parameter
-        full_press_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[2].ParameterName
+        full_press_parameter_name = self.TaskDefinition.TaskParameters[2].ParameterName
 
         #Get the name of the lever release point parameter
-        release_point_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[3].ParameterName
+        release_point_parameter_name = self.TaskDefinition.TaskParameters[3].ParameterName
 
         #Adjust the hit window duration if necessary.  This is adjusted according to the isi of recent trials
         if stage.HitWindowInSeconds.ParameterType == MotorStageParameter.StageParameterType.Variable:
-            isi_to_add = PythonLeverStageImplementation.inter_press_interval
-            if PythonLeverStageImplementation.press_count is 1 or PythonLeverStageImplementation.inter_press_interval is 0:
+            isi_to_add = self.inter_press_interval
+            if self.press_count is 1 or self.inter_press_interval is 0:
                 isi_to_add = stage.HitWindowInSeconds.MaximumValue * 1000
             stage.HitWindowInSeconds.History.Enqueue(System.Double(isi_to_add) / System.Double(1000))
             stage.HitWindowInSeconds.CalculateAndSetBoundedCurrentValue(was_successful_trial)
@@ -365,21 +305,11 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
         #Adjust the number of presses hit threshold if necessary
         if stage.StageParameters[hit_threshold_parameter_name].ParameterType == MotorStageParameter.StageParameterType.Variable:
-            stage.StageParameters[hit_threshold_parameter_name].History.Enqueue(PythonLeverStageImplementation.press_count)
+            stage.StageParameters[hit_threshold_parameter_name].History.Enqueue(self.press_count)
             stage.StageParameters[hit_threshold_parameter_name].CalculateAndSetBoundedCurrentValue(was_successful_trial)
             
         #Adjust the position of the auto-positioner, according to the stage settings
-        if stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable:
-            hit_count = all_trials.Where(lambda t: t.Result == MotorTrialResult.Hit).Count()
-            hit_count_modulus = hit_count % PythonLeverStageImplementation.Autopositioner_Trial_Interval
-            if hit_count > 0 and hit_count_modulus is 0:
-                if not PythonLeverStageImplementation.Autopositioner_Trial_Count_Handled.Contains(hit_count):
-                    if stage.Position.CurrentValue < 2.0:
-                        PythonLeverStageImplementation.Autopositioner_Trial_Count_Handled.append(hit_count)
-                        stage.Position.CurrentValue = stage.Position.CurrentValue + 0.5
-                        if stage.Position.CurrentValue is -0.5 or stage.Position.CurrentValue is 0:
-                            stage.Position.CurrentValue = 0.5
-                        MotoTrakAutopositioner.GetInstance().SetPosition(stage.Position.CurrentValue)
+        self.Autopositioner_Controller.RegisterTrial(current_trial, stage)
 
         return
 
@@ -387,7 +317,7 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
         #Set the beginning degree threshold based on the previous session if the stage requires it
         full_press_threshold_value = 0
-        lever_full_press_threshold_parameter_name = PythonLeverStageImplementation.TaskDefinition.TaskParameters[2].ParameterName
+        lever_full_press_threshold_parameter_name = self.TaskDefinition.TaskParameters[2].ParameterName
         if current_session.SelectedStage.StageParameters.ContainsKey(lever_full_press_threshold_parameter_name):
             full_press_threshold_value = current_session.SelectedStage.StageParameters[lever_full_press_threshold_parameter_name]
             last_trial = current_session.Trials.LastOrDefault()
@@ -398,21 +328,15 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
 
 
         # Find the number of feedings that occurred in this session
-        number_of_feedings = current_session.Trials.Where(lambda x: x.Result == MotorTrialResult.Hit).Count();
+        number_of_feedings = self.Session_Statistics.HitCount
 
         #Find the median number of presses that occurred per trial
-        net_press_count_list = List[System.Double]()
-        for i in PythonLeverStageImplementation.Press_Count_List:
-            net_press_count_list.Add(i)
-        median_press_count = MotorMath.Median(net_press_count_list)
+        median_press_count = self.Session_Statistics.Median("Press Count")
         if (System.Double.IsNaN(median_press_count)):
             median_press_count = 0
 
         #Find the median inter-press interval:
-        net_isi_list = List[System.Double]()
-        for i in PythonLeverStageImplementation.Inter_Press_Interval_List:
-            net_isi_list.Add(i)
-        median_isi = MotorMath.Median(net_isi_list)
+        median_isi = self.Session_Statistics.Median("Inter-Press Interval")
         if (System.Double.IsNaN(median_isi)):
             median_isi = 0
 
@@ -421,14 +345,11 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         hit_rate = 0
         trial_count = current_session.Trials.Count
         if trial_count > 0:
-            hit_count = net_isi_list.Where(lambda x: x <= minimum_possible_isi).Count() 
+            hit_count = self.Session_Statistics.CountAtOrBelow("Inter-Press Interval", minimum_possible_isi)
             hit_rate = (System.Double(hit_count) / System.Double(trial_count)) * 100
 
         #Find the median isi threshold
-        net_isi_thresh_list = List[System.Double]()
-        for i in PythonLeverStageImplementation.Inter_Press_Interval_Threshold_List:
-            net_isi_thresh_list.Add(i)
-        median_isi_thresh = MotorMath.Median(net_isi_thresh_list)
+        median_isi_thresh = self.Session_Statistics.Median("Inter-Press Interval Threshold")
         if (System.Double.IsNaN(median_isi_thresh)):
             median_isi_thresh = 0
 
@@ -442,4 +363,4 @@ class PythonLeverStageImplementation (IMotorStageImplementation):
         end_of_session_messages.Add("Median inter-press interval threshold: " + System.Convert.ToInt32(median_isi_thresh).ToString())
         end_of_session_messages.Add("Final full-press degree threshold: " + System.Convert.ToInt32(full_press_threshold_value).ToString())
 
-        return end_of_session_messages
\ No newline at end of file
+        return end_of_session_messages
@@ -1,59 +1,42 @@
 import clr
 clr.AddReference('System.Core')
 from System.Collections.Generic import List
-from System import Tuple
 from System import Math
 
 import System
 clr.ImportExtensions(System.Linq)
-from System.Linq import Enumerable
 
 clr.AddReference('MotoTrakBase')
-from MotoTrakBase import IMotorStageImplementation
-from MotoTrakBase import MotorStage
 from MotoTrakBase import MotorTrialResult
-from MotoTrakBase import MotorTrialAction
-from MotoTrakBase import MotorTrialActionType
-from MotoTrakBase import MotorStageStimulationType
-from MotoTrakBase import MotorStageAdaptiveThresholdType
 from MotoTrakBase import MotoTrak_V1_CommonParameters
-from MotoTrakBase import MotorTrialEventType
 from MotoTrakBase import MotorDeviceType
-from MotoTrakBase import MotoTrakAutopositioner
-from MotoTrakBase import MotorStageParameter
-from MotoTrakBase import MotorTaskDefinition
+from MotoTrakBase import MotoTrakAutopositionerController
+from MotoTrakBase import MotoTrakStartingPositionTable
 from MotoTrakBase import MotorTaskParameter
-from MotoTrakBase import MotoTrakSession
 
 clr.AddReference('MotoTrakUtilities')
 from MotoTrakUtilities import MotorMath
+from MotoTrakUtilities import StreamingPeakDetector
 
-class PythonPullStageImplementation_TXBDC_PullWindowEric (IMotorStageImplementation):
+from MotoTrakStageRuntime import PythonForceWindowStageImplementationBase
 
-    #Variables used by this task
-    Autopositioner_Trial_Interval = 50
-    Autopositioner_Trial_Count_Handled = []
-    Maximal_Force_List = []
-    Force_Threshold_List = []
-    Mean_Peak_List_Last_Ten = []
-    Mean_Peak_List_All_Trials = []
-    Std_Dev_List = []
-
-    Position_Of_Last_Trough = 0
-    Position_Of_Hit = 0
+class PythonPullStageImplementation_TXBDC_PullWindowEric (PythonForceWindowStageImplementationBase):
 
-    #Declare string parameters for this stage
-    TaskDefinition = MotorTaskDefinition()
+    #Variables used by this task
+    Autopositioner_Controller = MotoTrakAutopositionerController(MilestoneInterval = 50, PositionStep = 0.5, MaximumPosition = 2.0)
+    Starting_Position_Table = MotoTrakStartingPositionTable(DefaultPosition = -1.0, HitThresholds = List[System.Int32]([50, 100, 150, 200, 250, 300]), Positions = List[System.Double]([-0.5, 0.0, 0.5, 1.0, 1.5, 2.0]))
 
     def __init__(self):
+        PythonForceWindowStageImplementationBase.__init__(self)
+        self.Mean_Peak_List_Last_Ten = []
 
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskName = "Pull Task with force window (TXBDC Eric Version)"
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskDescription = "This version of the pull task has an upper and a lower bound to the force. The rat must maintain force within the window."
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.RequiredDeviceType = MotorDeviceType.Pull
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.OutputTriggerOptions = List[System.String](["Off", "On", "Beginning of every trial"])
+        self.TaskDefinition.TaskName = "Pull Task with force window (TXBDC Eric Version)"
+        self.TaskDefinition.TaskDescription = "This version of the pull task has an upper and a lower bound to the force. The rat must maintain force within the window."
+        self.TaskDefinition.RequiredDeviceType = MotorDeviceType.Pull
+        self.TaskDefinition.OutputTriggerOptions = List[System.String](["Off", "On", "Beginning of every trial"])
 
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.DevicePosition.IsAdaptive = True
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.DevicePosition.IsAdaptabilityCustomizeable = False
+        self.TaskDefinition.DevicePosition.IsAdaptive = True
+        self.TaskDefinition.DevicePosition.IsAdaptabilityCustomizeable = False
 
         lower_bound_parameter = MotorTaskParameter("Lower bound force threshold", "grams", True, True, True)
         upper_bound_parameter = MotorTaskParameter("Upper bound force threshold", "grams", True, True, True)
@@ -61,249 +44,80 @@ class PythonPullStageImplementation_TXBDC_PullWindowEric (IMotorStageImplementat
         mean_parameter = MotorTaskParameter("Mean force target", "grams", True, True, True)
         percent_stddev = MotorTaskParameter("Percent of standard deviation", "percent", False, True, True)
         
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters.Add(lower_bound_parameter)
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters.Add(upper_bound_parameter)
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters.Add(initiation_threshold_parameter)
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters.Add(mean_parameter)
-        PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters.Add(percent_stddev)
+        self.TaskDefinition.TaskParameters.Add(lower_bound_parameter)
+        self.TaskDefinition.TaskParameters.Add(upper_bound_parameter)
+        self.TaskDefinition.TaskParameters.Add(initiation_threshold_parameter)
+        self.TaskDefinition.TaskParameters.Add(mean_parameter)
+        self.TaskDefinition.TaskParameters.Add(percent_stddev)
 
         return
 
     def AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage):
 
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Maximal_Force_List = []
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Force_Threshold_List = []
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Autopositioner_Trial_Count_Handled = []
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten = []
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Std_Dev_List = []
-        PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_All_Trials = []
-
-        #Take only recent behavior sessions that have at least 50 successful trials
-        total_hits = 0
-        for i in recent_behavior_sessions:
-            this_session_hits = i.Trials.Where(lambda x: x.Result == MotorTrialResult.Hit).Count()
-            if this_session_hits >= 1:
-                total_hits += this_session_hits
-                
-        #Now, based off the total number of hits that have occurred in previous sessions, set the position of the autopositioner
-        position = -1.0
-        if total_hits >= 50 and total_hits < 100:
-            position = -0.5
-        elif total_hits >= 100 and total_hits < 150:
-            position = 0.0
-        elif total_hits >= 150 and total_hits < 200:
-            position = 0.5
-        elif total_hits >= 200 and total_hits < 250:
-            position = 1.0
-        elif total_hits >= 250 and total_hits < 300:
-            position = 1.5
-        elif total_hits >= 300:
-            position = 2.0
-        
-        #Set the position of the autopositioner if it is supposed to be adaptively set
-        if current_session_stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable:
-            current_session_stage.Position.CurrentValue = position
-            MotoTrakAutopositioner.GetInstance().SetPosition(position)
+        PythonForceWindowStageImplementationBase.AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage)
+        self.Mean_Peak_List_Last_Ten = []
 
         return
 
-    def TransformSignals(self, new_data_from_controller, stage, device):
-        result = List[List[System.Double]]()
-        for i in range(0, new_data_from_controller.Count):
-            stream_data = new_data_from_controller[i]
-            transformed_stream_data = List[System.Double]()
-            if (i is 1):
-                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: System.Double(device.Slope * (x - device.Baseline))).ToList())
-            else:
-                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: System.Double(x)).ToList())
-            result.Add(transformed_stream_data)
-        return result
-
-    def CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage):
-        #Create the value that will be our return value
-        return_value = -1
-
-        #Get the name of the initiation threshold parameter
-        initiation_threshold_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[2].ParameterName
-
-        #Look to see if the Initiation Threshold key exists
-        if stage.StageParameters.ContainsKey(initiation_threshold_parameter_name):
-            #Get the stage's initiation threshold
-            init_thresh = stage.StageParameters[initiation_threshold_parameter_name].CurrentValue
-
-            #Get the data stream itself
-            stream_data = signal[1]
+    def PrepareShadowSession(self, stage):
 
-            #Check to make sure we actually have new data to work with before going on
-            if new_datapoint_count > 0 and new_datapoint_count <= stream_data.Count:
-                #Look only at the most recent data from the signal
-                stream_data_to_use = stream_data.Skip(stream_data.Count - new_datapoint_count).ToList()
+        PythonForceWindowStageImplementationBase.PrepareShadowSession(self, stage)
+        self.Mean_Peak_List_Last_Ten = []
 
-                #Calculate how many OLD elements there are
-                difference_in_size = stream_data.Count - stream_data_to_use.Count
-
-                #Retrieve the maximal value for the signal
-                maximal_value = stream_data_to_use.Max()
-
-                if maximal_value >= init_thresh:
-                    return_value = stream_data_to_use.IndexOf(maximal_value) + difference_in_size
-                    PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Last_Trough = return_value
-                    PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Hit = -1
-                
-        return return_value
-
-    def CheckForTrialEvent(self, trial, new_datapoint_count, stage):
-        #Instantiate a list of tuples that will hold any events that capture as a result of this function.
-        result = List[Tuple[MotorTrialEventType, System.Int32]]()
-
-        #Get the name of the lower bound force threshold
-        lower_bound_force_threshold_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[0].ParameterName
-
-        #Get the name of the upper bound force threshold
-        upper_bound_force_threshold_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[1].ParameterName
-
-        #Get the name of the initiation threshold parameter
-        initiation_threshold_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[2].ParameterName
-
-        #Only proceed if a hit threshold has been defined for this stage
-        if stage.StageParameters.ContainsKey(lower_bound_force_threshold_name) and \
-            stage.StageParameters.ContainsKey(upper_bound_force_threshold_name):
-
-            #Get the stream data from the device
-            stream_data = trial.TrialData[1]
-            
-            #Check to see if the hit threshold has been exceeded
-            current_lower_bound = stage.StageParameters[lower_bound_force_threshold_name].CurrentValue
-            current_upper_bound = stage.StageParameters[upper_bound_force_threshold_name].CurrentValue
-            current_initiation_threshold = stage.StageParameters[initiation_threshold_parameter_name].CurrentValue
-            
-            # 0 = unknown, -1 = invalid, 1 = valid
-            pull_state = 0;
-
-            #Now iterate over the signal
-            for i in range(0, stream_data.Count):
-                #Only look at samples within the hit window
-                if (i >= stage.TotalRecordedSamplesBeforeHitWindow) and (i < (stage.TotalRecordedSamplesBeforeHitWindow + stage.TotalRecordedSamplesDuringHitWindow)):
-                    
-                    if (stream_data[i] >= current_upper_bound):
-                        #If this datapoint is above the upper bound, set the pull state to be "invalid"
-                        pull_state = -1
-                    elif (pull_state != 1 and stream_data[i] < current_initiation_threshold):
-                        #Otherwise, if it is below the initiation threshold, set the pull state to be "unknown"    
-                        pull_state = 0
-                        PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Last_Trough = i
-                    elif (pull_state == 0):
-                        #Otherwise, if the pull state is unknown, and the pull is between the lower and upper bounds, set it to be valid
-                        if (stream_data[i] >= current_lower_bound and stream_data[i] < current_upper_bound):
-                            pull_state = 1
-                    
-                    #Check to see if a hit has occurred
-                    if (pull_state == 1 and stream_data[i] < current_lower_bound):
-                        #Add the point at which the success occurred to the result
-                        result.Add(Tuple[MotorTrialEventType, int](MotorTrialEventType.SuccessfulTrial, i))
-                        PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Hit = i
-
-                        #Break out of the loop to return the result immediately
-                        break
-
-        #Return the result
-        return result
-
-    def ReactToTrialEvents(self, trial, stage):
-        result = List[MotorTrialAction]()
-        trial_events = trial.TrialEvents.Where(lambda x: x.Handled is False)
-        for evt in trial_events:
-            event_type = evt.EventType
-            evt.Handled = True
-
-            #If a trial has been initiated, and the output trigger type is set to trigger on every trial initiation,
-            #then send an output trigger
-            if event_type.value__ is MotorTrialEventType.TrialInitiation.value__:
-                output_trigger_type = str(stage.OutputTriggerType)
-                if output_trigger_type.lower() == "Beginning of every trial".lower():
-                    new_stim_action = MotorTrialAction()
-                    new_stim_action.ActionType = MotorTrialActionType.SendStimulationTrigger
-                    result.Add(new_stim_action)
-
-            if event_type.value__ is MotorTrialEventType.SuccessfulTrial.value__:
-                #If a successful trial happened, then feed the animal
-                new_action = MotorTrialAction()
-                new_action.ActionType = MotorTrialActionType.TriggerFeeder
-                result.Add(new_action)
-
-                #If stimulation is on for this stage, stimulate the animal
-                output_trigger_type = str(stage.OutputTriggerType)
-                if output_trigger_type.lower() == "On".lower():
-                    new_stim_action = MotorTrialAction()
-                    new_stim_action.ActionType = MotorTrialActionType.SendStimulationTrigger
-                    result.Add(new_stim_action)
-
-        return result
-
-    def PerformActionDuringTrial(self, trial, stage):
-        result = List[MotorTrialAction]()
-        return result
+        return
 
     def CreateEndOfTrialMessage(self, trial_number, trial, stage):
+        #Count this trial in the session statistics
+        self.Session_Statistics.AddTrial(trial)
+
         msg = ""
         msg += System.DateTime.Now.ToShortTimeString() + ", "
 
         #Get the name of the mean force target parameter
-        mean_force_target_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[3].ParameterName
+        mean_force_target_parameter_name = self.TaskDefinition.TaskParameters[3].ParameterName
 
         #Grab the mean force target
         mean_force_target = stage.StageParameters[mean_force_target_parameter_name].CurrentValue
 
         peaks_std_msg = "(StdDev not yet calculated)"
-        if (len(PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten) == 10):
-            peaks_list = List[System.Double](PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten)
+        if (len(self.Mean_Peak_List_Last_Ten) == 10):
+            peaks_list = List[System.Double](self.Mean_Peak_List_Last_Ten)
             peaks_std = MotorMath.StdDevAroundMean(peaks_list, mean_force_target)
-            PythonPullStageImplementation_TXBDC_PullWindowEric.Std_Dev_List.append(peaks_std)
+            self.Session_Statistics.AddValue("Peak StdDev", peaks_std)
             peaks_std_msg = "(StdDev = " + System.Convert.ToInt32(System.Math.Floor(peaks_std)).ToString() + " grams)"
 
-        #Get the device stream data
-        device_stream = trial.TrialData[1]
-        try:
-            peak_force = device_stream.GetRange(stage.TotalRecordedSamplesBeforeHitWindow, stage.TotalRecordedSamplesDuringHitWindow).Max()
-            PythonPullStageImplementation_TXBDC_PullWindowEric.Maximal_Force_List.append(peak_force)
-            
-            msg += "Trial " + str(trial_number) + " "
-            if trial.Result == MotorTrialResult.Hit:
-                msg += "HIT, "
-            else:
-                msg += "MISS, "
-
-            msg += peaks_std_msg
+        #Get the peak of the device stream within the hit window (there is no message if the hit window is empty)
+        peak_force = self.GetPeakValue(trial, stage)
+        if System.Double.IsNaN(peak_force):
+            return System.String.Empty
 
-            return msg
-        except ValueError:
-            return System.String.Empty;
-
-    def CalculateYValueForSessionOverviewPlot(self, trial, stage):
-        if PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Hit > -1:
-            max_force = stream_data.Where(lambda val, index: \
-                (index >= PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Last_Trough) and \
-                (index < PythonPullStageImplementation_TXBDC_PullWindowEric.Position_Of_Hit)).Max()
+        self.Session_Statistics.AddValue("Peak Force", peak_force)
+        
+        msg += "Trial " + str(trial_number) + " "
+        if trial.Result == MotorTrialResult.Hit:
+            msg += "HIT, "
+        else:
+            msg += "MISS, "
 
-            return max_force
+        msg += peaks_std_msg
 
-        return System.Double.NaN
+        return msg
 
     def AdjustDynamicStageParameters(self, all_trials, current_trial, stage):
         #Get the name of the lower bound force threshold
-        lower_bound_force_threshold_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[0].ParameterName
+        lower_bound_force_threshold_name = self.TaskDefinition.TaskParameters[0].ParameterName
 
         #Get the name of the lower bound force threshold
-        upper_bound_force_threshold_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[1].ParameterName
+        upper_bound_force_threshold_name = self.TaskDefinition.TaskParameters[1].ParameterName
 
         #Get the name of the initiation threshold parameter
-        initiation_threshold_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[2].ParameterName
+        initiation_threshold_parameter_name = self.TaskDefinition.TaskParameters[2].ParameterName
 
         #Get the name of the mean force target parameter
-        mean_force_target_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[3].ParameterName
+        mean_force_target_parameter_name = self.TaskDefinition.TaskParameters[3].ParameterName
 
         #Get the name of the mean force target parameter
-        percent_stddev_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[4].ParameterName
+        percent_stddev_parameter_name = self.TaskDefinition.TaskParameters[4].ParameterName
 
 
         #Adjust the hit threshold
@@ -331,7 +145,7 @@ class PythonPullStageImplementation_TXBDC_PullWindowEric (IMotorStageImplementat
             #Throw out any peaks that are below the initiation threshold
             #peaks = peaks.Where(lambda x: x.Item1 > initiation_threshold).ToList();
 
-            peaks = MotorMath.FindPeaksAboveInitiationThreshold(smoothed_hit_window_data, initiation_threshold)
+            peaks = StreamingPeakDetector.FindPeaks(smoothed_hit_window_data, initiation_threshold)
 
             if peaks.Count > 0:
                 cur_peak_mag = peaks[0].Item1                
@@ -344,15 +158,15 @@ class PythonPullStageImplementation_TXBDC_PullWindowEric (IMotorStageImplementat
                         cur_peak_pos = p.Item2
                         cur_peak_mag = this_peak_mag
 
-                PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten.append(cur_peak_mag)
-                PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_All_Trials.append(cur_peak_mag)
-                if (len(PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten) > 10):
-                    PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten.pop(0)
+                self.Mean_Peak_List_Last_Ten.append(cur_peak_mag)
+                self.Session_Statistics.AddValue("Mean Peak", cur_peak_mag)
+                if (len(self.Mean_Peak_List_Last_Ten) > 10):
+                    self.Mean_Peak_List_Last_Ten.pop(0)
             
-                if (len(PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten) == 10):
+                if (len(self.Mean_Peak_List_Last_Ten) == 10):
                     #Calculate the standard deviation of the peaks from the last 10 trials
-                    peaks_list = List[System.Double](PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten)
-                    #peaks_list = List[System.Double]([n for n in PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_Last_Ten])
+                    peaks_list = List[System.Double](self.Mean_Peak_List_Last_Ten)
+                    #peaks_list = List[System.Double]([n for n in self.Mean_Peak_List_Last_Ten])
                     peaks_std = MotorMath.StdDevAroundMean(peaks_list, mean_force_target)
                     
                     #Now calculate a fraction of the standard deviation, based on the stage definition
@@ -373,51 +187,32 @@ class PythonPullStageImplementation_TXBDC_PullWindowEric (IMotorStageImplementat
                         stage.StageParameters[lower_bound_force_threshold_name].CurrentValue = lower_bound
                         stage.StageParameters[upper_bound_force_threshold_name].CurrentValue = upper_bound
                     
-            #Find the maximal force from the current trial
-            max_force = stream_data.Where(lambda val, index: \
-                (index >= stage.TotalRecordedSamplesBeforeHitWindow) and \
-                (index < (stage.TotalRecordedSamplesBeforeHitWindow + stage.TotalRecordedSamplesDuringHitWindow))).Max()
-
         #Adjust the position of the auto-positioner, according to the stage settings
-        if stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable:
-            hit_count = all_trials.Where(lambda t: t.Result == MotorTrialResult.Hit).Count()
-            hit_count_modulus = hit_count % PythonPullStageImplementation_TXBDC_PullWindowEric.Autopositioner_Trial_Interval
-            if hit_count > 0 and hit_count_modulus is 0:
-                if not PythonPullStageImplementation_TXBDC_PullWindowEric.Autopositioner_Trial_Count_Handled.Contains(hit_count):
-                    if stage.Position.CurrentValue < 2.0:
-                        PythonPullStageImplementation_TXBDC_PullWindowEric.Autopositioner_Trial_Count_Handled.append(hit_count)
-                        stage.Position.CurrentValue = stage.Position.CurrentValue + 0.5
-                        MotoTrakAutopositioner.GetInstance().SetPosition(stage.Position.CurrentValue)
+        self.Autopositioner_Controller.RegisterTrial(current_trial, stage)
                 
         return
 
     def CreateEndOfSessionMessage(self, current_session):
-
         #Get the name of the mean force target parameter
-        mean_force_target_parameter_name = PythonPullStageImplementation_TXBDC_PullWindowEric.TaskDefinition.TaskParameters[3].ParameterName
+        mean_force_target_parameter_name = self.TaskDefinition.TaskParameters[3].ParameterName
 
         #Grab the mean force target
         mean_force_target = current_session.SelectedStage.StageParameters[mean_force_target_parameter_name].CurrentValue
 
-        # Find the number of feedings that occurred in this session
-        number_of_feedings = current_session.Trials.Where(lambda x: x.Result == MotorTrialResult.Hit).Count();
-
-        end_of_session_messages = List[System.String]()
-        end_of_session_messages.Add(System.DateTime.Now.ToShortTimeString() + " - Session ended.")
-        end_of_session_messages.Add("Pellets fed: " + System.Convert.ToInt32(number_of_feedings).ToString())
+        end_of_session_messages = PythonForceWindowStageImplementationBase.CreateEndOfSessionMessage(self, current_session)
 
         #Median of std deviations
         median_msg = "No median std dev calculated."
-        if (len(PythonPullStageImplementation_TXBDC_PullWindowEric.Std_Dev_List) > 0):
-            med_std = MotorMath.Median(List[System.Double](PythonPullStageImplementation_TXBDC_PullWindowEric.Std_Dev_List))
+        if (self.Session_Statistics.Count("Peak StdDev") > 0):
+            med_std = self.Session_Statistics.Median("Peak StdDev")
             median_msg = "Median StdDev: " + System.Convert.ToInt32(med_std).ToString()
         end_of_session_messages.Add(median_msg)
 
         #Overall std deviation
         std_dev_msg = "No overall std dev calculated."
-        if (len(PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_All_Trials) > 0):
-            std_dev_all = MotorMath.StdDevAroundMean(List[System.Double](PythonPullStageImplementation_TXBDC_PullWindowEric.Mean_Peak_List_All_Trials), mean_force_target)
+        if (self.Session_Statistics.Count("Mean Peak") > 1):
+            std_dev_all = self.Session_Statistics.StdDevAround("Mean Peak", mean_force_target)
             std_dev_msg = "Overall StdDev: " + System.Convert.ToInt32(std_dev_all).ToString()
         end_of_session_messages.Add(std_dev_msg)
 
-        return end_of_session_messages
\ No newline at end of file
+        return end_of_session_messages
@@ -0,0 +1,712 @@
+import clr
+clr.AddReference('System.Core')
+from System.Collections.Generic import List
+from System import Tuple
+
+import System
+from System import DateTime, TimeSpan
+clr.ImportExtensions(System.Linq)
+
+clr.AddReference('MotoTrakBase')
+from MotoTrakBase import IMotorStageImplementation
+from MotoTrakBase import MotorTrialResult
+from MotoTrakBase import MotorTrialAction
+from MotoTrakBase import MotorTrialActionType
+from MotoTrakBase import MotorTrialEventType
+from MotoTrakBase import MotorStageParameter
+from MotoTrakBase import MotorTaskDefinition
+from MotoTrakBase import MotoTrakSessionStatistics
+from MotoTrakBase import MotoTrakSessionCheckpoint
+from MotoTrakBase import MotorTrialFeatures
+from MotoTrakBase import MotorStageFrame
+from MotoTrakBase import MotorSignalBlockAdapter
+
+clr.AddReference('MotoTrakUtilities')
+from MotoTrakUtilities import MotorMath
+
+#This module is shared by all stage implementations.  It is imported (and compiled) once by the Python engine,
+#and each stage implementation subclasses PythonStageImplementationBase, overriding only the methods in which
+#its behavior differs from the standard pull task.
+#
+#A new instance of a stage implementation is created for every stage that uses it, and several sessions may run
+#in the same process at once (each on its own thread).  Anything that changes during a session must therefore be
+#held by the instance (assigned through self), never mutated in place on the class.
+
+class PythonStageImplementationBase (IMotorStageImplementation):
+
+    #Building blocks that each stage implementation declares for itself.  The autopositioner controller declared on
+    #the class is only a template; each instance works with its own copy of it.
+    TaskDefinition = None
+    Session_Statistics = None
+    Autopositioner_Controller = None
+    Starting_Position_Table = None
+
+    #The index of the device stream within each trial's data
+    Device_Stream_Index = 1
+
+    #Indices of the task parameters used by the shared methods below.  A value of None means the stage does not have that parameter.
+    Hit_Threshold_Parameter_Index = 0
+    Initiation_Threshold_Parameter_Index = 1
+    Reward_Delay_Parameter_Index = None
+
+    #Names and units used when reporting the peak signal value and hit threshold of each trial
+    Peak_Value_Series_Name = "Peak Force"
+    Threshold_Series_Name = "Force Threshold"
+    Peak_Value_Description = "maximal force"
+    Hit_Threshold_Description = "Hit threshold"
+    Signal_Units = "grams"
+
+    #The device stream is multiplied by this value when it is transformed (-1.0 inverts the signal)
+    Signal_Polarity = 1.0
+
+    UpcomingRewardTimes = None
+
+    #Instance attributes that are not saved in session checkpoints (the statistics and autopositioner controller save their own state)
+    Checkpoint_Excluded_Attributes = ('TaskDefinition', 'Session_Statistics', 'Autopositioner_Controller')
+
+    def __init__(self):
+        #Create the state that belongs to this instance.  Stage implementations call this before filling in their task definition.
+        self.TaskDefinition = MotorTaskDefinition()
+        self.Session_Statistics = MotoTrakSessionStatistics()
+        if self.Autopositioner_Controller is not None:
+            self.Autopositioner_Controller = self.Autopositioner_Controller.Clone()
+        self.UpcomingRewardTimes = []
+
+    #Shared building blocks used by the methods below, and available to stage implementations
+
+    def GetTaskParameterName(self, parameter_index):
+        if parameter_index is None:
+            return None
+        return self.TaskDefinition.TaskParameters[parameter_index].ParameterName
+
+    def GetStageParameterValue(self, stage, parameter_index, default_value):
+        parameter_name = self.GetTaskParameterName(parameter_index)
+        if parameter_name is not None and stage.StageParameters.ContainsKey(parameter_name):
+            return stage.StageParameters[parameter_name].CurrentValue
+        return default_value
+
+    def GetSignalOffset(self):
+        #Stage implementations may override this to subtract an offset from the device stream when it is transformed
+        return 0
+
+    def IsOverridden(self, method_name):
+        #True if the stage implementation replaces the version of a method defined by this shared runtime
+        return getattr(type(self), method_name).im_func is not getattr(PythonStageImplementationBase, method_name).im_func
+
+    def IsDeviceStreamAbsolute(self, stage):
+        #Stage implementations may override this to compare the absolute value of the device stream against thresholds
+        return False
+
+    def GetDeviceStream(self, stream_data, stage):
+        #Stage implementations may override this to transform the device stream before it is compared against thresholds
+        if self.IsDeviceStreamAbsolute(stage):
+            return MotorMath.AbsList(stream_data)
+        return stream_data
+
+    def FindPeakInHitWindow(self, stream_data, stage):
+        return MotorMath.MaxInRange(stream_data, stage.TotalRecordedSamplesBeforeHitWindow, stage.TotalRecordedSamplesDuringHitWindow)
+
+    def CalculateTrialFeatures(self, trial, stage):
+        #Called once when a trial ends.  The features of the device signal are measured against the hit threshold of the trial.
+        hit_threshold = self.GetStageParameterValue(stage, self.Hit_Threshold_Parameter_Index, System.Double.NaN)
+        return MotorTrialFeatures.Calculate(trial, stage, self.Device_Stream_Index, hit_threshold)
+
+    def GetTrialFeatures(self, trial, stage):
+        #Return the features that were calculated when the trial ended (calculating them now, if they were not)
+        if trial.Features is None:
+            trial.Features = self.CalculateTrialFeatures(trial, stage)
+        return trial.Features
+
+    def GetPeakValue(self, trial, stage):
+        #The peak of the device stream (see GetDeviceStream) within the hit window of a trial that has ended
+        return self.GetTrialFeatures(trial, stage).PeakValue
+
+    def FindFirstHitInHitWindow(self, stream_data, threshold, stage):
+        return MotorMath.FindFirstIndexAtOrAbove(stream_data, threshold, stage.TotalRecordedSamplesBeforeHitWindow, stage.TotalRecordedSamplesDuringHitWindow)
+
+    def SetStartingPosition(self, stage, position):
+        #Set the position of the autopositioner if it is supposed to be adaptively set
+        if stage.Position.ParameterType == MotorStageParameter.StageParameterType.Variable:
+            stage.Position.CurrentValue = position
+            stage.Autopositioner.SetPosition(position)
+
+    def ResetSwipeSensorThreshold(self):
+        self.MinimumIR = System.Int32.MaxValue
+        self.MaximumIR = 0
+        self.ThresholdIR = System.Int32.MinValue
+
+    def UpdateSwipeSensorThreshold(self, min_ir_data, max_ir_data):
+        #Skip the update if there was no IR data to look at
+        if System.Double.IsNaN(min_ir_data) or System.Double.IsNaN(max_ir_data):
+            return
+
+        #Calculate the IR min/max/threshold
+        self.MinimumIR = System.Math.Min(self.MinimumIR, min_ir_data)
+        self.MaximumIR = System.Math.Max(self.MaximumIR, max_ir_data)
+
+        min_max_difference = self.MaximumIR - self.MinimumIR
+        if min_max_difference >= 25:
+            self.ThresholdIR = (min_max_difference / 2) + self.MinimumIR
+        elif min_max_difference < 1:
+            self.MinimumIR = self.MaximumIR - 1
+
+    def FindSwipeSensorInitiation(self, signal, new_datapoint_count, ir_stream_index = 2):
+        #Update the IR threshold from the most recent data, and return the index at which the swipe sensor was tripped (or -1)
+        ir_data = signal[ir_stream_index]
+        if new_datapoint_count > 0 and new_datapoint_count <= ir_data.Count:
+            difference_in_size = ir_data.Count - new_datapoint_count
+            min_ir_data = MotorMath.MinInRange(ir_data, difference_in_size, new_datapoint_count)
+            max_ir_data = MotorMath.MaxInRange(ir_data, difference_in_size, new_datapoint_count)
+            self.UpdateSwipeSensorThreshold(min_ir_data, max_ir_data)
+
+            if min_ir_data <= self.ThresholdIR:
+                return ir_data.IndexOf(min_ir_data, difference_in_size)
+
+        return -1
+
+    def FindSustainedHit(self, stream_data, force_threshold, time_threshold, stage):
+        #Look for a pull (or turn) that stays at or above the force threshold for at least the time threshold.  Pulls may only begin
+        #within the hit window, but may be sustained beyond it.  Returns the index of the hit (or -1) and the sustained duration at the hit.
+        hit_index = -1
+        hit_duration = 0
+
+        # 0 = below, 1 = above
+        pull_state = 0
+
+        first_index = stage.TotalRecordedSamplesBeforeHitWindow
+        last_index = stage.TotalRecordedSamplesBeforeHitWindow + stage.TotalRecordedSamplesDuringHitWindow
+        for i in range(0, stream_data.Count):
+            value = stream_data[i]
+
+            #If a pull above the force threshold is currently occurring... (doesn't matter if we are in the hit window)
+            if (pull_state == 1):
+                if (value >= force_threshold):
+                    #Assuming the current sample we are inspecting remains above the force threshold, calculate how long it has been...
+                    time_above_force_threshold = stage.SamplePeriodInMilliseconds * (i - self.Position_Of_Last_Trough + 1)
+                    if (time_above_force_threshold >= self.Longest_Sustained_Force):
+                        self.Longest_Sustained_Force = time_above_force_threshold
+
+                    #Check to see if a hit has occurred
+                    if (time_above_force_threshold >= time_threshold and hit_index < 0):
+                        hit_index = i
+                        hit_duration = time_above_force_threshold
+                else:
+                    #Otherwise, set the state indicating the force has fallen below the force threshold...
+                    pull_state = 0
+
+            #Only look at samples within the hit window for initiating a new pull...
+            if (pull_state == 0 and i >= first_index and i < last_index and value >= force_threshold):
+                pull_state = 1
+                self.Position_Of_Last_Trough = i
+
+        return (hit_index, hit_duration)
+
+    def ResetSessionState(self):
+        if self.Session_Statistics is not None:
+            self.Session_Statistics.Clear()
+        if self.Autopositioner_Controller is not None:
+            self.Autopositioner_Controller.Reset()
+        self.UpcomingRewardTimes = []
+
+    def ScheduleReward(self, reward_delay_millis):
+        #Determine the time at which the feed should occur, and append it to the list of upcoming feed times
+        self.UpcomingRewardTimes.append(DateTime.Now + TimeSpan.FromMilliseconds(reward_delay_millis))
+
+    def CollectDueRewards(self, result):
+        if (len(self.UpcomingRewardTimes) > 0):
+            if (DateTime.Now >= self.UpcomingRewardTimes[0]):
+                #If it's time to feed, remove the timestamp from the upcoming feed times list
+                self.UpcomingRewardTimes.pop(0)
+
+                #If it's time to feed, then add the feed action to the result
+                new_action = MotorTrialAction()
+                new_action.ActionType = MotorTrialActionType.TriggerFeeder
+                result.Add(new_action)
+
+    def CreateStimulationAction(self):
+        new_stim_action = MotorTrialAction()
+        new_stim_action.ActionType = MotorTrialActionType.SendStimulationTrigger
+        return new_stim_action
+
+    def RequestStimulationOnHit(self, stage):
+        #Stage implementations may override this to limit how often the animal is stimulated after a successful trial
+        return True
+
+    #Session checkpoints.  Every number, flag, string, time, and list of numbers or times held by the instance is saved, so stage
+    #implementations that keep their session state in instance attributes do not need to do anything to be resumable.
+
+    def SaveCheckpointState(self, checkpoint):
+        for name, value in self.__dict__.items():
+            if name in self.Checkpoint_Excluded_Attributes:
+                continue
+            key = "Stage.Attributes." + name
+            if isinstance(value, bool):
+                checkpoint.SetBoolean(key, value)
+            elif isinstance(value, (int, long)):
+                checkpoint.SetInteger(key, value)
+            elif isinstance(value, float):
+                checkpoint.SetNumber(key, value)
+            elif isinstance(value, basestring):
+                checkpoint.SetText(key, value)
+            elif isinstance(value, DateTime):
+                checkpoint.SetTime(key, value)
+            elif isinstance(value, list):
+                if len(value) > 0 and all(isinstance(x, DateTime) for x in value):
+                    checkpoint.SetTimeList(key, List[DateTime](value))
+                elif all(isinstance(x, (int, long, float)) and not isinstance(x, bool) for x in value):
+                    checkpoint.SetNumberList(key, List[float]([float(x) for x in value]))
+
+        if self.Session_Statistics is not None:
+            self.Session_Statistics.SaveCheckpointState(checkpoint, "Stage.Statistics")
+        if self.Autopositioner_Controller is not None:
+            self.Autopositioner_Controller.SaveCheckpointState(checkpoint, "Stage.Autopositioner")
+
+    def RestoreCheckpointState(self, checkpoint):
+        prefix = "Stage.Attributes."
+        for key in checkpoint.GetNames(prefix):
+            kind = checkpoint.GetKind(key)
+            if kind == MotoTrakSessionCheckpoint.ValueKind.Boolean:
+                value = checkpoint.GetBoolean(key)
+            elif kind == MotoTrakSessionCheckpoint.ValueKind.Integer:
+                value = int(checkpoint.GetInteger(key))
+            elif kind == MotoTrakSessionCheckpoint.ValueKind.Number:
+                value = checkpoint.GetNumber(key)
+            elif kind == MotoTrakSessionCheckpoint.ValueKind.Text:
+                value = checkpoint.GetText(key)
+            elif kind == MotoTrakSessionCheckpoint.ValueKind.Time:
+                value = checkpoint.GetTime(key)
+            elif kind == MotoTrakSessionCheckpoint.ValueKind.TimeList:
+                value = list(checkpoint.GetTimeList(key))
+            else:
+                value = list(checkpoint.GetNumberList(key))
+            setattr(self, key[len(prefix):], value)
+
+        if self.Session_Statistics is not None:
+            self.Session_Statistics.RestoreCheckpointState(checkpoint, "Stage.Statistics")
+        if self.Autopositioner_Controller is not None:
+            self.Autopositioner_Controller.RestoreCheckpointState(checkpoint, "Stage.Autopositioner")
+
+    #Default implementation of IMotorStageImplementation (the standard pull task)
+
+    def AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage):
+        self.ResetSessionState()
+
+        #Look up the starting position from the number of hits the rat has had on this stage in previous sessions
+        if self.Starting_Position_Table is not None:
+            position = self.Starting_Position_Table.Lookup(current_session_stage.CumulativeHitCount)
+            self.SetStartingPosition(current_session_stage, position)
+
+        return
+
+    def PrepareShadowSession(self, stage):
+        #Called instead of AdjustBeginningStageParameters when this stage implementation shadows a session, so it must not
+        #change the stage or move the autopositioner
+        self.ResetSessionState()
+
+        return
+
+    def TransformSignals(self, new_data_from_controller, stage, device):
+        result = List[List[System.Double]]()
+        polarity = self.Signal_Polarity
+        offset = self.GetSignalOffset()
+        for i in range(0, new_data_from_controller.Count):
+            stream_data = new_data_from_controller[i]
+            transformed_stream_data = List[System.Double]()
+            if (i == self.Device_Stream_Index):
+                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: polarity * System.Double(device.Slope * (x - device.Baseline)) - offset).ToList())
+            else:
+                transformed_stream_data = List[System.Double](stream_data.Select(lambda x: System.Double(x)).ToList())
+            result.Add(transformed_stream_data)
+        return result
+
+    def TransformSignalBlock(self, new_data_from_controller, transformed_new_data, stage, device):
+        #The same transform as TransformSignals, done in place on the arrays of the blocks.  Stage implementations that
+        #override TransformSignals are handed the data as lists instead.
+        if self.IsOverridden('TransformSignals'):
+            MotorSignalBlockAdapter.TransformSignals(self, new_data_from_controller, transformed_new_data, stage, device)
+            return
+
+        transformed_new_data.CopyFrom(new_data_from_controller)
+        transformed_new_data.TransformStream(self.Device_Stream_Index, device.Slope, device.Baseline, self.Signal_Polarity, self.GetSignalOffset())
+
+    def CheckSignalBlockForTrialInitiation(self, signal, new_datapoint_count, stage):
+        #The same check as CheckSignalForTrialInitiation, done on the arrays of the signal block.  Stage implementations that
+        #override CheckSignalForTrialInitiation or GetDeviceStream are handed the signal as lists instead.
+        if self.IsOverridden('CheckSignalForTrialInitiation') or self.IsOverridden('GetDeviceStream'):
+            return MotorSignalBlockAdapter.CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage)
+
+        return_value = -1
+        initiation_threshold_parameter_name = self.GetTaskParameterName(self.Initiation_Threshold_Parameter_Index)
+        if stage.StageParameters.ContainsKey(initiation_threshold_parameter_name):
+            init_thresh = stage.StageParameters[initiation_threshold_parameter_name].CurrentValue
+            absolute = self.IsDeviceStreamAbsolute(stage)
+
+            if new_datapoint_count > 0 and new_datapoint_count <= signal.Length:
+                difference_in_size = signal.Length - new_datapoint_count
+                maximal_value = signal.MaxInRange(self.Device_Stream_Index, difference_in_size, new_datapoint_count, absolute)
+                if maximal_value >= init_thresh:
+                    self.UpcomingRewardTimes = []
+                    return_value = signal.IndexOf(self.Device_Stream_Index, maximal_value, difference_in_size, absolute)
+
+        return return_value
+
+    def CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage):
+        #Create the value that will be our return value
+        return_value = -1
+
+        #Get the name of the initiation threshold parameter
+        initiation_threshold_parameter_name = self.GetTaskParameterName(self.Initiation_Threshold_Parameter_Index)
+
+        #Look to see if the Initiation Threshold key exists
+        if stage.StageParameters.ContainsKey(initiation_threshold_parameter_name):
+            #Get the stage's initiation threshold
+            init_thresh = stage.StageParameters[initiation_threshold_parameter_name].CurrentValue
+
+            #Get the data stream itself
+            stream_data = self.GetDeviceStream(signal[self.Device_Stream_Index], stage)
+
+            #Check to make sure we actually have new data to work with before going on
+            if new_datapoint_count > 0 and new_datapoint_count <= stream_data.Count:
+                #Calculate how many OLD elements there are
+                difference_in_size = stream_data.Count - new_datapoint_count
+
+                #Retrieve the maximal value for the most recent data from the signal
+                maximal_value = MotorMath.MaxInRange(stream_data, difference_in_size, new_datapoint_count)
+
+                if maximal_value >= init_thresh:
+                    self.UpcomingRewardTimes = []
+                    return_value = stream_data.IndexOf(maximal_value, difference_in_size)
+
+        return return_value
+
+    def CheckForTrialEvent(self, trial, new_datapoint_count, stage):
+        #Instantiate a list of tuples that will hold any events that capture as a result of this function.
+        result = List[Tuple[MotorTrialEventType, System.Int32]]()
+
+        #Get the name of the hit threshold parameter
+        hit_threshold_parameter_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+
+        #Only proceed if a hit threshold has been defined for this stage
+        if stage.StageParameters.ContainsKey(hit_threshold_parameter_name):
+            #Get the stream data from the device
+            stream_data = self.GetDeviceStream(trial.TrialData[self.Device_Stream_Index], stage)
+
+            #Check to see if the stream data has exceeded the current hit threshold within the hit window
+            current_hit_thresh = stage.StageParameters[hit_threshold_parameter_name].CurrentValue
+            hit_index = self.FindFirstHitInHitWindow(stream_data, current_hit_thresh, stage)
+            if hit_index >= 0:
+                result.Add(Tuple[MotorTrialEventType, int](MotorTrialEventType.SuccessfulTrial, hit_index))
+
+        #Return the result
+        return result
+
+    def ReactToTrialEvents(self, trial, stage):
+        result = List[MotorTrialAction]()
+
+        #Get the reward delay, if this stage has one
+        reward_delay_millis = self.GetStageParameterValue(stage, self.Reward_Delay_Parameter_Index, 0) * 1000
+
+        trial_events = trial.TrialEvents.Where(lambda x: x.Handled is False)
+        for evt in trial_events:
+            event_type = evt.EventType
+            evt.Handled = True
+
+            #If a trial has been initiated, and the output trigger type is set to trigger on every trial initiation,
+            #then send an output trigger
+            if event_type.value__ is MotorTrialEventType.TrialInitiation.value__:
+                output_trigger_type = str(stage.OutputTriggerType)
+                if output_trigger_type.lower() == "Beginning of every trial".lower():
+                    result.Add(self.CreateStimulationAction())
+
+            if event_type.value__ is MotorTrialEventType.SuccessfulTrial.value__:
+                #If a successful trial happened, then feed the animal, unless the feed action should be delayed
+                if (reward_delay_millis > 0):
+                    self.ScheduleReward(reward_delay_millis)
+                else:
+                    new_action = MotorTrialAction()
+                    new_action.ActionType = MotorTrialActionType.TriggerFeeder
+                    result.Add(new_action)
+
+                #If stimulation is on for this stage, stimulate the animal
+                output_trigger_type = str(stage.OutputTriggerType)
+                if output_trigger_type.lower() == "On".lower() and self.RequestStimulationOnHit(stage):
+                    result.Add(self.CreateStimulationAction())
+
+        return result
+
+    def PerformActionDuringTrial(self, trial, stage):
+        result = List[MotorTrialAction]()
+        self.CollectDueRewards(result)
+        return result
+
+    def ProcessFrame(self, frame):
+        #Handles a whole processing frame in one call from MotoTrak.  The steps are the same, and run in the same order, as
+        #when MotoTrak calls each method separately, so stage implementations only need to override the individual methods.
+        #The data is transformed and checked in the frame's signal blocks, without copying it into lists.
+        self.TransformSignalBlock(frame.NewDataBlock, frame.TransformedDataBlock, frame.Stage, frame.Device)
+        frame.CommitTransformedData()
+
+        if frame.Phase == MotorStageFrame.FramePhase.WaitingForTrial:
+            frame.TrialInitiationIndex = self.CheckSignalBlockForTrialInitiation(frame.SignalBlock, frame.NewDatapointCount, frame.Stage)
+        elif frame.Phase == MotorStageFrame.FramePhase.TrialRunning:
+            trial = frame.Trial
+            if trial.Result == MotorTrialResult.Unknown:
+                #MotoTrak adds the new events to the trial before the stage reacts to them
+                frame.AddTrialEvents(self.CheckForTrialEvent(trial, frame.NewDatapointCount, frame.Stage))
+                frame.AddActions(self.ReactToTrialEvents(trial, frame.Stage))
+            frame.AddActions(self.PerformActionDuringTrial(trial, frame.Stage))
+
+    def CreateEndOfTrialMessage(self, trial_number, trial, stage):
+        #Count this trial in the session statistics
+        self.Session_Statistics.AddTrial(trial)
+
+        msg = ""
+        msg += System.DateTime.Now.ToShortTimeString() + ", "
+
+        #Get the peak of the device stream within the hit window (there is no message if the hit window is empty)
+        peak_value = self.GetPeakValue(trial, stage)
+        if System.Double.IsNaN(peak_value):
+            return System.String.Empty
+
+        self.Session_Statistics.AddValue(self.Peak_Value_Series_Name, peak_value)
+
+        msg += "Trial " + str(trial_number) + " "
+        if trial.Result == MotorTrialResult.Hit:
+            msg += "HIT, "
+        else:
+            msg += "MISS, "
+
+        msg += self.Peak_Value_Description + " = " + System.Convert.ToInt32(System.Math.Floor(peak_value)).ToString() + " " + self.Signal_Units + "."
+
+        #Get the name of the hit threshold parameter
+        hit_threshold_parameter_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+
+        if stage.StageParameters.ContainsKey(hit_threshold_parameter_name):
+            #Grab the hit threshold for the current trial
+            current_hit_threshold = stage.StageParameters[hit_threshold_parameter_name].CurrentValue
+
+            #Add the hit threshold to the list of all hit thresholds that we are maintaining for this session
+            self.Session_Statistics.AddValue(self.Threshold_Series_Name, current_hit_threshold)
+
+            #If this is an adaptive stage, then display the hit threshold of the current trial in the "end-of-trial" message to the user
+            if stage.StageParameters[hit_threshold_parameter_name].ParameterType == MotorStageParameter.StageParameterType.Variable:
+                msg += " (" + self.Hit_Threshold_Description + " = " + System.Math.Floor(current_hit_threshold).ToString() + " " + self.Signal_Units + ")"
+
+        return msg
+
+    def CalculateYValueForSessionOverviewPlot(self, trial, stage):
+        #Get the name of the hit threshold parameter
+        hit_threshold_parameter_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+
+        if stage.StageParameters.ContainsKey(hit_threshold_parameter_name):
+            #The maximal value of the device signal within the hit window of this trial
+            return self.GetPeakValue(trial, stage)
+
+        return System.Double.NaN
+
+    def AdjustDynamicStageParameters(self, all_trials, current_trial, stage):
+        #Get the name of the hit threshold parameter
+        hit_threshold_parameter_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+
+        #Adjust the hit threshold
+        if stage.StageParameters.ContainsKey(hit_threshold_parameter_name):
+            #Find the maximal force from the current trial (this is the peak of the signal as recorded, before any transform by GetDeviceStream)
+            max_force = self.GetTrialFeatures(current_trial, stage).PeakValue
+
+            #Retain the maximal force of the most recent trials
+            if not System.Double.IsNaN(max_force):
+                stage.StageParameters[hit_threshold_parameter_name].History.Enqueue(max_force)
+                stage.StageParameters[hit_threshold_parameter_name].CalculateAndSetBoundedCurrentValue()
+
+        #Adjust the position of the auto-positioner, according to the stage settings
+        if self.Autopositioner_Controller is not None:
+            self.Autopositioner_Controller.RegisterTrial(current_trial, stage)
+
+        return
+
+    def CreateEndOfSessionMessage(self, current_session):
+        #Get the name of the hit threshold parameter
+        hit_threshold_parameter_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+
+        # Find the percentage of trials that exceeded the maximum possible hit threshold in this session
+        maximal_hit_threshold = current_session.SelectedStage.StageParameters[hit_threshold_parameter_name].MaximumValue
+        percent_trials_greater_than_max = self.Session_Statistics.FractionAtOrAbove(self.Peak_Value_Series_Name, maximal_hit_threshold) * 100
+
+        # Find the number of feedings that occurred in this session
+        number_of_feedings = self.Session_Statistics.HitCount
+
+        # Find the median peak value from the sesion
+        median_peak_value = self.Session_Statistics.Median(self.Peak_Value_Series_Name)
+        if (System.Double.IsNaN(median_peak_value)):
+            median_peak_value = 0
+
+        # Find the median hit threshold from this session
+        median_threshold = self.Session_Statistics.Median(self.Threshold_Series_Name)
+        if (System.Double.IsNaN(median_threshold)):
+            median_threshold = 0
+
+        end_of_session_messages = List[System.String]()
+        end_of_session_messages.Add(System.DateTime.Now.ToShortTimeString() + " - Session ended.")
+        end_of_session_messages.Add("Pellets fed: " + System.Convert.ToInt32(number_of_feedings).ToString())
+        end_of_session_messages.Add("Median " + self.Peak_Value_Series_Name + ": " + System.Convert.ToInt32(median_peak_value).ToString())
+        end_of_session_messages.Add("% Trials > Maximum " + self.Threshold_Series_Name.lower() + ": " + System.Convert.ToInt32(percent_trials_greater_than_max).ToString())
+        end_of_session_messages.Add("Median " + self.Threshold_Series_Name + ": " + System.Convert.ToInt32(median_threshold).ToString())
+
+        return end_of_session_messages
+
+class PythonKnobStageImplementationBase (PythonStageImplementationBase):
+
+    #The knob signal is inverted when it is transformed, and is reported as a turn angle
+    Signal_Polarity = -1.0
+    Peak_Value_Series_Name = "Peak Turn Angle"
+    Threshold_Series_Name = "Turn Angle Threshold"
+    Peak_Value_Description = "peak turn angle"
+    Signal_Units = "degrees"
+
+    #The index of the weight task parameter.  Stages using less than 1 gram of weight track the knob's position from trial to trial.
+    Weight_Parameter_Index = None
+
+    Ending_Value_Of_Last_Trial = 0
+
+    def IsUnweighted(self, stage):
+        return (self.GetStageParameterValue(stage, self.Weight_Parameter_Index, 1) < 1)
+
+    def GetSignalOffset(self):
+        return self.Ending_Value_Of_Last_Trial
+
+    def IsDeviceStreamAbsolute(self, stage):
+        #The functionality of this task is different for stages using 0 grams of weight
+        return self.IsUnweighted(stage)
+
+    def GetPeakValue(self, trial, stage):
+        #For stages using 0 grams of weight, the device stream is the absolute value of the signal
+        features = self.GetTrialFeatures(trial, stage)
+        if self.IsUnweighted(stage):
+            return features.AbsolutePeakValue
+
+        return features.PeakValue
+
+    def AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage):
+        PythonStageImplementationBase.AdjustBeginningStageParameters(self, recent_behavior_sessions, current_session_stage)
+        self.Ending_Value_Of_Last_Trial = 0
+
+        return
+
+    def PrepareShadowSession(self, stage):
+        PythonStageImplementationBase.PrepareShadowSession(self, stage)
+        self.Ending_Value_Of_Last_Trial = 0
+
+        return
+
+    def AdjustDynamicStageParameters(self, all_trials, current_trial, stage):
+        #Adjust the initiation threshold and hit threshold for the case in which we have 0 grams of weight
+        if self.IsUnweighted(stage):
+            #Adjust the hit threshold and initiation threshold based on the knob's position
+            self.Ending_Value_Of_Last_Trial += current_trial.TrialData[self.Device_Stream_Index].Last()
+
+        #Adjust the hit threshold and the position of the auto-positioner in the same way as the standard pull task
+        PythonStageImplementationBase.AdjustDynamicStageParameters(self, all_trials, current_trial, stage)
+
+        return
+
+class PythonForceWindowStageImplementationBase (PythonStageImplementationBase):
+
+    #Stages with a force window have a lower bound (which is adapted like the hit threshold of the standard pull task),
+    #an upper bound, and an initiation threshold
+    Hit_Threshold_Parameter_Index = 0
+    Upper_Bound_Parameter_Index = 1
+    Initiation_Threshold_Parameter_Index = 2
+    Hit_Threshold_Description = "Lower bound force threshold"
+
+    Position_Of_Last_Trough = 0
+    Position_Of_Hit = 0
+
+    def UseUpperBound(self, stage):
+        #Stage implementations may override this to make the upper bound of the window optional
+        return True
+
+    def FindForceWindowHit(self, stream_data, lower_bound, upper_bound, initiation_threshold, use_upper_bound, stage):
+        # 0 = unknown, -1 = invalid, 1 = valid
+        pull_state = 0
+
+        #Only look at samples within the hit window
+        first_index = max(0, stage.TotalRecordedSamplesBeforeHitWindow)
+        last_index = min(stream_data.Count, stage.TotalRecordedSamplesBeforeHitWindow + stage.TotalRecordedSamplesDuringHitWindow)
+        for i in range(first_index, last_index):
+            value = stream_data[i]
+            if (use_upper_bound and value >= upper_bound):
+                #If this datapoint is above the upper bound, set the pull state to be "invalid"
+                pull_state = -1
+            elif (pull_state != 1 and value < initiation_threshold):
+                #Otherwise, if it is below the initiation threshold, set the pull state to be "unknown"
+                pull_state = 0
+                self.Position_Of_Last_Trough = i
+            elif (pull_state == 0 and value >= lower_bound):
+                #Otherwise, if the pull state is unknown, and the pull is between the lower and upper bounds, set it to be valid
+                if (use_upper_bound):
+                    pull_state = 1
+                else:
+                    #Without an upper bound, reaching the lower bound is a hit
+                    return i
+
+            #Check to see if a hit has occurred
+            if (pull_state == 1 and value < lower_bound):
+                return i
+
+        return -1
+
+    def CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage):
+        return_value = PythonStageImplementationBase.CheckSignalForTrialInitiation(self, signal, new_datapoint_count, stage)
+        if return_value >= 0:
+            self.Position_Of_Last_Trough = return_value
+            self.Position_Of_Hit = -1
+
+        return return_value
+
+    def CheckForTrialEvent(self, trial, new_datapoint_count, stage):
+        #Instantiate a list of tuples that will hold any events that capture as a result of this function.
+        result = List[Tuple[MotorTrialEventType, System.Int32]]()
+
+        #Get the names of the lower bound, upper bound, and initiation threshold parameters
+        lower_bound_force_threshold_name = self.GetTaskParameterName(self.Hit_Threshold_Parameter_Index)
+        upper_bound_force_threshold_name = self.GetTaskParameterName(self.Upper_Bound_Parameter_Index)
+        initiation_threshold_parameter_name = self.GetTaskParameterName(self.Initiation_Threshold_Parameter_Index)
+
+        #Only proceed if a hit threshold has been defined for this stage
+        if stage.StageParameters.ContainsKey(lower_bound_force_threshold_name) and \
+            stage.StageParameters.ContainsKey(upper_bound_force_threshold_name):
+
+            #Get the stream data from the device
+            stream_data = self.GetDeviceStream(trial.TrialData[self.Device_Stream_Index], stage)
+
+            #Get the current bounds of the window
+            current_lower_bound = stage.StageParameters[lower_bound_force_threshold_name].CurrentValue
+            current_upper_bound = stage.StageParameters[upper_bound_force_threshold_name].CurrentValue
+            current_initiation_threshold = stage.StageParameters[initiation_threshold_parameter_name].CurrentValue
+
+            hit_index = self.FindForceWindowHit(stream_data, current_lower_bound, current_upper_bound, current_initiation_threshold, self.UseUpperBound(stage), stage)
+            if hit_index >= 0:
+                #Add the point at which the success occurred to the result
+                result.Add(Tuple[MotorTrialEventType, int](MotorTrialEventType.SuccessfulTrial, hit_index))
+                self.Position_Of_Hit = hit_index
+
+        #Return the result
+        return result
+
+    def CalculateYValueForSessionOverviewPlot(self, trial, stage):
+        if self.Position_Of_Hit > -1:
+            #Find the maximal value of the device signal between the last trough and the hit
+            stream_data = self.GetDeviceStream(trial.TrialData[self.Device_Stream_Index], stage)
+            return MotorMath.MaxInRange(stream_data, self.Position_Of_Last_Trough, self.Position_Of_Hit - self.Position_Of_Last_Trough)
+
+        return System.Double.NaN
+
+    def CreateEndOfSessionMessage(self, current_session):
+        # Find the number of feedings that occurred in this session
+        number_of_feedings = self.Session_Statistics.HitCount
+
+        end_of_session_messages = List[System.String]()
+        end_of_session_messages.Add(System.DateTime.Now.ToShortTimeString() + " - Session ended.")
+        end_of_session_messages.Add("Pellets fed: " + System.Convert.ToInt32(number_of_feedings).ToString())
+
+        return end_of_session_messages
@@ -209,61 +209,17 @@ namespace MotoTrakUtilities
             return result_signal;
         }
 
+        /// <summary>
+        /// Finds the peak of each excursion of a signal above an initiation threshold.  This uses the batch mode of
+        /// StreamingPeakDetector, which can also be fed one sample at a time while a trial is running.
+        /// </summary>
+        /// <param name="v">The signal to be analyzed, as a list of doubles.</param>
+        /// <param name="init_thresh">The initiation threshold</param>
+        /// <returns>A list of tuples.  Each tuple represents a peak found in the signal.  The first value of the tuple is the magnitude
+        /// of the peak.  The second value of the tuple is the position of the peak within the signal.</returns>
         public static List<Tuple<double, double>> FindPeaksAboveInitiationThreshold (List<double> v, double init_thresh)
         {
-            List<Tuple<double, double>> peaks = new List<Tuple<double, double>>();
-
-            var binary_signal = v.Select(x => (x >= init_thresh) ? 1 : 0).ToList();
-            var diff_binary_signal = MotorMath.DiffInt(binary_signal);
-
-            //Get all points where the signal rose above the initiation threshold and where it fell below
-            var rises = Enumerable.Range(0, diff_binary_signal.Count).Where(x => diff_binary_signal[x] == 1).ToList();
-            var falls = Enumerable.Range(0, diff_binary_signal.Count).Where(x => diff_binary_signal[x] == -1).ToList();
-
-            //If there is a fall before the first rise, then insert a rise at the very beginning
-            if (falls.Count > 0 && rises.Count > 0)
-            {
-                var first_rise = rises.FirstOrDefault();
-                var first_fall = falls.FirstOrDefault();
-
-                var last_rise = rises.LastOrDefault();
-                var last_fall = falls.LastOrDefault();
-
-                if (first_rise >= first_fall)
-                {
-                    rises.Insert(0, 0);
-                }
-
-                if (last_rise >= last_fall)
-                {
-                    falls.Add(diff_binary_signal.Count - 1);
-                }
-            }
-            else if (falls.Count > 0 && rises.Count == 0)
-            {
-                rises.Add(0);
-            }
-            else if (falls.Count == 0 && rises.Count > 0)
-            {
-                falls.Add(diff_binary_signal.Count - 1);
-            }
-            
-            //Get elements of the signal between each rise and fall
-            for (int i = 0; i < rises.Count && i < falls.Count; i++)
-            {
-                var r = rises[i];
-                var f = falls[i];
-
-                var s = v.Where((y, x) => x >= r && x < f).Select(x => x).ToList();
-                var s_max = s.Max();
-                var s_max_idx = s.IndexOf(s_max);
-                var real_index = r + s_max_idx;
-                Tuple<double, double> new_peak = new Tuple<double, double>(s_max, real_index);
-
-                peaks.Add(new_peak);
-            }
-
-            return peaks;
+            return StreamingPeakDetector.FindPeaks(v, init_thresh);
         }
 
         /// <summary>
@@ -463,6 +419,79 @@ namespace MotoTrakUtilities
             return t.Where(x => !Double.IsNaN(x)).Max();
         }
 
+        /// <summary>
+        /// Calculates the maximum number within a range of a list.  The range is clipped to the bounds of the list.
+        /// </summary>
+        /// <param name="t">The list of numbers</param>
+        /// <param name="startIndex">The index at which the range begins</param>
+        /// <param name="count">The number of elements in the range</param>
+        /// <returns>The maximum number found in the range, or NaN if the range is empty</returns>
+        public static double MaxInRange ( List<double> t, int startIndex, int count )
+        {
+            int first = Math.Max(0, startIndex);
+            int last = Math.Min(t.Count, startIndex + count);
+
+            double result = double.NaN;
+            for (int i = first; i < last; i++)
+            {
+                if (t[i] > result || double.IsNaN(result))
+                {
+                    result = t[i];
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Calculates the minimum number within a range of a list.  The range is clipped to the bounds of the list.
+        /// </summary>
+        /// <param name="t">The list of numbers</param>
+        /// <param name="startIndex">The index at which the range begins</param>
+        /// <param name="count">The number of elements in the range</param>
+        /// <returns>The minimum number found in the range, or NaN if the range is empty</returns>
+        public static double MinInRange ( List<double> t, int startIndex, int count )
+        {
+            int first = Math.Max(0, startIndex);
+            int last = Math.Min(t.Count, startIndex + count);
+
+            double result = double.NaN;
+            for (int i = first; i < last; i++)
+            {
+                if (t[i] < result || double.IsNaN(result))
+                {
+                    result = t[i];
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Finds the first element within a range of a list that is greater than or equal to a threshold.
+        /// The range is clipped to the bounds of the list.
+        /// </summary>
+        /// <param name="t">The list of numbers</param>
+        /// <param name="threshold">The threshold</param>
+        /// <param name="startIndex">The index at which the range begins</param>
+        /// <param name="count">The number of elements in the range</param>
+        /// <returns>The index of the first element at or above the threshold, or -1 if no such element exists</returns>
+        public static int FindFirstIndexAtOrAbove ( List<double> t, double threshold, int startIndex, int count )
+        {
+            int first = Math.Max(0, startIndex);
+            int last = Math.Min(t.Count, startIndex + count);
+
+            for (int i = first; i < last; i++)
+            {
+                if (t[i] >= threshold)
+                {
+                    return i;
+                }
+            }
+
+            return -1;
+        }
+
         /// <summary>
         /// Calculates the absolute value of every element in a list, and returns the result.
         /// </summary>
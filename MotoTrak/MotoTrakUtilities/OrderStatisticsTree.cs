@@ -0,0 +1,397 @@
+﻿using System;
+using System.Collections.Generic;
+
+namespace MotoTrakUtilities
+{
+    /// <summary>
+    /// A sorted multiset of doubles that supports insertion, removal, rank, and selection in O(log n) time.
+    /// It is implemented as a size-augmented treap, and it is used wherever MotoTrak needs medians or
+    /// percentiles of values that arrive one at a time (for example, once per trial).
+    /// NaN values are ignored.
+    /// </summary>
+    public class OrderStatisticsTree
+    {
+        #region Private classes
+
+        private class Node
+        {
+            public double Value;
+            public int Priority;
+            public int Size = 1;
+            public Node Left = null;
+            public Node Right = null;
+
+            public Node(double value, int priority)
+            {
+                Value = value;
+                Priority = priority;
+            }
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private Node _root = null;
+        private Random _random = new Random(1);
+
+        #endregion
+
+        #region Public properties
+
+        /// <summary>
+        /// The number of values currently held in the tree
+        /// </summary>
+        public int Count
+        {
+            get
+            {
+                return NodeSize(_root);
+            }
+        }
+
+        /// <summary>
+        /// The smallest value in the tree, or NaN if the tree is empty
+        /// </summary>
+        public double Minimum
+        {
+            get
+            {
+                return (Count > 0) ? Select(0) : double.NaN;
+            }
+        }
+
+        /// <summary>
+        /// The largest value in the tree, or NaN if the tree is empty
+        /// </summary>
+        public double Maximum
+        {
+            get
+            {
+                return (Count > 0) ? Select(Count - 1) : double.NaN;
+            }
+        }
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Adds a value to the tree.
+        /// </summary>
+        /// <param name="value">The value to add</param>
+        public void Add (double value)
+        {
+            if (double.IsNaN(value))
+            {
+                return;
+            }
+
+            Node less, greater_or_equal;
+            SplitLessThan(_root, value, out less, out greater_or_equal);
+            _root = Merge(Merge(less, new Node(value, _random.Next())), greater_or_equal);
+        }
+
+        /// <summary>
+        /// Removes one occurrence of a value from the tree.
+        /// </summary>
+        /// <param name="value">The value to remove</param>
+        /// <returns>True if a value was removed, false if the value was not found</returns>
+        public bool Remove (double value)
+        {
+            if (double.IsNaN(value))
+            {
+                return false;
+            }
+
+            Node less, greater_or_equal, equal, greater;
+            SplitLessThan(_root, value, out less, out greater_or_equal);
+            SplitLessThanOrEqual(greater_or_equal, value, out equal, out greater);
+
+            bool removed = false;
+            if (equal != null)
+            {
+                equal = Merge(equal.Left, equal.Right);
+                removed = true;
+            }
+
+            _root = Merge(Merge(less, equal), greater);
+            return removed;
+        }
+
+        /// <summary>
+        /// Removes all values from the tree.
+        /// </summary>
+        public void Clear ()
+        {
+            _root = null;
+        }
+
+        /// <summary>
+        /// Returns the k-th smallest value in the tree (zero-based).
+        /// </summary>
+        /// <param name="k">The zero-based rank of the value to retrieve</param>
+        /// <returns>The value at rank k</returns>
+        public double Select (int k)
+        {
+            if (k < 0 || k >= Count)
+            {
+                throw new ArgumentOutOfRangeException("k");
+            }
+
+            Node current = _root;
+            while (current != null)
+            {
+                int left_size = NodeSize(current.Left);
+                if (k < left_size)
+                {
+                    current = current.Left;
+                }
+                else if (k == left_size)
+                {
+                    return current.Value;
+                }
+                else
+                {
+                    k -= left_size + 1;
+                    current = current.Right;
+                }
+            }
+
+            //This should never be reached, because k has already been bounds-checked
+            return double.NaN;
+        }
+
+        /// <summary>
+        /// Returns the number of values in the tree that are strictly less than the given value.
+        /// </summary>
+        /// <param name="value">The value to compare against</param>
+        /// <returns>The number of values less than the given value</returns>
+        public int CountLessThan (double value)
+        {
+            int result = 0;
+            Node current = _root;
+            while (current != null)
+            {
+                if (current.Value < value)
+                {
+                    result += NodeSize(current.Left) + 1;
+                    current = current.Right;
+                }
+                else
+                {
+                    current = current.Left;
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Returns the number of values in the tree that are less than or equal to the given value.
+        /// </summary>
+        /// <param name="value">The value to compare against</param>
+        /// <returns>The number of values less than or equal to the given value</returns>
+        public int CountLessThanOrEqual (double value)
+        {
+            int result = 0;
+            Node current = _root;
+            while (current != null)
+            {
+                if (current.Value <= value)
+                {
+                    result += NodeSize(current.Left) + 1;
+                    current = current.Right;
+                }
+                else
+                {
+                    current = current.Left;
+                }
+            }
+
+            return result;
+        }
+
+        /// <summary>
+        /// Returns the number of values in the tree that are greater than or equal to the given value.
+        /// </summary>
+        /// <param name="value">The value to compare against</param>
+        /// <returns>The number of values greater than or equal to the given value</returns>
+        public int CountGreaterThanOrEqual (double value)
+        {
+            return Count - CountLessThan(value);
+        }
+
+        /// <summary>
+        /// Calculates the median of the values in the tree. This returns the same result as MotorMath.Median.
+        /// </summary>
+        /// <returns>The median, or NaN if the tree is empty</returns>
+        public double Median ()
+        {
+            int n = Count;
+            if (n == 0)
+            {
+                return double.NaN;
+            }
+
+            int half_index = n / 2;
+            if ((n % 2) == 0)
+            {
+                return (Select(half_index) + Select(half_index - 1)) / 2;
+            }
+            else
+            {
+                return Select(half_index);
+            }
+        }
+
+        /// <summary>
+        /// Calculates the Nth percentile of the values in the tree. This uses the same (Excel-style)
+        /// interpolation as MotorMath.Percentile.
+        /// </summary>
+        /// <param name="excelPercentile">Desired percentile between 0 and 1</param>
+        /// <returns>The number at the Nth percentile, or NaN if the tree is empty</returns>
+        public double Percentile (double excelPercentile)
+        {
+            int N = Count;
+            if (N == 0)
+            {
+                return double.NaN;
+            }
+
+            double n = (N - 1) * excelPercentile + 1;
+            if (n == 1d) return Select(0);
+            else if (n == N) return Select(N - 1);
+            else
+            {
+                int k = (int)n;
+                double d = n - k;
+                double lower = Select(k - 1);
+                return lower + d * (Select(k) - lower);
+            }
+        }
+
+        /// <summary>
+        /// Returns the values in the tree in ascending order.
+        /// </summary>
+        /// <returns>A sorted list of all values in the tree</returns>
+        public List<double> ToSortedList ()
+        {
+            List<double> result = new List<double>(Count);
+            Stack<Node> stack = new Stack<Node>();
+            Node current = _root;
+            while (current != null || stack.Count > 0)
+            {
+                while (current != null)
+                {
+                    stack.Push(current);
+                    current = current.Left;
+                }
+
+                current = stack.Pop();
+                result.Add(current.Value);
+                current = current.Right;
+            }
+
+            return result;
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private static int NodeSize (Node n)
+        {
+            return (n == null) ? 0 : n.Size;
+        }
+
+        private static void UpdateSize (Node n)
+        {
+            n.Size = NodeSize(n.Left) + NodeSize(n.Right) + 1;
+        }
+
+        /// <summary>
+        /// Splits a subtree into values strictly less than the key, and values greater than or equal to the key.
+        /// </summary>
+        private static void SplitLessThan (Node n, double key, out Node left, out Node right)
+        {
+            if (n == null)
+            {
+                left = null;
+                right = null;
+            }
+            else if (n.Value < key)
+            {
+                Node l, r;
+                SplitLessThan(n.Right, key, out l, out r);
+                n.Right = l;
+                UpdateSize(n);
+                left = n;
+                right = r;
+            }
+            else
+            {
+                Node l, r;
+                SplitLessThan(n.Left, key, out l, out r);
+                n.Left = r;
+                UpdateSize(n);
+                left = l;
+                right = n;
+            }
+        }
+
+        /// <summary>
+        /// Splits a subtree into values less than or equal to the key, and values strictly greater than the key.
+        /// </summary>
+        private static void SplitLessThanOrEqual (Node n, double key, out Node left, out Node right)
+        {
+            if (n == null)
+            {
+                left = null;
+                right = null;
+            }
+            else if (n.Value <= key)
+            {
+                Node l, r;
+                SplitLessThanOrEqual(n.Right, key, out l, out r);
+                n.Right = l;
+                UpdateSize(n);
+                left = n;
+                right = r;
+            }
+            else
+            {
+                Node l, r;
+                SplitLessThanOrEqual(n.Left, key, out l, out r);
+                n.Left = r;
+                UpdateSize(n);
+                left = l;
+                right = n;
+            }
+        }
+
+        /// <summary>
+        /// Merges two subtrees, where every value in the left subtree is less than or equal to every value in the right subtree.
+        /// </summary>
+        private static Node Merge (Node left, Node right)
+        {
+            if (left == null) return right;
+            if (right == null) return left;
+
+            if (left.Priority > right.Priority)
+            {
+                left.Right = Merge(left.Right, right);
+                UpdateSize(left);
+                return left;
+            }
+            else
+            {
+                right.Left = Merge(left, right.Left);
+                UpdateSize(right);
+                return right;
+            }
+        }
+
+        #endregion
+    }
+}
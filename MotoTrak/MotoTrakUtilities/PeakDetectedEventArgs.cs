@@ -0,0 +1,58 @@
+﻿using System;
+
+namespace MotoTrakUtilities
+{
+    /// <summary>
+    /// Describes a peak that was found by a StreamingPeakDetector.
+    /// </summary>
+    public class PeakDetectedEventArgs : EventArgs
+    {
+        #region Private data members
+
+        private double _peak_value = double.NaN;
+        private int _peak_index = 0;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a description of a peak
+        /// </summary>
+        /// <param name="peak_value">The value of the signal at the peak</param>
+        /// <param name="peak_index">The index of the peak within the signal</param>
+        public PeakDetectedEventArgs(double peak_value, int peak_index)
+        {
+            _peak_value = peak_value;
+            _peak_index = peak_index;
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The value of the signal at the peak
+        /// </summary>
+        public double PeakValue
+        {
+            get
+            {
+                return _peak_value;
+            }
+        }
+
+        /// <summary>
+        /// The index of the peak within the signal (counted from the first sample added since the detector was last reset)
+        /// </summary>
+        public int PeakIndex
+        {
+            get
+            {
+                return _peak_index;
+            }
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,230 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakUtilities
+{
+    /// <summary>
+    /// A fixed-size window of the most recent values (oldest values are evicted first), which also keeps the values of the
+    /// window in an order statistics tree.  Adding a value (and evicting the oldest) takes O(log n) time, and the median or a
+    /// percentile of the window is found in O(log n) time without copying or sorting the window.  Queries are cached until
+    /// the window changes, so asking for the same statistic again (for example, once per frame) takes O(1) time.
+    /// 
+    /// This is used for the history of adaptive stage parameters, where the window size is set by the parameter's increment.
+    /// It is safe to use from several threads.  NaN values take up a place in the window but are left out of the statistics.
+    /// </summary>
+    public class SlidingWindowOrderStatistics
+    {
+        #region Private data members
+
+        private object _window_lock = new object();
+        private Queue<double> _window = new Queue<double>();
+        private OrderStatisticsTree _sorted_values = new OrderStatisticsTree();
+        private Dictionary<double, double> _cached_percentiles = new Dictionary<double, double>();
+        private double _cached_median = double.NaN;
+        private bool _is_median_cached = false;
+        private int _limit = 10;
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates an empty window that holds up to 10 values
+        /// </summary>
+        public SlidingWindowOrderStatistics()
+        {
+            //empty constructor
+        }
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The largest number of values that the window holds.  If the limit is reduced, the oldest values are evicted.
+        /// </summary>
+        public int Limit
+        {
+            get
+            {
+                return _limit;
+            }
+            set
+            {
+                lock (_window_lock)
+                {
+                    _limit = Math.Max(0, value);
+                    EvictOverflow();
+                }
+            }
+        }
+
+        /// <summary>
+        /// The number of values in the window
+        /// </summary>
+        public int Count
+        {
+            get
+            {
+                lock (_window_lock)
+                {
+                    return _window.Count;
+                }
+            }
+        }
+
+        /// <summary>
+        /// Whether the window holds as many values as its limit
+        /// </summary>
+        public bool IsFull
+        {
+            get
+            {
+                lock (_window_lock)
+                {
+                    return _window.Count == _limit;
+                }
+            }
+        }
+
+        /// <summary>
+        /// A copy of the values in the window, from oldest to newest
+        /// </summary>
+        public List<double> ListClone
+        {
+            get
+            {
+                lock (_window_lock)
+                {
+                    return _window.ToList();
+                }
+            }
+        }
+
+        /// <summary>
+        /// The smallest value in the window, or NaN if the window is empty
+        /// </summary>
+        public double Minimum
+        {
+            get
+            {
+                lock (_window_lock)
+                {
+                    return _sorted_values.Minimum;
+                }
+            }
+        }
+
+        /// <summary>
+        /// The largest value in the window, or NaN if the window is empty
+        /// </summary>
+        public double Maximum
+        {
+            get
+            {
+                lock (_window_lock)
+                {
+                    return _sorted_values.Maximum;
+                }
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Adds a value to the window, evicting the oldest value if the window is full
+        /// </summary>
+        /// <param name="value">The value to add</param>
+        public void Enqueue (double value)
+        {
+            lock (_window_lock)
+            {
+                _window.Enqueue(value);
+                _sorted_values.Add(value);
+                EvictOverflow();
+                InvalidateCache();
+            }
+        }
+
+        /// <summary>
+        /// Removes all values from the window
+        /// </summary>
+        public void Clear ()
+        {
+            lock (_window_lock)
+            {
+                _window.Clear();
+                _sorted_values.Clear();
+                InvalidateCache();
+            }
+        }
+
+        /// <summary>
+        /// The median of the window.  This returns the same result as MotorMath.Median.
+        /// </summary>
+        /// <returns>The median, or NaN if the window is empty</returns>
+        public double Median ()
+        {
+            lock (_window_lock)
+            {
+                if (!_is_median_cached)
+                {
+                    _cached_median = _sorted_values.Median();
+                    _is_median_cached = true;
+                }
+
+                return _cached_median;
+            }
+        }
+
+        /// <summary>
+        /// The Nth percentile of the window.  This uses the same (Excel-style) interpolation as MotorMath.Percentile.
+        /// </summary>
+        /// <param name="excelPercentile">Desired percentile between 0 and 1</param>
+        /// <returns>The number at the Nth percentile, or NaN if the window is empty</returns>
+        public double Percentile (double excelPercentile)
+        {
+            lock (_window_lock)
+            {
+                double result = double.NaN;
+                if (!_cached_percentiles.TryGetValue(excelPercentile, out result))
+                {
+                    result = _sorted_values.Percentile(excelPercentile);
+                    _cached_percentiles[excelPercentile] = result;
+                }
+
+                return result;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private void EvictOverflow ()
+        {
+            bool evicted = false;
+            while (_window.Count > _limit)
+            {
+                _sorted_values.Remove(_window.Dequeue());
+                evicted = true;
+            }
+
+            if (evicted)
+            {
+                InvalidateCache();
+            }
+        }
+
+        private void InvalidateCache ()
+        {
+            _is_median_cached = false;
+            _cached_percentiles.Clear();
+        }
+
+        #endregion
+    }
+}
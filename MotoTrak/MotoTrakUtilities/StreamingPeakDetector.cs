@@ -0,0 +1,311 @@
+﻿using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace MotoTrakUtilities
+{
+    /// <summary>
+    /// Finds the peak of each excursion of a signal above an initiation threshold, one sample at a time.  The detector
+    /// keeps track of whether the signal is above or below the threshold and of the running maximum of the current
+    /// excursion, so each sample is handled in O(1) time and the signal never needs to be scanned again.  Each peak is
+    /// reported (through the PeakDetected event, and as the return value of Add) as soon as the signal falls back below
+    /// the threshold, and a trailing excursion is reported when Finish is called at the end of the trial.
+    /// 
+    /// The peaks are the same as those returned by MotorMath.FindPeaksAboveInitiationThreshold for the same signal, which
+    /// now uses the batch mode of this class (FindPeaks).  In particular, each excursion is measured from the sample just
+    /// before the signal crosses the threshold up to (but not including) the last sample above the threshold, and a signal
+    /// that never goes below the threshold has no peaks.
+    /// </summary>
+    public class StreamingPeakDetector
+    {
+        #region Private data members
+
+        private double _threshold = 0;
+        private int _sample_count = 0;
+        private double _previous_sample = double.NaN;
+        private bool _previous_sample_above_threshold = false;
+        private bool _any_sample_below_threshold = false;
+        private bool _is_in_excursion = false;
+        private int _excursion_sample_count = 0;
+        private double _excursion_max = double.NaN;
+        private int _excursion_max_index = 0;
+        private bool _found_empty_excursion = false;
+        private List<Tuple<double, double>> _peaks = new List<Tuple<double, double>>();
+
+        #endregion
+
+        #region Constructor
+
+        /// <summary>
+        /// Creates a peak detector that uses the given initiation threshold
+        /// </summary>
+        /// <param name="threshold">The initiation threshold</param>
+        public StreamingPeakDetector(double threshold)
+        {
+            _threshold = threshold;
+        }
+
+        #endregion
+
+        #region Events
+
+        /// <summary>
+        /// Raised each time a peak is found
+        /// </summary>
+        public event EventHandler<PeakDetectedEventArgs> PeakDetected;
+
+        #endregion
+
+        #region Properties
+
+        /// <summary>
+        /// The initiation threshold.  A sample is above the threshold if it is greater than or equal to it.
+        /// </summary>
+        public double Threshold
+        {
+            get
+            {
+                return _threshold;
+            }
+        }
+
+        /// <summary>
+        /// The number of samples that have been added since the detector was last reset
+        /// </summary>
+        public int SampleCount
+        {
+            get
+            {
+                return _sample_count;
+            }
+        }
+
+        /// <summary>
+        /// Whether the most recent sample was above the threshold
+        /// </summary>
+        public bool IsInExcursion
+        {
+            get
+            {
+                return _is_in_excursion;
+            }
+        }
+
+        /// <summary>
+        /// The peaks that have been found since the detector was last reset.  Each tuple holds the value of the peak and
+        /// its index within the signal, in the same form as MotorMath.FindPeaksAboveInitiationThreshold.
+        /// </summary>
+        public List<Tuple<double, double>> Peaks
+        {
+            get
+            {
+                return _peaks;
+            }
+        }
+
+        #endregion
+
+        #region Methods
+
+        /// <summary>
+        /// Clears all state, so that the detector is ready for a new signal
+        /// </summary>
+        public void Reset ()
+        {
+            _sample_count = 0;
+            _previous_sample = double.NaN;
+            _previous_sample_above_threshold = false;
+            _any_sample_below_threshold = false;
+            _is_in_excursion = false;
+            _excursion_sample_count = 0;
+            _excursion_max = double.NaN;
+            _excursion_max_index = 0;
+            _found_empty_excursion = false;
+            _peaks = new List<Tuple<double, double>>();
+        }
+
+        /// <summary>
+        /// Clears all state and sets a new initiation threshold
+        /// </summary>
+        /// <param name="threshold">The new initiation threshold</param>
+        public void Reset (double threshold)
+        {
+            _threshold = threshold;
+            Reset();
+        }
+
+        /// <summary>
+        /// Adds the next sample of the signal.
+        /// </summary>
+        /// <param name="sample">The sample</param>
+        /// <returns>The peak that was completed by this sample, or null if no peak was completed</returns>
+        public Tuple<double, double> Add (double sample)
+        {
+            Tuple<double, double> peak = null;
+            bool is_above_threshold = (sample >= _threshold);
+            if (!is_above_threshold)
+            {
+                _any_sample_below_threshold = true;
+            }
+
+            if (_sample_count == 0)
+            {
+                if (is_above_threshold)
+                {
+                    //A signal that begins above the threshold has an excursion that begins at the first sample
+                    StartExcursion();
+                }
+            }
+            else if (is_above_threshold)
+            {
+                //The excursion includes the sample just before the signal crossed the threshold, and each sample after
+                //that, except for the last sample that is above the threshold
+                if (!_previous_sample_above_threshold)
+                {
+                    StartExcursion();
+                }
+
+                IncludeInExcursion(_previous_sample, _sample_count - 1);
+            }
+            else if (_previous_sample_above_threshold)
+            {
+                peak = EndExcursion();
+            }
+
+            _previous_sample = sample;
+            _previous_sample_above_threshold = is_above_threshold;
+            _sample_count++;
+
+            return peak;
+        }
+
+        /// <summary>
+        /// Adds several samples of the signal.
+        /// </summary>
+        /// <param name="samples">The samples</param>
+        /// <returns>The peaks that were completed by these samples</returns>
+        public List<Tuple<double, double>> AddRange (IEnumerable<double> samples)
+        {
+            List<Tuple<double, double>> new_peaks = new List<Tuple<double, double>>();
+            foreach (double sample in samples)
+            {
+                var peak = Add(sample);
+                if (peak != null)
+                {
+                    new_peaks.Add(peak);
+                }
+            }
+
+            return new_peaks;
+        }
+
+        /// <summary>
+        /// Marks the end of the signal.  If the signal ends above the threshold, the peak of the final excursion is reported.
+        /// </summary>
+        /// <returns>The peak of the final excursion, or null if there is none</returns>
+        public Tuple<double, double> Finish ()
+        {
+            if (!_is_in_excursion)
+            {
+                return null;
+            }
+
+            if (!_any_sample_below_threshold)
+            {
+                //A signal that never goes below the threshold has no rises or falls, and so it has no peaks
+                _is_in_excursion = false;
+                return null;
+            }
+
+            return EndExcursion();
+        }
+
+        /// <summary>
+        /// Finds the peaks of a whole signal in one pass.  This returns the same result as
+        /// MotorMath.FindPeaksAboveInitiationThreshold, including the exception that is thrown if the signal is above the
+        /// threshold at its first sample only.
+        /// </summary>
+        /// <param name="v">The signal</param>
+        /// <param name="threshold">The initiation threshold</param>
+        /// <returns>A list of tuples.  The first value of each tuple is the value of the peak, and the second is its index.</returns>
+        public static List<Tuple<double, double>> FindPeaks (List<double> v, double threshold)
+        {
+            StreamingPeakDetector detector = new StreamingPeakDetector(threshold);
+            for (int i = 0; i < v.Count; i++)
+            {
+                detector.Add(v[i]);
+            }
+
+            detector.Finish();
+
+            if (detector._found_empty_excursion)
+            {
+                throw new InvalidOperationException("Sequence contains no elements");
+            }
+
+            return detector.Peaks;
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private void StartExcursion ()
+        {
+            _is_in_excursion = true;
+            _excursion_sample_count = 0;
+            _excursion_max = double.NaN;
+            _excursion_max_index = 0;
+        }
+
+        private void IncludeInExcursion (double sample, int index)
+        {
+            //This follows Enumerable.Max and List.IndexOf: NaN values are only kept if every value is NaN, and the index
+            //is that of the first occurrence of the maximum
+            if (_excursion_sample_count == 0)
+            {
+                _excursion_max = sample;
+                _excursion_max_index = index;
+            }
+            else if (double.IsNaN(_excursion_max))
+            {
+                if (!double.IsNaN(sample))
+                {
+                    _excursion_max = sample;
+                    _excursion_max_index = index;
+                }
+            }
+            else if (sample > _excursion_max)
+            {
+                _excursion_max = sample;
+                _excursion_max_index = index;
+            }
+
+            _excursion_sample_count++;
+        }
+
+        private Tuple<double, double> EndExcursion ()
+        {
+            _is_in_excursion = false;
+
+            if (_excursion_sample_count == 0)
+            {
+                //This only happens if the signal is above the threshold at its first sample only
+                _found_empty_excursion = true;
+                return null;
+            }
+
+            Tuple<double, double> peak = new Tuple<double, double>(_excursion_max, _excursion_max_index);
+            _peaks.Add(peak);
+
+            if (PeakDetected != null)
+            {
+                PeakDetected(this, new PeakDetectedEventArgs(_excursion_max, _excursion_max_index));
+            }
+
+            return peak;
+        }
+
+        #endregion
+    }
+}
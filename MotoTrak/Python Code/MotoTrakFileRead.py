@@ -0,0 +1,367 @@
+# MotoTrakFileRead.py
+# Vulintus, Inc.
+#
+# Reads MotoTrak 2.0 data files (file versions -5, -6, and -7) into Python,
+# for offline analysis.  This is the Python counterpart of the Matlab reader
+# in "Matlab Code", and returns the same structure as a dictionary.  It runs
+# under Python 2.7 and Python 3, and has no dependencies outside of the
+# standard library.
+#
+#   session = read_file(path)
+#   index = read_trial_index(path)
+#   trial = read_trial(path, trial_number)
+#   features = read_trial_features(path)
+
+import mmap
+import os
+import struct
+
+BLOCK_TRIAL = 0
+BLOCK_MANUAL_FEED = 1
+BLOCK_PAUSE_START = 2
+BLOCK_PAUSE_FINISH = 3
+BLOCK_TIMESTAMPED_NOTE = 4
+BLOCK_GENERAL_NOTE = 5
+BLOCK_SESSION_END = 6
+
+CODEC_RAW = 0
+CODEC_DELTA_VARINT = 1
+CODEC_QUANTIZED_DELTA_VARINT = 2
+
+INDEX_FILE_EXTENSION = '.index'
+INDEX_FILE_SIGNATURE = b'MTIX'
+INDEX_FILE_VERSION = 1
+INDEX_ENTRY = struct.Struct('<IqiBI')
+
+FEATURES_FILE_EXTENSION = '.features'
+FEATURES_FILE_SIGNATURE = b'MTFX'
+FEATURES_FILE_VERSION = 1
+FEATURES_ENTRY = struct.Struct('<Iffifffifff')
+FEATURES_FIELDS = ('trial_number', 'threshold', 'peak_value', 'peak_index', 'time_to_peak_ms', 'time_above_threshold_ms',
+                   'absolute_peak_value', 'absolute_peak_index', 'absolute_time_to_peak_ms',
+                   'absolute_time_above_threshold_ms', 'hit_latency_ms')
+
+SUPPORTED_VERSIONS = (-5, -6, -7)
+
+
+class _Reader(object):
+    """Reads little-endian values from a byte string."""
+
+    def __init__(self, data, position=0):
+        self.data = data
+        self.position = position
+
+    def remaining(self):
+        return len(self.data) - self.position
+
+    def read(self, fmt):
+        values = struct.unpack_from('<' + fmt, self.data, self.position)
+        self.position += struct.calcsize('<' + fmt)
+        return values
+
+    def read_one(self, fmt):
+        return self.read(fmt)[0]
+
+    def read_bytes(self, n):
+        if self.remaining() < n:
+            raise EOFError('Unexpected end of file')
+        value = self.data[self.position:self.position + n]
+        self.position += n
+        return value
+
+    def read_string(self, n):
+        return self.read_bytes(n).decode('latin-1')
+
+    def skip(self, n):
+        self.position += n
+
+
+def _read_header(reader):
+    """Reads the session header.  Returns the session dictionary."""
+    version = reader.read_one('b')
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError('Incorrect file version.  We cannot read this file.')
+
+    session = {'version': version}
+    session['start_time'] = reader.read_one('d')
+    session['subject'] = reader.read_string(reader.read_one('B'))
+    session['booth'] = reader.read_string(reader.read_one('B'))
+    session['stage'] = reader.read_string(reader.read_one('B'))
+    session['device'] = reader.read_string(reader.read_one('B'))
+
+    n = reader.read_one('B')
+    session['calibration_coefficients'] = list(reader.read('%df' % n))
+
+    session['data_streams'] = []
+    for i in range(reader.read_one('B')):
+        description = reader.read_string(reader.read_one('B'))
+        units = reader.read_string(reader.read_one('B'))
+        session['data_streams'].append({'stream_description': description, 'stream_units': units})
+
+    session['parameters'] = [reader.read_string(reader.read_one('B')) for i in range(reader.read_one('I'))]
+
+    session['nominal_parameters'] = []
+    if version <= -6:
+        session['nominal_parameters'] = [reader.read_string(reader.read_one('B')) for i in range(reader.read_one('I'))]
+
+    return session
+
+
+def _decode_stream(reader, n_samples):
+    """Reads and decodes one stream of trial data from a compressed (-7) file."""
+    codec = reader.read_one('B')
+    length = reader.read_one('I')
+    payload = bytearray(reader.read_bytes(length))
+
+    if codec == CODEC_RAW:
+        return list(struct.unpack_from('<%df' % n_samples, bytes(payload), 0))
+
+    if codec not in (CODEC_DELTA_VARINT, CODEC_QUANTIZED_DELTA_VARINT):
+        raise ValueError('Unknown signal codec: %d' % codec)
+
+    position = 0
+    quantum = 1.0
+    if codec == CODEC_QUANTIZED_DELTA_VARINT:
+        quantum = struct.unpack_from('<f', bytes(payload), 0)[0]
+        position = 4
+
+    samples = []
+    value = 0
+    for i in range(n_samples):
+        zigzag = 0
+        shift = 0
+        while True:
+            b = payload[position]
+            position += 1
+            zigzag |= (b & 0x7F) << shift
+            shift += 7
+            if b < 0x80:
+                break
+        value += (zigzag >> 1) ^ -(zigzag & 1)
+        samples.append(value * quantum)
+
+    return samples
+
+
+def _read_trial(reader, num_streams, version):
+    """Reads a trial block (after the block identifier).  Returns the trial dictionary."""
+    trial = {}
+    trial['trial_number'] = reader.read_one('I')
+    trial['start_time'] = reader.read_one('d')
+    trial['result'] = reader.read_one('B')
+    trial['end_time'] = float('nan')
+    if trial['result'] == ord('P'):
+        trial['end_time'] = reader.read_one('d')
+
+    (trial['hit_window_duration'], trial['pre_trial_duration'], trial['post_trial_duration'],
+     trial['post_trial_timeout'], trial['position']) = reader.read('5f')
+
+    n = reader.read_one('B')
+    trial['parameters'] = list(reader.read('%df' % n))
+
+    trial['nominal_parameters'] = []
+    if version <= -6:
+        for i in range(reader.read_one('B')):
+            trial['nominal_parameters'].append(reader.read_string(reader.read_one('B')))
+
+    n = reader.read_one('B')
+    trial['hit_times'] = list(reader.read('%dd' % n))
+    n = reader.read_one('B')
+    trial['output_trigger_times'] = list(reader.read('%dd' % n))
+
+    n_samples = reader.read_one('I')
+    trial['signal'] = []
+    for i in range(num_streams):
+        if version == -7:
+            trial['signal'].append(_decode_stream(reader, n_samples))
+        else:
+            trial['signal'].append(list(reader.read('%df' % n_samples)))
+
+    return trial
+
+
+def _skip_block(reader, num_streams, version):
+    """Steps over one block without reading the trial signal.  Returns an index entry for trial blocks, and None otherwise."""
+    byte_offset = reader.position
+    block_id = reader.read_one('i')
+
+    if block_id == BLOCK_TRIAL:
+        trial_number = reader.read_one('I')
+        reader.skip(8)
+        result = reader.read_one('B')
+        if result == ord('P'):
+            reader.skip(8)
+        reader.skip(5 * 4)
+        reader.skip(4 * reader.read_one('B'))
+        if version <= -6:
+            for i in range(reader.read_one('B')):
+                reader.skip(reader.read_one('B'))
+        reader.skip(8 * reader.read_one('B'))
+        reader.skip(8 * reader.read_one('B'))
+        sample_count = reader.read_one('I')
+        if version == -7:
+            for i in range(num_streams):
+                reader.skip(1)
+                reader.skip(reader.read_one('I'))
+        else:
+            reader.skip(4 * num_streams * sample_count)
+        return {'trial_number': trial_number, 'byte_offset': byte_offset, 'block_length': reader.position - byte_offset,
+                'result': result, 'sample_count': sample_count}
+
+    if block_id in (BLOCK_MANUAL_FEED, BLOCK_PAUSE_START, BLOCK_PAUSE_FINISH, BLOCK_SESSION_END):
+        reader.skip(8)
+    elif block_id == BLOCK_TIMESTAMPED_NOTE:
+        reader.skip(8)
+        reader.skip(reader.read_one('H'))
+    elif block_id == BLOCK_GENERAL_NOTE:
+        reader.skip(reader.read_one('H'))
+
+    return None
+
+
+def _read_index_file(index_path, session_file_length):
+    """Reads the entries of a trial index file, stopping at the first entry that is incomplete or out of range."""
+    entries = []
+    if not os.path.isfile(index_path):
+        return entries
+
+    with open(index_path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < 8 or data[0:4] != INDEX_FILE_SIGNATURE or struct.unpack_from('<i', data, 4)[0] != INDEX_FILE_VERSION:
+        return entries
+
+    position = 8
+    while len(data) - position >= INDEX_ENTRY.size:
+        trial_number, byte_offset, block_length, result, sample_count = INDEX_ENTRY.unpack_from(data, position)
+        position += INDEX_ENTRY.size
+        if byte_offset < 0 or block_length <= 0 or byte_offset + block_length > session_file_length:
+            break
+        entries.append({'trial_number': trial_number, 'byte_offset': byte_offset, 'block_length': block_length,
+                        'result': result, 'sample_count': sample_count})
+
+    return entries
+
+
+def _is_trial_block_at(data, entry):
+    """Checks whether a trial block with the trial number of an index entry begins where the entry says it does."""
+    if entry['byte_offset'] < 0 or entry['byte_offset'] + 8 > len(data):
+        return False
+    block_id, trial_number = struct.unpack_from('<iI', data, entry['byte_offset'])
+    return block_id == BLOCK_TRIAL and trial_number == entry['trial_number']
+
+
+def _load(path):
+    """Maps a session file into memory (so that only the parts that are read are loaded from disk), and reads its header."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError('The file is empty.')
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    reader = _Reader(data)
+    session = _read_header(reader)
+    return data, reader, session
+
+
+def read_file(path):
+    """Reads an entire MotoTrak session file.  Returns a dictionary with the session header and a list of trials."""
+    data, reader, session = _load(path)
+    version = session['version']
+    num_streams = len(session['data_streams'])
+
+    session['trial'] = []
+    session['manual_feeds'] = []
+    session['pause_start_times'] = []
+    session['pause_end_times'] = []
+    session['session_notes'] = ''
+    session['timestamped_notes'] = []
+
+    while reader.remaining() >= 4:
+        try:
+            block_id = reader.read_one('i')
+            if block_id == BLOCK_TRIAL:
+                session['trial'].append(_read_trial(reader, num_streams, version))
+            elif block_id == BLOCK_MANUAL_FEED:
+                session['manual_feeds'].append(reader.read_one('d'))
+            elif block_id == BLOCK_PAUSE_START:
+                session['pause_start_times'].append(reader.read_one('d'))
+            elif block_id == BLOCK_PAUSE_FINISH:
+                session['pause_end_times'].append(reader.read_one('d'))
+            elif block_id == BLOCK_TIMESTAMPED_NOTE:
+                timestamp = reader.read_one('d')
+                text = reader.read_string(reader.read_one('H'))
+                session['timestamped_notes'].append({'timestamp': timestamp, 'text': text})
+            elif block_id == BLOCK_GENERAL_NOTE:
+                session['session_notes'] = reader.read_string(reader.read_one('H'))
+            elif block_id == BLOCK_SESSION_END:
+                session['end_time'] = reader.read_one('d')
+        except (struct.error, EOFError, IndexError):
+            # The last block in the file is incomplete
+            break
+
+    return session
+
+
+def read_trial_index(path):
+    """Returns the trial number, byte offset, block length, result, and sample count of every trial in a session file.
+    The trial index file that is saved alongside the session file is used when it matches the session file, and the rest
+    of the session file is scanned for any trials that are missing from it."""
+    data, reader, session = _load(path)
+    return _build_trial_index(path, data, reader, session)
+
+
+def _build_trial_index(path, data, reader, session):
+    num_streams = len(session['data_streams'])
+
+    entries = _read_index_file(path + INDEX_FILE_EXTENSION, len(data))
+    if entries:
+        if _is_trial_block_at(data, entries[-1]):
+            reader.position = entries[-1]['byte_offset'] + entries[-1]['block_length']
+        else:
+            entries = []
+
+    while reader.remaining() > 0:
+        try:
+            entry = _skip_block(reader, num_streams, session['version'])
+        except (struct.error, EOFError):
+            break
+        if reader.position > len(data):
+            break
+        if entry is not None:
+            entries.append(entry)
+
+    return entries
+
+
+def read_trial(path, trial_number):
+    """Reads one trial (trial_number is the one-based position of the trial in the session) by seeking directly to it.
+    Returns the trial dictionary, or None if the trial does not exist."""
+    data, reader, session = _load(path)
+    entries = _build_trial_index(path, data, reader, session)
+    if trial_number < 1 or trial_number > len(entries):
+        return None
+
+    reader.position = entries[trial_number - 1]['byte_offset'] + 4
+    return _read_trial(reader, len(session['data_streams']), session['version'])
+
+
+def read_trial_features(path):
+    """Returns the features of every trial in a session file (peak value, time to peak, time above threshold, hit latency,
+    and the same features of the absolute value of the signal), as they were calculated when each trial ended.  These are
+    read from the features file that is saved alongside the session file, so an empty list is returned without one."""
+    entries = []
+    features_path = path + FEATURES_FILE_EXTENSION
+    if not os.path.isfile(features_path):
+        return entries
+
+    with open(features_path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < 8 or data[0:4] != FEATURES_FILE_SIGNATURE or struct.unpack_from('<i', data, 4)[0] != FEATURES_FILE_VERSION:
+        return entries
+
+    position = 8
+    while len(data) - position >= FEATURES_ENTRY.size:
+        entries.append(dict(zip(FEATURES_FIELDS, FEATURES_ENTRY.unpack_from(data, position))))
+        position += FEATURES_ENTRY.size
+
+    return entries
@@ -0,0 +1,381 @@
+# MotoTrakMotorMath.py
+# Vulintus, Inc.
+#
+# NumPy versions of the signal functions in MotoTrakUtilities.MotorMath, for
+# offline analysis of whole cohorts.  Each function takes a 2-D array of
+# trials x samples (or a 1-D array for a single trial) and works along the
+# last axis, so every trial is processed in the same vectorized pass.  The
+# results are the same, bit for bit, as those of the C# functions: sums are
+# added in the same order, NaN values are sorted before all other values (as
+# Array.Sort and OrderBy do in .NET), and Percentile uses the same Excel-style
+# interpolation.  Where the C# function would throw an exception, these
+# functions raise ValueError.
+#
+# It runs under Python 2.7 and Python 3, and needs NumPy.
+#
+#   signals = numpy.array(...)              # trials x samples
+#   medians = median(signals)
+#   q1 = percentile(signals, 0.25)
+#   rows, values, positions = find_peaks(smooth_signal(signals, 3))
+#
+# Running this file benchmarks each function on simulated trials:
+#
+#   python MotoTrakMotorMath.py [n_trials] [n_samples]
+
+import sys
+import time
+
+import numpy
+
+
+def _as_trials(values):
+    """Returns the values as a 2-D float array of trials x samples, and whether the input was a single trial."""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if values.ndim == 1:
+        return values[numpy.newaxis, :], True
+    if values.ndim != 2:
+        raise ValueError('Expected a 1-D or 2-D array of trials x samples.')
+    return values, False
+
+
+def _result(values, is_single_trial):
+    return values[0] if is_single_trial else values
+
+
+def _sequential_sum(values):
+    """Sums each row from left to right, starting at zero, as Enumerable.Sum and Enumerable.Average do.
+    (numpy.sum adds in pairs, which rounds differently.)"""
+    columns = numpy.asfortranarray(values)
+    total = numpy.zeros(values.shape[0])
+    for j in range(values.shape[1]):
+        total += columns[:, j]
+    return total
+
+
+def _sorted_with_nan_first(values):
+    """Sorts each row, and returns the sorted rows with the number of NaN values in each.  NumPy sorts NaN values last,
+    while .NET sorts them first, so position p of the .NET ordering is position p - (NaN count) of the NumPy ordering."""
+    return numpy.sort(values, axis=1), numpy.isnan(values).sum(axis=1)
+
+
+def _element_at(sorted_values, nan_counts, position):
+    """Returns the element at a position of each row, in the .NET ordering (see _sorted_with_nan_first)."""
+    index = position - nan_counts
+    taken = numpy.take_along_axis(sorted_values, numpy.clip(index, 0, None)[:, numpy.newaxis], axis=1)[:, 0]
+    return numpy.where(index >= 0, taken, numpy.nan)
+
+
+def median(values):
+    """MotorMath.Median of each trial.  An empty trial has a median of NaN."""
+    values, is_single_trial = _as_trials(values)
+    n = values.shape[1]
+    if n == 0:
+        return _result(numpy.full(values.shape[0], numpy.nan), is_single_trial)
+
+    sorted_values, nan_counts = _sorted_with_nan_first(values)
+    half_index = n // 2
+    if n % 2 == 0:
+        result = (_element_at(sorted_values, nan_counts, half_index) + _element_at(sorted_values, nan_counts, half_index - 1)) / 2
+    else:
+        result = _element_at(sorted_values, nan_counts, half_index)
+
+    return _result(result, is_single_trial)
+
+
+def percentile(values, excel_percentile):
+    """MotorMath.Percentile of each trial, where excel_percentile is between 0 and 1 (as with Excel's PERCENTILE)."""
+    values, is_single_trial = _as_trials(values)
+    n = values.shape[1]
+    sorted_values, nan_counts = _sorted_with_nan_first(values)
+
+    rank = (n - 1) * excel_percentile + 1
+    if n > 0 and rank == 1:
+        result = _element_at(sorted_values, nan_counts, 0)
+    elif n > 0 and rank == n:
+        result = _element_at(sorted_values, nan_counts, n - 1)
+    else:
+        k = int(rank)
+        if k < 1 or k > n - 1:
+            raise ValueError('The percentile must be between 0 and 1, and each trial must have at least one value.')
+        d = rank - k
+        lower = _element_at(sorted_values, nan_counts, k - 1)
+        upper = _element_at(sorted_values, nan_counts, k)
+        result = lower + d * (upper - lower)
+
+    return _result(result, is_single_trial)
+
+
+def std_dev(values):
+    """MotorMath.StdDev of each trial.  An empty trial has a standard deviation of NaN."""
+    values, is_single_trial = _as_trials(values)
+    n = values.shape[1]
+    if n == 0:
+        return _result(numpy.full(values.shape[0], numpy.nan), is_single_trial)
+
+    mean = _sequential_sum(values) / n
+    return std_dev_around_mean(values[0] if is_single_trial else values, mean[0] if is_single_trial else mean)
+
+
+def std_dev_around_mean(values, mean):
+    """MotorMath.StdDevAroundMean of each trial.  The mean may be a single value, or one value for each trial.
+    An empty trial has a standard deviation of NaN."""
+    values, is_single_trial = _as_trials(values)
+    n = values.shape[1]
+    if n == 0:
+        return _result(numpy.full(values.shape[0], numpy.nan), is_single_trial)
+
+    mean = numpy.asarray(mean, dtype=numpy.float64)
+    deviations = values - (mean[:, numpy.newaxis] if mean.ndim == 1 else mean)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        result = numpy.sqrt(_sequential_sum(deviations * deviations) / (n - 1))
+
+    return _result(result, is_single_trial)
+
+
+def diff_int(values):
+    """MotorMath.DiffInt of each trial: the difference between each sample and the next, with the last difference
+    repeated so that each trial keeps its number of samples (a trial with one sample becomes a 0)."""
+    values = numpy.asarray(values)
+    if values.shape[-1] == 0:
+        return values.copy()
+    if values.shape[-1] == 1:
+        return numpy.zeros_like(values)
+
+    differences = numpy.diff(values, axis=-1)
+    return numpy.concatenate([differences, differences[..., -1:]], axis=-1)
+
+
+def smooth_signal(values, smoothing_factor=3):
+    """MotorMath.SmoothSignal of each trial: a running average over smoothing_factor samples on each side.  As in the C#
+    function, both ends of the trial are padded with copies of the first sample."""
+    values, is_single_trial = _as_trials(values)
+    n = values.shape[1]
+    if n == 0:
+        return _result(values.copy(), is_single_trial)
+
+    ends = numpy.repeat(values[:, :1], smoothing_factor, axis=1)
+    padded = numpy.concatenate([ends, values, ends], axis=1)
+
+    #Add the samples of each window from left to right, as Enumerable.Average does
+    window_size = (smoothing_factor * 2) + 1
+    total = numpy.zeros(values.shape)
+    for j in range(window_size):
+        total += padded[:, j:j + n]
+
+    return _result(total / window_size, is_single_trial)
+
+
+def _find_peaks_in_trial(v):
+    """MotorMath.FindPeaks of one trial, step by step.  This is used for trials that contain NaN values."""
+    peaks = []
+    mn = numpy.inf
+    mx = -numpy.inf
+    mxpos = numpy.nan
+    look_for_max = True
+    for i in range(len(v)):
+        element = v[i]
+        if element > mx:
+            mx = element
+            mxpos = i
+        if element < mn:
+            mn = element
+
+        if look_for_max:
+            if element < mx:
+                peaks.append((mx, mxpos))
+                mn = element
+                look_for_max = False
+        elif element > mn:
+            mx = element
+            mxpos = i
+            look_for_max = True
+
+    return peaks
+
+
+def _linq_max(segment):
+    """Enumerable.Max of a list of doubles, and the index that List.IndexOf returns for it (NaN is only the maximum if every
+    value is NaN, and NaN is equal to NaN for IndexOf)."""
+    value = segment[0]
+    for x in segment[1:]:
+        if x > value or numpy.isnan(value):
+            value = x
+    if numpy.isnan(value):
+        return value, int(numpy.flatnonzero(numpy.isnan(segment))[0])
+    return value, int(numpy.flatnonzero(segment == value)[0])
+
+
+def _find_peaks_above_threshold_in_trial(v, threshold):
+    """MotorMath.FindPeaksAboveInitiationThreshold of one trial, step by step.  This is used for trials that contain NaN values."""
+    differences = diff_int((v >= threshold).astype(numpy.int64))
+    rises = list(numpy.flatnonzero(differences == 1))
+    falls = list(numpy.flatnonzero(differences == -1))
+    if len(falls) > 0 and len(rises) > 0:
+        if rises[0] >= falls[0]:
+            rises.insert(0, 0)
+        if rises[-1] >= falls[-1]:
+            falls.append(len(differences) - 1)
+    elif len(falls) > 0:
+        rises.append(0)
+    elif len(rises) > 0:
+        falls.append(len(differences) - 1)
+
+    peaks = []
+    for r, f in zip(rises, falls):
+        if f <= r:
+            raise ValueError('A peak above the initiation threshold has no samples (MotorMath throws an exception here).')
+        value, index = _linq_max(v[r:f])
+        peaks.append((value, r + index))
+
+    return peaks
+
+
+def _flatten_peaks(peaks_by_trial):
+    rows = numpy.concatenate([numpy.full(len(p), t, dtype=numpy.int64) for t, p in peaks_by_trial] + [numpy.zeros(0, dtype=numpy.int64)])
+    values = numpy.array([x[0] for t, p in peaks_by_trial for x in p], dtype=numpy.float64)
+    positions = numpy.array([x[1] for t, p in peaks_by_trial for x in p], dtype=numpy.int64)
+    return rows, values, positions
+
+
+def _merge_peaks(fast_peaks, slow_peaks):
+    """Combines the peaks of the vectorized trials with the peaks of the trials that were found step by step, ordered by trial."""
+    rows, values, positions = [numpy.concatenate([a, b]) for a, b in zip(fast_peaks, slow_peaks)]
+    order = numpy.lexsort((positions, rows))
+    return rows[order], values[order], positions[order]
+
+
+def find_peaks(values):
+    """MotorMath.FindPeaks of each trial.  Returns three arrays with one element per peak: the trial (row) of the peak,
+    the value of the peak, and its position (sample index) within the trial.  The peaks are ordered by trial and position."""
+    values, is_single_trial = _as_trials(values)
+    has_nan = numpy.isnan(values).any(axis=1)
+    finite = values[~has_nan]
+    finite_rows = numpy.flatnonzero(~has_nan)
+
+    #Without NaN values, FindPeaks looks for the first fall after each rise (ignoring flat stretches).  The peak is the
+    #sample before the fall, at the position of the last rise before it (or the first sample).
+    t, n = finite.shape
+    sign = numpy.zeros((t, n), dtype=numpy.int8)
+    if n > 1:
+        sign[:, 1:] = (finite[:, 1:] > finite[:, :-1]).astype(numpy.int8) - (finite[:, 1:] < finite[:, :-1]).astype(numpy.int8)
+
+    index = numpy.arange(n)
+    last_change = numpy.maximum.accumulate(numpy.where(sign != 0, index, -1), axis=1)
+    last_rise = numpy.maximum.accumulate(numpy.where(sign == 1, index, 0), axis=1)
+    previous_sign = numpy.zeros((t, n), dtype=numpy.int8)
+    if n > 1:
+        previous_change = last_change[:, :-1]
+        previous_sign[:, 1:] = numpy.where(previous_change >= 0,
+            numpy.take_along_axis(sign, numpy.clip(previous_change, 0, None), axis=1), 0)
+
+    is_peak = (sign == -1) & (previous_sign != -1)
+    peak_rows, peak_falls = numpy.nonzero(is_peak)
+    fast_peaks = (finite_rows[peak_rows], finite[peak_rows, peak_falls - 1], last_rise[peak_rows, peak_falls - 1].astype(numpy.int64))
+
+    slow_peaks = _flatten_peaks([(r, _find_peaks_in_trial(values[r])) for r in numpy.flatnonzero(has_nan)])
+    return _merge_peaks(fast_peaks, slow_peaks)
+
+
+def find_peaks_above_initiation_threshold(values, initiation_threshold):
+    """MotorMath.FindPeaksAboveInitiationThreshold of each trial.  Returns three arrays with one element per peak: the
+    trial (row) of the peak, the value of the peak, and its position within the trial.  The peaks are ordered by trial
+    and position.  The C# function throws an exception for a trial that is above the threshold at its first sample only
+    (or, after a rise, at its last sample only), and this function raises ValueError in the same cases."""
+    values, is_single_trial = _as_trials(values)
+    if values.shape[1] == 0:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0), numpy.zeros(0, dtype=numpy.int64)
+
+    has_nan = numpy.isnan(values).any(axis=1)
+    finite = values[~has_nan]
+    finite_rows = numpy.flatnonzero(~has_nan)
+    t, n = finite.shape
+
+    differences = diff_int((finite >= initiation_threshold).astype(numpy.int8))
+    is_rise = differences == 1
+    is_fall = differences == -1
+    rise_count = is_rise.sum(axis=1)
+    fall_count = is_fall.sum(axis=1)
+    first_rise = numpy.argmax(is_rise, axis=1)
+    first_fall = numpy.argmax(is_fall, axis=1)
+    last_rise = n - 1 - numpy.argmax(is_rise[:, ::-1], axis=1)
+    last_fall = n - 1 - numpy.argmax(is_fall[:, ::-1], axis=1)
+
+    #The same adjustments as the C# function: a rise is added at the first sample if the trial begins with a fall, and a
+    #fall is added at the last sample if the trial ends with a rise
+    both = (rise_count > 0) & (fall_count > 0)
+    add_first_rise = (both & (first_rise >= first_fall)) | ((fall_count > 0) & (rise_count == 0))
+    add_last_fall = (both & (last_rise >= last_fall)) | ((fall_count == 0) & (rise_count > 0))
+    if n > 0:
+        is_rise[:, 0] |= add_first_rise
+        is_fall[:, n - 1] |= add_last_fall
+
+    #Pair the Nth rise of each trial with its Nth fall
+    pair_count = numpy.minimum(is_rise.sum(axis=1), is_fall.sum(axis=1))
+    rise_rows, rise_positions = numpy.nonzero(is_rise)
+    fall_rows, fall_positions = numpy.nonzero(is_fall)
+    rise_rank = numpy.arange(len(rise_rows)) - numpy.searchsorted(rise_rows, rise_rows)
+    fall_rank = numpy.arange(len(fall_rows)) - numpy.searchsorted(fall_rows, fall_rows)
+    keep_rise = rise_rank < pair_count[rise_rows]
+    keep_fall = fall_rank < pair_count[fall_rows]
+    pair_rows = rise_rows[keep_rise]
+    starts = rise_positions[keep_rise]
+    ends = fall_positions[keep_fall]
+    if numpy.any(ends <= starts):
+        raise ValueError('A peak above the initiation threshold has no samples (MotorMath throws an exception here).')
+
+    #Gather the samples of every pair into one array, and find the maximum of each pair (and the first position of it)
+    lengths = ends - starts
+    segment_starts = numpy.concatenate([[0], numpy.cumsum(lengths)[:-1]]).astype(numpy.int64)
+    segment_ids = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    offsets = numpy.arange(lengths.sum()) - segment_starts[segment_ids]
+    samples = finite[pair_rows[segment_ids], starts[segment_ids] + offsets]
+    if len(lengths) > 0:
+        peak_values = numpy.maximum.reduceat(samples, segment_starts)
+        first_offsets = numpy.minimum.reduceat(numpy.where(samples == peak_values[segment_ids], offsets, n), segment_starts)
+    else:
+        peak_values = numpy.zeros(0)
+        first_offsets = numpy.zeros(0, dtype=numpy.int64)
+    fast_peaks = (finite_rows[pair_rows], peak_values, (starts + first_offsets).astype(numpy.int64))
+
+    slow_peaks = _flatten_peaks([(r, _find_peaks_above_threshold_in_trial(values[r], initiation_threshold))
+        for r in numpy.flatnonzero(has_nan)])
+    return _merge_peaks(fast_peaks, slow_peaks)
+
+
+def benchmark(n_trials=100000, n_samples=500, chunk_size=10000, seed=0):
+    """Times each function on simulated pull trials (a sin^2 pull with noise in the middle of each trial), and prints the
+    number of trials processed per second.  The trials are generated and processed in chunks, to bound memory use."""
+    random = numpy.random.RandomState(seed)
+    tests = [
+        ('median', lambda x: median(x)),
+        ('percentile(0.25)', lambda x: percentile(x, 0.25)),
+        ('percentile(0.75)', lambda x: percentile(x, 0.75)),
+        ('std_dev_around_mean', lambda x: std_dev_around_mean(x, 100.0)),
+        ('smooth_signal(3)', lambda x: smooth_signal(x, 3)),
+        ('diff_int', lambda x: diff_int(numpy.rint(x).astype(numpy.int64))),
+        ('find_peaks', lambda x: find_peaks(x)),
+        ('find_peaks_above_initiation_threshold', lambda x: find_peaks_above_initiation_threshold(x, 20.0)),
+    ]
+    elapsed = dict((name, 0.0) for name, f in tests)
+
+    done = 0
+    while done < n_trials:
+        count = min(chunk_size, n_trials - done)
+        phase = numpy.linspace(0, numpy.pi, n_samples // 3)
+        pull = numpy.zeros(n_samples)
+        pull[n_samples // 3:n_samples // 3 + len(phase)] = numpy.sin(phase) ** 2
+        trials = random.uniform(50, 300, (count, 1)) * pull + random.normal(0, 2, (count, n_samples))
+        for name, f in tests:
+            start = time.time()
+            f(trials)
+            elapsed[name] += time.time() - start
+        done += count
+
+    print('%d trials x %d samples' % (n_trials, n_samples))
+    for name, f in tests:
+        print('%-40s %8.2f s %12.0f trials/s' % (name, elapsed[name], n_trials / max(elapsed[name], 1e-9)))
+
+
+if __name__ == '__main__':
+    arguments = [int(x) for x in sys.argv[1:3]]
+    benchmark(*arguments)
@@ -0,0 +1,558 @@
+# MotoTrakRecalibrate.py
+# Vulintus, Inc.
+#
+# Re-applies the calibration of the device signal in stored MotoTrak 2.0
+# session files (file versions -5, -6, and -7), for when a device turns out to
+# have been calibrated wrongly.  The device signal of each trial was saved as
+# Slope * (x - Baseline), using the slope and baseline that are saved in the
+# session header, so the raw signal is recovered by inverting that transform,
+# and the corrected slope and baseline are then applied to it.  The other
+# streams (timestamps, the IR sensor) are raw values and are copied unchanged.
+#
+# The corrected calibrations are read from a calibration history, a CSV file
+# with one row for each calibration:
+#
+#   booth,device,time,baseline,slope
+#   3,Pull,2026-03-02 09:15,507,0.2561
+#
+# Each row gives the correct calibration of a booth's device from that time
+# on (the device may be left empty to match any device).  Each session that
+# started within the chosen time range is recalibrated with the latest row
+# for its booth and device that is not after the start of the session.
+#
+# Files are recalibrated in place, or written to an output folder, along with
+# their trial index and features files (the features are recalculated from the
+# recalibrated signal).  With rescoring turned on, the result of each hit or
+# miss is decided again from the recalibrated signal and the trial's hit
+# threshold, in the same way as the standard pull stages do (the first sample
+# in the hit window at or above the threshold).  The trials of a file are
+# recalibrated together as one array, and the files are divided among worker
+# processes.  Knob sessions are skipped, because the offset that knob stages
+# subtract from the signal of each trial is not saved in the session file.
+#
+# It runs under Python 2.7 and Python 3, and needs NumPy.
+#
+#   history = read_calibration_history('history.csv')
+#   results = recalibrate_files(paths, history, start_time, end_time)
+#
+# From the command line:
+#
+#   python MotoTrakRecalibrate.py history.csv data_folder [--start 2026-03-01]
+#       [--end 2026-04-01] [--output folder] [--rescore] [--processes 4]
+
+import argparse
+import csv
+import datetime
+import multiprocessing
+import os
+import struct
+import sys
+
+import numpy
+
+import MotoTrakFileRead
+
+DEVICE_STREAM_DESCRIPTION = 'Device signal'
+TIMESTAMP_STREAM_DESCRIPTION = 'Timestamp'
+HIT_THRESHOLD_PARAMETER = 'Hit Threshold'
+SESSION_FILE_EXTENSION = '.MotoTrak'
+
+RESULT_HIT = ord('H')
+RESULT_MISS = ord('M')
+RESULT_PAUSE = ord('P')
+
+DEFAULT_SAMPLE_PERIOD_MS = 10.0
+
+_LARGEST_EXACT_INTEGER = 9007199254740992.0
+_TIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+
+def _parse_time(text):
+    """Parses a date, or a date and time, and returns it as a Matlab datenum (the form used in session files)."""
+    text = text.strip()
+    for time_format in _TIME_FORMATS:
+        try:
+            t = datetime.datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        midnight = datetime.datetime(t.year, t.month, t.day)
+        return t.toordinal() + 366 + (t - midnight).total_seconds() / 86400.0
+    raise ValueError('Unrecognized time: ' + text)
+
+
+def read_calibration_history(path):
+    """Reads a calibration history CSV file.  Returns a list of dictionaries with the booth, device, time (as a Matlab
+    datenum), baseline, and slope of each calibration, in order of time."""
+    history = []
+    with open(path, 'r') as f:
+        for row in csv.DictReader(f):
+            row = dict((k.strip().lower(), (v or '').strip()) for k, v in row.items() if k is not None)
+            history.append({'booth': row['booth'], 'device': row.get('device', ''), 'time': _parse_time(row['time']),
+                            'baseline': float(row['baseline']), 'slope': float(row['slope'])})
+    history.sort(key=lambda entry: entry['time'])
+    return history
+
+
+def find_calibration(history, booth, device, session_time):
+    """Returns the latest calibration in the history for a booth and device that is not after a session's start time, or
+    None if there is none."""
+    result = None
+    for entry in history:
+        if entry['time'] > session_time:
+            break
+        if entry['booth'] == booth.strip() and (not entry['device'] or entry['device'].lower() == device.strip().lower()):
+            result = entry
+    return result
+
+
+def _read_layout(data):
+    """Reads the header of a session file, and the position of every block and of every part of each trial block that
+    may change when the file is recalibrated."""
+    reader = MotoTrakFileRead._Reader(data)
+    session = MotoTrakFileRead._read_header(reader)
+    version = session['version']
+    num_streams = len(session['data_streams'])
+
+    #The calibration coefficients follow the version, the start time, and four strings
+    position = 9
+    for i in range(4):
+        position += 1 + struct.unpack_from('<B', data, position)[0]
+    session['coefficients_position'] = position + 1
+    session['header_length'] = reader.position
+
+    blocks = []
+    while reader.remaining() >= 4:
+        start = reader.position
+        block_id = struct.unpack_from('<i', data, start)[0]
+        if block_id != MotoTrakFileRead.BLOCK_TRIAL:
+            MotoTrakFileRead._skip_block(reader, num_streams, version)
+            blocks.append({'start': start, 'end': reader.position, 'trial': None})
+            continue
+
+        try:
+            trial = _read_trial_layout(reader, num_streams, version)
+        except (struct.error, EOFError, IndexError):
+            #The last block in the file is incomplete
+            break
+
+        if reader.position > len(data):
+            break
+        blocks.append({'start': start, 'end': reader.position, 'trial': trial})
+
+    return session, blocks
+
+
+def _read_trial_layout(reader, num_streams, version):
+    """Reads a trial block, keeping the positions of the parts that may change."""
+    reader.skip(4)
+    trial = {'trial_number': reader.read_one('I'), 'start_time': reader.read_one('d')}
+    trial['result_position'] = reader.position
+    trial['result'] = reader.read_one('B')
+    if trial['result'] == RESULT_PAUSE:
+        reader.skip(8)
+    (trial['hit_window_duration'], trial['pre_trial_duration'], _, _, _) = reader.read('5f')
+    trial['parameters'] = list(reader.read('%df' % reader.read_one('B')))
+    if version <= -6:
+        for i in range(reader.read_one('B')):
+            reader.skip(reader.read_one('B'))
+    trial['hit_times_position'] = reader.position
+    trial['hit_times'] = list(reader.read('%dd' % reader.read_one('B')))
+    trial['triggers_position'] = reader.position
+    reader.skip(8 * reader.read_one('B'))
+    trial['sample_count'] = reader.read_one('I')
+
+    trial['streams'] = []
+    for i in range(num_streams):
+        stream_start = reader.position
+        if version == -7:
+            codec = reader.read_one('B')
+            reader.skip(reader.read_one('I'))
+        else:
+            codec = MotoTrakFileRead.CODEC_RAW
+            reader.skip(4 * trial['sample_count'])
+        trial['streams'].append({'start': stream_start, 'end': reader.position, 'codec': codec})
+
+    return trial
+
+
+def _decode_stream(data, stream, sample_count, version):
+    """Decodes one stream of a trial as a NumPy array, in the same way as MotoTrakFileRead."""
+    if version != -7:
+        return numpy.frombuffer(data[stream['start']:stream['end']], dtype='<f4').astype(numpy.float64)
+
+    payload = numpy.frombuffer(data[stream['start'] + 5:stream['end']], dtype=numpy.uint8)
+    if stream['codec'] == MotoTrakFileRead.CODEC_RAW:
+        return payload.view('<f4').astype(numpy.float64)
+    if stream['codec'] not in (MotoTrakFileRead.CODEC_DELTA_VARINT, MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT):
+        raise ValueError('Unknown signal codec: %d' % stream['codec'])
+
+    quantum = 1.0
+    if stream['codec'] == MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT:
+        quantum = float(payload[0:4].view('<f4')[0])
+        payload = payload[4:]
+
+    if sample_count == 0:
+        return numpy.zeros(0)
+
+    #Each varint ends with the first byte below 0x80, and its 7-bit groups are least-significant first
+    ends = numpy.flatnonzero(payload < 0x80)[:sample_count]
+    payload = payload[:ends[-1] + 1]
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    groups = numpy.repeat(numpy.arange(len(ends)), ends - starts + 1)
+    shifts = ((numpy.arange(len(payload)) - starts[groups]) * 7).astype(numpy.uint64)
+    zigzag = numpy.add.reduceat((payload & 0x7F).astype(numpy.uint64) << shifts, starts)
+    deltas = (zigzag >> numpy.uint64(1)).astype(numpy.int64) ^ -(zigzag & numpy.uint64(1)).astype(numpy.int64)
+    return numpy.cumsum(deltas).astype(numpy.float64) * quantum
+
+
+def _encode_varints(values):
+    """Zigzag-encodes the differences between whole numbers and saves them as variable-length integers."""
+    deltas = numpy.diff(numpy.concatenate(([0], values))).astype(numpy.int64)
+    zigzag = ((deltas << 1) ^ (deltas >> 63)).view(numpy.uint64)
+
+    byte_counts = numpy.ones(len(zigzag), dtype=numpy.int64)
+    remainder = zigzag >> numpy.uint64(7)
+    while numpy.any(remainder):
+        byte_counts += remainder > 0
+        remainder >>= numpy.uint64(7)
+
+    starts = numpy.concatenate(([0], numpy.cumsum(byte_counts)[:-1]))
+    encoded = numpy.zeros(int(byte_counts.sum()), dtype=numpy.uint8)
+    for k in range(int(byte_counts.max()) if len(byte_counts) else 0):
+        has_byte = byte_counts > k
+        group = (zigzag[has_byte] >> numpy.uint64(7 * k)) & numpy.uint64(0x7F)
+        more = numpy.where(byte_counts[has_byte] > k + 1, 0x80, 0)
+        encoded[starts[has_byte] + k] = group.astype(numpy.uint8) | more.astype(numpy.uint8)
+    return encoded.tobytes()
+
+
+def _encode_stream(samples, version, original_codec, original_quantum):
+    """Encodes the recalibrated device stream of a trial.  Compressed (-7) files use the codec that MotoTrakSignalCodec
+    would pick, with the quantum that the stream was saved with."""
+    float_samples = samples.astype('<f4')
+    if version != -7:
+        return float_samples.tobytes()
+
+    values = float_samples.astype(numpy.float64)
+    codec = MotoTrakFileRead.CODEC_RAW
+    quantized = None
+    if numpy.all(numpy.isfinite(values)) and numpy.all(numpy.abs(numpy.round(values)) < _LARGEST_EXACT_INTEGER):
+        if numpy.all(numpy.round(values) == values):
+            codec = MotoTrakFileRead.CODEC_DELTA_VARINT
+            quantized = numpy.round(values)
+        elif original_codec == MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT and original_quantum > 0:
+            scaled = numpy.round(values / original_quantum)
+            if numpy.all(numpy.abs(scaled) < _LARGEST_EXACT_INTEGER):
+                codec = MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT
+                quantized = scaled
+
+    payload = b''
+    if codec != MotoTrakFileRead.CODEC_RAW:
+        if codec == MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT:
+            payload = struct.pack('<f', original_quantum)
+        payload += _encode_varints(quantized.astype(numpy.int64))
+
+        #Fall back to the raw codec if nothing was gained
+        if len(payload) >= 4 * len(values):
+            codec = MotoTrakFileRead.CODEC_RAW
+
+    if codec == MotoTrakFileRead.CODEC_RAW:
+        payload = float_samples.tobytes()
+
+    return struct.pack('<BI', codec, len(payload)) + payload
+
+
+def _pad(arrays):
+    """Places a list of 1-D arrays in the rows of a 2-D array, padded with NaN (with at least one column)."""
+    width = max([len(a) for a in arrays] + [1])
+    result = numpy.full((len(arrays), width), numpy.nan)
+    for i, a in enumerate(arrays):
+        result[i, :len(a)] = a
+    return result
+
+
+def _first_index(mask):
+    """Returns the index of the first true value in each row, or -1 for rows without one."""
+    return numpy.where(mask.any(axis=1), numpy.argmax(mask, axis=1), -1)
+
+
+def _calculate_features(signals, lengths, start_index, count, thresholds, hit_index, period):
+    """Calculates the features of each trial within its hit window, in the same way as MotorTrialFeatures.Calculate."""
+    columns = numpy.arange(signals.shape[1])[numpy.newaxis, :]
+    first = numpy.maximum(0, start_index)[:, numpy.newaxis]
+    last = numpy.minimum(lengths, start_index + count)[:, numpy.newaxis]
+    in_window = (columns >= first) & (columns < last)
+    has_window = last[:, 0] > first[:, 0]
+    rows = numpy.arange(signals.shape[0])
+    thresholds = thresholds[:, numpy.newaxis]
+
+    features = {}
+    for prefix, values in (('', signals), ('absolute_', numpy.abs(signals))):
+        #The first maximum in the window is the peak.  NaN samples are passed over, unless every sample in the window is NaN,
+        #in which case the peak is NaN at the last sample.
+        valid = in_window & ~numpy.isnan(values)
+        peak_index = numpy.where(valid.any(axis=1), numpy.argmax(numpy.where(valid, values, -numpy.inf), axis=1),
+                                 numpy.where(has_window, last[:, 0] - 1, -1))
+        peak_value = numpy.where(peak_index >= 0, values[rows, numpy.maximum(peak_index, 0)], numpy.nan)
+        peak_value = numpy.where(valid.any(axis=1), peak_value, numpy.nan)
+
+        with numpy.errstate(invalid='ignore'):
+            samples_above_threshold = (in_window & (values >= thresholds)).sum(axis=1)
+        features[prefix + 'peak_value'] = peak_value
+        features[prefix + 'peak_index'] = peak_index
+        features[prefix + 'time_to_peak_ms'] = numpy.where(peak_index >= 0, (peak_index - start_index) * period, numpy.nan)
+        features[prefix + 'time_above_threshold_ms'] = samples_above_threshold * period
+
+    features['hit_latency_ms'] = numpy.where(hit_index >= 0, (hit_index - start_index) * period, numpy.nan)
+    return features
+
+
+def recalibrate_file(path, history, start_time=None, end_time=None, output_folder=None, rescore=False):
+    """Recalibrates one session file.  Returns a dictionary that describes what was done (the status is 'recalibrated' or
+    'skipped', with the reason a file was skipped)."""
+    result = {'path': path, 'status': 'skipped', 'reason': '', 'trials': 0, 'rescored': 0}
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    session, blocks = _read_layout(data)
+    result['start_time'] = session['start_time']
+
+    if (start_time is not None and session['start_time'] < start_time) or (end_time is not None and session['start_time'] >= end_time):
+        result['reason'] = 'outside of the time range'
+        return result
+    if session['device'].strip().lower() == 'knob':
+        result['reason'] = 'knob sessions cannot be recalibrated'
+        return result
+
+    descriptions = [s['stream_description'] for s in session['data_streams']]
+    coefficients = session['calibration_coefficients']
+    if DEVICE_STREAM_DESCRIPTION not in descriptions or len(coefficients) < 2 or coefficients[1] == 0:
+        result['reason'] = 'no calibrated device signal'
+        return result
+
+    calibration = find_calibration(history, session['booth'], session['device'], session['start_time'])
+    if calibration is None:
+        result['reason'] = 'no calibration in the history for booth ' + session['booth']
+        return result
+
+    old_baseline, old_slope = coefficients[0], coefficients[1]
+    new_baseline, new_slope = calibration['baseline'], calibration['slope']
+    result['old_calibration'] = (old_baseline, old_slope)
+    result['new_calibration'] = (new_baseline, new_slope)
+    if struct.pack('<ff', old_baseline, old_slope) == struct.pack('<ff', new_baseline, new_slope):
+        result['reason'] = 'already calibrated correctly'
+        return result
+
+    version = session['version']
+    device_stream = descriptions.index(DEVICE_STREAM_DESCRIPTION)
+    timestamp_stream = descriptions.index(TIMESTAMP_STREAM_DESCRIPTION) if TIMESTAMP_STREAM_DESCRIPTION in descriptions else None
+    trials = [b['trial'] for b in blocks if b['trial'] is not None]
+    result['trials'] = len(trials)
+
+    #Recalibrate the device signal of every trial in one pass
+    signals = [_decode_stream(data, t['streams'][device_stream], t['sample_count'], version) for t in trials]
+    lengths = numpy.array([len(s) for s in signals], dtype=numpy.int64)
+    flat = numpy.concatenate(signals) if signals else numpy.zeros(0)
+    flat = new_slope * ((flat / old_slope + old_baseline) - new_baseline)
+    signals = numpy.split(flat, numpy.cumsum(lengths)[:-1]) if signals else []
+    padded = _pad(signals)
+
+    #The sample period is taken from the timestamps of each trial, and the hit window from the trial's durations
+    period = numpy.full(len(trials), DEFAULT_SAMPLE_PERIOD_MS)
+    if timestamp_stream is not None and len(trials) > 0:
+        timestamps = _pad([_decode_stream(data, t['streams'][timestamp_stream], t['sample_count'], version) for t in trials])
+        if timestamps.shape[1] > 1:
+            with numpy.errstate(invalid='ignore'):
+                differences = numpy.diff(timestamps, axis=1)
+                differences[differences <= 0] = numpy.nan
+            has_difference = ~numpy.all(numpy.isnan(differences), axis=1)
+            if numpy.any(has_difference):
+                period[has_difference] = numpy.nanmedian(differences[has_difference], axis=1)
+    start_index = numpy.round(numpy.array([t['pre_trial_duration'] for t in trials]) * 1000.0 / period).astype(numpy.int64)
+    window_count = numpy.round(numpy.array([t['hit_window_duration'] for t in trials]) * 1000.0 / period).astype(numpy.int64)
+
+    parameter_names = session['parameters']
+    thresholds = numpy.full(len(trials), numpy.nan)
+    if HIT_THRESHOLD_PARAMETER in parameter_names:
+        k = parameter_names.index(HIT_THRESHOLD_PARAMETER)
+        thresholds = numpy.array([t['parameters'][k] if k < len(t['parameters']) else numpy.nan for t in trials], dtype=numpy.float64)
+
+    columns = numpy.arange(padded.shape[1])[numpy.newaxis, :]
+    in_window = (columns >= numpy.maximum(0, start_index)[:, numpy.newaxis]) & \
+                (columns < numpy.minimum(lengths, start_index + window_count)[:, numpy.newaxis])
+    with numpy.errstate(invalid='ignore'):
+        hit_index = _first_index(in_window & (padded >= thresholds[:, numpy.newaxis]))
+
+    #Decide each hit or miss again, if rescoring was asked for
+    results = numpy.array([t['result'] for t in trials], dtype=numpy.int64)
+    new_results = results.copy()
+    if rescore:
+        can_rescore = ((results == RESULT_HIT) | (results == RESULT_MISS)) & ~numpy.isnan(thresholds)
+        new_results[can_rescore] = numpy.where(hit_index[can_rescore] >= 0, RESULT_HIT, RESULT_MISS)
+        result['rescored'] = int(numpy.sum(new_results != results))
+
+    #Write the recalibrated session file, with a new trial index
+    output_path = path if output_folder is None else os.path.join(output_folder, os.path.basename(path))
+    temporary_path = output_path + '.recalibrating'
+    index_entries = []
+    trial_position = 0
+    with open(temporary_path, 'wb') as f:
+        header = bytearray(data[0:session['header_length']])
+        struct.pack_into('<ff', header, session['coefficients_position'], new_baseline, new_slope)
+        f.write(bytes(header))
+        written = len(header)
+
+        for block in blocks:
+            trial = block['trial']
+            if trial is None:
+                f.write(data[block['start']:block['end']])
+                written += block['end'] - block['start']
+                continue
+
+            i = trial_position
+            trial_position += 1
+            hit_times = trial['hit_times']
+            if new_results[i] != results[i]:
+                hit_times = []
+                if new_results[i] == RESULT_HIT:
+                    hit_times = [trial['start_time'] + (hit_index[i] - start_index[i]) * period[i] / 86400000.0]
+
+            original_stream = trial['streams'][device_stream]
+            quantum = 0.0
+            if version == -7 and original_stream['codec'] == MotoTrakFileRead.CODEC_QUANTIZED_DELTA_VARINT:
+                quantum = struct.unpack_from('<f', data, original_stream['start'] + 5)[0]
+
+            pieces = [data[block['start']:trial['result_position']], struct.pack('<B', int(new_results[i])),
+                      data[trial['result_position'] + 1:trial['hit_times_position']],
+                      struct.pack('<B%dd' % len(hit_times), len(hit_times), *hit_times),
+                      data[trial['triggers_position']:original_stream['start']],
+                      _encode_stream(signals[i], version, original_stream['codec'], quantum),
+                      data[original_stream['end']:block['end']]]
+            block_bytes = b''.join(pieces)
+            f.write(block_bytes)
+            index_entries.append(MotoTrakFileRead.INDEX_ENTRY.pack(trial['trial_number'], written, len(block_bytes),
+                                                                  int(new_results[i]), trial['sample_count']))
+            written += len(block_bytes)
+
+        if blocks:
+            f.write(data[blocks[-1]['end']:])
+        else:
+            f.write(data[session['header_length']:])
+
+    _replace(temporary_path, output_path)
+
+    with open(output_path + MotoTrakFileRead.INDEX_FILE_EXTENSION, 'wb') as f:
+        f.write(MotoTrakFileRead.INDEX_FILE_SIGNATURE + struct.pack('<i', MotoTrakFileRead.INDEX_FILE_VERSION))
+        f.write(b''.join(index_entries))
+
+    #Recalculate the features of the trials in the features file, keeping the threshold each trial was scored with
+    old_features = MotoTrakFileRead.read_trial_features(path)
+    if old_features:
+        feature_hits = numpy.where(new_results == RESULT_HIT, hit_index, -1)
+        row_of_trial = dict((t['trial_number'], i) for i, t in enumerate(trials))
+        feature_thresholds = thresholds.copy()
+        for entry in old_features:
+            if entry['trial_number'] in row_of_trial:
+                i = row_of_trial[entry['trial_number']]
+                feature_thresholds[i] = entry['threshold']
+                if not rescore:
+                    #Without rescoring, each trial keeps the hit it was scored with
+                    feature_hits[i] = -1
+                    if not numpy.isnan(entry['hit_latency_ms']):
+                        feature_hits[i] = start_index[i] + int(round(entry['hit_latency_ms'] / period[i]))
+
+        features = _calculate_features(padded, lengths, start_index, window_count, feature_thresholds, feature_hits, period)
+        features['threshold'] = feature_thresholds
+
+        with open(output_path + MotoTrakFileRead.FEATURES_FILE_EXTENSION, 'wb') as f:
+            f.write(MotoTrakFileRead.FEATURES_FILE_SIGNATURE + struct.pack('<i', MotoTrakFileRead.FEATURES_FILE_VERSION))
+            for entry in old_features:
+                if entry['trial_number'] in row_of_trial:
+                    i = row_of_trial[entry['trial_number']]
+                    entry = dict((name, features[name][i]) for name in MotoTrakFileRead.FEATURES_FIELDS[1:])
+                    entry['trial_number'] = trials[i]['trial_number']
+                f.write(MotoTrakFileRead.FEATURES_ENTRY.pack(*[entry[name] for name in MotoTrakFileRead.FEATURES_FIELDS]))
+
+    result['status'] = 'recalibrated'
+    result['output_path'] = output_path
+    return result
+
+
+def _replace(source, destination):
+    """Replaces a file with another (os.replace is not available in Python 2.7)."""
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+def _recalibrate_job(arguments):
+    path = arguments[0]
+    try:
+        return recalibrate_file(*arguments)
+    except Exception as e:
+        return {'path': path, 'status': 'failed', 'reason': str(e), 'trials': 0, 'rescored': 0}
+
+
+def find_session_files(paths):
+    """Returns the session files among a list of files and folders (folders are searched recursively)."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                files.extend(os.path.join(folder, name) for name in sorted(names) if name.endswith(SESSION_FILE_EXTENSION))
+        else:
+            files.append(path)
+    return files
+
+
+def recalibrate_files(paths, history, start_time=None, end_time=None, output_folder=None, rescore=False, processes=None):
+    """Recalibrates the session files in a list of files and folders, dividing the files among worker processes.  The
+    start and end times are Matlab datenums (or None for no limit).  Returns the result of each file."""
+    files = find_session_files(paths)
+    if output_folder is not None and not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+
+    jobs = [(path, history, start_time, end_time, output_folder, rescore) for path in files]
+    if processes == 1 or len(jobs) <= 1:
+        return [_recalibrate_job(job) for job in jobs]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return list(pool.imap_unordered(_recalibrate_job, jobs))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-applies the calibration of the device signal in MotoTrak session files.')
+    parser.add_argument('history', help='the calibration history (a CSV file)')
+    parser.add_argument('paths', nargs='+', help='session files, or folders to search for session files')
+    parser.add_argument('--start', help='only sessions that started at or after this time')
+    parser.add_argument('--end', help='only sessions that started before this time')
+    parser.add_argument('--output', help='write the recalibrated files to this folder, instead of in place')
+    parser.add_argument('--rescore', action='store_true', help='decide each hit or miss again')
+    parser.add_argument('--processes', type=int, default=None, help='the number of worker processes')
+    args = parser.parse_args()
+
+    history = read_calibration_history(args.history)
+    start_time = _parse_time(args.start) if args.start else None
+    end_time = _parse_time(args.end) if args.end else None
+    results = recalibrate_files(args.paths, history, start_time, end_time, args.output, args.rescore, args.processes)
+
+    for result in sorted(results, key=lambda r: r['path']):
+        if result['status'] == 'recalibrated':
+            print('%s: recalibrated %d trials (%d rescored), baseline %g -> %g, slope %g -> %g' % (
+                result['path'], result['trials'], result['rescored'], result['old_calibration'][0],
+                result['new_calibration'][0], result['old_calibration'][1], result['new_calibration'][1]))
+        else:
+            print('%s: %s (%s)' % (result['path'], result['status'], result['reason']))
+
+    return 0 if all(r['status'] != 'failed' for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# MotoTrakStreamRead.py
+# Vulintus, Inc.
+#
+# Reads the stream files that MotoTrak 2.0 saves alongside session files when
+# "STREAM RECORDING: True" is set in the configuration file.  A stream file
+# holds the raw data from every stream of the controller board for the whole
+# session, including the time between trials, in chunks that each begin with
+# the index and time of their first sample, so any part of the session can be
+# read without reading the rest of the file.  It runs under Python 2.7 and
+# Python 3, and has no dependencies outside of the standard library.
+#
+#   recording = StreamRecording(path)
+#   indices, streams = recording.read_samples(first_sample, sample_count)
+#   indices, streams = recording.read_time_range(start_time, end_time)
+#   sample = recording.sample_at_time(time)
+#   recording.close()
+
+import bisect
+import datetime
+import mmap
+import os
+import struct
+
+STREAM_FILE_EXTENSION = '.stream'
+STREAM_FILE_SIGNATURE = b'MTRS'
+STREAM_FILE_VERSION = 1
+STREAM_HEADER = struct.Struct('<4siiiiiq')
+CHUNK_HEADER = struct.Struct('<qqii')
+
+_TICKS_PER_SECOND = 10000000
+_DATETIME_ZERO = datetime.datetime(1, 1, 1)
+
+
+def _ticks_to_datetime(ticks):
+    """Converts .NET DateTime ticks (100 ns since 0001-01-01) to a datetime."""
+    return _DATETIME_ZERO + datetime.timedelta(microseconds=ticks // 10)
+
+
+class StreamRecording(object):
+    """A stream file, mapped into memory so that only the parts that are read are loaded from disk.  The path may be the
+    path of the session file or of the stream file itself.
+
+    Samples are numbered from the start of the recording.  Samples that MotoTrak had to drop while recording (because the
+    disk could not keep up) keep their numbers but are missing from the file, so the sample indices that are returned
+    alongside the data may skip.  Times may be given as datetimes or as seconds since the start of the recording."""
+
+    def __init__(self, path):
+        if not path.endswith(STREAM_FILE_EXTENSION):
+            path = path + STREAM_FILE_EXTENSION
+        self.path = path
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < STREAM_HEADER.size:
+                raise ValueError('The file is too short to be a stream file.')
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (signature, version, self.stream_count, self.samples_per_chunk, self.sample_period_ms, chunk_count,
+         start_ticks) = STREAM_HEADER.unpack_from(self._data, 0)
+        if signature != STREAM_FILE_SIGNATURE:
+            raise ValueError('The file is not a stream file.')
+        if version != STREAM_FILE_VERSION:
+            raise ValueError('Unsupported stream file version: %d' % version)
+
+        self.start_time = _ticks_to_datetime(start_ticks)
+        self._chunk_size = CHUNK_HEADER.size + self.stream_count * self.samples_per_chunk * 8
+
+        #The chunk count in the header is updated as chunks are started, so a file that is still being recorded (or whose
+        #recording was cut short) is read up to the last chunk that holds samples
+        self.chunks = []
+        for k in range(chunk_count):
+            byte_offset = STREAM_HEADER.size + k * self._chunk_size
+            if byte_offset + self._chunk_size > len(self._data):
+                break
+            first_sample, first_ticks, sample_count, _ = CHUNK_HEADER.unpack_from(self._data, byte_offset)
+            if sample_count <= 0 or sample_count > self.samples_per_chunk:
+                break
+            self.chunks.append({'first_sample': first_sample, 'first_time': _ticks_to_datetime(first_ticks),
+                                'first_ticks': first_ticks, 'sample_count': sample_count, 'byte_offset': byte_offset})
+
+        self._chunk_first_samples = [c['first_sample'] for c in self.chunks]
+        self._chunk_first_ticks = [c['first_ticks'] for c in self.chunks]
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def sample_count(self):
+        """The number of samples in the file (not counting any that were dropped)."""
+        return sum(c['sample_count'] for c in self.chunks)
+
+    @property
+    def end_sample(self):
+        """The index that follows the last sample in the file."""
+        if not self.chunks:
+            return 0
+        return self.chunks[-1]['first_sample'] + self.chunks[-1]['sample_count']
+
+    def _to_ticks(self, time):
+        if isinstance(time, datetime.datetime):
+            delta = time - _DATETIME_ZERO
+            return (delta.days * 86400 + delta.seconds) * _TICKS_PER_SECOND + delta.microseconds * 10
+        start_delta = self.start_time - _DATETIME_ZERO
+        start_ticks = (start_delta.days * 86400 + start_delta.seconds) * _TICKS_PER_SECOND + start_delta.microseconds * 10
+        return start_ticks + int(round(time * _TICKS_PER_SECOND))
+
+    def sample_at_time(self, time):
+        """Returns the index of the first sample taken at or after a time, or the index that follows the last sample if
+        the time is after the end of the recording."""
+        ticks = self._to_ticks(time)
+        k = bisect.bisect_right(self._chunk_first_ticks, ticks) - 1
+        if k < 0:
+            return self.chunks[0]['first_sample'] if self.chunks else 0
+
+        chunk = self.chunks[k]
+        period_ticks = self.sample_period_ms * _TICKS_PER_SECOND // 1000
+        offset = 0
+        if period_ticks > 0:
+            offset = -(-(ticks - chunk['first_ticks']) // period_ticks)
+        if offset < chunk['sample_count']:
+            return chunk['first_sample'] + offset
+        if k + 1 < len(self.chunks):
+            return self.chunks[k + 1]['first_sample']
+        return self.end_sample
+
+    def time_of_sample(self, sample):
+        """Returns the time at which a sample was taken, as a datetime, or None if the sample is not in the file."""
+        k = bisect.bisect_right(self._chunk_first_samples, sample) - 1
+        if k < 0 or sample - self.chunks[k]['first_sample'] >= self.chunks[k]['sample_count']:
+            return None
+        offset = sample - self.chunks[k]['first_sample']
+        return self.chunks[k]['first_time'] + datetime.timedelta(milliseconds=offset * self.sample_period_ms)
+
+    def read_samples(self, first_sample, sample_count):
+        """Reads the samples numbered first_sample to first_sample + sample_count - 1.  Returns the indices of the samples
+        that are in the file, and a list with the values of each stream at those samples."""
+        end = first_sample + sample_count
+        indices = []
+        streams = [[] for _ in range(self.stream_count)]
+
+        k = max(0, bisect.bisect_right(self._chunk_first_samples, first_sample) - 1)
+        while k < len(self.chunks) and self.chunks[k]['first_sample'] < end:
+            chunk = self.chunks[k]
+            start_offset = max(0, first_sample - chunk['first_sample'])
+            end_offset = min(chunk['sample_count'], end - chunk['first_sample'])
+            n = end_offset - start_offset
+            if n > 0:
+                indices.extend(range(chunk['first_sample'] + start_offset, chunk['first_sample'] + end_offset))
+                fmt = '<%dq' % n
+                for s in range(self.stream_count):
+                    position = chunk['byte_offset'] + CHUNK_HEADER.size + (s * self.samples_per_chunk + start_offset) * 8
+                    streams[s].extend(struct.unpack_from(fmt, self._data, position))
+            k += 1
+
+        return indices, streams
+
+    def read_time_range(self, start_time, end_time):
+        """Reads the samples taken from start_time up to (but not including) end_time."""
+        first_sample = self.sample_at_time(start_time)
+        return self.read_samples(first_sample, self.sample_at_time(end_time) - first_sample)
@@ -0,0 +1,185 @@
+# test_MotoTrakMotorMath.py
+# Vulintus, Inc.
+#
+# Checks MotoTrakMotorMath.py against golden outputs written by the C#
+# MotorMath functions (MotoTrakMotorMathGolden.jsonl, one case per line).  The
+# golden file is written by:
+#
+#   SessionRunner.exe --write-motor-math-golden MotoTrakMotorMathGolden.jsonl
+#
+# Each case is checked on its own (as a 1-D trial), and the cases of the same
+# family and length are checked together (as a 2-D array of trials), so that
+# both the single-trial and the vectorized paths are covered.  Results must
+# match exactly; where the C# function threw an exception, ValueError must be
+# raised.
+#
+#   python -m pytest test_MotoTrakMotorMath.py
+
+import json
+import os
+from collections import OrderedDict
+
+import numpy
+import pytest
+
+import MotoTrakMotorMath as motor_math
+
+GOLDEN_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'MotoTrakMotorMathGolden.jsonl')
+
+
+def _load_cases():
+    with open(GOLDEN_FILE) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+CASES = _load_cases()
+
+
+def _groups():
+    """The cases of each family and length, in file order."""
+    groups = OrderedDict()
+    for case in CASES:
+        groups.setdefault((case['family'], case['length']), []).append(case)
+    return list(groups.values())
+
+
+GROUPS = _groups()
+
+
+def _is_error(expected):
+    return isinstance(expected, dict) and 'error' in expected
+
+
+def _same(actual, expected):
+    actual = numpy.asarray(actual, dtype=numpy.float64)
+    expected = numpy.asarray(expected, dtype=numpy.float64)
+    return actual.shape == expected.shape and bool(numpy.all((actual == expected) | (numpy.isnan(actual) & numpy.isnan(expected))))
+
+
+def _peaks(rows, values, positions, row):
+    """The peaks of one trial, as [value, position] pairs (the order in which MotorMath returns them)."""
+    selected = numpy.asarray(rows) == row
+    return [[v, p] for v, p in zip(numpy.asarray(values)[selected], numpy.asarray(positions)[selected])]
+
+
+def _check(label, function, expected, compare=_same):
+    """Calls function, and checks its result against the golden result (or that it raises ValueError)."""
+    if _is_error(expected):
+        with pytest.raises(ValueError):
+            function()
+        return None
+
+    actual = function()
+    assert compare(actual, expected), '%s: expected %r, got %r' % (label, expected, actual)
+
+
+def _label(case):
+    return '%s, length %d, case %d' % (case['family'], case['length'], case['index'])
+
+
+def _trials(group):
+    return numpy.array([case['values'] for case in group], dtype=numpy.float64).reshape(len(group), group[0]['length'])
+
+
+def test_golden_file_covers_every_family():
+    assert len(CASES) >= 3000
+    assert set(case['family'] for case in CASES) == set(['ints', 'reals', 'tenths', 'nan'])
+
+
+def test_median():
+    for case in CASES:
+        _check(_label(case), lambda: motor_math.median(case['values']), case['median'])
+    for group in GROUPS:
+        _check(_label(group[0]), lambda: motor_math.median(_trials(group)), [case['median'] for case in group])
+
+
+def test_percentile():
+    for case in CASES:
+        for rank, expected in case['percentile']:
+            _check('%s, rank %r' % (_label(case), rank), lambda: motor_math.percentile(case['values'], rank), expected)
+    for group in GROUPS:
+        for i, (rank, expected) in enumerate(group[0]['percentile']):
+            all_expected = [case['percentile'][i][1] for case in group]
+            if any(_is_error(x) for x in all_expected):
+                expected = {'error': 'any'}
+            else:
+                expected = all_expected
+            _check('%s, rank %r' % (_label(group[0]), rank), lambda: motor_math.percentile(_trials(group), rank), expected)
+
+
+def test_std_dev():
+    for case in CASES:
+        _check(_label(case), lambda: motor_math.std_dev(case['values']), case['std_dev'])
+    for group in GROUPS:
+        _check(_label(group[0]), lambda: motor_math.std_dev(_trials(group)), [case['std_dev'] for case in group])
+
+
+def test_std_dev_around_mean():
+    for case in CASES:
+        for mean, expected in case['std_dev_around_mean']:
+            _check('%s, mean %r' % (_label(case), mean), lambda: motor_math.std_dev_around_mean(case['values'], mean), expected)
+    for group in GROUPS:
+        for i, (mean, expected) in enumerate(group[0]['std_dev_around_mean']):
+            _check('%s, mean %r' % (_label(group[0]), mean), lambda: motor_math.std_dev_around_mean(_trials(group), mean),
+                [case['std_dev_around_mean'][i][1] for case in group])
+
+
+def test_smooth_signal():
+    for case in CASES:
+        for factor, expected in case['smooth_signal']:
+            _check('%s, factor %r' % (_label(case), factor), lambda: motor_math.smooth_signal(case['values'], int(factor)), expected)
+    for group in GROUPS:
+        for i, (factor, expected) in enumerate(group[0]['smooth_signal']):
+            _check('%s, factor %r' % (_label(group[0]), factor), lambda: motor_math.smooth_signal(_trials(group), int(factor)),
+                [case['smooth_signal'][i][1] for case in group])
+
+
+def test_diff_int():
+    int_cases = [case for case in CASES if 'diff_int' in case]
+    assert int_cases
+    for case in int_cases:
+        values = numpy.array(case['values'], dtype=numpy.int64)
+        _check(_label(case), lambda: motor_math.diff_int(values), case['diff_int'])
+    for group in GROUPS:
+        if 'diff_int' in group[0]:
+            values = _trials(group).astype(numpy.int64)
+            _check(_label(group[0]), lambda: motor_math.diff_int(values), [case['diff_int'] for case in group])
+
+
+def _check_peaks(label, function, cases, expected_by_case):
+    """Checks the peaks found in a 1-D trial or a 2-D array of trials against the golden peaks of each trial."""
+    if any(_is_error(x) for x in expected_by_case):
+        with pytest.raises(ValueError):
+            function()
+        return None
+
+    rows, values, positions = function()
+    for row, (case, expected) in enumerate(zip(cases, expected_by_case)):
+        actual = _peaks(rows, values, positions, row)
+        assert len(actual) == len(expected) and all(_same(a, e) for a, e in zip(actual, expected)), \
+            '%s (%s): expected %r, got %r' % (label, _label(case), expected, actual)
+
+
+def test_find_peaks():
+    for case in CASES:
+        _check_peaks(_label(case), lambda: motor_math.find_peaks(case['values']), [case], [case['find_peaks']])
+    for group in GROUPS:
+        _check_peaks(_label(group[0]), lambda: motor_math.find_peaks(_trials(group)), group, [case['find_peaks'] for case in group])
+
+
+def test_find_peaks_above_initiation_threshold():
+    for case in CASES:
+        for threshold, expected in case['find_peaks_above_initiation_threshold']:
+            _check_peaks('threshold %r' % threshold, lambda: motor_math.find_peaks_above_initiation_threshold(case['values'], threshold),
+                [case], [expected])
+    for group in GROUPS:
+        for i, (threshold, expected) in enumerate(group[0]['find_peaks_above_initiation_threshold']):
+            _check_peaks('threshold %r' % threshold, lambda: motor_math.find_peaks_above_initiation_threshold(_trials(group), threshold),
+                group, [case['find_peaks_above_initiation_threshold'][i][1] for case in group])
+
+
+def test_throwing_cases_are_covered():
+    percentile_errors = sum(1 for case in CASES for rank, expected in case['percentile'] if _is_error(expected))
+    peak_errors = sum(1 for case in CASES for threshold, expected in case['find_peaks_above_initiation_threshold'] if _is_error(expected))
+    assert percentile_errors > 0
+    assert peak_errors > 0
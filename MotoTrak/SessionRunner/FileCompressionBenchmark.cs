@@ -0,0 +1,167 @@
+﻿using MotoTrakBase;
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
+using System.Linq;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Measures how well the compressed MotoTrak file version (-7) works on real session files.  Each session file is read in and
+    /// saved again to a scratch folder with each kind of signal compression, and then each saved file is read back in.  For each
+    /// kind of compression, the total file size, the compression ratio relative to uncompressed files, the decode speed (in MB of
+    /// uncompressed trial data per second), and the largest difference between a decoded sample and its float32 value are printed.
+    /// 
+    /// Usage: SessionRunner.exe --benchmark-file-compression (session_file.MotoTrak | folder) [quantum] [scratch_folder]
+    /// </summary>
+    public static class FileCompressionBenchmark
+    {
+        #region Private classes
+
+        private class CompressionResult
+        {
+            public long FileBytes = 0;
+            public long SignalBytes = 0;
+            public double DecodeSeconds = 0;
+            public double MaximumError = 0;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private const int _decode_repetitions = 3;
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Runs the benchmark
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the benchmark switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --benchmark-file-compression (session_file.MotoTrak | folder) [quantum] [scratch_folder]");
+                return;
+            }
+
+            List<string> session_files = new List<string>();
+            if (Directory.Exists(args[0]))
+            {
+                session_files = Directory.EnumerateFiles(args[0], "*.MotoTrak", SearchOption.AllDirectories).ToList();
+            }
+            else
+            {
+                session_files.Add(args[0]);
+            }
+
+            double quantum = MotoTrakConfiguration.GetInstance().FileCompressionQuantum;
+            if (args.Length > 1)
+            {
+                Double.TryParse(args[1], out quantum);
+            }
+
+            string scratch_folder = (args.Length > 2) ? args[2] : Path.Combine(Path.GetTempPath(), "MotoTrakFileCompressionBenchmark");
+            Directory.CreateDirectory(scratch_folder);
+
+            Dictionary<MotoTrakFileSave.SignalCompression, CompressionResult> results = new Dictionary<MotoTrakFileSave.SignalCompression, CompressionResult>();
+            foreach (MotoTrakFileSave.SignalCompression compression in Enum.GetValues(typeof(MotoTrakFileSave.SignalCompression)))
+            {
+                results[compression] = new CompressionResult();
+            }
+
+            int sessions_used = 0;
+            foreach (string session_file in session_files)
+            {
+                MotoTrakSession session = MotoTrakFileRead.ReadFile(session_file);
+                if (session == null || session.Trials.Count == 0)
+                {
+                    continue;
+                }
+
+                sessions_used++;
+                foreach (var result in results)
+                {
+                    string scratch_file = Path.Combine(scratch_folder, result.Key.ToString() + ".MotoTrak");
+                    MeasureCompression(session, result.Key, quantum, scratch_file, result.Value);
+                }
+            }
+
+            Console.WriteLine("Compressed " + sessions_used.ToString() + " sessions, with a quantum of " + quantum.ToString() + " for calibrated streams");
+            Console.WriteLine();
+            Console.WriteLine(string.Format("{0,-12}{1,14}{2,10}{3,16}{4,14}", "Compression", "Size (MB)", "Ratio", "Decode (MB/s)", "Max error"));
+
+            long uncompressed_bytes = results[MotoTrakFileSave.SignalCompression.None].FileBytes;
+            foreach (var result in results)
+            {
+                Console.WriteLine(string.Format("{0,-12}{1,14:0.00}{2,10:0.00}{3,16:0.0}{4,14:0.######}",
+                    result.Key.ToString(),
+                    result.Value.FileBytes / 1048576.0,
+                    (result.Value.FileBytes > 0) ? (double)uncompressed_bytes / result.Value.FileBytes : 0,
+                    (result.Value.DecodeSeconds > 0) ? (result.Value.SignalBytes / 1048576.0) / result.Value.DecodeSeconds : 0,
+                    result.Value.MaximumError));
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Saves a session with one kind of compression, reads it back in, and adds the measurements to the result
+        /// </summary>
+        private static void MeasureCompression (MotoTrakSession session, MotoTrakFileSave.SignalCompression compression, double quantum,
+            string scratch_file, CompressionResult result)
+        {
+            MotoTrakFileSave file_save = new MotoTrakFileSave(scratch_file);
+            file_save.Compression = compression;
+            file_save.CompressionQuantum = quantum;
+            if (!file_save.OpenFileStream())
+            {
+                Console.WriteLine("Unable to open " + scratch_file);
+                return;
+            }
+
+            file_save.SaveEntireSession(session);
+            file_save.CloseFileStream();
+
+            result.FileBytes += new FileInfo(scratch_file).Length;
+            result.SignalBytes += session.Trials.Sum(x => x.TrialData.Sum(y => (long)y.Count)) * sizeof(float);
+
+            //Read the file back in a few times, and keep the fastest time (the file is in the disk cache after the first read)
+            double fastest_decode = double.MaxValue;
+            MotoTrakSession decoded_session = null;
+            Stopwatch stopwatch = new Stopwatch();
+            for (int i = 0; i < _decode_repetitions; i++)
+            {
+                stopwatch.Restart();
+                decoded_session = MotoTrakFileRead.ReadFile(scratch_file);
+                stopwatch.Stop();
+
+                fastest_decode = Math.Min(fastest_decode, stopwatch.Elapsed.TotalSeconds);
+            }
+
+            result.DecodeSeconds += fastest_decode;
+
+            //Find the largest difference between a decoded sample and the float32 value that an uncompressed file would hold
+            for (int t = 0; decoded_session != null && t < session.Trials.Count && t < decoded_session.Trials.Count; t++)
+            {
+                for (int s = 0; s < session.Trials[t].TrialData.Count; s++)
+                {
+                    List<double> original = session.Trials[t].TrialData[s];
+                    List<double> decoded = decoded_session.Trials[t].TrialData[s];
+                    for (int x = 0; x < original.Count && x < decoded.Count; x++)
+                    {
+                        result.MaximumError = Math.Max(result.MaximumError, Math.Abs((float)original[x] - decoded[x]));
+                    }
+                }
+            }
+        }
+
+        #endregion
+    }
+}
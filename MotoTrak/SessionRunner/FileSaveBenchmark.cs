@@ -0,0 +1,154 @@
+﻿using MotoTrakBase;
+using MotoTrakUtilities;
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Measures how long the session loop is blocked by MotoTrakFileSave.SaveTrial.  The trials of an existing session file are
+    /// saved over and over to a scratch folder, once with the old per-sample, flush-every-trial writing scheme and once with each
+    /// flush policy of the buffered writer, and the distribution of SaveTrial latencies is printed for each.
+    /// 
+    /// Usage: SessionRunner.exe --benchmark-file-save session_file.MotoTrak [number_of_trials] [scratch_folder]
+    /// </summary>
+    public static class FileSaveBenchmark
+    {
+        #region Public methods
+
+        /// <summary>
+        /// Runs the benchmark
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the benchmark switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --benchmark-file-save session_file.MotoTrak [number_of_trials] [scratch_folder]");
+                return;
+            }
+
+            MotoTrakSession session = MotoTrakFileRead.ReadFile(args[0]);
+            if (session == null || session.Trials.Count == 0)
+            {
+                Console.WriteLine("Unable to read any trials from " + args[0]);
+                return;
+            }
+
+            int number_of_trials = 500;
+            if (args.Length > 1)
+            {
+                Int32.TryParse(args[1], out number_of_trials);
+            }
+
+            string scratch_folder = (args.Length > 2) ? args[2] : Path.Combine(Path.GetTempPath(), "MotoTrakFileSaveBenchmark");
+            Directory.CreateDirectory(scratch_folder);
+
+            Console.WriteLine("Saving " + number_of_trials.ToString() + " trials (" + session.Trials[0].TrialData.Count.ToString() + " streams of " +
+                session.Trials[0].TrialData[0].Count.ToString() + " samples) to " + scratch_folder);
+            Console.WriteLine();
+            Console.WriteLine(string.Format("{0,-28}{1,12}{2,12}{3,12}{4,12}{5,12}", "Writer", "Mean (ms)", "Median", "95th pct", "Max", "Close (ms)"));
+
+            RunLegacyWriter(session, number_of_trials, Path.Combine(scratch_folder, "legacy.MotoTrak"));
+            foreach (MotoTrakFileSave.FlushPolicy policy in Enum.GetValues(typeof(MotoTrakFileSave.FlushPolicy)))
+            {
+                RunBufferedWriter(session, number_of_trials, policy, Path.Combine(scratch_folder, policy.ToString() + ".MotoTrak"));
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Saves trials with MotoTrakFileSave, using the given flush policy
+        /// </summary>
+        private static void RunBufferedWriter (MotoTrakSession session, int number_of_trials, MotoTrakFileSave.FlushPolicy policy, string file_name)
+        {
+            MotoTrakFileSave file_save = new MotoTrakFileSave(file_name);
+            file_save.DurabilityPolicy = policy;
+            if (!file_save.OpenFileStream())
+            {
+                Console.WriteLine("Unable to open " + file_name);
+                return;
+            }
+
+            file_save.SaveSessionHeaders(session);
+
+            List<double> latencies = new List<double>();
+            Stopwatch stopwatch = new Stopwatch();
+            for (int i = 0; i < number_of_trials; i++)
+            {
+                MotorTrial trial = session.Trials[i % session.Trials.Count];
+
+                stopwatch.Restart();
+                file_save.SaveTrial(trial, Convert.ToUInt32(i + 1));
+                stopwatch.Stop();
+
+                latencies.Add(stopwatch.Elapsed.TotalMilliseconds);
+            }
+
+            stopwatch.Restart();
+            file_save.CloseFileStream();
+            stopwatch.Stop();
+
+            PrintResult("Buffered, " + policy.ToString(), latencies, stopwatch.Elapsed.TotalMilliseconds);
+        }
+
+        /// <summary>
+        /// Saves the sample data of each trial the way MotoTrakFileSave.SaveTrial used to: one BinaryWriter call per sample, followed
+        /// by a flush of the file stream, all on the calling thread.
+        /// </summary>
+        private static void RunLegacyWriter (MotoTrakSession session, int number_of_trials, string file_name)
+        {
+            List<double> latencies = new List<double>();
+            Stopwatch stopwatch = new Stopwatch();
+
+            FileStream file_stream = new FileStream(file_name, FileMode.Create);
+            BinaryWriter binary_writer = new BinaryWriter(file_stream, Encoding.ASCII);
+            for (int i = 0; i < number_of_trials; i++)
+            {
+                MotorTrial trial = session.Trials[i % session.Trials.Count];
+
+                stopwatch.Restart();
+                for (int s = 0; s < trial.TrialData.Count; s++)
+                {
+                    for (int x = 0; x < trial.TrialData[s].Count; x++)
+                    {
+                        binary_writer.Write(Convert.ToSingle(trial.TrialData[s][x]));
+                    }
+                }
+                file_stream.Flush();
+                stopwatch.Stop();
+
+                latencies.Add(stopwatch.Elapsed.TotalMilliseconds);
+            }
+
+            stopwatch.Restart();
+            file_stream.Close();
+            stopwatch.Stop();
+
+            PrintResult("Legacy (samples only)", latencies, stopwatch.Elapsed.TotalMilliseconds);
+        }
+
+        /// <summary>
+        /// Prints one row of the results table
+        /// </summary>
+        private static void PrintResult (string writer_name, List<double> latencies, double close_time)
+        {
+            Console.WriteLine(string.Format("{0,-28}{1,12:0.000}{2,12:0.000}{3,12:0.000}{4,12:0.000}{5,12:0.0}",
+                writer_name,
+                latencies.Average(),
+                MotorMath.Median(latencies),
+                MotorMath.Percentile(latencies.ToArray(), 0.95),
+                latencies.Max(),
+                close_time));
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,187 @@
+﻿using MotoTrakUtilities;
+using System;
+using System.Collections.Generic;
+using System.Globalization;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Writes the golden outputs that the Python version of MotorMath ("Python Code/MotoTrakMotorMath.py") is tested against.
+    /// Signals of several lengths are generated from a fixed seed in four families: small integers (with many ties and flat
+    /// stretches), real-valued random walks, multiples of 0.1 (which cannot be represented exactly), and random walks with NaN
+    /// values.  Each signal is run through Median, Percentile, StdDev, StdDevAroundMean, SmoothSignal, DiffInt (integer signals
+    /// only), FindPeaks and FindPeaksAboveInitiationThreshold, and the results are written one case per line, as JSON.  Doubles
+    /// are written so that they read back exactly, and NaN is written as NaN, as Python's json module does.  Where a function
+    /// throws an exception, the name of the exception is written instead of a result.
+    /// 
+    /// Usage: SessionRunner.exe --write-motor-math-golden output_file [cases_per_length]
+    /// </summary>
+    public static class MotorMathGoldenWriter
+    {
+        #region Private data members
+
+        private const int _seed = 20161;
+        private static readonly string[] _families = new string[] { "ints", "reals", "tenths", "nan" };
+        private static readonly int[] _lengths = new int[] { 0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20 };
+        private static readonly double[] _percentiles = new double[] { 0, 0.1, 0.25, 0.5, 0.75, 0.9, 1 };
+        private static readonly double[] _means = new double[] { 0, 0.5, -1.25 };
+        private static readonly int[] _smoothing_factors = new int[] { 1, 3 };
+        private static readonly double[] _thresholds = new double[] { -2, -0.5, 0, 0.3, 1, 3 };
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Writes the golden outputs
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --write-motor-math-golden output_file [cases_per_length]");
+                return;
+            }
+
+            int cases_per_length = 69;
+            if (args.Length > 1)
+            {
+                Int32.TryParse(args[1], out cases_per_length);
+            }
+
+            Random random = new Random(_seed);
+            int case_count = 0;
+            using (StreamWriter writer = new StreamWriter(args[0], false, new UTF8Encoding(false)))
+            {
+                writer.NewLine = "\n";
+                foreach (string family in _families)
+                {
+                    foreach (int length in _lengths)
+                    {
+                        for (int i = 0; i < cases_per_length; i++)
+                        {
+                            List<double> values = CreateSignal(random, family, length);
+                            writer.WriteLine(WriteCase(family, length, i, values));
+                            case_count++;
+                        }
+                    }
+                }
+            }
+
+            Console.WriteLine("Wrote " + case_count.ToString() + " cases to " + args[0]);
+        }
+
+        #endregion
+
+        #region Private methods
+
+        private static List<double> CreateSignal (Random random, string family, int length)
+        {
+            List<double> values = new List<double>();
+            double walk = 0;
+            for (int i = 0; i < length; i++)
+            {
+                switch (family)
+                {
+                    case "ints":
+                        values.Add(random.Next(-3, 4));
+                        break;
+                    case "tenths":
+                        values.Add(random.Next(-20, 21) * 0.1);
+                        break;
+                    case "nan":
+                        walk += random.NextDouble() * 2 - 1;
+                        values.Add((random.NextDouble() < 0.15) ? double.NaN : walk);
+                        break;
+                    default:
+                        walk += random.NextDouble() * 2 - 1;
+                        values.Add(walk);
+                        break;
+                }
+            }
+
+            return values;
+        }
+
+        private static string WriteCase (string family, int length, int index, List<double> values)
+        {
+            List<string> fields = new List<string>();
+            fields.Add(Field("family", "\"" + family + "\""));
+            fields.Add(Field("length", length.ToString(CultureInfo.InvariantCulture)));
+            fields.Add(Field("index", index.ToString(CultureInfo.InvariantCulture)));
+            fields.Add(Field("values", FormatList(values)));
+
+            fields.Add(Field("median", Evaluate(() => FormatNumber(MotorMath.Median(values.ToList())))));
+            fields.Add(Field("percentile", FormatPairs(_percentiles,
+                p => Evaluate(() => FormatNumber(MotorMath.Percentile(values.ToArray(), p))))));
+            fields.Add(Field("std_dev", Evaluate(() => FormatNumber(MotorMath.StdDev(values.ToList())))));
+            fields.Add(Field("std_dev_around_mean", FormatPairs(_means,
+                m => Evaluate(() => FormatNumber(MotorMath.StdDevAroundMean(values.ToList(), m))))));
+            fields.Add(Field("smooth_signal", FormatPairs(_smoothing_factors.Select(x => (double)x).ToArray(),
+                f => Evaluate(() => FormatList(MotorMath.SmoothSignal(values.ToList(), (int)f))))));
+
+            if (family == "ints")
+            {
+                fields.Add(Field("diff_int", Evaluate(() => FormatList(MotorMath.DiffInt(values.Select(x => (int)x).ToList()).Select(x => (double)x).ToList()))));
+            }
+
+            fields.Add(Field("find_peaks", Evaluate(() => FormatPeaks(MotorMath.FindPeaks(values.ToList())))));
+            fields.Add(Field("find_peaks_above_initiation_threshold", FormatPairs(_thresholds,
+                t => Evaluate(() => FormatPeaks(MotorMath.FindPeaksAboveInitiationThreshold(values.ToList(), t))))));
+
+            return "{" + string.Join(", ", fields) + "}";
+        }
+
+        /// <summary>
+        /// Runs a function, and returns its formatted result, or an object that names the exception it threw
+        /// </summary>
+        private static string Evaluate (Func<string> function)
+        {
+            try
+            {
+                return function();
+            }
+            catch (Exception e)
+            {
+                return "{\"error\": \"" + e.GetType().Name + "\"}";
+            }
+        }
+
+        private static string Field (string name, string value)
+        {
+            return "\"" + name + "\": " + value;
+        }
+
+        private static string FormatNumber (double value)
+        {
+            return Double.IsNaN(value) ? "NaN" : value.ToString("R", CultureInfo.InvariantCulture);
+        }
+
+        private static string FormatList (List<double> values)
+        {
+            return "[" + string.Join(", ", values.Select(x => FormatNumber(x))) + "]";
+        }
+
+        /// <summary>
+        /// Formats the peaks found by MotorMath as [value, position] pairs
+        /// </summary>
+        private static string FormatPeaks (List<Tuple<double, double>> peaks)
+        {
+            return "[" + string.Join(", ", peaks.Select(x => "[" + FormatNumber(x.Item1) + ", " + FormatNumber(x.Item2) + "]")) + "]";
+        }
+
+        /// <summary>
+        /// Formats the result for each argument as [argument, result] pairs
+        /// </summary>
+        private static string FormatPairs (double[] arguments, Func<double, string> result)
+        {
+            return "[" + string.Join(", ", arguments.Select(x => "[" + FormatNumber(x) + ", " + result(x) + "]")) + "]";
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,525 @@
+﻿using MotoTrakBase;
+using MotoTrakUtilities;
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.IO;
+using System.Linq;
+using System.Runtime;
+using System.Threading;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Measures how the session loop holds up as more booths run on the same computer.  Each simulated booth runs a real stage
+    /// (and its Python stage implementation) against its own simulated controller board (see MotorBoardSimulator), on its own
+    /// thread, with the same processing frame as MotoTrak: read the stream, transform it, look for a trial initiation or for trial
+    /// events, react to them, and carry out the resulting actions, aiming for one frame every 30 ms.
+    /// 
+    /// The number of booths is doubled from 1 up to the maximum, and each step runs for a fixed time.  For each step, the
+    /// harness reports frame times (overall, and for frames in which a trial ended, which is when the stage implementation does
+    /// most of its work), the latency from the sample on which a hit occurred to the feeder being triggered (this includes any
+    /// reward delay set by the stage), and garbage collections.  Garbage collection pauses are not reported by this version of
+    /// .NET, so a probe thread that wakes every millisecond records how long the process was stalled instead.
+    /// 
+    /// The harness also reports how long each frame spends in the stage implementation.  Stage implementations that implement
+    /// IMotorStageFrameProcessor handle each frame with one call, as MotoTrak does; the dispatch argument ("frame", "legacy", or
+    /// "both") chooses whether that call is used, or whether the stage implementation is called once for each step of the frame,
+    /// so that the interop overhead of the two can be compared.
+    /// 
+    /// Each booth's stage moves its own board's autopositioner (see MotorStage.Autopositioner).
+    /// 
+    /// The harness has no user interface, so it can be run headless (for example, under Mono on Linux).
+    /// 
+    /// Usage: SessionRunner.exe --benchmark-booths stage_file [max_booths] [seconds_per_step] [report.csv] [frame|legacy|both]
+    /// </summary>
+    public static class MultiBoothLoadHarness
+    {
+        #region Private classes
+
+        /// <summary>
+        /// One booth: a stage, its own stage implementation instance, and its own simulated controller board
+        /// </summary>
+        private class SimulatedBooth
+        {
+            public MotorStage Stage = null;
+            public MotorBoardSimulator Board = null;
+            public MotorDevice Device = null;
+            public List<MotorTrial> Trials = new List<MotorTrial>();
+            public bool UseFrameProcessing = true;
+
+            public List<double> FrameMilliseconds = new List<double>();
+            public List<double> StageMilliseconds = new List<double>();
+            public List<double> TrialEndFrameMilliseconds = new List<double>();
+            public List<double> HitToFeedMilliseconds = new List<double>();
+            public int Hits = 0;
+            public int Errors = 0;
+        }
+
+        #endregion
+
+        #region Private data members
+
+        private const int _expected_milliseconds_per_frame = 30;
+        private const double _stall_threshold_in_milliseconds = 20;
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Runs the harness
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the harness switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --benchmark-booths stage_file [max_booths] [seconds_per_step] [report.csv] [frame|legacy|both]");
+                return;
+            }
+
+            string stage_file = args[0];
+
+            int max_booths = 32;
+            if (args.Length > 1)
+            {
+                Int32.TryParse(args[1], out max_booths);
+            }
+
+            double seconds_per_step = 60;
+            if (args.Length > 2)
+            {
+                Double.TryParse(args[2], out seconds_per_step);
+            }
+
+            string report_file = (args.Length > 3) ? args[3] : string.Empty;
+
+            string dispatch = (args.Length > 4) ? args[4].ToLowerInvariant() : "frame";
+            List<bool> dispatch_modes = new List<bool>();
+            if (dispatch.Equals("frame") || dispatch.Equals("both"))
+            {
+                dispatch_modes.Add(true);
+            }
+
+            if (dispatch.Equals("legacy") || dispatch.Equals("both"))
+            {
+                dispatch_modes.Add(false);
+            }
+
+            if (dispatch_modes.Count == 0)
+            {
+                Console.WriteLine("Unknown dispatch: " + dispatch + " (expected frame, legacy, or both)");
+                return;
+            }
+
+            //Load the stage implementations, and make sure nothing reaches for a real controller board
+            MotoTrakConfiguration.GetInstance().ReadConfigurationFile();
+            MotoTrakConfiguration.GetInstance().PreSpecifiedComPort = "SIMULATED";
+            MotoTrakConfiguration.GetInstance().InitializeStageImplementations();
+
+            MotorStage test_stage = MotorStage.LoadStageFromFile(stage_file);
+            if (test_stage == null || test_stage.StageImplementation == null)
+            {
+                Console.WriteLine("Unable to load the stage, or its stage implementation, from " + stage_file);
+                return;
+            }
+
+            Console.WriteLine("Stage: " + test_stage.StageName + ", device: " + test_stage.DeviceType.ToString() + ", sample period: " +
+                test_stage.SamplePeriodInMilliseconds.ToString() + " ms, GC latency mode: " + GCSettings.LatencyMode.ToString() +
+                ", server GC: " + GCSettings.IsServerGC.ToString());
+            Console.WriteLine();
+
+            List<string> report_lines = new List<string>()
+            {
+                "Dispatch,Booths,Frames,MeanFrameMs,P50FrameMs,P99FrameMs,MaxFrameMs,P99TrialEndFrameMs,MeanStageMs,P99StageMs,FramesPerSecondPerBooth,Trials,Hits," +
+                "P50HitToFeedMs,P99HitToFeedMs,MaxHitToFeedMs,Gen0Collections,Gen1Collections,Gen2Collections,Stalls,MaxStallMs,Errors"
+            };
+
+            Console.WriteLine(string.Format("{0,-8}{1,6}{2,10}{3,10}{4,10}{5,10}{6,10}{7,10}{8,12}{9,8}{10,8}{11,10}{12,10}{13,8}{14,8}{15,10}",
+                "Dispatch", "Booths", "Frame ms", "p99", "max", "end p99", "Stage ms", "p99", "fps/booth", "Trials", "Hits", "Feed p50", "Feed p99",
+                "Gen 2", "Stalls", "Max stall"));
+
+            //Double the number of booths at each step, finishing with the maximum
+            List<int> booth_counts = new List<int>();
+            for (int booth_count = 1; booth_count < max_booths; booth_count *= 2)
+            {
+                booth_counts.Add(booth_count);
+            }
+
+            booth_counts.Add(Math.Max(1, max_booths));
+
+            foreach (int booth_count in booth_counts)
+            {
+                foreach (bool use_frame_processing in dispatch_modes)
+                {
+                    string line = RunStep(stage_file, booth_count, seconds_per_step, use_frame_processing);
+                    if (line != null)
+                    {
+                        report_lines.Add(line);
+                    }
+                }
+            }
+
+            if (!string.IsNullOrEmpty(report_file))
+            {
+                File.WriteAllLines(report_file, report_lines);
+                Console.WriteLine();
+                Console.WriteLine("Report saved to " + report_file);
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Runs a number of booths at once for a fixed time, prints a row of the report, and returns the same row in CSV form
+        /// </summary>
+        private static string RunStep (string stage_file, int booth_count, double seconds_per_step, bool use_frame_processing)
+        {
+            List<SimulatedBooth> booths = new List<SimulatedBooth>();
+            for (int i = 0; i < booth_count; i++)
+            {
+                MotorStage stage = MotorStage.LoadStageFromFile(stage_file);
+                if (stage == null || stage.StageImplementation == null)
+                {
+                    return null;
+                }
+
+                SimulatedBooth booth = new SimulatedBooth();
+                booth.Stage = stage;
+                booth.UseFrameProcessing = use_frame_processing;
+                booth.Board = new MotorBoardSimulator(stage.DeviceType, 1000 * booth_count + i);
+                booth.Board.SetStreamingPeriod(stage.SamplePeriodInMilliseconds);
+                booth.Device = booth.Board.GetMotorDevice();
+                stage.Autopositioner = new MotoTrakAutopositioner(booth.Board);
+                stage.StageImplementation.AdjustBeginningStageParameters(new List<MotoTrakSession>(), stage);
+                booths.Add(booth);
+            }
+
+            //Start from a clean heap, so that each step pays only for its own garbage
+            GC.Collect();
+            GC.WaitForPendingFinalizers();
+            int[] collections_before = Enumerable.Range(0, 3).Select(x => GC.CollectionCount(x)).ToArray();
+
+            List<double> stalls = new List<double>();
+            using (CancellationTokenSource cancellation = new CancellationTokenSource())
+            {
+                Thread probe_thread = new Thread(() => RunStallProbe(stalls, cancellation.Token));
+                probe_thread.IsBackground = true;
+                probe_thread.Start();
+
+                List<Thread> booth_threads = booths.Select(x => new Thread(() => RunBooth(x, cancellation.Token)) { IsBackground = true }).ToList();
+                booth_threads.ForEach(x => x.Start());
+
+                cancellation.CancelAfter(TimeSpan.FromSeconds(seconds_per_step));
+                booth_threads.ForEach(x => x.Join());
+                probe_thread.Join();
+            }
+
+            int[] collections = Enumerable.Range(0, 3).Select(x => GC.CollectionCount(x) - collections_before[x]).ToArray();
+
+            List<double> frames = booths.SelectMany(x => x.FrameMilliseconds).ToList();
+            List<double> stage_frames = booths.SelectMany(x => x.StageMilliseconds).ToList();
+            string dispatch = use_frame_processing ? "frame" : "legacy";
+            List<double> trial_end_frames = booths.SelectMany(x => x.TrialEndFrameMilliseconds).ToList();
+            List<double> hit_to_feed = booths.SelectMany(x => x.HitToFeedMilliseconds).ToList();
+            int trials = booths.Sum(x => x.Trials.Count);
+            int hits = booths.Sum(x => x.Hits);
+            int errors = booths.Sum(x => x.Errors);
+            double frames_per_second_per_booth = frames.Count / seconds_per_step / booth_count;
+
+            Console.WriteLine(string.Format("{0,-8}{1,6}{2,10:0.00}{3,10:0.00}{4,10:0.00}{5,10:0.00}{6,10:0.000}{7,10:0.000}{8,12:0.0}{9,8}{10,8}{11,10:0.0}{12,10:0.0}{13,8}{14,8}{15,10:0.0}",
+                dispatch, booth_count, Mean(frames), Percentile(frames, 0.99), Max(frames), Percentile(trial_end_frames, 0.99),
+                Mean(stage_frames), Percentile(stage_frames, 0.99), frames_per_second_per_booth, trials, hits,
+                Percentile(hit_to_feed, 0.5), Percentile(hit_to_feed, 0.99), collections[2], stalls.Count, Max(stalls)));
+
+            return string.Join(",", new object[]
+            {
+                dispatch, booth_count, frames.Count, Mean(frames), Percentile(frames, 0.5), Percentile(frames, 0.99), Max(frames),
+                Percentile(trial_end_frames, 0.99), Mean(stage_frames), Percentile(stage_frames, 0.99), frames_per_second_per_booth, trials, hits,
+                Percentile(hit_to_feed, 0.5), Percentile(hit_to_feed, 0.99), Max(hit_to_feed),
+                collections[0], collections[1], collections[2], stalls.Count, Max(stalls), errors
+            }.Select(x => Convert.ToString(x, System.Globalization.CultureInfo.InvariantCulture)));
+        }
+
+        /// <summary>
+        /// Runs the session loop of one booth until cancellation is requested
+        /// </summary>
+        private static void RunBooth (SimulatedBooth booth, CancellationToken cancellation_token)
+        {
+            MotorStage stage = booth.Stage;
+            IMotorStageImplementation stage_implementation = stage.StageImplementation;
+            IMotorTrialFeatureCalculator feature_calculator = stage_implementation as IMotorTrialFeatureCalculator;
+            IMotorStageFrameProcessor frame_processor = booth.UseFrameProcessing ? stage_implementation as IMotorStageFrameProcessor : null;
+            int device_signal_index = stage.DataStreamTypes.IndexOf(MotorBoardDataStreamType.DeviceValue);
+            int timestamp_index = stage.DataStreamTypes.IndexOf(MotorBoardDataStreamType.Timestamp);
+
+            MotorSignalBlock stream_data_transformed = new MotorSignalBlock(stage.TotalDataStreams, stage.TotalRecordedSamplesPerTrial);
+            stream_data_transformed.Reset(stage.TotalDataStreams, stage.TotalRecordedSamplesPerTrial);
+            MotorSignalBlock new_data_block = new MotorSignalBlock();
+            MotorSignalBlock transformed_new_data = new MotorSignalBlock();
+            IMotorStageSignalBlockImplementation block_implementation = MotorSignalBlockAdapter.For(stage_implementation);
+            List<MotorTrialAction> pending_actions = new List<MotorTrialAction>();
+            List<double> monitored_signal = null;
+            MotorTrial current_trial = null;
+            double hit_sample_time = double.NaN;
+
+            //The simulated board's timestamps count milliseconds from when streaming was enabled, as this clock does
+            booth.Board.EnableStreaming(1);
+            Stopwatch stream_clock = Stopwatch.StartNew();
+            Stopwatch frame_stopwatch = new Stopwatch();
+            Stopwatch stage_stopwatch = new Stopwatch();
+
+            //New trial events are added to the trial, and a hit is counted, as MotoTrak does
+            Action<List<Tuple<MotorTrialEventType, int>>> add_trial_events = (new_events) =>
+            {
+                foreach (var new_event in new_events)
+                {
+                    current_trial.TrialEvents.Add(new MotorTrialEvent() { EventType = new_event.Item1, EventIndex = new_event.Item2 });
+                    if (new_event.Item1 == MotorTrialEventType.SuccessfulTrial && current_trial.Result == MotorTrialResult.Unknown)
+                    {
+                        current_trial.Result = MotorTrialResult.Hit;
+                        current_trial.HitTimes.Add(DateTime.Now);
+                        current_trial.HitIndices.Add(new_event.Item2);
+                        booth.Hits++;
+
+                        if (timestamp_index > -1 && new_event.Item2 >= 0 && new_event.Item2 < current_trial.TrialData[timestamp_index].Count)
+                        {
+                            hit_sample_time = current_trial.TrialData[timestamp_index][new_event.Item2];
+                        }
+                    }
+                }
+            };
+
+            while (!cancellation_token.IsCancellationRequested)
+            {
+                frame_stopwatch.Restart();
+                bool trial_ended = false;
+
+                try
+                {
+                    //Move this booth's autopositioner, if it has somewhere to go
+                    stage.Autopositioner.RunAutopositioner();
+
+                    int buffer_size = stage.TotalRecordedSamplesPerTrial;
+                    stream_data_transformed.WindowLength = buffer_size;
+
+                    //Read the new data
+                    var new_data_points = booth.Board.ReadStream();
+                    if (new_data_points.Count > buffer_size)
+                    {
+                        new_data_points = new_data_points.GetRange(new_data_points.Count - buffer_size, buffer_size);
+                    }
+
+                    int number_of_new_data_points = new_data_points.Count;
+                    new_data_block.SetFromRows(new_data_points);
+
+                    //Transform the new data, and look for a trial initiation or for trial events, with one call into the stage
+                    //implementation if it handles whole frames, or with one call for each step otherwise
+                    stage_stopwatch.Restart();
+                    MotorStageFrame frame = null;
+                    if (frame_processor != null)
+                    {
+                        frame = new MotorStageFrame(new_data_block, number_of_new_data_points, stream_data_transformed, transformed_new_data, stage, booth.Device);
+                        if (current_trial == null)
+                        {
+                            frame.Phase = MotorStageFrame.FramePhase.WaitingForTrial;
+                        }
+                        else
+                        {
+                            frame.Phase = MotorStageFrame.FramePhase.TrialRunning;
+                            frame.Trial = current_trial;
+                            frame.TrialEventHandler = add_trial_events;
+                        }
+
+                        if (!frame_processor.ProcessFrame(frame))
+                        {
+                            frame = null;
+                        }
+                    }
+
+                    int trial_initiation_index = -1;
+                    if (frame != null)
+                    {
+                        trial_initiation_index = frame.TrialInitiationIndex;
+                        AddActions(pending_actions, frame.Actions);
+                    }
+                    else
+                    {
+                        block_implementation.TransformSignalBlock(new_data_block, transformed_new_data, stage, booth.Device);
+                        stream_data_transformed.Append(transformed_new_data);
+
+                        if (current_trial == null)
+                        {
+                            trial_initiation_index = block_implementation.CheckSignalBlockForTrialInitiation(stream_data_transformed, number_of_new_data_points, stage);
+                        }
+                        else
+                        {
+                            for (int i = 0; i < current_trial.TrialData.Count && i < transformed_new_data.StreamCount; i++)
+                            {
+                                current_trial.TrialData[i].AddRange(transformed_new_data.GetStream(i));
+                            }
+
+                            if (current_trial.Result == MotorTrialResult.Unknown)
+                            {
+                                add_trial_events(stage_implementation.CheckForTrialEvent(current_trial, number_of_new_data_points, stage));
+                                AddActions(pending_actions, stage_implementation.ReactToTrialEvents(current_trial, stage));
+                            }
+
+                            AddActions(pending_actions, stage_implementation.PerformActionDuringTrial(current_trial, stage));
+                        }
+                    }
+
+                    booth.StageMilliseconds.Add(stage_stopwatch.Elapsed.TotalMilliseconds);
+
+                    if (current_trial == null)
+                    {
+                        //Wait for a trial to begin
+                        if (trial_initiation_index > -1)
+                        {
+                            current_trial = InitiateTrial(stage, trial_initiation_index, stream_data_transformed);
+                        }
+
+                        //MotoTrak copies the signal for display on each frame while it waits
+                        monitored_signal = stream_data_transformed.GetStream(device_signal_index).ToList();
+                    }
+                    else
+                    {
+                        //End the trial once all of its samples have been collected
+                        if (current_trial.TrialData[0].Count >= stage.TotalRecordedSamplesPerTrial)
+                        {
+                            if (current_trial.Result == MotorTrialResult.Unknown)
+                            {
+                                current_trial.Result = MotorTrialResult.Miss;
+                            }
+
+                            current_trial.TrialEvents.Add(new MotorTrialEvent() { EventType = MotorTrialEventType.TrialEnd, EventIndex = current_trial.TrialData[0].Count - 1 });
+                            AddActions(pending_actions, stage_implementation.ReactToTrialEvents(current_trial, stage));
+                            if (feature_calculator != null)
+                            {
+                                current_trial.Features = feature_calculator.CalculateTrialFeatures(current_trial, stage);
+                            }
+
+                            stage_implementation.CalculateYValueForSessionOverviewPlot(current_trial, stage);
+                            stage_implementation.CreateEndOfTrialMessage(booth.Trials.Count + 1, current_trial, stage);
+                            current_trial.ConvertTimestamps(0, stage);
+                            booth.Trials.Add(current_trial);
+                            stage_implementation.AdjustDynamicStageParameters(booth.Trials, current_trial, stage);
+
+                            current_trial = null;
+                            trial_ended = true;
+                        }
+                    }
+
+                    //Carry out the actions that are due
+                    foreach (var action in pending_actions.Where(x => DateTime.Now >= x.ActionTime).ToList())
+                    {
+                        pending_actions.Remove(action);
+                        if (action.ActionType == MotorTrialActionType.TriggerFeeder)
+                        {
+                            booth.Board.TriggerFeeder();
+                            if (!double.IsNaN(hit_sample_time))
+                            {
+                                booth.HitToFeedMilliseconds.Add(stream_clock.Elapsed.TotalMilliseconds - hit_sample_time);
+                                hit_sample_time = double.NaN;
+                            }
+                        }
+                        else
+                        {
+                            action.ExecuteAction(booth.Board, stage.Autopositioner);
+                        }
+                    }
+                }
+                catch (Exception)
+                {
+                    booth.Errors++;
+                    current_trial = null;
+                }
+
+                double frame_milliseconds = frame_stopwatch.Elapsed.TotalMilliseconds;
+                booth.FrameMilliseconds.Add(frame_milliseconds);
+                if (trial_ended)
+                {
+                    booth.TrialEndFrameMilliseconds.Add(frame_milliseconds);
+                }
+
+                int milliseconds_to_sleep = _expected_milliseconds_per_frame - Convert.ToInt32(Math.Round(frame_milliseconds));
+                if (milliseconds_to_sleep > 0)
+                {
+                    Thread.Sleep(milliseconds_to_sleep);
+                }
+            }
+
+            booth.Board.EnableStreaming(0);
+        }
+
+        /// <summary>
+        /// Creates a new trial from the data in the buffer, as MotoTrak does when a trial is initiated
+        /// </summary>
+        private static MotorTrial InitiateTrial (MotorStage stage, int trial_initiation_index, MotorSignalBlock stream_data_transformed)
+        {
+            trial_initiation_index = Math.Max(0, Math.Min(stream_data_transformed.Length, trial_initiation_index));
+            int point_to_start_keeping_data = Math.Max(0, Math.Min(stream_data_transformed.Length, trial_initiation_index - stage.TotalRecordedSamplesBeforeHitWindow));
+
+            MotorTrial trial = new MotorTrial();
+            trial.StartTime = DateTime.Now;
+            trial.TrialData = Enumerable.Range(0, stream_data_transformed.StreamCount).Select(x => stream_data_transformed.CopyToList(x,
+                point_to_start_keeping_data, Math.Min(stream_data_transformed.Length, trial_initiation_index + 1) - point_to_start_keeping_data)).ToList();
+            trial.TrialEvents.Add(new MotorTrialEvent()
+            {
+                EventType = MotorTrialEventType.TrialInitiation,
+                EventIndex = stage.TotalRecordedSamplesBeforeHitWindow
+            });
+
+            return trial;
+        }
+
+        private static void AddActions (List<MotorTrialAction> pending_actions, List<MotorTrialAction> new_actions)
+        {
+            if (new_actions != null)
+            {
+                pending_actions.AddRange(new_actions);
+            }
+        }
+
+        /// <summary>
+        /// Wakes every millisecond, and records each time the thread was held up for longer than the stall threshold
+        /// (typically by a garbage collection that suspended every thread)
+        /// </summary>
+        private static void RunStallProbe (List<double> stalls, CancellationToken cancellation_token)
+        {
+            Stopwatch stopwatch = Stopwatch.StartNew();
+            double last_wake = 0;
+            while (!cancellation_token.IsCancellationRequested)
+            {
+                Thread.Sleep(1);
+                double now = stopwatch.Elapsed.TotalMilliseconds;
+                if (now - last_wake > _stall_threshold_in_milliseconds)
+                {
+                    stalls.Add(now - last_wake);
+                }
+
+                last_wake = now;
+            }
+        }
+
+        private static double Mean (List<double> values)
+        {
+            return (values.Count > 0) ? values.Average() : double.NaN;
+        }
+
+        private static double Max (List<double> values)
+        {
+            return (values.Count > 0) ? values.Max() : double.NaN;
+        }
+
+        private static double Percentile (List<double> values, double percentile)
+        {
+            return (values.Count > 0) ? MotorMath.Percentile(values.ToArray(), percentile) : double.NaN;
+        }
+
+        #endregion
+    }
+}
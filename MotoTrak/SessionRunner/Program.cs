@@ -13,6 +13,49 @@ namespace SessionRunner
         [STAThread]
         static void Main(string[] args)
         {
+            //Run a benchmark if one was requested on the command line
+            if (args.Length > 0 && args[0].Equals("--benchmark-file-save", StringComparison.OrdinalIgnoreCase))
+            {
+                FileSaveBenchmark.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--benchmark-file-compression", StringComparison.OrdinalIgnoreCase))
+            {
+                FileCompressionBenchmark.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--simulate-board", StringComparison.OrdinalIgnoreCase))
+            {
+                SimulatedBoardStandIn.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--benchmark-booths", StringComparison.OrdinalIgnoreCase))
+            {
+                MultiBoothLoadHarness.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--benchmark-stage-dispatch", StringComparison.OrdinalIgnoreCase))
+            {
+                StageDispatchBenchmark.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--check-signal-quality", StringComparison.OrdinalIgnoreCase))
+            {
+                SignalQualityCheck.Run(args.Skip(1).ToArray());
+                return;
+            }
+
+            if (args.Length > 0 && args[0].Equals("--write-motor-math-golden", StringComparison.OrdinalIgnoreCase))
+            {
+                MotorMathGoldenWriter.Run(args.Skip(1).ToArray());
+                return;
+            }
+
             OpenFileDialog dialog = new OpenFileDialog();
             dialog.Title = "Select a file to analyze";
             dialog.Filter = "MotoTrak File|*.MotoTrak";
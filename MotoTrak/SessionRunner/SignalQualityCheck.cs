@@ -0,0 +1,162 @@
+﻿using MotoTrakBase;
+using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Checks that the signal quality monitor (see MotoTrakSignalQualityMonitor) only raises alerts for faults.  Sessions are
+    /// simulated faster than real time with a simulated controller board (see MotorBoardSimulator) for each kind of device, with
+    /// no noise on the device signal, so that a resting device reads the same converter count, as a real one does:
+    /// 
+    /// An idle session: the animal works at the device, but often leaves it alone for a minute or so.  No alerts should be raised.
+    /// An empty booth: nothing touches the device or the swipe sensor for the whole session.  One flat signal alert should be
+    ///     raised for the device, once the flat signal limit has passed.
+    /// 
+    /// Each frame is handed to the monitor as MotoTrak hands it over: the raw data from the board, and the data with the device
+    /// stream calibrated.  A trial is initiated each time the device signal rises through the initiation threshold.  The exit code
+    /// is 1 if any session raises the wrong number of alerts.
+    /// 
+    /// Usage: SessionRunner.exe --check-signal-quality [minutes_per_session] [flat_signal_limit_in_seconds]
+    /// </summary>
+    public static class SignalQualityCheck
+    {
+        #region Private data members
+
+        private const int _sample_period_in_milliseconds = 10;
+        private const int _milliseconds_per_frame = 30;
+        private const double _idle_movement_interval_in_milliseconds = 20000;
+        private const double _empty_booth_movement_interval_in_milliseconds = 1e12;
+        private const int _device_stream_index = 1;
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Runs the check
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the check switch</param>
+        public static void Run (string[] args)
+        {
+            double minutes_per_session = 60;
+            if (args.Length > 0)
+            {
+                Double.TryParse(args[0], out minutes_per_session);
+            }
+
+            double flat_signal_limit_in_seconds = MotoTrakConfiguration.GetInstance().FlatSignalLimitInSeconds;
+            if (args.Length > 1)
+            {
+                Double.TryParse(args[1], out flat_signal_limit_in_seconds);
+            }
+
+            Console.WriteLine("Simulating " + minutes_per_session.ToString() + " minute sessions, with a flat signal limit of " +
+                flat_signal_limit_in_seconds.ToString() + " seconds");
+            Console.WriteLine();
+            Console.WriteLine(string.Format("{0,-10}{1,-16}{2,10}{3,10}{4,10}{5,8}", "Device", "Session", "Trials", "Alerts", "Expected", ""));
+
+            bool passed = true;
+            bool is_flat_alert_expected = (minutes_per_session * 60 >= flat_signal_limit_in_seconds);
+            foreach (MotorDeviceType device_type in new[] { MotorDeviceType.Pull, MotorDeviceType.Knob, MotorDeviceType.Lever })
+            {
+                passed &= RunSession(device_type, "Idle session", _idle_movement_interval_in_milliseconds, minutes_per_session,
+                    flat_signal_limit_in_seconds, 0);
+                passed &= RunSession(device_type, "Empty booth", _empty_booth_movement_interval_in_milliseconds, minutes_per_session,
+                    flat_signal_limit_in_seconds, is_flat_alert_expected ? 1 : 0);
+            }
+
+            Console.WriteLine();
+            Console.WriteLine(passed ? "All sessions raised the expected alerts." : "Some sessions did not raise the expected alerts.");
+            if (!passed)
+            {
+                Environment.ExitCode = 1;
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Runs one simulated session through the signal quality monitor, prints a row of the report, and returns whether the
+        /// expected number of alerts was raised
+        /// </summary>
+        private static bool RunSession (MotorDeviceType device_type, string session_name, double movement_interval_in_milliseconds,
+            double minutes_per_session, double flat_signal_limit_in_seconds, int expected_alert_count)
+        {
+            MotorBoardSimulator board = new MotorBoardSimulator(device_type, 1);
+            board.NoiseAmplitude = 0;
+            board.MeanMovementIntervalInMilliseconds = movement_interval_in_milliseconds;
+            board.SetStreamingPeriod(_sample_period_in_milliseconds);
+            MotorDevice device = board.GetMotorDevice();
+
+            MotorStage stage = new MotorStage()
+            {
+                StageName = "Signal quality check",
+                DeviceType = device_type,
+                SamplePeriodInMilliseconds = _sample_period_in_milliseconds
+            };
+
+            MotoTrakSession session = new MotoTrakSession()
+            {
+                BoothLabel = "1",
+                Device = device,
+                SelectedStage = stage,
+                StartTime = DateTime.Now
+            };
+
+            MotoTrakSignalQualityMonitor monitor = new MotoTrakSignalQualityMonitor(session, flat_signal_limit_in_seconds,
+                MotoTrakConfiguration.GetInstance().SignalClipMaximum);
+
+            //Trials are initiated at a quarter of a typical movement
+            double initiation_threshold = board.PeakAmplitude / 4;
+            bool is_above_threshold = false;
+            int trial_count = 0;
+
+            int samples_per_frame = _milliseconds_per_frame / _sample_period_in_milliseconds;
+            long total_frames = Convert.ToInt64(minutes_per_session * 60000 / _milliseconds_per_frame);
+            MotorSignalBlock raw_block = new MotorSignalBlock();
+            MotorSignalBlock transformed_block = new MotorSignalBlock();
+
+            board.EnableStreaming(1);
+            for (long f = 0; f < total_frames; f++)
+            {
+                raw_block.SetFromRows(board.ReadNextSamples(samples_per_frame));
+                transformed_block.CopyFrom(raw_block);
+                transformed_block.TransformStream(_device_stream_index, device.Slope, device.Baseline, 1, 0);
+                monitor.AddFrame(raw_block, transformed_block);
+
+                for (int i = 0; i < transformed_block.Length; i++)
+                {
+                    bool is_above = (transformed_block[_device_stream_index, i] >= initiation_threshold);
+                    if (is_above && !is_above_threshold)
+                    {
+                        trial_count++;
+                        monitor.NotifyTrialInitiation();
+                    }
+
+                    is_above_threshold = is_above;
+                }
+            }
+
+            board.EnableStreaming(0);
+
+            bool passed = (monitor.AlertCount == expected_alert_count);
+            Console.WriteLine(string.Format("{0,-10}{1,-16}{2,10}{3,10}{4,10}{5,8}", device_type.ToString(), session_name, trial_count,
+                monitor.AlertCount, expected_alert_count, passed ? "OK" : "FAILED"));
+            if (!passed)
+            {
+                foreach (string msg in monitor.CreateSessionSummary())
+                {
+                    Console.WriteLine("    " + msg);
+                }
+            }
+
+            return passed;
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,85 @@
+﻿using MotoTrakBase;
+using System;
+using System.IO;
+using System.Threading;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Runs a simulated controller board on a serial device (on Linux, one end of a pair of linked pseudo-terminals), so that
+    /// MotoTrak can be run against it as if real hardware were connected.  The simulated animal's behavior is described in
+    /// MotorBoardSimulator.  The stand-in runs until a key is pressed.
+    /// 
+    /// For example:
+    ///     socat -d -d pty,raw,echo=0,link=/tmp/motorboard pty,raw,echo=0,link=/tmp/mototrak
+    ///     SessionRunner.exe --simulate-board /tmp/motorboard pull
+    /// and then set the COM port of MotoTrak to /tmp/mototrak.
+    /// 
+    /// Usage: SessionRunner.exe --simulate-board device_path [pull | knob | lever] [seed] [bursts_per_second] [stalls_per_second]
+    /// </summary>
+    public static class SimulatedBoardStandIn
+    {
+        #region Public methods
+
+        /// <summary>
+        /// Runs the stand-in
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the stand-in switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --simulate-board device_path [pull | knob | lever] [seed] [bursts_per_second] [stalls_per_second]");
+                return;
+            }
+
+            MotorDeviceType device_type = MotorDeviceType.Pull;
+            if (args.Length > 1 && !Enum.TryParse(args[1], true, out device_type))
+            {
+                Console.WriteLine("Unknown device type: " + args[1]);
+                return;
+            }
+
+            int seed = Environment.TickCount;
+            if (args.Length > 2)
+            {
+                Int32.TryParse(args[2], out seed);
+            }
+
+            MotorBoardSimulator simulator = new MotorBoardSimulator(device_type, seed);
+
+            double bursts_per_second = 0;
+            if (args.Length > 3 && Double.TryParse(args[3], out bursts_per_second))
+            {
+                simulator.BurstsPerSecond = bursts_per_second;
+            }
+
+            double stalls_per_second = 0;
+            if (args.Length > 4 && Double.TryParse(args[4], out stalls_per_second))
+            {
+                simulator.StallsPerSecond = stalls_per_second;
+            }
+
+            //The reads and writes are done through separate streams, because one thread reads commands while another writes data
+            using (FileStream input = new FileStream(args[0], FileMode.Open, FileAccess.Read, FileShare.ReadWrite, 1))
+            using (FileStream output = new FileStream(args[0], FileMode.Open, FileAccess.Write, FileShare.ReadWrite, 1))
+            using (CancellationTokenSource cancellation = new CancellationTokenSource())
+            {
+                Thread stand_in_thread = new Thread(() => simulator.ServeSerialConnection(input, output, cancellation.Token));
+                stand_in_thread.IsBackground = true;
+                stand_in_thread.Start();
+
+                Console.WriteLine("Simulating a " + device_type.ToString().ToLower() + " board on " + args[0] + " (seed " + seed.ToString() + ").  Press any key to stop.");
+                Console.ReadKey(true);
+
+                cancellation.Cancel();
+                stand_in_thread.Join(1000);
+
+                Console.WriteLine("Samples streamed: " + simulator.SamplesStreamed.ToString() + ", dropped: " + simulator.SamplesDropped.ToString() +
+                    ", feeds: " + simulator.FeedCount.ToString() + ", stimulations: " + simulator.StimulationCount.ToString());
+            }
+        }
+
+        #endregion
+    }
+}
@@ -0,0 +1,172 @@
+﻿using MotoTrakBase;
+using MotoTrakUtilities;
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Linq;
+using System.Threading;
+
+namespace SessionRunner
+{
+    /// <summary>
+    /// Measures how long it takes to call into a Python stage implementation with each dispatch strategy of
+    /// PythonStageImplementation: the script engine's ObjectOperations.InvokeMember, Dynamitey's Dynamic.InvokeMember, and the
+    /// delegates that are bound once when the Python instance is created.  For each strategy, the session loop is run at 30 and
+    /// at 100 frames per second against a simulated controller board, and on each frame the stage implementation is called as
+    /// MotoTrak calls it while waiting for a trial: once to transform the new data, and once to check for a trial initiation.
+    /// Only the time spent in those two calls is measured.
+    /// 
+    /// Usage: SessionRunner.exe --benchmark-stage-dispatch stage_file [seconds_per_run]
+    /// </summary>
+    public static class StageDispatchBenchmark
+    {
+        #region Private data members
+
+        private static readonly int[] _frames_per_second = new int[] { 30, 100 };
+        private const int _calls_per_frame = 2;
+        private const int _warm_up_frames = 100;
+
+        #endregion
+
+        #region Public methods
+
+        /// <summary>
+        /// Runs the benchmark
+        /// </summary>
+        /// <param name="args">The command line arguments that follow the benchmark switch</param>
+        public static void Run (string[] args)
+        {
+            if (args.Length < 1)
+            {
+                Console.WriteLine("Usage: SessionRunner.exe --benchmark-stage-dispatch stage_file [seconds_per_run]");
+                return;
+            }
+
+            double seconds_per_run = 20;
+            if (args.Length > 1)
+            {
+                Double.TryParse(args[1], out seconds_per_run);
+            }
+
+            //Load the stage implementations, and make sure nothing reaches for a real controller board
+            MotoTrakConfiguration.GetInstance().ReadConfigurationFile();
+            MotoTrakConfiguration.GetInstance().PreSpecifiedComPort = "SIMULATED";
+            MotoTrakConfiguration.GetInstance().InitializeStageImplementations();
+
+            MotorStage stage = MotorStage.LoadStageFromFile(args[0]);
+            PythonStageImplementation python_stage_implementation = (stage != null) ? stage.StageImplementation as PythonStageImplementation : null;
+            if (python_stage_implementation == null)
+            {
+                Console.WriteLine("Unable to load the stage, or its Python stage implementation, from " + args[0]);
+                return;
+            }
+
+            Console.WriteLine("Stage: " + stage.StageName + " (" + python_stage_implementation.ModuleFileName + "), sample period: " +
+                stage.SamplePeriodInMilliseconds.ToString() + " ms, " + _calls_per_frame.ToString() + " calls per frame");
+            Console.WriteLine();
+            Console.WriteLine(string.Format("{0,-24}{1,6}{2,8}{3,12}{4,12}{5,12}{6,12}{7,12}{8,10}",
+                "Strategy", "FPS", "Frames", "Mean (us)", "Median", "99th pct", "Max", "Per call", "Budget %"));
+
+            foreach (int frames_per_second in _frames_per_second)
+            {
+                foreach (PythonStageImplementation.DispatchStrategy strategy in Enum.GetValues(typeof(PythonStageImplementation.DispatchStrategy)))
+                {
+                    RunStrategy(stage, python_stage_implementation, strategy, frames_per_second, seconds_per_run);
+                }
+            }
+        }
+
+        #endregion
+
+        #region Private methods
+
+        /// <summary>
+        /// Runs the session loop at a fixed frame rate for a fixed time with one dispatch strategy, and prints a row of the report
+        /// </summary>
+        private static void RunStrategy (MotorStage stage, PythonStageImplementation python_stage_implementation,
+            PythonStageImplementation.DispatchStrategy strategy, int frames_per_second, double seconds_per_run)
+        {
+            MotorBoardSimulator board = new MotorBoardSimulator(stage.DeviceType, frames_per_second);
+            board.SetStreamingPeriod(stage.SamplePeriodInMilliseconds);
+            MotorDevice device = board.GetMotorDevice();
+            stage.Autopositioner = new MotoTrakAutopositioner(board);
+            python_stage_implementation.AdjustBeginningStageParameters(new List<MotoTrakSession>(), stage);
+
+            int buffer_size = stage.TotalRecordedSamplesPerTrial;
+            List<List<double>> stream_data_transformed = Enumerable.Range(0, stage.TotalDataStreams)
+                .Select(x => Enumerable.Repeat<double>(0, buffer_size).ToList()).ToList();
+
+            //Start from a clean heap, so that each run pays only for its own garbage
+            GC.Collect();
+            GC.WaitForPendingFinalizers();
+
+            List<double> dispatch_microseconds = new List<double>();
+            double milliseconds_per_frame = 1000.0 / frames_per_second;
+            Stopwatch run_clock = new Stopwatch();
+            Stopwatch frame_stopwatch = new Stopwatch();
+            Stopwatch dispatch_stopwatch = new Stopwatch();
+            int frame_count = 0;
+
+            board.EnableStreaming(1);
+            run_clock.Start();
+            while (run_clock.Elapsed.TotalSeconds < seconds_per_run)
+            {
+                frame_stopwatch.Restart();
+
+                var new_data_points = board.ReadStream();
+                if (new_data_points.Count > buffer_size)
+                {
+                    new_data_points = new_data_points.GetRange(new_data_points.Count - buffer_size, buffer_size);
+                }
+
+                int number_of_new_data_points = new_data_points.Count;
+                var transposed_new_data = MotorMath.Transpose(new_data_points);
+
+                dispatch_stopwatch.Restart();
+                var transformed_new_data = (List<List<double>>)python_stage_implementation.InvokePythonMethod(strategy, "TransformSignals",
+                    transposed_new_data, stage, device);
+                dispatch_stopwatch.Stop();
+
+                for (int i = 0; i < transformed_new_data.Count && i < stream_data_transformed.Count; i++)
+                {
+                    stream_data_transformed[i].AddRange(transformed_new_data[i]);
+                    stream_data_transformed[i].RemoveRange(0, Math.Max(0, stream_data_transformed[i].Count - buffer_size));
+                }
+
+                dispatch_stopwatch.Start();
+                Convert.ToInt32(python_stage_implementation.InvokePythonMethod(strategy, "CheckSignalForTrialInitiation",
+                    stream_data_transformed, number_of_new_data_points, stage));
+                dispatch_stopwatch.Stop();
+
+                //The first frames include the cost of building each call site, so they are not counted
+                frame_count++;
+                if (frame_count > _warm_up_frames)
+                {
+                    dispatch_microseconds.Add(dispatch_stopwatch.Elapsed.TotalMilliseconds * 1000);
+                }
+
+                int milliseconds_to_sleep = Convert.ToInt32(Math.Round(milliseconds_per_frame - frame_stopwatch.Elapsed.TotalMilliseconds));
+                if (milliseconds_to_sleep > 0)
+                {
+                    Thread.Sleep(milliseconds_to_sleep);
+                }
+            }
+
+            board.EnableStreaming(0);
+
+            if (dispatch_microseconds.Count == 0)
+            {
+                Console.WriteLine(string.Format("{0,-24}{1,6}{2,8}", strategy.ToString(), frames_per_second, 0));
+                return;
+            }
+
+            double mean = dispatch_microseconds.Average();
+            Console.WriteLine(string.Format("{0,-24}{1,6}{2,8}{3,12:0.0}{4,12:0.0}{5,12:0.0}{6,12:0.0}{7,12:0.0}{8,10:0.00}",
+                strategy.ToString(), frames_per_second, dispatch_microseconds.Count, mean,
+                MotorMath.Percentile(dispatch_microseconds.ToArray(), 0.5), MotorMath.Percentile(dispatch_microseconds.ToArray(), 0.99),
+                dispatch_microseconds.Max(), mean / _calls_per_frame, 100 * mean / (milliseconds_per_frame * 1000)));
+        }
+
+        #endregion
+    }
+}